@@ -0,0 +1,273 @@
+"""create initial schema on an empty database
+
+Revision ID: 0000_initial_schema
+Revises: 
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0000_initial_schema'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# The app used to call create_all() on import, so databases that predate
+# Alembic already have these tables and are left alone. An empty database
+# gets the same schema, frozen as it stood before 0001; the later revisions
+# then apply their changes on top exactly as they do for an existing one.
+# Don't import the models here: they keep moving, this revision must not.
+
+TABLES = [
+    'availability',
+    'technicians',
+    'chat_sessions',
+    'chat_settings',
+    'complaints',
+    'dashboard_notifications',
+    'message_logs',
+    'oauth_states',
+    'payment_settings',
+    'services',
+    'social_accounts',
+    'social_automation_settings',
+    'staff',
+    'subscriptions',
+    'whatsapp_sessions',
+    'appointments',
+    'payment_proofs',
+]
+
+
+def upgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'technicians' in insp.get_table_names():
+        return
+
+    op.create_table(
+        'availability',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('technician_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.String(), nullable=False),
+        sa.Column('start_time', sa.String(), nullable=False),
+        sa.Column('end_time', sa.String(), nullable=False),
+    )
+    op.create_index('ix_availability_id', 'availability', ['id'])
+    op.create_index('ix_availability_technician_id', 'availability', ['technician_id'])
+    op.create_table(
+        'technicians',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('full_name', sa.String(), nullable=False),
+        sa.Column('business_name', sa.String(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False, unique=True),
+        sa.Column('password', sa.String(), nullable=False),
+    )
+    op.create_index('ix_technicians_id', 'technicians', ['id'])
+    op.create_table(
+        'chat_sessions',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('session_id', sa.String(), nullable=False),
+        sa.Column('technician_id', sa.Integer(), sa.ForeignKey('technicians.id'), nullable=False),
+        sa.Column('platform', sa.String(), nullable=True),
+        sa.Column('account_id', sa.String(), nullable=True),
+        sa.Column('step', sa.String(), nullable=True),
+        sa.Column('client_name', sa.String(), nullable=True),
+        sa.Column('client_phone', sa.String(), nullable=True),
+        sa.Column('client_email', sa.String(), nullable=True),
+        sa.Column('service_id', sa.Integer(), nullable=True),
+        sa.Column('appointment_date', sa.String(), nullable=True),
+        sa.Column('appointment_time', sa.String(), nullable=True),
+        sa.Column('booking_id', sa.Integer(), nullable=True),
+        sa.Column('last_message', sa.Text(), nullable=True),
+        sa.Column('message_count', sa.Integer(), nullable=True),
+        sa.Column('handoff_paused', sa.Boolean(), nullable=True),
+        sa.Column('handoff_note', sa.String(), nullable=True),
+        sa.Column('handoff_updated_at', sa.String(), nullable=True),
+        sa.Column('created_at', sa.String(), nullable=False),
+        sa.Column('updated_at', sa.String(), nullable=False),
+        sa.Column('expires_at', sa.String(), nullable=False),
+    )
+    op.create_index('ix_chat_sessions_id', 'chat_sessions', ['id'])
+    op.create_index('ix_chat_sessions_session_id', 'chat_sessions', ['session_id'], unique=True)
+    op.create_table(
+        'chat_settings',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('technician_id', sa.Integer(), sa.ForeignKey('technicians.id'), nullable=False, unique=True),
+        sa.Column('tone', sa.String(), nullable=True),
+        sa.Column('custom_prompt', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.String(), nullable=True),
+        sa.Column('model_name', sa.String(), nullable=True),
+        sa.Column('temperature', sa.Float(), nullable=True),
+    )
+    op.create_index('ix_chat_settings_id', 'chat_settings', ['id'])
+    op.create_table(
+        'complaints',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('technician_id', sa.Integer(), sa.ForeignKey('technicians.id'), nullable=False),
+        sa.Column('booking_id', sa.Integer(), nullable=True),
+        sa.Column('client_name', sa.String(), nullable=False),
+        sa.Column('client_contact', sa.String(), nullable=True),
+        sa.Column('complaint_text', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('created_at', sa.String(), nullable=False),
+    )
+    op.create_index('ix_complaints_id', 'complaints', ['id'])
+    op.create_index('ix_complaints_technician_id', 'complaints', ['technician_id'])
+    op.create_table(
+        'dashboard_notifications',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('technician_id', sa.Integer(), sa.ForeignKey('technicians.id'), nullable=False),
+        sa.Column('event_type', sa.String(), nullable=False),
+        sa.Column('title', sa.String(), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('related_id', sa.Integer(), nullable=True),
+        sa.Column('is_read', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.String(), nullable=False),
+    )
+    op.create_index('ix_dashboard_notifications_id', 'dashboard_notifications', ['id'])
+    op.create_index('ix_dashboard_notifications_technician_id', 'dashboard_notifications', ['technician_id'])
+    op.create_table(
+        'message_logs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('technician_id', sa.Integer(), sa.ForeignKey('technicians.id'), nullable=False),
+        sa.Column('platform', sa.String(), nullable=False),
+        sa.Column('direction', sa.String(), nullable=True),
+        sa.Column('sender_id', sa.String(), nullable=True),
+        sa.Column('recipient_id', sa.String(), nullable=True),
+        sa.Column('message_content', sa.Text(), nullable=True),
+        sa.Column('session_id', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('created_at', sa.String(), nullable=False),
+    )
+    op.create_index('ix_message_logs_id', 'message_logs', ['id'])
+    op.create_table(
+        'oauth_states',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('state', sa.String(), nullable=False),
+        sa.Column('technician_id', sa.Integer(), sa.ForeignKey('technicians.id'), nullable=False),
+        sa.Column('platform', sa.String(), nullable=False),
+        sa.Column('created_at', sa.String(), nullable=False),
+        sa.Column('expires_at', sa.String(), nullable=False),
+        sa.Column('used', sa.Boolean(), nullable=True),
+    )
+    op.create_index('ix_oauth_states_id', 'oauth_states', ['id'])
+    op.create_index('ix_oauth_states_state', 'oauth_states', ['state'], unique=True)
+    op.create_table(
+        'payment_settings',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('technician_id', sa.Integer(), sa.ForeignKey('technicians.id'), nullable=False),
+        sa.Column('provider', sa.String(), nullable=False),
+        sa.Column('public_key', sa.String(), nullable=True),
+        sa.Column('secret_key', sa.String(), nullable=True),
+        sa.Column('bank_name', sa.String(), nullable=True),
+        sa.Column('account_name', sa.String(), nullable=True),
+        sa.Column('account_number', sa.String(), nullable=True),
+        sa.Column('auto_confirm_proofs', sa.Boolean(), nullable=True),
+    )
+    op.create_index('ix_payment_settings_id', 'payment_settings', ['id'])
+    op.create_table(
+        'services',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('technician_id', sa.Integer(), sa.ForeignKey('technicians.id'), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('duration', sa.Integer(), nullable=False),
+    )
+    op.create_index('ix_services_id', 'services', ['id'])
+    op.create_table(
+        'social_accounts',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('technician_id', sa.Integer(), sa.ForeignKey('technicians.id'), nullable=False),
+        sa.Column('platform', sa.String(), nullable=False),
+        sa.Column('account_name', sa.String(), nullable=False),
+        sa.Column('account_id', sa.String(), nullable=True),
+        sa.Column('phone_number', sa.String(), nullable=True),
+        sa.Column('access_token', sa.Text(), nullable=True),
+        sa.Column('refresh_token', sa.Text(), nullable=True),
+        sa.Column('token_expires_at', sa.String(), nullable=True),
+        sa.Column('connected_at', sa.String(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('webhook_verified', sa.Boolean(), nullable=True),
+        sa.Column('webhook_url', sa.String(), nullable=True),
+    )
+    op.create_index('ix_social_accounts_id', 'social_accounts', ['id'])
+    op.create_table(
+        'social_automation_settings',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('technician_id', sa.Integer(), sa.ForeignKey('technicians.id'), nullable=False, unique=True),
+        sa.Column('auto_reply_enabled', sa.Boolean(), nullable=True),
+        sa.Column('welcome_dm_template', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.String(), nullable=False),
+    )
+    op.create_index('ix_social_automation_settings_id', 'social_automation_settings', ['id'])
+    op.create_table(
+        'staff',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('technician_id', sa.Integer(), sa.ForeignKey('technicians.id'), nullable=False),
+        sa.Column('full_name', sa.String(), nullable=False),
+        sa.Column('role', sa.String(), nullable=True),
+        sa.Column('active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.String(), nullable=True),
+    )
+    op.create_index('ix_staff_id', 'staff', ['id'])
+    op.create_index('ix_staff_technician_id', 'staff', ['technician_id'])
+    op.create_table(
+        'subscriptions',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('technician_id', sa.Integer(), sa.ForeignKey('technicians.id'), nullable=False),
+        sa.Column('plan', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('start_date', sa.String(), nullable=True),
+        sa.Column('end_date', sa.String(), nullable=True),
+        sa.Column('stripe_subscription_id', sa.String(), nullable=True),
+    )
+    op.create_index('ix_subscriptions_id', 'subscriptions', ['id'])
+    op.create_table(
+        'whatsapp_sessions',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('technician_id', sa.Integer(), sa.ForeignKey('technicians.id'), nullable=False),
+        sa.Column('session_id', sa.String(), nullable=False),
+        sa.Column('qr_code_data', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('created_at', sa.String(), nullable=False),
+        sa.Column('expires_at', sa.String(), nullable=False),
+        sa.Column('connected_at', sa.String(), nullable=True),
+    )
+    op.create_index('ix_whatsapp_sessions_id', 'whatsapp_sessions', ['id'])
+    op.create_index('ix_whatsapp_sessions_session_id', 'whatsapp_sessions', ['session_id'], unique=True)
+    op.create_table(
+        'appointments',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('technician_id', sa.Integer(), nullable=False),
+        sa.Column('service_id', sa.Integer(), nullable=False),
+        sa.Column('client_name', sa.String(), nullable=False),
+        sa.Column('date', sa.String(), nullable=False),
+        sa.Column('time', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('booking_source', sa.String(), nullable=True),
+        sa.Column('staff_id', sa.Integer(), sa.ForeignKey('staff.id'), nullable=True),
+    )
+    op.create_index('ix_appointments_id', 'appointments', ['id'])
+    op.create_index('ix_appointments_technician_id', 'appointments', ['technician_id'])
+    op.create_table(
+        'payment_proofs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('booking_id', sa.Integer(), sa.ForeignKey('appointments.id'), nullable=False),
+        sa.Column('technician_id', sa.Integer(), sa.ForeignKey('technicians.id'), nullable=False),
+        sa.Column('filename', sa.String(), nullable=False),
+        sa.Column('uploaded_at', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('reviewed_at', sa.String(), nullable=True),
+        sa.Column('reviewed_by', sa.String(), nullable=True),
+    )
+    op.create_index('ix_payment_proofs_id', 'payment_proofs', ['id'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    existing = set(sa.inspect(conn).get_table_names())
+    for table in reversed(TABLES):
+        if table in existing:
+            op.drop_table(table)
@@ -1,7 +1,7 @@
 """add appointments columns
 
 Revision ID: 0001_add_appointments_columns
-Revises: 
+Revises: 0000_initial_schema
 Create Date: 2026-02-17 00:00:00.000000
 """
 from alembic import op
@@ -9,7 +9,7 @@ import sqlalchemy as sa
 
 # revision identifiers, used by Alembic.
 revision = '0001_add_appointments_columns'
-down_revision = None
+down_revision = '0000_initial_schema'
 branch_labels = None
 depends_on = None
 
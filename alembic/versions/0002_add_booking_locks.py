@@ -0,0 +1,41 @@
+"""add booking locks
+
+Revision ID: 0002_add_booking_locks
+Revises: 0001_add_appointments_columns
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002_add_booking_locks'
+down_revision = '0001_add_appointments_columns'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # One lock row per technician-day; the booking service updates it before
+    # checking for overlaps so concurrent bookings for the same day serialize.
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'booking_locks' in insp.get_table_names():
+        return
+
+    op.create_table(
+        'booking_locks',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('technician_id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.String(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False, server_default='0'),
+        sa.UniqueConstraint('technician_id', 'date', name='uq_booking_locks_technician_date'),
+    )
+    op.create_index('ix_booking_locks_id', 'booking_locks', ['id'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'booking_locks' in insp.get_table_names():
+        op.drop_index('ix_booking_locks_id', table_name='booking_locks')
+        op.drop_table('booking_locks')
@@ -0,0 +1,291 @@
+"""native date/time columns and appointment indexes
+
+Revision ID: 0003_native_datetime_columns
+Revises: 0002_add_booking_locks
+Create Date: 2026-10-18 00:00:00.000000
+
+Each String date/time column is replaced by a native column: a nullable
+shadow column is added, backfilled in id-ordered batches (each batch commits
+on its own so large tenants never hold a long table lock), then swapped in
+and given the same NULL / NOT NULL as the model.
+
+Values are read as leniently as the app reads them ("9:00" is a valid
+time). Every column is checked before anything is changed, and the
+migration stops with a list of offending rows if any value still can't be
+converted, rather than writing NULL over data the downgrade can't restore.
+"""
+import os
+from datetime import date, datetime, time, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003_native_datetime_columns'
+down_revision = '0002_add_booking_locks'
+branch_labels = None
+depends_on = None
+
+# Rows copied per transaction while backfilling; keeps each lock short
+BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+
+DATE = sa.Date()
+TIME = sa.Time()
+TIMESTAMP = sa.DateTime(timezone=True)
+
+# (table, column, native type, nullable) - nullability is the same before and after
+COLUMNS = [
+    ('appointments', 'date', DATE, False),
+    ('appointments', 'time', TIME, False),
+    ('appointments', 'created_at', TIMESTAMP, True),
+    ('availability', 'start_time', TIME, False),
+    ('availability', 'end_time', TIME, False),
+    ('staff', 'created_at', TIMESTAMP, True),
+    ('subscriptions', 'start_date', TIMESTAMP, True),
+    ('subscriptions', 'end_date', TIMESTAMP, True),
+    ('social_accounts', 'token_expires_at', TIMESTAMP, True),
+    ('social_accounts', 'connected_at', TIMESTAMP, False),
+    ('social_automation_settings', 'updated_at', TIMESTAMP, False),
+    ('whatsapp_sessions', 'created_at', TIMESTAMP, False),
+    ('whatsapp_sessions', 'expires_at', TIMESTAMP, False),
+    ('whatsapp_sessions', 'connected_at', TIMESTAMP, True),
+    ('oauth_states', 'created_at', TIMESTAMP, False),
+    ('oauth_states', 'expires_at', TIMESTAMP, False),
+    ('chat_settings', 'updated_at', TIMESTAMP, True),
+    ('payment_proofs', 'uploaded_at', TIMESTAMP, False),
+    ('payment_proofs', 'reviewed_at', TIMESTAMP, True),
+    ('chat_sessions', 'created_at', TIMESTAMP, False),
+    ('chat_sessions', 'updated_at', TIMESTAMP, False),
+    ('chat_sessions', 'expires_at', TIMESTAMP, False),
+    ('message_logs', 'created_at', TIMESTAMP, False),
+    ('dashboard_notifications', 'created_at', TIMESTAMP, False),
+    ('complaints', 'created_at', TIMESTAMP, False),
+]
+
+NATIVE_TYPES = {(table, column): native for table, column, native, _ in COLUMNS}
+
+INDEXES = [
+    ('ix_appointments_technician_date_status', ['technician_id', 'date', 'status']),
+    ('ix_appointments_technician_staff_date', ['technician_id', 'staff_id', 'date']),
+]
+
+TMP_SUFFIX = '__swap'
+
+
+# ==========================
+# VALUE CONVERSION
+# ==========================
+
+# The parsers below are frozen copies of the app's (availability.parse_time,
+# column_types.to_date / to_utc_datetime) as of this revision. Migrations
+# must not import live app code: a later change there would silently change
+# what this revision does to existing data.
+
+class UnconvertibleValues(RuntimeError):
+    """Legacy values that have no native equivalent; nothing has been changed yet"""
+
+
+def _parse_minutes(text):
+    """HH:MM (or HH:MM:SS, or bare HH) as minutes since midnight"""
+    parts = text.strip().split(':')
+    hours, minutes = int(parts[0]), int(parts[1]) if len(parts) > 1 else 0
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or (hours == 24 and minutes):
+        raise ValueError(f"Invalid time: {text}")
+    return hours * 60 + minutes
+
+
+def _to_date(text):
+    return date.fromisoformat(text[:10])
+
+
+def _to_utc_datetime(text):
+    value = datetime.fromisoformat(text)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _to_time(text):
+    try:
+        return time.fromisoformat(text)
+    except ValueError:
+        # Same parsing as availability slots: "9:00", "9", "09:00:30"
+        minutes = _parse_minutes(text)
+        if minutes >= 24 * 60:
+            raise ValueError(f"{text} has no TIME equivalent")
+        return time(minutes // 60, minutes % 60)
+
+
+def _to_native(value, native_type):
+    """Parse a legacy string value (None for NULL/empty); raises ValueError if it can't be parsed"""
+    if value is None or str(value).strip() == '':
+        return None
+    text = str(value).strip()
+    if isinstance(native_type, sa.Date):
+        return _to_date(text)
+    if isinstance(native_type, sa.Time):
+        return _to_time(text)
+    return _to_utc_datetime(text.replace('Z', '+00:00'))
+
+
+def _to_string(value, native_type):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    if isinstance(native_type, sa.Time) and value.second == 0 and value.microsecond == 0:
+        return value.strftime('%H:%M')
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc).isoformat()
+    return value.isoformat()
+
+
+# ==========================
+# HELPERS
+# ==========================
+
+def _columns(conn, table):
+    insp = sa.inspect(conn)
+    if table not in insp.get_table_names():
+        return None
+    return {c['name']: c['type'] for c in insp.get_columns(table)}
+
+
+def _is_string(col_type):
+    return isinstance(col_type, (sa.String, sa.Text))
+
+
+def _select_batches(conn, table, source, read_type):
+    """Yield (id, value) rows of `table` in id-ordered batches"""
+    select_batch = sa.text(
+        f'SELECT id, {source} FROM {table} WHERE id > :last_id ORDER BY id LIMIT :limit'
+    ).columns(sa.column('id', sa.Integer()), sa.column(source, read_type))
+    last_id = 0
+    while True:
+        rows = conn.execute(select_batch, {'last_id': last_id, 'limit': BATCH_SIZE}).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _check_convertible(conn):
+    """Raise UnconvertibleValues before any column is touched if a value can't be migrated"""
+    problems = []
+    for table, column, native_type, nullable in COLUMNS:
+        cols = _columns(conn, table)
+        if cols is None or column not in cols or not _is_string(cols[column]):
+            continue
+        for rows in _select_batches(conn, table, column, sa.String()):
+            for row_id, value in rows:
+                try:
+                    converted = _to_native(value, native_type)
+                except ValueError:
+                    problems.append(f"{table}.{column} id={row_id}: {value!r}")
+                    continue
+                if converted is None and not nullable:
+                    problems.append(f"{table}.{column} id={row_id}: empty value in a NOT NULL column")
+    if problems:
+        shown = "\n  ".join(problems[:50])
+        more = f"\n  ... and {len(problems) - 50} more" if len(problems) > 50 else ""
+        raise UnconvertibleValues(
+            f"{len(problems)} value(s) can't be converted to native date/time columns; "
+            f"fix them and re-run the migration:\n  {shown}{more}"
+        )
+
+
+def _backfill(conn, table, source, target, read_type, write_type, convert):
+    """Copy `source` into `target` in id-ordered batches, one commit per batch"""
+    update_row = sa.text(
+        f'UPDATE {table} SET {target} = :value WHERE id = :row_id'
+    ).bindparams(sa.bindparam('value', type_=write_type))
+
+    # Runs inside autocommit_block, so every batch UPDATE commits on its own
+    for rows in _select_batches(conn, table, source, read_type):
+        conn.execute(update_row, [{'value': convert(value), 'row_id': row_id} for row_id, value in rows])
+
+
+def _swap_column(table, column, new_type, to_native):
+    """Add a shadow column, backfill it in batches, then swap it in place of `column`; False if there was nothing to swap"""
+    conn = op.get_bind()
+    cols = _columns(conn, table)
+    if cols is None or column not in cols:
+        return False
+    if _is_string(cols[column]) != to_native:
+        # Already converted (e.g. created by create_all with the new models)
+        return False
+
+    tmp = column + TMP_SUFFIX
+    if tmp not in cols:
+        op.add_column(table, sa.Column(tmp, new_type, nullable=True))
+
+    if to_native:
+        read_type, write_type = sa.String(), new_type
+        convert = lambda v: _to_native(v, new_type)  # noqa: E731
+    else:
+        old_type = NATIVE_TYPES[(table, column)]
+        read_type, write_type = old_type, sa.String()
+        convert = lambda v: _to_string(v, old_type)  # noqa: E731
+
+    with op.get_context().autocommit_block():
+        _backfill(conn, table, column, tmp, read_type, write_type, convert)
+
+    # Both are metadata-only operations on Postgres and SQLite >= 3.35
+    op.execute(f'ALTER TABLE {table} DROP COLUMN {column}')
+    op.execute(f'ALTER TABLE {table} RENAME COLUMN {tmp} TO {column}')
+    return True
+
+
+def _restore_not_null(swapped):
+    """Put NOT NULL back on swapped columns (batch mode rebuilds the table on SQLite)"""
+    tables = {}
+    for table, column, column_type, nullable in swapped:
+        if not nullable:
+            tables.setdefault(table, []).append((column, column_type))
+    for table, columns in tables.items():
+        with op.batch_alter_table(table) as batch:
+            for column, column_type in columns:
+                batch.alter_column(column, existing_type=column_type, nullable=False)
+
+
+def _drop_appointment_indexes(conn):
+    existing = {ix['name'] for ix in sa.inspect(conn).get_indexes('appointments')}
+    for name, _ in INDEXES:
+        if name in existing:
+            op.drop_index(name, table_name='appointments')
+
+
+def upgrade():
+    conn = op.get_bind()
+    _check_convertible(conn)
+    if _columns(conn, 'appointments') is not None:
+        # Indexes on the old columns would block DROP COLUMN; recreate afterwards
+        _drop_appointment_indexes(conn)
+
+    _restore_not_null([
+        (table, column, native_type, nullable)
+        for table, column, native_type, nullable in COLUMNS
+        if _swap_column(table, column, native_type, to_native=True)
+    ])
+
+    if _columns(conn, 'appointments') is None:
+        return
+
+    concurrently = conn.dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for name, cols in INDEXES:
+            op.create_index(name, 'appointments', cols, postgresql_concurrently=concurrently)
+
+
+def downgrade():
+    conn = op.get_bind()
+    if _columns(conn, 'appointments') is not None:
+        _drop_appointment_indexes(conn)
+
+    _restore_not_null([
+        (table, column, sa.String(), nullable)
+        for table, column, _, nullable in reversed(COLUMNS)
+        if _swap_column(table, column, sa.String(), to_native=False)
+    ])
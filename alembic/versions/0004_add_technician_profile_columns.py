@@ -0,0 +1,43 @@
+"""add technician profile columns
+
+Revision ID: 0004_add_technician_profile_columns
+Revises: 0003_native_datetime_columns
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004_add_technician_profile_columns'
+down_revision = '0003_native_datetime_columns'
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    ('phone', sa.String(), None),
+    ('country', sa.String(), None),
+    ('payment_provider', sa.String(), None),
+    ('deposit_required', sa.Boolean(), sa.false()),
+    ('deposit_amount', sa.Float(), '0'),
+]
+
+
+def upgrade():
+    # Add columns used by signup/login to technicians table if they don't exist
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    cols = [c['name'] for c in insp.get_columns('technicians')]
+
+    for name, col_type, default in COLUMNS:
+        if name not in cols:
+            op.add_column('technicians', sa.Column(name, col_type, nullable=True, server_default=default))
+
+
+def downgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    cols = [c['name'] for c in insp.get_columns('technicians')]
+
+    for name, _, _ in reversed(COLUMNS):
+        if name in cols:
+            op.drop_column('technicians', name)
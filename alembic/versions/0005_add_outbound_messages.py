@@ -0,0 +1,50 @@
+"""add outbound messages outbox
+
+Revision ID: 0005_add_outbound_messages
+Revises: 0004_add_technician_profile_columns
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005_add_outbound_messages'
+down_revision = '0004_add_technician_profile_columns'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'outbound_messages' in insp.get_table_names():
+        return
+
+    op.create_table(
+        'outbound_messages',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('message_log_id', sa.Integer(), sa.ForeignKey('message_logs.id'), nullable=False),
+        sa.Column('technician_id', sa.Integer(), sa.ForeignKey('technicians.id'), nullable=False),
+        sa.Column('platform', sa.String(), nullable=False),
+        sa.Column('recipient_id', sa.String(), nullable=False),
+        sa.Column('social_account_id', sa.Integer(), sa.ForeignKey('social_accounts.id'), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=True),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('provider_message_id', sa.String(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index('ix_outbound_messages_id', 'outbound_messages', ['id'])
+    op.create_index('ix_outbound_messages_message_log_id', 'outbound_messages', ['message_log_id'])
+    op.create_index('ix_outbound_messages_provider_message_id', 'outbound_messages', ['provider_message_id'])
+    op.create_index('ix_outbound_messages_status_next_attempt', 'outbound_messages', ['status', 'next_attempt_at'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'outbound_messages' in insp.get_table_names():
+        op.drop_table('outbound_messages')
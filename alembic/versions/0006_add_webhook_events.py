@@ -0,0 +1,41 @@
+"""add webhook events inbox
+
+Revision ID: 0006_add_webhook_events
+Revises: 0005_add_outbound_messages
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0006_add_webhook_events'
+down_revision = '0005_add_outbound_messages'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'webhook_events' in insp.get_table_names():
+        return
+
+    op.create_table(
+        'webhook_events',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('received_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_webhook_events_id', 'webhook_events', ['id'])
+    op.create_index('ix_webhook_events_status_received', 'webhook_events', ['status', 'received_at'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'webhook_events' in insp.get_table_names():
+        op.drop_table('webhook_events')
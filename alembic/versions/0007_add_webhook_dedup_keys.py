@@ -0,0 +1,35 @@
+"""add webhook dedup keys
+
+Revision ID: 0007_add_webhook_dedup_keys
+Revises: 0006_add_webhook_events
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0007_add_webhook_dedup_keys'
+down_revision = '0006_add_webhook_events'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'webhook_dedup_keys' in insp.get_table_names():
+        return
+
+    op.create_table(
+        'webhook_dedup_keys',
+        sa.Column('key', sa.String(), primary_key=True),
+        sa.Column('seen_at', sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index('ix_webhook_dedup_keys_seen_at', 'webhook_dedup_keys', ['seen_at'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'webhook_dedup_keys' in insp.get_table_names():
+        op.drop_table('webhook_dedup_keys')
@@ -0,0 +1,41 @@
+"""add keyset pagination indexes for notifications and message logs
+
+Revision ID: 0008_add_feed_indexes
+Revises: 0007_add_webhook_dedup_keys
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0008_add_feed_indexes'
+down_revision = '0007_add_webhook_dedup_keys'
+branch_labels = None
+depends_on = None
+
+# (table, index name, columns); id is the keyset tie-breaker
+INDEXES = [
+    ('message_logs', 'ix_message_logs_technician_created', ['technician_id', 'created_at', 'id']),
+    ('message_logs', 'ix_message_logs_session_created', ['session_id', 'created_at', 'id']),
+    ('dashboard_notifications', 'ix_dashboard_notifications_technician_created', ['technician_id', 'created_at', 'id']),
+]
+
+
+def upgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    tables = set(insp.get_table_names())
+    for table, name, columns in INDEXES:
+        if table not in tables:
+            continue
+        if name not in {ix['name'] for ix in insp.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    tables = set(insp.get_table_names())
+    for table, name, _ in INDEXES:
+        if table in tables and name in {ix['name'] for ix in insp.get_indexes(table)}:
+            op.drop_index(name, table_name=table)
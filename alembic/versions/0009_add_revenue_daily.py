@@ -0,0 +1,72 @@
+"""add revenue_daily rollup table
+
+Revision ID: 0009_add_revenue_daily
+Revises: 0008_add_feed_indexes
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0009_add_revenue_daily'
+down_revision = '0008_add_feed_indexes'
+branch_labels = None
+depends_on = None
+
+# Same rules as services/backend/revenue.py: cancelled bookings are
+# excluded, confirmed/paid payments count as confirmed, the rest as pending.
+BACKFILL = """
+INSERT INTO revenue_daily (
+    technician_id, day, staff_id, service_id,
+    confirmed_revenue, confirmed_bookings, pending_revenue, pending_bookings
+)
+SELECT
+    a.technician_id,
+    a.date,
+    COALESCE(a.staff_id, 0),
+    COALESCE(a.service_id, 0),
+    SUM(CASE WHEN LOWER(COALESCE(a.payment_status, '')) IN ('confirmed', 'paid')
+             THEN COALESCE(a.service_price, s.price, 0) ELSE 0 END),
+    SUM(CASE WHEN LOWER(COALESCE(a.payment_status, '')) IN ('confirmed', 'paid') THEN 1 ELSE 0 END),
+    SUM(CASE WHEN LOWER(COALESCE(a.payment_status, '')) NOT IN ('confirmed', 'paid')
+             THEN COALESCE(a.service_price, s.price, 0) ELSE 0 END),
+    SUM(CASE WHEN LOWER(COALESCE(a.payment_status, '')) NOT IN ('confirmed', 'paid') THEN 1 ELSE 0 END)
+FROM appointments a
+LEFT JOIN services s ON s.id = a.service_id
+WHERE a.date IS NOT NULL
+  AND LOWER(COALESCE(a.status, '')) NOT IN ('cancelled', 'canceled')
+GROUP BY a.technician_id, a.date, COALESCE(a.staff_id, 0), COALESCE(a.service_id, 0)
+"""
+
+
+def upgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'revenue_daily' in insp.get_table_names():
+        return
+
+    op.create_table(
+        'revenue_daily',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('technician_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('staff_id', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('service_id', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('confirmed_revenue', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('confirmed_bookings', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('pending_revenue', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('pending_bookings', sa.Integer(), nullable=False, server_default='0'),
+        sa.UniqueConstraint('technician_id', 'day', 'staff_id', 'service_id', name='uq_revenue_daily_key'),
+    )
+    op.create_index('ix_revenue_daily_id', 'revenue_daily', ['id'])
+
+    if 'appointments' in insp.get_table_names():
+        op.execute(BACKFILL)
+
+
+def downgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'revenue_daily' in insp.get_table_names():
+        op.drop_index('ix_revenue_daily_id', table_name='revenue_daily')
+        op.drop_table('revenue_daily')
@@ -0,0 +1,36 @@
+"""add token expiry index on social_accounts
+
+Revision ID: 0010_add_social_account_expiry_index
+Revises: 0009_add_revenue_daily
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0010_add_social_account_expiry_index'
+down_revision = '0009_add_revenue_daily'
+branch_labels = None
+depends_on = None
+
+INDEX = 'ix_social_accounts_active_expiry'
+
+
+def _has_index(insp):
+    return INDEX in {ix['name'] for ix in insp.get_indexes('social_accounts')}
+
+
+def upgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'social_accounts' not in insp.get_table_names():
+        return
+    if not _has_index(insp):
+        op.create_index(INDEX, 'social_accounts', ['is_active', 'token_expires_at'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'social_accounts' in insp.get_table_names() and _has_index(insp):
+        op.drop_index(INDEX, table_name='social_accounts')
@@ -0,0 +1,35 @@
+"""add processing lease to webhook events
+
+Revision ID: 0011_add_webhook_event_lease
+Revises: 0010_add_social_account_expiry_index
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0011_add_webhook_event_lease'
+down_revision = '0010_add_social_account_expiry_index'
+branch_labels = None
+depends_on = None
+
+
+def _columns(insp):
+    return {c['name'] for c in insp.get_columns('webhook_events')}
+
+
+def upgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'webhook_events' not in insp.get_table_names():
+        return
+    if 'lease_until' not in _columns(insp):
+        op.add_column('webhook_events', sa.Column('lease_until', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'webhook_events' in insp.get_table_names() and 'lease_until' in _columns(insp):
+        with op.batch_alter_table('webhook_events') as batch:
+            batch.drop_column('lease_until')
@@ -0,0 +1,37 @@
+"""add version to chat sessions
+
+Revision ID: 0012_add_chat_session_version
+Revises: 0011_add_webhook_event_lease
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0012_add_chat_session_version'
+down_revision = '0011_add_webhook_event_lease'
+branch_labels = None
+depends_on = None
+
+
+def _columns(insp):
+    return {c['name'] for c in insp.get_columns('chat_sessions')}
+
+
+def upgrade():
+    # Bumped on every write; workers update a session only at the version
+    # they read, so one worker's cached copy can't overwrite another's turn.
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'chat_sessions' not in insp.get_table_names():
+        return
+    if 'version' not in _columns(insp):
+        op.add_column('chat_sessions', sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if 'chat_sessions' in insp.get_table_names() and 'version' in _columns(insp):
+        with op.batch_alter_table('chat_sessions') as batch:
+            batch.drop_column('version')
@@ -1,13 +1,27 @@
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
+import os
+import threading
+from types import SimpleNamespace
 import jwt
+from cachetools import TTLCache
 from fastapi import HTTPException, status
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from services.backend import metrics, models
 
 # ---------------- CONFIG ----------------
 SECRET_KEY = "AIVA_SUPER_SECRET_KEY"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 7
 
+# Verified tokens and technician rows are cached per process; the TTL bounds
+# how long another worker's profile/password change can go unnoticed.
+AUTH_CACHE_TTL_SEC = int(os.getenv("AUTH_CACHE_TTL_SEC", "60"))
+AUTH_CACHE_MAX = int(os.getenv("AUTH_CACHE_MAX", "10000"))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
@@ -21,11 +35,11 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 
 # ---------------- TOKEN CREATION ----------------
-def create_access_token(email: str) -> str:
+def create_access_token(subject: str) -> str:
     expire = datetime.now(timezone.utc) + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
 
     payload = {
-        "sub": email,
+        "sub": subject,
         "exp": expire
     }
 
@@ -33,8 +47,94 @@ def create_access_token(email: str) -> str:
     return token
 
 
+# ---------------- AUTH CACHE ----------------
+class AuthCache:
+    """LRU/TTL cache of verified token claims and technician snapshots"""
+
+    def __init__(self, maxsize: int = AUTH_CACHE_MAX, ttl: int = AUTH_CACHE_TTL_SEC):
+        self.claims: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)  # token -> (email, exp)
+        self.technicians: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)  # email -> snapshot
+        self.lock = threading.Lock()
+        self.counters = {
+            "token_hits": 0,
+            "token_misses": 0,
+            "technician_hits": 0,
+            "technician_misses": 0,
+            "invalidations": 0,
+        }
+
+    def get_claims(self, token: str):
+        with self.lock:
+            cached = self.claims.get(token)
+            if cached is not None and cached[1] > datetime.now(timezone.utc).timestamp():
+                self.counters["token_hits"] += 1
+                return cached[0]
+            self.counters["token_misses"] += 1
+            return None
+
+    def put_claims(self, token: str, email: str, exp: float) -> None:
+        with self.lock:
+            self.claims[token] = (email, exp)
+
+    def get_technician(self, email: str):
+        with self.lock:
+            cached = self.technicians.get(email)
+            self.counters["technician_hits" if cached is not None else "technician_misses"] += 1
+            return cached
+
+    def put_technician(self, email: str, snapshot) -> None:
+        with self.lock:
+            self.technicians[email] = snapshot
+
+    def invalidate_technician(self, technician_id: int = None, email: str = None) -> None:
+        with self.lock:
+            for key, snapshot in list(self.technicians.items()):
+                if key == email or snapshot.id == technician_id:
+                    del self.technicians[key]
+            self.counters["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.claims.clear()
+            self.technicians.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                **self.counters,
+                "tokens_cached": len(self.claims),
+                "technicians_cached": len(self.technicians),
+            }
+
+
+auth_cache = AuthCache()
+metrics.register("auth_cache", auth_cache.stats)
+
+
+def _snapshot(tech: models.Technician) -> SimpleNamespace:
+    """Detached, read-only copy of a technician row (password excluded)"""
+    values = {
+        attr.key: getattr(tech, attr.key)
+        for attr in tech.__mapper__.column_attrs
+        if attr.key != "password"
+    }
+    return SimpleNamespace(**values)
+
+
+@event.listens_for(models.Technician, "after_update")
+@event.listens_for(models.Technician, "after_delete")
+def _invalidate_on_change(mapper, connection, target):
+    """Profile or password changes drop the cached row in this process"""
+    auth_cache.invalidate_technician(technician_id=target.id, email=target.email)
+
+
 # ---------------- TOKEN VERIFICATION ----------------
-def get_technician_from_token(token: str):
+def decode_token(token: str) -> str:
+    """Verify a JWT and return its subject (email), using the claims cache"""
+    email = auth_cache.get_claims(token)
+    if email is not None:
+        return email
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email = payload.get("sub")
@@ -45,8 +145,6 @@ def get_technician_from_token(token: str):
                 detail="Invalid authentication token"
             )
 
-        return email
-
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -57,4 +155,42 @@ def get_technician_from_token(token: str):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
-        )
\ No newline at end of file
+        )
+
+    auth_cache.put_claims(token, email, float(payload.get("exp", 0)))
+    return email
+
+
+def get_technician_from_token(token: str, db: Session):
+    """Resolve a bearer token to a read-only technician snapshot (None if unknown)"""
+    email = decode_token(token)
+
+    cached = auth_cache.get_technician(email)
+    if cached is not None:
+        return cached
+
+    tech = db.query(models.Technician).filter(models.Technician.email == email).first()
+    if not tech:
+        return None
+
+    snapshot = _snapshot(tech)
+    auth_cache.put_technician(email, snapshot)
+    return snapshot
+
+
+async def get_technician_from_token_async(token: str, db: AsyncSession):
+    """get_technician_from_token() for async endpoints"""
+    email = decode_token(token)
+
+    cached = auth_cache.get_technician(email)
+    if cached is not None:
+        return cached
+
+    result = await db.execute(select(models.Technician).where(models.Technician.email == email))
+    tech = result.scalars().first()
+    if not tech:
+        return None
+
+    snapshot = _snapshot(tech)
+    auth_cache.put_technician(email, snapshot)
+    return snapshot
@@ -0,0 +1,295 @@
+# availability.py
+# Slot engine: turns Availability rows and service durations into per-day
+# interval sets and subtracts the intervals blocked by existing appointments.
+from datetime import date as date_type, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy.orm import Session
+
+from services.backend import models
+
+# Intervals are (start, end) minutes since midnight, end exclusive.
+Interval = Tuple[int, int]
+
+# Statuses that hold a slot (see docs/booking-integration-contract.md)
+BLOCKING_STATUSES = ("pending", "payment_sent", "confirmed", "paid")
+
+DEFAULT_TIMEZONE = "UTC"
+DEFAULT_DURATION_MINUTES = 60
+DEFAULT_STEP_MINUTES = 30
+
+# Used when a technician has not configured any availability yet
+DEFAULT_WORKING_HOURS: Tuple[str, str] = ("09:00", "18:00")
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+def parse_time(value: str) -> int:
+    """Parse HH:MM (or HH:MM:SS) into minutes since midnight"""
+    parts = value.strip().split(":")
+    hours, minutes = int(parts[0]), int(parts[1]) if len(parts) > 1 else 0
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or (hours == 24 and minutes):
+        raise ValueError(f"Invalid time: {value}")
+    return hours * 60 + minutes
+
+
+def format_time(minutes: int) -> str:
+    """Format minutes since midnight as HH:MM"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def parse_date(value: str) -> date_type:
+    """Parse an ISO date (YYYY-MM-DD)"""
+    return date_type.fromisoformat(value.strip())
+
+
+def get_timezone(name: Optional[str]) -> ZoneInfo:
+    """Resolve an IANA timezone name, raising ValueError if unknown"""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {name}")
+
+
+def _day_matches(day: str, target: date_type) -> bool:
+    """Availability.day may hold a weekday name/abbreviation or an ISO date"""
+    value = (day or "").strip().lower()
+    if not value:
+        return False
+    if value[0].isdigit():
+        try:
+            return parse_date(value) == target
+        except ValueError:
+            return False
+    weekday = WEEKDAYS[target.weekday()]
+    return value == weekday or (len(value) >= 3 and weekday.startswith(value))
+
+
+# ==========================
+# INTERVAL SET OPERATIONS
+# ==========================
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sort and merge overlapping/adjacent intervals"""
+    merged: List[Interval] = []
+    for start, end in sorted(i for i in intervals if i[1] > i[0]):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(free: List[Interval], blocked: List[Interval]) -> List[Interval]:
+    """Remove merged `blocked` intervals from merged `free` intervals (linear sweep)"""
+    result: List[Interval] = []
+    j = 0
+    for start, end in free:
+        cursor = start
+        while j < len(blocked) and blocked[j][1] <= cursor:
+            j += 1
+        k = j
+        while k < len(blocked) and blocked[k][0] < end:
+            if blocked[k][0] > cursor:
+                result.append((cursor, blocked[k][0]))
+            cursor = max(cursor, blocked[k][1])
+            k += 1
+        if cursor < end:
+            result.append((cursor, end))
+    return result
+
+
+def overlaps(intervals: List[Interval], candidate: Interval) -> bool:
+    """True if candidate intersects any interval in the list"""
+    return any(start < candidate[1] and candidate[0] < end for start, end in intervals)
+
+
+def slot_starts(free: List[Interval], duration: int, step: int, not_before: int = 0) -> List[int]:
+    """Start minutes on a `step` grid where a `duration` block fits inside a free interval"""
+    starts: List[int] = []
+    for start, end in free:
+        first = max(start, not_before)
+        # Align to the step grid relative to the interval start
+        offset = (first - start) % step
+        cursor = first if offset == 0 else first + (step - offset)
+        while cursor + duration <= end:
+            starts.append(cursor)
+            cursor += step
+    return starts
+
+
+# ==========================
+# DATABASE LOADERS
+# ==========================
+
+def working_intervals(db: Session, technician_id: int, target: date_type) -> List[Interval]:
+    """Working hours for a technician on one date, from Availability rows"""
+    rows = db.query(
+        models.Availability.day,
+        models.Availability.start_time,
+        models.Availability.end_time,
+    ).filter(models.Availability.technician_id == technician_id).all()
+    return intervals_for_day(rows, target)
+
+
+def intervals_for_day(rows: Iterable, target: date_type) -> List[Interval]:
+    """Working intervals on one date from (day, start_time, end_time) rows"""
+    rows = list(rows)
+    if not rows:
+        return [(parse_time(DEFAULT_WORKING_HOURS[0]), parse_time(DEFAULT_WORKING_HOURS[1]))]
+
+    # Date-specific rows override the weekly schedule for that date
+    dated = [r for r in rows if r.day and r.day.strip()[:1].isdigit() and _day_matches(r.day, target)]
+    chosen = dated or [r for r in rows if not (r.day and r.day.strip()[:1].isdigit()) and _day_matches(r.day, target)]
+
+    intervals = []
+    for row in chosen:
+        try:
+            intervals.append((parse_time(row.start_time), parse_time(row.end_time)))
+        except (ValueError, AttributeError):
+            continue
+    return merge_intervals(intervals)
+
+
+def service_duration(db: Session, technician_id: int, service_id: Optional[int]) -> int:
+    """Duration in minutes for a technician's service"""
+    if service_id is None:
+        return DEFAULT_DURATION_MINUTES
+    duration = db.query(models.Service.duration).filter(
+        models.Service.id == service_id,
+        models.Service.technician_id == technician_id,
+    ).scalar()
+    if duration is None:
+        raise LookupError("Service not found")
+    return int(duration) if duration and duration > 0 else DEFAULT_DURATION_MINUTES
+
+
+def blocked_intervals(
+    db: Session,
+    technician_id: int,
+    target: date_type,
+    staff_id: Optional[int] = None,
+    exclude_booking_id: Optional[int] = None,
+) -> List[Interval]:
+    """Intervals held by slot-blocking appointments, in one query per technician-day"""
+    query = db.query(
+        models.Appointment.time,
+        models.Service.duration,
+    ).outerjoin(
+        models.Service, models.Service.id == models.Appointment.service_id
+    ).filter(
+        models.Appointment.technician_id == technician_id,
+        models.Appointment.date == target.isoformat(),
+        models.Appointment.status.in_(BLOCKING_STATUSES),
+    )
+    if staff_id is not None:
+        query = query.filter(models.Appointment.staff_id == staff_id)
+    if exclude_booking_id is not None:
+        query = query.filter(models.Appointment.id != exclude_booking_id)
+
+    intervals = []
+    for booked_time, duration in query.all():
+        try:
+            start = parse_time(booked_time)
+        except (ValueError, AttributeError):
+            continue
+        intervals.append((start, start + (duration or DEFAULT_DURATION_MINUTES)))
+    return merge_intervals(intervals)
+
+
+# ==========================
+# PUBLIC API
+# ==========================
+
+def free_intervals(
+    db: Session,
+    technician_id: int,
+    target: date_type,
+    staff_id: Optional[int] = None,
+) -> List[Interval]:
+    """Working intervals minus blocked intervals for one technician-day"""
+    return subtract_intervals(
+        working_intervals(db, technician_id, target),
+        blocked_intervals(db, technician_id, target, staff_id=staff_id),
+    )
+
+
+def _earliest_start(target: date_type, tz: ZoneInfo, now: Optional[datetime]) -> Optional[int]:
+    """Minutes since midnight before which slots are in the past; None if the whole day is past"""
+    local_now = (now or datetime.now(tz)).astimezone(tz)
+    if target < local_now.date():
+        return None
+    if target > local_now.date():
+        return 0
+    return local_now.hour * 60 + local_now.minute + 1
+
+
+def get_available_slots(
+    db: Session,
+    technician_id: int,
+    target: date_type,
+    service_id: Optional[int] = None,
+    staff_id: Optional[int] = None,
+    timezone_name: Optional[str] = None,
+    step_minutes: int = DEFAULT_STEP_MINUTES,
+    now: Optional[datetime] = None,
+) -> Dict:
+    """Bookable start times (HH:MM) for a technician on a date"""
+    tz = get_timezone(timezone_name)
+    duration = service_duration(db, technician_id, service_id)
+    not_before = _earliest_start(target, tz, now)
+
+    slots: List[str] = []
+    if not_before is not None:
+        free = free_intervals(db, technician_id, target, staff_id=staff_id)
+        slots = [format_time(m) for m in slot_starts(free, duration, step_minutes, not_before)]
+
+    return {
+        "technician_id": technician_id,
+        "date": target.isoformat(),
+        "timezone": tz.key,
+        "duration_minutes": duration,
+        "slots": slots,
+    }
+
+
+def is_slot_available(
+    db: Session,
+    technician_id: int,
+    target: date_type,
+    start_time: str,
+    service_id: Optional[int] = None,
+    staff_id: Optional[int] = None,
+) -> bool:
+    """True if [start, start + duration) does not overlap a blocking appointment"""
+    start = parse_time(start_time)
+    duration = service_duration(db, technician_id, service_id)
+    blocked = blocked_intervals(db, technician_id, target, staff_id=staff_id)
+    return not overlaps(blocked, (start, start + duration))
+
+
+def next_available_slots(
+    db: Session,
+    technician_id: int,
+    target: date_type,
+    after_time: str,
+    service_id: Optional[int] = None,
+    staff_id: Optional[int] = None,
+    limit: int = 3,
+    days_ahead: int = 7,
+) -> List[str]:
+    """Up to `limit` bookable slots after `after_time`, looking ahead a few days"""
+    duration = service_duration(db, technician_id, service_id)
+    suggestions: List[str] = []
+    for offset in range(days_ahead + 1):
+        day = target + timedelta(days=offset)
+        not_before = parse_time(after_time) + 1 if offset == 0 else 0
+        free = free_intervals(db, technician_id, day, staff_id=staff_id)
+        for minute in slot_starts(free, duration, DEFAULT_STEP_MINUTES, not_before):
+            label = format_time(minute)
+            suggestions.append(label if offset == 0 else f"{day.isoformat()} {label}")
+            if len(suggestions) >= limit:
+                return suggestions
+    return suggestions
@@ -0,0 +1,137 @@
+# booking.py
+# Shared booking service: every booking write (AI chat, website calendar,
+# authenticated /book) goes through create_booking so the overlap check and
+# the insert happen atomically under a per-technician-day lock.
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from services.backend import availability, models
+
+BOOKING_SOURCES = ("ai", "website")
+
+
+class SlotUnavailableError(Exception):
+    """Raised when the requested slot overlaps a slot-blocking booking."""
+
+    code = "SLOT_UNAVAILABLE"
+    message = "This time slot is no longer available"
+
+    def __init__(self, next_available: Optional[List[str]] = None):
+        super().__init__(self.message)
+        self.next_available = next_available or []
+
+    def to_dict(self) -> dict:
+        return {
+            "code": self.code,
+            "message": self.message,
+            "next_available": self.next_available,
+        }
+
+
+def _bump_lock(db: Session, technician_id: int, day: str) -> int:
+    return db.query(models.BookingLock).filter(
+        models.BookingLock.technician_id == technician_id,
+        models.BookingLock.date == day,
+    ).update(
+        {models.BookingLock.version: models.BookingLock.version + 1},
+        synchronize_session=False,
+    )
+
+
+def lock_technician_day(db: Session, technician_id: int, day: str) -> None:
+    """Take the write lock for a technician-day for the rest of the transaction.
+
+    The UPDATE takes a row lock on Postgres and the database write lock on
+    SQLite, so concurrent bookings for the same technician-day serialize
+    while other technicians and days proceed in parallel.
+    """
+    if _bump_lock(db, technician_id, day):
+        return
+
+    try:
+        with db.begin_nested():
+            db.add(models.BookingLock(technician_id=technician_id, date=day, version=1))
+    except IntegrityError:
+        # Another worker created the row first; lock the existing one
+        _bump_lock(db, technician_id, day)
+
+
+def create_booking(
+    db: Session,
+    technician_id: int,
+    service_id: int,
+    client_name: str,
+    date: str,
+    time: str,
+    client_phone: Optional[str] = None,
+    client_email: Optional[str] = None,
+    staff_id: Optional[int] = None,
+    source: str = "website",
+    status: str = "pending",
+) -> models.Appointment:
+    """Atomically check the slot and create the booking.
+
+    Raises LookupError for an unknown service, ValueError for malformed
+    input and SlotUnavailableError (with next_available computed in the same
+    transaction) when the slot is taken.
+    """
+    if source not in BOOKING_SOURCES:
+        raise ValueError(f"Invalid source: {source}")
+
+    target = availability.parse_date(date)
+    start = availability.parse_time(time)
+    day = target.isoformat()
+    slot_time = availability.format_time(start)
+
+    service = db.query(models.Service).filter(
+        models.Service.id == service_id,
+        models.Service.technician_id == technician_id,
+    ).first()
+    if not service:
+        raise LookupError("Service not found")
+    duration = service.duration if service.duration and service.duration > 0 else availability.DEFAULT_DURATION_MINUTES
+
+    try:
+        lock_technician_day(db, technician_id, day)
+
+        blocked = availability.blocked_intervals(db, technician_id, target, staff_id=staff_id)
+        if availability.overlaps(blocked, (start, start + duration)):
+            next_available = availability.next_available_slots(
+                db,
+                technician_id,
+                target,
+                slot_time,
+                service_id=service_id,
+                staff_id=staff_id,
+            )
+            db.rollback()
+            raise SlotUnavailableError(next_available)
+
+        booking = models.Appointment(
+            technician_id=technician_id,
+            service_id=service_id,
+            staff_id=staff_id,
+            client_name=client_name,
+            client_phone=client_phone,
+            client_email=client_email,
+            date=day,
+            time=slot_time,
+            status=status,
+            service_price=service.price,
+            payment_status="unpaid",
+            booking_source=source,
+            created_at=datetime.now(timezone.utc).isoformat(),
+        )
+        db.add(booking)
+        db.commit()
+    except SlotUnavailableError:
+        raise
+    except Exception:
+        db.rollback()
+        raise
+
+    db.refresh(booking)
+    return booking
@@ -0,0 +1,574 @@
+# chat_engine.py
+# Table-driven booking conversation for ChatSession. FLOW declares each step
+# once (what it asks, how it reads the answer, where it goes next) and is
+# compiled at import into a dict of Step objects, so a turn is one lookup and
+# one handler call. Handlers work on a ChatState copy of the session row and
+# the turn is saved with a single INSERT/UPDATE. Services, working hours and
+# deposit settings come from the technician's knowledge snapshot, so a warm
+# turn only reads the session (plus appointments when a date is being
+# checked), and FAQ-style questions are answered from the snapshot too.
+# Each message is read once by extraction.extract() against the catalog's
+# service matcher, and handlers work from that result.
+import os
+import uuid
+from dataclasses import dataclass, field, fields
+from datetime import date as date_type, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from services.backend import availability, booking as booking_service, extraction, knowledge, models
+from services.backend.column_types import to_utc_datetime
+
+CHAT_SESSION_TTL_SEC = int(os.getenv("CHAT_SESSION_TTL_SEC", str(24 * 3600)))  # idle time before a conversation starts over
+
+SUGGESTION_COUNT = 3
+SUGGESTION_DAYS_AHEAD = 7
+
+
+# ==========================
+# SESSION STATE
+# ==========================
+
+@dataclass
+class ChatState:
+    """Plain copy of the ChatSession columns a turn reads and writes"""
+    step: str = "start"
+    client_name: Optional[str] = None
+    client_phone: Optional[str] = None
+    client_email: Optional[str] = None
+    service_id: Optional[int] = None
+    appointment_date: Optional[str] = None
+    appointment_time: Optional[str] = None
+    booking_id: Optional[int] = None
+    last_message: Optional[str] = None
+    message_count: int = 0
+
+    @classmethod
+    def from_row(cls, row: models.ChatSession) -> "ChatState":
+        state = cls(**{f.name: getattr(row, f.name) for f in fields(cls)})
+        state.step = state.step or "start"
+        state.message_count = state.message_count or 0
+        return state
+
+    def values(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+
+def load_state(row: Optional[models.ChatSession], now: Optional[datetime] = None) -> ChatState:
+    """State for a session row; a missing or idle-expired session starts fresh"""
+    now = now or datetime.now(timezone.utc)
+    if row is None or (row.expires_at and to_utc_datetime(row.expires_at) <= now):
+        return ChatState()
+    return ChatState.from_row(row)
+
+
+def new_session_id() -> str:
+    return str(uuid.uuid4())
+
+
+class StaleSessionError(Exception):
+    """Raised when a session row was written elsewhere since it was read"""
+
+
+def save_turn(
+    db: Session,
+    state: ChatState,
+    technician_id: int,
+    session_id: str,
+    previous: Optional[dict] = None,
+    platform: Optional[str] = None,
+    account_id: Optional[str] = None,
+    now: Optional[datetime] = None,
+    commit: bool = True,
+    version: int = 0,
+) -> int:
+    """Persist a turn: one INSERT for a new session (previous=None), otherwise
+    one UPDATE of the columns that differ from `previous`.
+
+    The UPDATE only applies to the row at `version` (the one `previous` was
+    read from) and raises StaleSessionError when another writer got there
+    first. Returns the row's new version.
+    """
+    now = now or datetime.now(timezone.utc)
+    expires_at = (now + timedelta(seconds=CHAT_SESSION_TTL_SEC)).isoformat()
+    now = now.isoformat()
+    if previous is None:
+        db.add(models.ChatSession(
+            session_id=session_id,
+            technician_id=technician_id,
+            platform=platform,
+            account_id=account_id,
+            created_at=now,
+            updated_at=now,
+            expires_at=expires_at,
+            version=0,
+            **state.values(),
+        ))
+        version = 0
+    else:
+        changes = {key: value for key, value in state.values().items() if previous.get(key) != value}
+        changes.update(updated_at=now, expires_at=expires_at, version=version + 1)
+        updated = db.query(models.ChatSession).filter(
+            models.ChatSession.session_id == session_id,
+            models.ChatSession.version == version,
+        ).update(changes, synchronize_session=False)
+        if not updated:
+            raise StaleSessionError(f"Chat session {session_id} changed since it was read")
+        version += 1
+    if commit:
+        db.commit()
+    return version
+
+
+# ==========================
+# TURN CONTEXT
+# ==========================
+
+@dataclass
+class Turn:
+    """Result of one message: the reply plus what the client is asked for next"""
+    reply: str
+    step: str
+    need: Optional[str] = None
+    services: Optional[List[dict]] = None
+    price: Optional[float] = None
+    suggestions: Optional[List[str]] = None
+    booking_id: Optional[int] = None
+    intent: Optional[str] = None
+    confidence: Optional[float] = None
+
+
+@dataclass
+class TurnContext:
+    db: Session
+    catalog: knowledge.KnowledgeSnapshot
+    state: ChatState
+    now: datetime  # in the client's timezone
+    extraction: extraction.Extraction
+    assistant_name: str = "your booking assistant"
+    lines: List[str] = field(default_factory=list)
+    services: Optional[List[dict]] = None
+    suggestions: Optional[List[str]] = None
+
+    @property
+    def service(self) -> Optional[knowledge.ServiceInfo]:
+        return self.catalog.service(self.state.service_id)
+
+    def say(self, line: str) -> None:
+        self.lines.append(line)
+
+    def show_services(self) -> None:
+        self.services = [s._asdict() for s in self.catalog.services]
+
+
+def _service_menu(ctx: TurnContext) -> str:
+    return ctx.catalog.menu
+
+
+def _free_starts(ctx: TurnContext, day: date_type, duration: int) -> List[int]:
+    """Bookable start minutes on a day from cached hours and one appointments query"""
+    today = ctx.now.date()
+    if day < today:
+        return []
+    not_before = ctx.now.hour * 60 + ctx.now.minute + 1 if day == today else 0
+    free = availability.subtract_intervals(
+        availability.intervals_for_day(ctx.catalog.hours, day),
+        availability.blocked_intervals(ctx.db, ctx.catalog.technician_id, day),
+    )
+    return availability.slot_starts(free, duration, availability.DEFAULT_STEP_MINUTES, not_before)
+
+
+def _slot_is_free(ctx: TurnContext) -> bool:
+    """Whether the state's date and time (typed or pre-filled) are still bookable"""
+    state = ctx.state
+    if not (state.appointment_date and state.appointment_time):
+        return False
+    try:
+        day, minute = availability.parse_date(state.appointment_date), availability.parse_time(state.appointment_time)
+    except ValueError:
+        return False
+    duration = ctx.service.duration if ctx.service else availability.DEFAULT_DURATION_MINUTES
+    return minute in _free_starts(ctx, day, duration)
+
+
+def _suggest(ctx: TurnContext, start_day: date_type, after: int = -1) -> List[str]:
+    """Next few free slots from start_day onwards (stops at the first day with any)"""
+    duration = ctx.service.duration if ctx.service else availability.DEFAULT_DURATION_MINUTES
+    for offset in range(SUGGESTION_DAYS_AHEAD + 1):
+        day = start_day + timedelta(days=offset)
+        starts = [m for m in _free_starts(ctx, day, duration) if offset or m > after]
+        if starts:
+            return [f"{day.isoformat()} {availability.format_time(m)}" for m in starts[:SUGGESTION_COUNT]]
+    return []
+
+
+# ==========================
+# STEP HANDLERS
+# ==========================
+# A handler reads the client's message into ctx.state and returns the step to
+# move to, or None to stay (after ctx.say()-ing what was wrong).
+
+def _matched_service(ctx: TurnContext) -> Optional[int]:
+    ex = ctx.extraction
+    if ex.service_id is not None and ex.service_score >= extraction.EXTRACTION_MIN_CONFIDENCE:
+        return ex.service_id
+    return None
+
+
+def _greet(ctx: TurnContext, text: str, step: "Step") -> Optional[str]:
+    # "Hi, I'm Amy, can I get a brow tint on Friday?" fills what it can up front
+    ex, state = ctx.extraction, ctx.state
+    state.client_name = ex.name or state.client_name
+    state.service_id = _matched_service(ctx) or state.service_id
+    if ex.date is not None:
+        state.appointment_date = ex.date.isoformat()
+    state.client_phone = ex.phone or state.client_phone
+    state.client_email = ex.email or state.client_email
+    ctx.say(f"Hi 👋 I'm {ctx.assistant_name} for {ctx.catalog.business_name}.")
+    return step.next
+
+
+def _take_name(ctx: TurnContext, text: str, step: "Step") -> Optional[str]:
+    name = ctx.extraction.name or extraction.parse_name(text, allow_plain=True)
+    if not name:
+        ctx.say("Sorry, I didn't catch your name.")
+        return None
+    ctx.state.client_name = name
+    return step.next
+
+
+def _take_service(ctx: TurnContext, text: str, step: "Step") -> Optional[str]:
+    services = ctx.catalog.services
+    choice = text.strip().rstrip(".")
+    if choice.isdigit() and 1 <= int(choice) <= len(services):
+        chosen = services[int(choice) - 1].id
+    else:
+        chosen = _matched_service(ctx)
+    if chosen is None:
+        ctx.say("Sorry, I couldn't match that to one of our services. Reply with its number:\n" + _service_menu(ctx))
+        ctx.show_services()
+        return None
+    ctx.state.service_id = chosen
+    return step.next
+
+
+def _take_datetime(ctx: TurnContext, text: str, step: "Step") -> Optional[str]:
+    ex = ctx.extraction
+    day = ex.date or (availability.parse_date(ctx.state.appointment_date) if ctx.state.appointment_date else None)
+    minute = ex.time
+    if day is None:
+        ctx.say("Which day would you like? (e.g. tomorrow, Friday or 2026-03-14)")
+        return None
+    ctx.state.appointment_date = day.isoformat()
+    ctx.state.appointment_time = None
+    if minute is None:
+        ctx.say(f"What time on {day.isoformat()}?")
+        ctx.suggestions = _suggest(ctx, day)
+        return None
+
+    starts = _free_starts(ctx, day, ctx.service.duration if ctx.service else availability.DEFAULT_DURATION_MINUTES)
+    if minute not in starts:
+        ctx.say(f"Sorry, {availability.format_time(minute)} on {day.isoformat()} isn't available.")
+        ctx.suggestions = _suggest(ctx, day, after=minute)
+        if ctx.suggestions:
+            ctx.say("The next free slots are: " + ", ".join(ctx.suggestions))
+        return None
+    ctx.state.appointment_time = availability.format_time(minute)
+    return step.next
+
+
+def _take_contact(ctx: TurnContext, text: str, step: "Step") -> Optional[str]:
+    ex = ctx.extraction
+    if not ex.phone and not ex.email:
+        ctx.say("Please send a phone number or email address so we can reach you.")
+        return None
+    ctx.state.client_phone = ex.phone or ctx.state.client_phone
+    ctx.state.client_email = ex.email or ctx.state.client_email
+    return step.next
+
+
+def _confirm(ctx: TurnContext, text: str, step: "Step") -> Optional[str]:
+    state = ctx.state
+    if ctx.extraction.intent == "deny":
+        state.service_id = state.appointment_date = state.appointment_time = None
+        ctx.say("No problem, let's change it.")
+        return "service"
+    if ctx.extraction.intent != "confirm":
+        ctx.say("Please reply YES to confirm or NO to change the booking.")
+        return None
+
+    try:
+        booking = booking_service.create_booking(
+            ctx.db,
+            technician_id=ctx.catalog.technician_id,
+            service_id=state.service_id,
+            client_name=state.client_name,
+            client_phone=state.client_phone,
+            client_email=state.client_email,
+            date=state.appointment_date,
+            time=state.appointment_time,
+            source="ai",
+        )
+    except booking_service.SlotUnavailableError as e:
+        state.appointment_time = None
+        ctx.say("Sorry, that slot was just taken.")
+        ctx.suggestions = e.next_available[:SUGGESTION_COUNT]
+        return "datetime"
+    except LookupError:
+        state.service_id = None
+        ctx.say("Sorry, that service is no longer available.")
+        return "service"
+
+    state.booking_id = booking.id
+    ctx.say(f"You're booked in! ✅ Booking #{booking.id}: {ctx.service.name} on {booking.date} at {booking.time}.")
+    return step.next
+
+
+def _after_booking(ctx: TurnContext, text: str, step: "Step") -> Optional[str]:
+    state = ctx.state
+    if ctx.extraction.intent == "book":
+        state.service_id = state.appointment_date = state.appointment_time = state.booking_id = None
+        return step.next
+    ctx.say(f"Your booking #{state.booking_id} is on {state.appointment_date} at {state.appointment_time}. Say BOOK to make another booking.")
+    return None
+
+
+# ==========================
+# PROMPTS
+# ==========================
+
+def _ask_name(ctx: TurnContext) -> str:
+    return "What's your name?"
+
+
+def _ask_service(ctx: TurnContext) -> str:
+    if not ctx.catalog.services:
+        return f"Online booking isn't set up yet, please contact {ctx.catalog.business_name} directly."
+    ctx.show_services()
+    return "Which service would you like?\n" + _service_menu(ctx)
+
+
+def _ask_datetime(ctx: TurnContext) -> str:
+    state = ctx.state
+    line = ""
+    if state.appointment_date and state.appointment_time:
+        # Entered with a slot that is past, closed or taken
+        line = f"Sorry, {state.appointment_time} on {state.appointment_date} isn't available. "
+        state.appointment_time = None
+    if ctx.suggestions is None:
+        ctx.suggestions = _suggest(ctx, ctx.now.date())
+    return line + "What day and time would you like?" + (f" Next free: {', '.join(ctx.suggestions)}" if ctx.suggestions else "")
+
+
+def _ask_contact(ctx: TurnContext) -> str:
+    return "What's the best phone number or email to reach you?"
+
+
+def _show_price(ctx: TurnContext) -> str:
+    service = ctx.service
+    line = f"{service.name} is {knowledge.format_money(service.price)} and takes {service.duration} minutes."
+    if ctx.catalog.deposit_required and ctx.catalog.deposit_amount:
+        line += f" A {knowledge.format_money(ctx.catalog.deposit_amount)} deposit secures the slot."
+    return line
+
+
+def _ask_confirm(ctx: TurnContext) -> str:
+    state = ctx.state
+    return (
+        f"Shall I book {ctx.service.name} on {state.appointment_date} at {state.appointment_time} "
+        f"for {state.client_name}? Reply YES to confirm or NO to change it."
+    )
+
+
+def _booked(ctx: TurnContext) -> str:
+    return "We'll be in touch with payment details. Say BOOK any time to make another booking."
+
+
+# ==========================
+# FLOW TABLE
+# ==========================
+
+Handler = Callable[[TurnContext, str, "Step"], Optional[str]]
+
+
+@dataclass(frozen=True)
+class Step:
+    """One row of the flow table.
+
+    `prompt` is said when the step is entered. Steps without a handler are
+    pass-through (their prompt is said and the flow moves straight on);
+    steps whose `filled` check already holds (e.g. pre-filled contact
+    details) are skipped. Entering a step whose `requires` steps aren't
+    filled goes back to the first of those instead.
+    """
+    name: str
+    next: Optional[str] = None
+    handler: Optional[Handler] = None
+    prompt: Optional[Callable[[TurnContext], str]] = None
+    need: Optional[str] = None
+    filled: Optional[Callable[[TurnContext], bool]] = None
+    requires: Tuple[str, ...] = ()
+
+
+FLOW: Tuple[Step, ...] = (
+    Step("start", next="name", handler=_greet),
+    Step("name", next="service", handler=_take_name, prompt=_ask_name, need="client_name",
+         filled=lambda ctx: bool(ctx.state.client_name)),
+    Step("service", next="datetime", handler=_take_service, prompt=_ask_service, need="service",
+         filled=lambda ctx: ctx.service is not None),
+    Step("datetime", next="contact", handler=_take_datetime, prompt=_ask_datetime, need="datetime",
+         filled=_slot_is_free),
+    Step("contact", next="price", handler=_take_contact, prompt=_ask_contact, need="contact",
+         filled=lambda ctx: bool(ctx.state.client_phone or ctx.state.client_email)),
+    Step("price", next="confirm", prompt=_show_price, requires=("service", "datetime")),
+    Step("confirm", next="booking_created", handler=_confirm, prompt=_ask_confirm, need="confirm",
+         requires=("service", "datetime")),
+    Step("booking_created", next="service", handler=_after_booking, prompt=_booked),
+    Step("completed", next="service", handler=_after_booking),
+)
+
+
+class Flow:
+    """Compiled FLOW: steps by name, validated once"""
+
+    def __init__(self, steps: Iterable[Step]):
+        steps = tuple(steps)
+        self.steps: Dict[str, Step] = {s.name: s for s in steps}
+        if len(self.steps) != len(steps):
+            raise ValueError("Duplicate step names in chat flow")
+        self.first = steps[0].name
+        for step in steps:
+            if step.next is not None and step.next not in self.steps:
+                raise ValueError(f"Chat step {step.name!r} points at unknown step {step.next!r}")
+            if step.handler is None and (step.prompt is None or step.next is None):
+                raise ValueError(f"Pass-through chat step {step.name!r} needs a prompt and a next step")
+            for required in step.requires:
+                if required not in self.steps or self.steps[required].filled is None:
+                    raise ValueError(f"Chat step {step.name!r} requires {required!r}, which has no filled check")
+
+    def unmet(self, ctx: TurnContext, step: Step) -> Optional[str]:
+        """First step `step` requires that isn't filled yet"""
+        for required in step.requires:
+            if not self.steps[required].filled(ctx):
+                return required
+        return None
+
+    def enter(self, ctx: TurnContext, name: str) -> Step:
+        """Move to `name`, saying prompts and skipping filled/pass-through steps"""
+        for _ in range(len(self.steps)):
+            step = self.steps[name]
+            missing = self.unmet(ctx, step)
+            if missing is not None:
+                name = missing
+                continue
+            if step.filled is not None and step.filled(ctx):
+                name = step.next
+                continue
+            ctx.state.step = step.name
+            if step.prompt is not None:
+                ctx.say(step.prompt(ctx))
+            if step.handler is not None:
+                return step
+            name = step.next
+        raise RuntimeError(f"Chat flow loops without asking anything (at {name!r})")
+
+
+def compile_flow(steps: Iterable[Step] = FLOW) -> Flow:
+    return Flow(steps)
+
+
+class ChatEngine:
+    """Runs one turn of the booking conversation against a compiled Flow"""
+
+    def __init__(self, flow: Optional[Flow] = None, catalogs: Optional[knowledge.KnowledgeStore] = None):
+        self.flow = flow or compile_flow()
+        self.catalogs = catalogs or knowledge.store
+
+    def turn(
+        self,
+        db: Session,
+        technician_id: int,
+        state: ChatState,
+        message: str,
+        assistant_name: Optional[str] = None,
+        now: Optional[datetime] = None,
+        timezone_name: Optional[str] = None,
+    ) -> Turn:
+        """Apply `message` to `state` (in place) and build the reply.
+
+        Raises LookupError for an unknown technician and ValueError for an
+        unknown timezone; relative days ("tomorrow", "Friday") are read in
+        `timezone_name` (the app default when None).
+        """
+        catalog = self.catalogs.get(db, technician_id)
+        if catalog is None:
+            raise LookupError("Technician not found")
+        tz = availability.get_timezone(timezone_name)
+        now = (now or datetime.now(timezone.utc)).astimezone(tz)
+        text = (message or "").strip()
+        ctx = TurnContext(
+            db=db, catalog=catalog, state=state, now=now,
+            extraction=extraction.extract(text, catalog.matcher, now=now),
+        )
+        if assistant_name:
+            ctx.assistant_name = assistant_name
+        state.last_message = text
+        state.message_count = (state.message_count or 0) + 1
+
+        if ctx.extraction.intent == "restart":
+            state.service_id = state.appointment_date = state.appointment_time = state.booking_id = None
+            state.step = self.flow.first
+
+        current = self.flow.steps.get(state.step) or self.flow.steps[self.flow.first]
+        if state.service_id is not None and ctx.service is None:
+            # Removed from the catalog since it was chosen: pick again
+            state.service_id = None
+            ctx.say("Sorry, that service is no longer available.")
+        missing = self.flow.unmet(ctx, current)
+        if missing is not None:
+            # e.g. the service was removed or the slot was taken since it was chosen
+            return self._result(ctx, self.flow.enter(ctx, missing))
+        faq = self._faq(ctx, text, current)
+        if faq is not None:
+            # Answer the question from the snapshot, then carry on from where we were
+            if faq.topic in ("services", "prices"):
+                ctx.show_services()
+            ctx.say(faq.text)
+            if current.name != self.flow.first:
+                if current.prompt is not None:
+                    ctx.say(current.prompt(ctx))
+                return self._result(ctx, current)
+
+        target = current.handler(ctx, text, current)
+        step = self.flow.enter(ctx, target) if target is not None else current
+        if target is None and step.prompt is not None and not ctx.lines:
+            ctx.say(step.prompt(ctx))
+        return self._result(ctx, step)
+
+    def _faq(self, ctx: TurnContext, text: str, current: Step) -> Optional[knowledge.Answer]:
+        if ctx.extraction.intent in ("restart", "confirm", "deny"):
+            return None
+        answer = ctx.catalog.answer(text, ctx.extraction)
+        if answer is None and ctx.extraction.intent == "services":
+            answer = knowledge.Answer("services", ctx.catalog.answers["services"])
+        if answer is not None and current.name == "service" and answer.topic in ("services", "prices", "service"):
+            return None  # the service step reads these itself
+        return answer
+
+    def _result(self, ctx: TurnContext, step: Step) -> Turn:
+        service = ctx.service
+        return Turn(
+            reply="\n".join(ctx.lines),
+            step=step.name,
+            need=step.need,
+            services=ctx.services,
+            price=service.price if service and step.name in ("confirm", "booking_created") else None,
+            suggestions=ctx.suggestions,
+            booking_id=ctx.state.booking_id,
+            intent=ctx.extraction.intent,
+            confidence=ctx.extraction.confidence,
+        )
+
+
+engine = ChatEngine()
@@ -0,0 +1,358 @@
+# chat_sessions.py
+# Write-behind cache of active chat conversations. A burst of messages from
+# one sender is served from memory: the session row is read once, each turn
+# runs under that session's lock, and the row is only written when the
+# conversation changes step. Other changes (message count, last message,
+# answers that did not advance the step) are flushed by a background task
+# once the conversation goes idle or expires, and everything still dirty
+# is flushed on shutdown. The cache is per process; anything else that
+# writes a ChatSession row (e.g. a handoff toggle) should call invalidate().
+# Writes are versioned, so when several workers hold the same conversation
+# only the first write from a given version lands; the others find the row
+# moved on, drop their cached copy and reload it on the next turn.
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from services.backend import chat_engine, metrics, models
+from services.backend.column_types import to_utc_datetime
+from services.backend.database import SessionLocal
+
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "true").lower() == "true"
+CHAT_CACHE_MAX = int(os.getenv("CHAT_CACHE_MAX", "5000"))
+CHAT_CACHE_IDLE_SEC = float(os.getenv("CHAT_CACHE_IDLE_SEC", "60"))
+CHAT_CACHE_FLUSH_INTERVAL_SEC = float(os.getenv("CHAT_CACHE_FLUSH_INTERVAL_SEC", "5"))
+
+
+def find_session(
+    db: Session,
+    technician_id: int,
+    session_id: Optional[str] = None,
+    platform: Optional[str] = None,
+    account_id: Optional[str] = None,
+) -> Optional[models.ChatSession]:
+    """A technician's session by id, or the latest one for a platform account"""
+    query = db.query(models.ChatSession).filter(models.ChatSession.technician_id == technician_id)
+    if session_id:
+        return query.filter(models.ChatSession.session_id == session_id).first()
+    if platform and account_id:
+        return query.filter(
+            models.ChatSession.platform == platform,
+            models.ChatSession.account_id == account_id,
+        ).order_by(models.ChatSession.id.desc()).first()
+    return None
+
+
+@dataclass
+class CachedSession:
+    session_id: str
+    technician_id: int
+    platform: Optional[str]
+    account_id: Optional[str]
+    state: chat_engine.ChatState
+    persisted: Optional[dict]  # values last written; None until the row exists
+    expires_at: datetime
+    version: int = 0  # row version `persisted` was read or written at
+    handoff_paused: bool = False
+    touched_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    idle_since: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    discarded: bool = False
+
+    @property
+    def dirty(self) -> bool:
+        return self.persisted != self.state.values()
+
+    def touch(self, now: datetime) -> None:
+        self.touched_at = now
+        self.idle_since = time.monotonic()
+        self.expires_at = now + timedelta(seconds=chat_engine.CHAT_SESSION_TTL_SEC)
+
+
+class SessionCache:
+    """LRU of CachedSession by session_id, with per-session locks"""
+
+    def __init__(
+        self,
+        maxsize: int = CHAT_CACHE_MAX,
+        idle_after: float = CHAT_CACHE_IDLE_SEC,
+        enabled: bool = CHAT_CACHE_ENABLED,
+        session_factory=SessionLocal,
+    ):
+        self.maxsize = maxsize
+        self.idle_after = idle_after
+        self.enabled = enabled
+        self.session_factory = session_factory
+        self._items: "OrderedDict[str, CachedSession]" = OrderedDict()
+        self._accounts: Dict[Tuple[int, str, str], str] = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "flushes": 0, "writes_deferred": 0, "evicted": 0, "expired": 0, "conflicts": 0}
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[key] += n
+
+    # ---------------- lookup ----------------
+    def _cached(self, technician_id: int, session_id: Optional[str], platform: Optional[str], account_id: Optional[str]) -> Optional[CachedSession]:
+        with self._lock:
+            if not session_id and platform and account_id:
+                session_id = self._accounts.get((technician_id, platform, account_id))
+            entry = self._items.get(session_id) if session_id else None
+            if entry is None or entry.technician_id != technician_id:
+                return None
+            self._items.move_to_end(entry.session_id)
+            return entry
+
+    def _adopt(self, entry: CachedSession) -> CachedSession:
+        """Add a freshly loaded entry unless another thread got there first"""
+        with self._lock:
+            existing = self._items.get(entry.session_id)
+            if existing is not None:
+                return existing
+            self._items[entry.session_id] = entry
+            if entry.platform and entry.account_id:
+                self._accounts[(entry.technician_id, entry.platform, entry.account_id)] = entry.session_id
+            return entry
+
+    def _load(self, db: Session, technician_id: int, session_id, platform, account_id, create_id: str) -> CachedSession:
+        row = find_session(db, technician_id, session_id, platform, account_id)
+        now = datetime.now(timezone.utc)
+        if row is None:
+            return CachedSession(
+                session_id=create_id,
+                technician_id=technician_id,
+                platform=platform,
+                account_id=account_id,
+                state=chat_engine.ChatState(),
+                persisted=None,
+                expires_at=now + timedelta(seconds=chat_engine.CHAT_SESSION_TTL_SEC),
+            )
+        return CachedSession(
+            session_id=row.session_id,
+            technician_id=technician_id,
+            platform=row.platform,
+            account_id=row.account_id,
+            state=chat_engine.ChatState.from_row(row),
+            persisted=chat_engine.ChatState.from_row(row).values(),
+            expires_at=to_utc_datetime(row.expires_at) if row.expires_at else now,
+            version=row.version or 0,
+            handoff_paused=bool(row.handoff_paused),
+        )
+
+    def _acquire(self, db: Session, technician_id: int, session_id, platform, account_id, create_id) -> CachedSession:
+        """Find or load a session and take its lock"""
+        while True:
+            entry = self._cached(technician_id, session_id, platform, account_id)
+            self._count("hits" if entry is not None else "misses")
+            if entry is None:
+                entry = self._adopt(self._load(db, technician_id, session_id, platform, account_id, create_id))
+            entry.lock.acquire()
+            if not entry.discarded:
+                return entry
+            # Flushed out while we waited for the lock; load it again
+            entry.lock.release()
+            self._remove(entry)
+
+    @contextmanager
+    def session(
+        self,
+        db: Session,
+        technician_id: int,
+        session_id: Optional[str] = None,
+        platform: Optional[str] = None,
+        account_id: Optional[str] = None,
+        create_id: Optional[str] = None,
+    ) -> Iterator[CachedSession]:
+        """Hold one conversation for a turn.
+
+        A new session gets `create_id` (or a random id). On a clean exit the
+        session is written if it is new or its step changed (every turn when
+        the cache is disabled); if the turn raises, the cached copy is
+        dropped so the next turn reloads from the database. That includes
+        StaleSessionError, when another worker wrote the row since it was
+        read: the turn is lost and should be retried.
+        """
+        entry = self._acquire(db, technician_id, session_id, platform, account_id, create_id or chat_engine.new_session_id())
+        try:
+            now = datetime.now(timezone.utc)
+            if entry.expires_at <= now:
+                entry.state = chat_engine.ChatState()
+                self._count("expired")
+            step_before = entry.persisted.get("step") if entry.persisted else None
+            yield entry
+            entry.touch(now)
+            if not self.enabled or entry.persisted is None or entry.state.step != step_before:
+                self._commit(db, entry)
+                self._count("flushes")
+            else:
+                self._count("writes_deferred")
+            if not self.enabled:
+                self._drop(entry)
+        except BaseException:
+            self._drop(entry)
+            raise
+        finally:
+            entry.lock.release()
+        self._evict_overflow()
+
+    # ---------------- writes ----------------
+    def _commit(self, db: Session, entry: CachedSession) -> None:
+        """Write the session's changes in their own transaction (caller holds entry.lock)"""
+        values = entry.state.values()
+        try:
+            version = chat_engine.save_turn(
+                db,
+                entry.state,
+                entry.technician_id,
+                entry.session_id,
+                previous=entry.persisted,
+                platform=entry.platform,
+                account_id=entry.account_id,
+                now=entry.touched_at,
+                commit=False,
+                version=entry.version,
+            )
+        except chat_engine.StaleSessionError:
+            db.rollback()
+            self._count("conflicts")
+            raise
+        db.commit()
+        entry.persisted, entry.version = values, version
+
+    def flush(self, idle_only: bool = True) -> int:
+        """Write dirty sessions (only idle/expired ones unless idle_only=False)
+        and evict the idle/expired ones; returns how many were written"""
+        now = time.monotonic()
+        wall = datetime.now(timezone.utc)
+        with self._lock:
+            entries = list(self._items.values())
+
+        written = 0
+        db = self.session_factory()
+        try:
+            for entry in entries:
+                stale = now - entry.idle_since >= self.idle_after or entry.expires_at <= wall
+                if idle_only and not stale:
+                    continue
+                # Busy sessions are mid-turn; they are picked up on a later pass
+                if not (entry.lock.acquire(blocking=False) if idle_only else entry.lock.acquire(timeout=5)):
+                    continue
+                try:
+                    if entry.persisted is not None and entry.dirty:
+                        self._commit(db, entry)
+                        written += 1
+                    if stale:
+                        self._drop(entry)
+                except chat_engine.StaleSessionError:
+                    self._drop(entry)  # another worker's write wins; reload on the next turn
+                except Exception as e:
+                    db.rollback()
+                    print("⚠️  Chat session flush failed:", entry.session_id, e)
+                finally:
+                    entry.lock.release()
+        finally:
+            db.close()
+
+        self._count("flushes", written)
+        return written
+
+    # ---------------- eviction ----------------
+    def _remove(self, entry: CachedSession) -> None:
+        with self._lock:
+            if self._items.get(entry.session_id) is entry:
+                del self._items[entry.session_id]
+            key = (entry.technician_id, entry.platform, entry.account_id)
+            if self._accounts.get(key) == entry.session_id:
+                del self._accounts[key]
+
+    def _drop(self, entry: CachedSession) -> None:
+        entry.discarded = True
+        self._remove(entry)
+
+    def invalidate(self, session_id: str) -> None:
+        """Flush and forget a session whose row is about to be changed elsewhere"""
+        with self._lock:
+            entry = self._items.get(session_id)
+        if entry is None:
+            return
+        with entry.lock:
+            if entry.discarded:
+                return
+            if entry.persisted is not None and entry.dirty:
+                db = self.session_factory()
+                try:
+                    self._commit(db, entry)
+                except chat_engine.StaleSessionError:
+                    pass  # the row already moved on; nothing of ours to keep
+                finally:
+                    db.close()
+            self._drop(entry)
+
+    def _evict_overflow(self) -> None:
+        while True:
+            with self._lock:
+                if len(self._items) <= self.maxsize:
+                    return
+                session_id = next(iter(self._items))
+            self.invalidate(session_id)
+            self._count("evicted")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._accounts.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = list(self._items.values())
+            data = {**self.counters, "size": len(entries)}
+        data["dirty"] = sum(1 for e in entries if e.dirty)
+        return data
+
+
+cache = SessionCache()
+metrics.register("chat_sessions", cache.stats)
+
+
+# ==========================
+# BACKGROUND FLUSHER
+# ==========================
+
+_flusher: Optional[asyncio.Task] = None
+
+
+async def _flush_loop() -> None:
+    while True:
+        await asyncio.sleep(CHAT_CACHE_FLUSH_INTERVAL_SEC)
+        try:
+            await asyncio.to_thread(cache.flush)
+        except Exception as e:
+            print("⚠️  Chat session flush error:", e)
+
+
+async def start_flusher() -> None:
+    global _flusher
+    if not CHAT_CACHE_ENABLED or _flusher is not None:
+        return
+    _flusher = asyncio.create_task(_flush_loop())
+
+
+async def stop_flusher() -> None:
+    """Stop the flusher and write every dirty session"""
+    global _flusher
+    if _flusher is not None:
+        _flusher.cancel()
+        try:
+            await _flusher
+        except asyncio.CancelledError:
+            pass
+        _flusher = None
+    await asyncio.to_thread(cache.flush, False)
@@ -0,0 +1,96 @@
+# column_types.py
+# Native DATE / TIME / TIMESTAMP columns that keep the app's ISO-string
+# interface: bind parameters accept ISO strings or date/time objects, and
+# loaded values come back as ISO strings (UTC for timestamps). Range
+# filters and ORDER BY run on native types and can use indexes.
+from datetime import date, datetime, time, timezone
+
+from sqlalchemy import Date, DateTime, Time
+from sqlalchemy.types import TypeDecorator
+
+
+def to_date(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value).strip()[:10])
+
+
+def to_time(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.time().replace(tzinfo=None)
+    if isinstance(value, time):
+        return value.replace(tzinfo=None)
+    return time.fromisoformat(str(value).strip())
+
+
+def to_utc_datetime(value):
+    """Parse an ISO timestamp (or date) and normalize it to aware UTC"""
+    if value is None or value == "":
+        return None
+    if not isinstance(value, datetime):
+        if isinstance(value, date):
+            value = datetime(value.year, value.month, value.day)
+        else:
+            value = datetime.fromisoformat(str(value).strip())
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def format_time(value: time) -> str:
+    if value.second == 0 and value.microsecond == 0:
+        return value.strftime("%H:%M")
+    return value.isoformat()
+
+
+class ISODate(TypeDecorator):
+    """DATE column exchanged as 'YYYY-MM-DD'"""
+
+    impl = Date
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return to_date(value)
+
+    def process_result_value(self, value, dialect):
+        return value.isoformat() if value is not None else None
+
+
+class ISOTime(TypeDecorator):
+    """TIME column exchanged as 'HH:MM' (or 'HH:MM:SS' when seconds are set)"""
+
+    impl = Time
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return to_time(value)
+
+    def process_result_value(self, value, dialect):
+        return format_time(value) if value is not None else None
+
+
+class ISODateTime(TypeDecorator):
+    """Timezone-aware TIMESTAMP column exchanged as UTC ISO-8601 strings"""
+
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        value = to_utc_datetime(value)
+        if value is not None and dialect.name == "sqlite":
+            # SQLite has no timezone storage; values are kept as naive UTC
+            value = value.replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        return to_utc_datetime(value).isoformat()
@@ -1,16 +1,166 @@
 import os
+import threading
+import time
+from typing import Optional
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from services.backend import metrics
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./aiva_saas.db")
 
-connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+# Connection pool (file SQLite and server databases)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; -1 disables
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# SQLite tuning: WAL lets readers run while a write is in progress
+SQLITE_TUNED = os.getenv("SQLITE_TUNED", "true").lower() == "true"
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+
+class _TimedPool:
+    """Pool mixin that records how long each checkout waited for a connection"""
+
+    def __init__(self, creator, pool_size: int = 5, max_overflow: int = 10, **kw):
+        super().__init__(creator, pool_size=pool_size, max_overflow=max_overflow, **kw)
+        self.capacity = pool_size + max(max_overflow, 0)
+        self._stats_lock = threading.Lock()
+        self._stats = {"checkouts": 0, "timeouts": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self._stats["timeouts"] += 1
+            raise
+        finally:
+            waited = (time.perf_counter() - started) * 1000
+            with self._stats_lock:
+                self._stats["checkouts"] += 1
+                self._stats["wait_ms_total"] += waited
+                self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], waited)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            data = dict(self._stats)
+        checked_out = self.checkedout()
+        data.update(
+            wait_ms_avg=round(data["wait_ms_total"] / data["checkouts"], 3) if data["checkouts"] else 0.0,
+            wait_ms_total=round(data["wait_ms_total"], 3),
+            wait_ms_max=round(data["wait_ms_max"], 3),
+            size=self.size(),
+            checked_out=checked_out,
+            overflow=max(self.overflow(), 0),
+            capacity=self.capacity,
+            saturation=round(checked_out / self.capacity, 3) if self.capacity else 0.0,
+        )
+        return data
+
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return _is_sqlite(url) and (":memory:" in url or url.rstrip("/") in ("sqlite:", "sqlite+pysqlite:"))
+
+
+def _apply_sqlite_pragmas(engine: Engine, wal: bool) -> None:
+    # For async engines pass engine.sync_engine; the adapted DBAPI connection
+    # still exposes a blocking cursor() here.
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            if wal:
+                cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        finally:
+            cursor.close()
+
+
+def _pool_kwargs(url: str, poolclass) -> dict:
+    kwargs = {}
+    if _is_sqlite(url):
+        kwargs["connect_args"] = {"check_same_thread": False}
+    # In-memory SQLite needs its own single-connection pool; leave it alone
+    if not _is_memory_sqlite(url):
+        kwargs.update(
+            poolclass=poolclass,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+    return kwargs
+
+
+def build_engine(url: str = DATABASE_URL, sqlite_tuned: bool = SQLITE_TUNED, **overrides) -> Engine:
+    """Create an engine with the env-driven pool settings (and SQLite tuning)"""
+    engine = create_engine(url, **{**_pool_kwargs(url, TimedQueuePool), **overrides})
+    if _is_sqlite(url) and sqlite_tuned:
+        _apply_sqlite_pragmas(engine, wal=not _is_memory_sqlite(url))
+    return engine
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args=connect_args
-)
+
+def async_url(url: str) -> str:
+    """Async-driver form of a sync URL (sqlite -> aiosqlite, postgresql -> asyncpg)"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    if backend in ("postgresql", "postgres"):
+        return parsed.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+    return url
+
+
+def build_async_engine(url: str, sqlite_tuned: bool = SQLITE_TUNED, **overrides) -> AsyncEngine:
+    """Async counterpart of build_engine(); same pool settings and SQLite tuning"""
+    kwargs = _pool_kwargs(url, TimedAsyncQueuePool)
+    if not _is_sqlite(url):
+        kwargs.pop("connect_args", None)
+    engine = create_async_engine(url, **{**kwargs, **overrides})
+    if _is_sqlite(url) and sqlite_tuned:
+        _apply_sqlite_pragmas(engine.sync_engine, wal=not _is_memory_sqlite(url))
+    return engine
+
+
+def pool_stats(engine) -> dict:
+    """Checkout wait times and saturation (pool gauges only for the timed pools)"""
+    pool = engine.pool
+    data = {"pool": type(pool).__name__}
+    if isinstance(pool, _TimedPool):
+        data.update(pool.stats())
+    return data
+
+
+engine = build_engine(DATABASE_URL)
+
+metrics.register("db_pool", lambda: pool_stats(engine))
 
 SessionLocal = sessionmaker(bind=engine)
 
@@ -21,4 +171,46 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# ==========================
+# ASYNC SESSIONS
+# ==========================
+# Read-heavy endpoints use AsyncSession so they don't hold a threadpool slot
+# while waiting on the database. The engine is created on first use, so the
+# async driver (aiosqlite / asyncpg) is only needed by processes that serve
+# those endpoints.
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_url(DATABASE_URL)
+
+_async_engine: Optional[AsyncEngine] = None
+_async_sessionmaker: Optional[async_sessionmaker] = None
+_async_lock = threading.Lock()
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine, _async_sessionmaker
+    with _async_lock:
+        if _async_engine is None:
+            _async_engine = build_async_engine(ASYNC_DATABASE_URL)
+            _async_sessionmaker = async_sessionmaker(_async_engine, expire_on_commit=False)
+            metrics.register("db_pool_async", lambda: pool_stats(_async_engine))
+        return _async_engine
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    get_async_engine()
+    return _async_sessionmaker()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_sessionmaker
+    engine, _async_engine, _async_sessionmaker = _async_engine, None, None
+    if engine is not None:
+        await engine.dispose()
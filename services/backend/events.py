@@ -0,0 +1,225 @@
+# events.py
+# In-process pub/sub behind the dashboard's server-sent events stream.
+# ORM listeners collect new DashboardNotification / MessageLog / Appointment
+# rows during a flush and publish them once the transaction commits, so every
+# writer (API handlers, webhook workers, the outbox) feeds the stream without
+# extra calls. Bulk query(...).update() skips those hooks; such writers call
+# publish_message_updates after committing. Each technician has a short replay buffer; clients reconnect
+# with Last-Event-ID and get what they missed, or a "resync" event telling
+# them to refetch over REST when the gap is no longer buffered.
+#
+# The broker is per process: with several workers, a tab only sees events
+# written by the worker it is connected to, and falls back to resync/polling.
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from services.backend import metrics, models
+
+EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", "200"))
+EVENT_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("EVENT_SUBSCRIBER_QUEUE_SIZE", "500"))
+EVENT_HEARTBEAT_SEC = float(os.getenv("EVENT_HEARTBEAT_SEC", "15"))
+EVENT_RETRY_MS = 3000
+
+
+@dataclass
+class Event:
+    id: int
+    technician_id: int
+    type: str
+    data: dict
+
+    def format(self) -> str:
+        """Serialize as one SSE frame"""
+        payload = json.dumps(jsonable_encoder(self.data), separators=(",", ":"))
+        return f"id: {self.id}\nevent: {self.type}\ndata: {payload}\n\n"
+
+
+RESYNC = "resync"
+
+
+class Subscriber:
+    """One open stream: an asyncio queue fed thread-safely from publishers"""
+
+    def __init__(self, technician_id: int, maxsize: int = EVENT_SUBSCRIBER_QUEUE_SIZE):
+        self.technician_id = technician_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def _put(self, item: Event) -> None:
+        if self.queue.full():
+            # Slow consumer: drop the backlog and make the client refetch
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            item = Event(item.id, item.technician_id, RESYNC, {"reason": "overflow"})
+        self.queue.put_nowait(item)
+
+    def push(self, item: Event) -> None:
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._put, item)
+
+
+class EventBroker:
+    """Per-technician fan-out with a bounded replay buffer"""
+
+    def __init__(self, buffer_size: int = EVENT_BUFFER_SIZE):
+        # Millisecond-based start so IDs keep increasing across restarts and
+        # a cursor from a previous process is recognised as stale.
+        self._seq = int(time.time() * 1000)
+        self.first_id = self._seq + 1
+        self.buffer_size = buffer_size
+        self._buffers: Dict[int, Deque[Event]] = defaultdict(lambda: deque(maxlen=self.buffer_size))
+        self._evicted_upto: Dict[int, int] = {}
+        self._subscribers: Dict[int, Set[Subscriber]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self.counters = {"published": 0, "replayed": 0, "resyncs": 0}
+
+    def publish(self, technician_id: int, event_type: str, data: dict) -> Event:
+        with self._lock:
+            self._seq += 1
+            item = Event(self._seq, technician_id, event_type, data)
+            buffer = self._buffers[technician_id]
+            if len(buffer) == buffer.maxlen:
+                self._evicted_upto[technician_id] = buffer[0].id
+            buffer.append(item)
+            subscribers = list(self._subscribers.get(technician_id, ()))
+            self.counters["published"] += 1
+
+        for subscriber in subscribers:
+            subscriber.push(item)
+        return item
+
+    def subscribe(self, technician_id: int, last_event_id: Optional[int] = None) -> Subscriber:
+        """Open a stream; events after last_event_id are replayed first (call on the event loop)"""
+        subscriber = Subscriber(technician_id)
+        with self._lock:
+            self._subscribers[technician_id].add(subscriber)
+            if last_event_id is None:
+                return subscriber
+
+            missed_unbuffered = (
+                last_event_id < self.first_id - 1
+                or last_event_id > self._seq
+                or last_event_id < self._evicted_upto.get(technician_id, 0)
+            )
+            if missed_unbuffered:
+                self.counters["resyncs"] += 1
+                subscriber.queue.put_nowait(Event(self._seq, technician_id, RESYNC, {"reason": "cursor_expired"}))
+                return subscriber
+
+            for item in self._buffers.get(technician_id, ()):
+                if item.id > last_event_id:
+                    subscriber._put(item)
+                    self.counters["replayed"] += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.technician_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.technician_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "subscribers": sum(len(s) for s in self._subscribers.values()),
+                "last_event_id": self._seq,
+            }
+
+
+broker = EventBroker()
+metrics.register("events", broker.stats)
+
+
+async def stream(
+    subscriber: Subscriber,
+    is_disconnected: Callable[[], Awaitable[bool]],
+    heartbeat: float = EVENT_HEARTBEAT_SEC,
+) -> AsyncIterator[str]:
+    """SSE body for one subscriber; heartbeats keep proxies from closing idle streams"""
+    try:
+        yield f"retry: {EVENT_RETRY_MS}\n\n"
+        while True:
+            try:
+                item = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    break
+                yield ": ping\n\n"
+                continue
+            yield item.format()
+    finally:
+        broker.unsubscribe(subscriber)
+
+
+# ==========================
+# ORM HOOKS
+# ==========================
+
+# model -> (insert event, update event)
+_TRACKED = {
+    models.DashboardNotification: ("notification", None),
+    models.MessageLog: ("message", "message_updated"),
+    models.Appointment: ("booking_created", "booking_updated"),
+}
+
+
+def _row(target) -> dict:
+    return {attr.key: getattr(target, attr.key) for attr in target.__mapper__.column_attrs}
+
+
+def _queue(session: Session, technician_id: Optional[int], event_type: str, target) -> None:
+    if technician_id is None:
+        return
+    session.info.setdefault("pending_events", []).append((technician_id, event_type, _row(target)))
+
+
+def _register(model, insert_type: str, update_type: Optional[str]) -> None:
+    @event.listens_for(model, "after_insert")
+    def _after_insert(mapper, connection, target):
+        _queue(Session.object_session(target), target.technician_id, insert_type, target)
+
+    if update_type:
+        @event.listens_for(model, "after_update")
+        def _after_update(mapper, connection, target):
+            _queue(Session.object_session(target), target.technician_id, update_type, target)
+
+
+for _model, (_insert_type, _update_type) in _TRACKED.items():
+    _register(_model, _insert_type, _update_type)
+
+
+def publish_message_updates(session: Session, log_ids) -> None:
+    """message_updated for MessageLog rows changed by a bulk query(...).update(),
+    which the after_update hook never sees; call once the update has committed"""
+    ids = [log_id for log_id in log_ids if log_id is not None]
+    if not ids:
+        return
+    rows = session.query(models.MessageLog).filter(models.MessageLog.id.in_(ids)).order_by(models.MessageLog.id).all()
+    for row in rows:
+        if row.technician_id is not None:
+            broker.publish(row.technician_id, "message_updated", _row(row))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session):
+    pending: List = session.info.pop("pending_events", None) or []
+    for technician_id, event_type, data in pending:
+        broker.publish(technician_id, event_type, data)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop("pending_events", None)
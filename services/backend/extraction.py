@@ -0,0 +1,427 @@
+# extraction.py
+# Local intent and entity extraction for chat messages. Everything here is
+# precompiled at import (regexes) or once per technician catalog (the
+# service-name trie), so extracting a DM costs microseconds and the common
+# cases (a service, a day and time, a name, a phone number, yes/no) never
+# need a model call. Each result carries a confidence score; callers fall
+# back to a model when it is below EXTRACTION_MIN_CONFIDENCE.
+import os
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from datetime import date as date_type, datetime, timedelta, timezone, tzinfo
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+EXTRACTION_MIN_CONFIDENCE = float(os.getenv("EXTRACTION_MIN_CONFIDENCE", "0.6"))
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+MONTHS = ("january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december")
+
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and collapse everything but letters/digits to single spaces"""
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+# ==========================
+# INTENTS
+# ==========================
+# First match wins, so more specific intents come first.
+
+INTENTS: Tuple[Tuple[str, float, "re.Pattern"], ...] = tuple(
+    (name, confidence, re.compile(pattern, re.I))
+    for name, confidence, pattern in (
+        ("restart", 0.95, r"^\s*(restart|start over|reset)\s*[.!]*\s*$"),
+        ("cancel", 0.85, r"\b(cancel|cancell?ation)\b"),
+        ("reschedule", 0.85, r"\b(reschedule|re-schedule|move|change) (my|the) (booking|appointment)\b|\breschedule\b"),
+        ("confirm", 0.9, r"^\s*(y|yes|yeah|yep|yup|yas|sure|ok|okay|confirm(ed)?|correct|perfect|sounds good|book it|please do)\b"),
+        ("deny", 0.9, r"^\s*(n|no|nope|nah|not really|change( it)?|wrong)\b"),
+        ("services", 0.9, r"\b(services|menu|price ?list|prices|pricing|how much|what do you (offer|do))\b"),
+        ("book", 0.85, r"\b(book|booking|appointment|appt|another|slot|available|availability|free)\b"),
+        ("thanks", 0.8, r"\b(thanks|thank you|thx|cheers|ty)\b"),
+        ("greeting", 0.8, r"^\s*(hi+|hello|hey+|hiya|yo|good (morning|afternoon|evening))\b"),
+    )
+)
+
+
+# ==========================
+# ENTITY PATTERNS
+# ==========================
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+PHONE_RE = re.compile(r"(?<![\w])\+?\d[\d\s().-]{6,}\d(?![\w])")
+ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+DMY_DATE_RE = re.compile(r"\b(\d{1,2})([/.])(\d{1,2})(?:\2(\d{2,4}))?\b")
+_MONTH = r"(" + "|".join(m[:3] + r"[a-z]*" for m in MONTHS) + r")"
+DAY_MONTH_RE = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?(?:\s+of)?\s+" + _MONTH + r"\b(?:\s+(\d{4}))?", re.I)
+MONTH_DAY_RE = re.compile(r"\b" + _MONTH + r"\s+(\d{1,2})(?:st|nd|rd|th)?\b(?:,?\s+(\d{4}))?", re.I)
+RELATIVE_DAY_RE = re.compile(r"\b(today|tonight|tomorrow|tmrw|tmr|day after tomorrow)\b", re.I)
+IN_DAYS_RE = re.compile(r"\bin (\d{1,2}|a|one|two|three) (day|days|week|weeks)\b", re.I)
+WEEKDAY_RE = re.compile(r"\b(next |this )?(" + "|".join(WEEKDAYS) + r"|mon|tues?|wed|thu(?:rs?)?|fri|sat|sun)\b", re.I)
+CLOCK_RE = re.compile(r"(?<![/.])\b([01]?\d|2[0-3])[:.]([0-5]\d)(?![/.]\d)\s*(am|pm)?\b", re.I)
+HOUR_RE = re.compile(r"\b(1[0-2]|0?[1-9])\s*(am|pm)\b", re.I)
+AT_HOUR_RE = re.compile(r"\bat (1[0-2]|[1-9])\b(?![:.]\d)", re.I)
+NOON_RE = re.compile(r"\b(noon|midday)\b", re.I)
+NAME_CUE_RE = re.compile(r"\b(?:my name is|my name's|name is|i am|i'm|im|this is|it's|call me)\s+([a-z][a-z'-]*(?:\s+[a-z][a-z'-]*){0,2})", re.I)
+PLAIN_NAME_RE = re.compile(r"^[a-z][a-z'-]*(?:\s+[a-z][a-z'-]*){0,3}$", re.I)
+
+_SMALL_NUMBERS = {"a": 1, "one": 1, "two": 2, "three": 3}
+
+# Words that follow "I'm"/"this is" without being a name, and words a bare
+# reply would not be a name made of
+NOT_NAME_WORDS = frozenset("""
+    a an the looking interested wondering free available here booking trying after just good fine not sorry ok okay
+    hi hello hey yes no thanks thank you please want would like need can could book appointment so very really still
+    going coming running late sure from with at on in for to and but your my me
+""".split())
+
+# Words never worth fuzzy-matching against service names
+FILLER_WORDS = frozenset("""
+    i im me my you your a an the to for of on at in and or with is are be can could would like want need please
+    book booking appointment get have do does some any just also next this that tomorrow today
+""".split())
+
+
+def _local_today(now: Optional[datetime], tz: Optional[tzinfo]) -> date_type:
+    now = now or datetime.now(timezone.utc)
+    if now.tzinfo is None:
+        now = now.replace(tzinfo=timezone.utc)
+    return now.astimezone(tz).date() if tz is not None else now.date()
+
+
+def _month_number(name: str) -> int:
+    prefix = name[:3].lower()
+    return next(i for i, month in enumerate(MONTHS, 1) if month.startswith(prefix))
+
+
+def _dated(year: Optional[str], month: int, day: int, today: date_type) -> Optional[date_type]:
+    """A calendar date; without a year, the next occurrence on or after today"""
+    try:
+        if year:
+            value = int(year)
+            return date_type(value + 2000 if value < 100 else value, month, day)
+        parsed = date_type(today.year, month, day)
+        return parsed if parsed >= today else date_type(today.year + 1, month, day)
+    except ValueError:
+        return None
+
+
+def parse_date(text: str, today: date_type) -> Optional[Tuple[date_type, Tuple[int, int]]]:
+    """(date, span) for the first date expression in the message.
+
+    Clock times are blanked first, so "tomorrow at 10.30" is tomorrow and
+    not 10 March; a match that isn't a real date (31/02) falls through to
+    the next one.
+    """
+    for match in CLOCK_RE.finditer(text):
+        text = _blank(text, match.span())
+    for match in ISO_DATE_RE.finditer(text):
+        parsed = _dated(match.group(1), int(match.group(2)), int(match.group(3)), today)
+        if parsed:
+            return parsed, match.span()
+    for match in DAY_MONTH_RE.finditer(text):
+        parsed = _dated(match.group(3), _month_number(match.group(2)), int(match.group(1)), today)
+        if parsed:
+            return parsed, match.span()
+    for match in MONTH_DAY_RE.finditer(text):
+        parsed = _dated(match.group(3), _month_number(match.group(1)), int(match.group(2)), today)
+        if parsed:
+            return parsed, match.span()
+    for match in DMY_DATE_RE.finditer(text):
+        if match.group(2) == "." and not match.group(4):
+            continue  # "9.30" is a time; dotted dates need a year
+        parsed = _dated(match.group(4), int(match.group(3)), int(match.group(1)), today)
+        if parsed:
+            return parsed, match.span()
+    match = RELATIVE_DAY_RE.search(text)
+    if match:
+        word = match.group(1).lower()
+        offset = 2 if word == "day after tomorrow" else 0 if word in ("today", "tonight") else 1
+        return today + timedelta(days=offset), match.span()
+    match = IN_DAYS_RE.search(text)
+    if match:
+        count = _SMALL_NUMBERS.get(match.group(1).lower()) or int(match.group(1))
+        days = count * 7 if match.group(2).lower().startswith("week") else count
+        return today + timedelta(days=days), match.span()
+    match = WEEKDAY_RE.search(text)
+    if match:
+        prefix = match.group(2)[:3].lower()
+        weekday = next(i for i, name in enumerate(WEEKDAYS) if name.startswith(prefix))
+        ahead = (weekday - today.weekday()) % 7
+        if ahead == 0 and (match.group(1) or "").strip().lower() == "next":
+            ahead = 7
+        return today + timedelta(days=ahead), match.span()
+    return None
+
+
+def parse_time(text: str) -> Optional[Tuple[int, Tuple[int, int]]]:
+    """(minutes since midnight, span) for '14:30', '2:30pm', '2pm', 'at 3' or 'noon'"""
+    match = CLOCK_RE.search(text)
+    if match:
+        hours, minutes, meridiem = int(match.group(1)), int(match.group(2)), match.group(3)
+    else:
+        match = HOUR_RE.search(text)
+        if match:
+            hours, minutes, meridiem = int(match.group(1)), 0, match.group(2)
+        else:
+            match = NOON_RE.search(text)
+            if match:
+                return 12 * 60, match.span()
+            match = AT_HOUR_RE.search(text)
+            if not match:
+                return None
+            # "at 3" in a booking chat means the afternoon
+            hours, minutes, meridiem = int(match.group(1)), 0, "pm" if int(match.group(1)) < 8 else None
+    if meridiem:
+        if hours > 12:
+            return None
+        hours = hours % 12 + (12 if meridiem.lower() == "pm" else 0)
+    return hours * 60 + minutes, match.span()
+
+
+def _name(text: str, allow_plain: bool) -> Optional[Tuple[str, Tuple[int, int]]]:
+    match = NAME_CUE_RE.search(text)
+    if match:
+        words = []
+        for word in match.group(1).split():
+            if word.lower() in NOT_NAME_WORDS:
+                break
+            words.append(word)
+        span = (match.start(1), match.start(1) + len(" ".join(words)))
+    elif allow_plain:
+        candidate = text.strip(" .!")
+        if not PLAIN_NAME_RE.match(candidate):
+            return None
+        words = candidate.split()
+        if any(word.lower() in NOT_NAME_WORDS for word in words):
+            return None
+        span = (0, len(text))
+    else:
+        return None
+    if not words:
+        return None
+    return " ".join(word.capitalize() for word in words), span
+
+
+def parse_name(text: str, allow_plain: bool = False) -> Optional[str]:
+    """A name given with a cue ("my name is ..."); with allow_plain, a bare one- to four-word reply"""
+    found = _name(text, allow_plain)
+    return found[0] if found else None
+
+
+def _blank(text: str, span: Tuple[int, int]) -> str:
+    return text[:span[0]] + " " * (span[1] - span[0]) + text[span[1]:]
+
+
+# ==========================
+# SERVICE NAME TRIE
+# ==========================
+
+class _Node:
+    __slots__ = ("children", "values")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.values: Dict[int, float] = {}  # service id -> weight of this key
+
+
+def _max_edits(length: int) -> int:
+    return 0 if length <= 3 else 1 if length <= 7 else 2
+
+
+class ServiceMatcher:
+    """Fuzzy service-name lookup over a character trie.
+
+    Keys are each service's full normalized name (weight 1.0) and its
+    distinctive words (weight 0.75, split between services sharing the
+    word). Lookups try exact n-grams first and only walk the trie with a
+    bounded Levenshtein row when nothing matched exactly.
+    """
+
+    def __init__(self, services: Iterable[Tuple[int, str]]):
+        self.root = _Node()
+        self.exact: Dict[str, Dict[int, float]] = {}
+        self.key_lengths = set()
+        self.max_words = 1
+        word_owners: Dict[str, List[int]] = {}
+        for service_id, name in services:
+            key = normalize(name)
+            if not key:
+                continue
+            self._insert(key, service_id, 1.0)
+            self.max_words = max(self.max_words, len(key.split()))
+            for word in set(key.split()):
+                if len(word) >= 3 and word not in FILLER_WORDS and word != key:
+                    word_owners.setdefault(word, []).append(service_id)
+        for word, owners in word_owners.items():
+            for service_id in owners:
+                self._insert(word, service_id, 0.75 / len(owners))
+
+    def _insert(self, key: str, service_id: int, weight: float) -> None:
+        node = self.root
+        for ch in key:
+            node = node.children.setdefault(ch, _Node())
+        node.values[service_id] = max(weight, node.values.get(service_id, 0.0))
+        self.exact[key] = node.values
+        self.key_lengths.add(len(key))
+
+    def _fuzzy(self, word: str, max_edits: int) -> List[Tuple[int, Dict[int, float]]]:
+        """Keys within max_edits of `word` (adjacent swaps count as one edit).
+
+        Only keys sharing the first letter are searched: typos there are rare
+        and it cuts the walk to one branch of the trie.
+        """
+        start = self.root.children.get(word[0])
+        if start is None:
+            return []
+        results = []
+        n = len(word)
+        first = list(range(n + 1))
+        # (node, its char, row for the parent prefix, row before that, parent char)
+        stack = [(start, word[0], first, None, "")]
+        while stack:
+            node, ch, previous, before, previous_ch = stack.pop()
+            row = [previous[0] + 1]
+            best = row[0]
+            for i in range(1, n + 1):
+                # Inlined min(): this loop is the hot path of a fuzzy lookup
+                cost = row[i - 1] + 1
+                if previous[i] + 1 < cost:
+                    cost = previous[i] + 1
+                if previous[i - 1] + (word[i - 1] != ch) < cost:
+                    cost = previous[i - 1] + (word[i - 1] != ch)
+                if before is not None and i > 1 and word[i - 1] == previous_ch and word[i - 2] == ch and before[i - 2] + 1 < cost:
+                    cost = before[i - 2] + 1
+                row.append(cost)
+                if cost < best:
+                    best = cost
+            if row[-1] <= max_edits and node.values:
+                results.append((row[-1], node.values))
+            if best <= max_edits:
+                stack.extend((child, c, row, previous, ch) for c, child in node.children.items())
+        return results
+
+    def match(self, text: str) -> Tuple[Optional[int], float]:
+        """(service id, score 0-1) for the best service mentioned in `text`; None if absent or ambiguous"""
+        tokens = normalize(text).split()
+        scores: Dict[int, float] = {}
+
+        def add(values: Dict[int, float], penalty: float = 0.0) -> None:
+            for service_id, weight in values.items():
+                scores[service_id] = max(scores.get(service_id, 0.0), weight - penalty)
+
+        grams = [
+            " ".join(tokens[i:i + n])
+            for n in range(min(self.max_words, len(tokens)), 0, -1)
+            for i in range(len(tokens) - n + 1)
+        ]
+        for gram in grams:
+            if gram in self.exact:
+                add(self.exact[gram])
+        if max(scores.values(), default=0.0) < 1.0:
+            # No full name matched exactly: look for misspelt ones (and, if
+            # no word matched either, misspelt words)
+            for gram in grams:
+                words = gram.split(" ")
+                if words[0] in FILLER_WORDS or words[-1] in FILLER_WORDS or gram.isdigit() or (scores and len(words) == 1):
+                    continue
+                edits = _max_edits(len(gram))
+                if edits and any(abs(len(gram) - n) <= edits for n in self.key_lengths):
+                    for distance, values in self._fuzzy(gram, edits):
+                        add(values, 0.15 * distance)
+
+        if not scores:
+            return None, 0.0
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if len(ranked) > 1 and ranked[1][1] >= ranked[0][1] - 0.05:
+            return None, 0.0
+        return ranked[0][0], round(ranked[0][1], 3)
+
+
+# ==========================
+# EXTRACTION
+# ==========================
+
+@dataclass
+class Extraction:
+    intent: str
+    confidence: float
+    name: Optional[str] = None
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    date: Optional[date_type] = None
+    time: Optional[int] = None  # minutes since midnight
+    service_id: Optional[int] = None
+    service_score: float = 0.0
+    entities: List[str] = field(default_factory=list)
+
+    @property
+    def needs_fallback(self) -> bool:
+        return self.confidence < EXTRACTION_MIN_CONFIDENCE
+
+
+def extract(
+    text: str,
+    services: Optional[ServiceMatcher] = None,
+    now: Optional[datetime] = None,
+    tz: Optional[tzinfo] = None,
+) -> Extraction:
+    """Intent and entities for one message; relative dates resolve in `tz`"""
+    text = text or ""
+    today = _local_today(now, tz)
+    result = Extraction(intent="unknown", confidence=0.0 if not text.strip() else 0.2)
+
+    for name, confidence, pattern in INTENTS:
+        if pattern.search(text):
+            result.intent, result.confidence = name, confidence
+            break
+
+    # Pull out entities left to right, blanking each match so a date's
+    # digits are not read again as a time or a phone number
+    rest = text
+    email = EMAIL_RE.search(rest)
+    if email:
+        result.email = email.group(0).lower()
+        rest = _blank(rest, email.span())
+    found = parse_date(rest, today)
+    if found:
+        result.date, span = found
+        rest = _blank(rest, span)
+    found = parse_time(rest)
+    if found:
+        result.time, span = found
+        rest = _blank(rest, span)
+    phone = PHONE_RE.search(rest)
+    if phone and sum(ch.isdigit() for ch in phone.group(0)) >= 8:
+        result.phone = re.sub(r"[^\d+]", "", phone.group(0))
+        rest = _blank(rest, phone.span())
+    found = _name(rest, allow_plain=False)
+    if found:
+        result.name, span = found
+        rest = _blank(rest, span)
+    if services is not None:
+        result.service_id, result.service_score = services.match(rest)
+
+    result.entities = [
+        key for key in ("name", "phone", "email", "date", "time", "service_id") if getattr(result, key) is not None
+    ]
+    if result.entities:
+        entity_confidence = min(0.9, 0.6 + 0.1 * len(result.entities))
+        if result.intent == "unknown":
+            result.intent, result.confidence = "provide_info", entity_confidence
+        else:
+            result.confidence = max(result.confidence, entity_confidence)
+    if result.service_id is not None and result.service_score < 0.6:
+        result.confidence = min(result.confidence, result.service_score)
+    return result
+
+
+def service_matcher(services: Sequence) -> ServiceMatcher:
+    """Matcher for objects with .id and .name (e.g. Service rows or knowledge.ServiceInfo)"""
+    return ServiceMatcher((s.id, s.name) for s in services)
@@ -0,0 +1,117 @@
+# idempotency.py
+# Idempotency-Key support for booking/payment writes (see
+# docs/booking-integration-contract.md). Completed responses are kept in a
+# bounded in-process TTL cache so a retry is answered with a dict lookup
+# instead of another availability query and insert.
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from cachetools import TTLCache
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+IDEMPOTENCY_TTL_SEC = int(os.getenv("IDEMPOTENCY_TTL_SEC", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+MAX_KEY_LENGTH = 255
+
+
+@dataclass
+class IdempotencyRecord:
+    fingerprint: str
+    status_code: Optional[int] = None  # None while the first request is in flight
+    body: Any = None
+
+
+def fingerprint(payload: Any) -> str:
+    """Stable hash of a request payload"""
+    raw = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """Bounded key -> response store with TTL eviction (thread-safe)"""
+
+    def __init__(self, maxsize: int = IDEMPOTENCY_MAX_KEYS, ttl: int = IDEMPOTENCY_TTL_SEC):
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def begin(self, key: str, request_fingerprint: str) -> Optional[IdempotencyRecord]:
+        """Claim a key. Returns the existing record if the key was already used."""
+        with self._lock:
+            existing = self._cache.get(key)
+            if existing is not None:
+                return existing
+            self._cache[key] = IdempotencyRecord(fingerprint=request_fingerprint)
+            return None
+
+    def complete(self, key: str, request_fingerprint: str, status_code: int, body: Any) -> None:
+        with self._lock:
+            self._cache[key] = IdempotencyRecord(request_fingerprint, status_code, body)
+
+    def release(self, key: str) -> None:
+        """Forget an in-flight key so the client can retry after a failure"""
+        with self._lock:
+            record = self._cache.get(key)
+            if record is not None and record.status_code is None:
+                del self._cache[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._cache)
+
+
+store = IdempotencyStore()
+
+
+def run_idempotent(
+    idempotency_key: Optional[str],
+    scope: str,
+    payload: Any,
+    handler: Callable[[], Any],
+    status_code: int = 200,
+) -> Any:
+    """Run `handler` once per (scope, Idempotency-Key) and replay its response.
+
+    Without a key the handler simply runs. Reusing a key with a different
+    payload is rejected with 422, and a retry that arrives while the first
+    request is still running gets 409. Only successful responses are stored;
+    errors release the key so the client can retry.
+    """
+    if not idempotency_key:
+        return handler()
+
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(400, "Idempotency-Key too long")
+
+    key = f"{scope}:{idempotency_key}"
+    request_fingerprint = fingerprint(payload)
+    existing = store.begin(key, request_fingerprint)
+
+    if existing is not None:
+        if existing.fingerprint != request_fingerprint:
+            raise HTTPException(422, "Idempotency-Key was already used with a different request")
+        if existing.status_code is None:
+            raise HTTPException(409, "A request with this Idempotency-Key is still in progress")
+        return JSONResponse(
+            status_code=existing.status_code,
+            content=existing.body,
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+    try:
+        result = handler()
+    except BaseException:
+        store.release(key)
+        raise
+
+    store.complete(key, request_fingerprint, status_code, jsonable_encoder(result))
+    return result
@@ -0,0 +1,462 @@
+# knowledge.py
+# Per-technician knowledge snapshot: services with prices and durations,
+# opening hours, deposit and payment rules and the auto-reply switch, read
+# from Technician, Service, Availability, PaymentSetting and
+# SocialAutomationSetting in one build and then frozen. Replies to the
+# common DM questions (prices, hours, deposit, how to pay, what's on offer)
+# are rendered at build time, so chat turns and webhook handlers answer
+# them without touching the database.
+#
+# A commit that writes any of those tables drops the technician's snapshot
+# in this process and the background refresher rebuilds it; snapshots older
+# than KNOWLEDGE_MAX_AGE_SEC are rebuilt as well, which picks up changes
+# made by other processes. The version only moves when the content does.
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+from typing import Dict, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from services.backend import availability, extraction, metrics, models
+from services.backend.database import SessionLocal
+
+KNOWLEDGE_MAX_TECHNICIANS = int(os.getenv("KNOWLEDGE_MAX_TECHNICIANS", "5000"))
+KNOWLEDGE_MAX_AGE_SEC = float(os.getenv("KNOWLEDGE_MAX_AGE_SEC", "300"))
+KNOWLEDGE_REFRESH_INTERVAL_SEC = float(os.getenv("KNOWLEDGE_REFRESH_INTERVAL_SEC", "1"))
+
+CURRENCY_SYMBOL = "£"
+
+# PaymentSetting.provider / Technician.payment_provider -> how a client pays
+PAYMENT_METHODS = {
+    "stripe": "card",
+    "paystack": "card",
+    "flutterwave": "card",
+    "bank": "bank transfer",
+    "manual": "bank transfer",
+}
+
+
+def format_money(amount: float) -> str:
+    return f"{CURRENCY_SYMBOL}{amount:.2f}"
+
+
+class ServiceInfo(NamedTuple):
+    id: int
+    name: str
+    price: float
+    duration: int
+
+
+class HoursRow(NamedTuple):
+    day: str
+    start_time: str
+    end_time: str
+
+
+class Answer(NamedTuple):
+    topic: str  # services | prices | duration | hours | deposit | payment | service
+    text: str
+
+
+# ==========================
+# QUESTIONS
+# ==========================
+# First match wins: "how much is the deposit?" is about the deposit, not prices.
+
+TOPICS: Tuple[Tuple[str, "re.Pattern"], ...] = tuple(
+    (name, re.compile(pattern, re.I))
+    for name, pattern in (
+        ("deposit", r"\b(deposits?|upfront)\b"),
+        ("payment", r"\b(pay|paying|payment|card|cash|bank transfer)\b"),
+        ("hours", r"\b(open|opening|hours|close|closing|closed|what time do you|when are you)\b"),
+        ("duration", r"\b(how long|duration)\b"),
+        ("prices", r"\b(prices?|pricing|cost|costs|how much|rates?|charge)\b"),
+        ("services", r"\b(services|menu|treatments|what do you (offer|do))\b"),
+    )
+)
+QUESTION_RE = re.compile(r"\?|^\s*(how|what|what's|whats|when|where|which|do|does|is|are|can|could)\b", re.I)
+SHORT_QUESTION_WORDS = 3  # "prices", "opening hours?" and the like count as questions
+
+
+def question_topic(text: str) -> Optional[str]:
+    """Topic of an FAQ-style question, or None if the message isn't one"""
+    if not text or not (QUESTION_RE.search(text) or len(text.split()) <= SHORT_QUESTION_WORDS):
+        return None
+    return next((name for name, pattern in TOPICS if pattern.search(text)), None)
+
+
+# ==========================
+# SNAPSHOT
+# ==========================
+
+@dataclass(frozen=True)
+class KnowledgeSnapshot:
+    """What chat and webhook handlers know about a technician, frozen at build time"""
+    technician_id: int
+    version: int
+    checksum: str
+    business_name: str
+    deposit_required: bool
+    deposit_amount: float
+    payment_methods: Tuple[str, ...]
+    auto_reply_enabled: bool
+    services: Tuple[ServiceInfo, ...]
+    hours: Tuple[HoursRow, ...]
+    menu: str  # numbered service list with prices and durations
+    answers: Mapping[str, str] = field(compare=False, repr=False)
+    service_answers: Mapping[int, str] = field(compare=False, repr=False)
+    matcher: extraction.ServiceMatcher = field(compare=False, repr=False)
+    built_at: float = field(default_factory=time.monotonic, compare=False)
+
+    def service(self, service_id: Optional[int]) -> Optional[ServiceInfo]:
+        return next((s for s in self.services if s.id == service_id), None)
+
+    def answer(self, text: str, extracted: Optional[extraction.Extraction] = None) -> Optional[Answer]:
+        """Prebuilt reply to an FAQ-style question (a named service gets its own price/duration line)"""
+        topic = question_topic(text)
+        if topic is None:
+            return None
+        if topic in ("prices", "duration"):
+            if extracted is not None:
+                service_id, score = extracted.service_id, extracted.service_score
+            else:
+                service_id, score = self.matcher.match(text)
+            if service_id in self.service_answers and score >= extraction.EXTRACTION_MIN_CONFIDENCE:
+                return Answer("service", self.service_answers[service_id])
+        return Answer(topic, self.answers[topic])
+
+
+def load_facts(db: Session, technician_id: int) -> Optional[dict]:
+    """Everything a snapshot is built from, as plain JSON-able values"""
+    tech = db.query(
+        models.Technician.business_name,
+        models.Technician.deposit_required,
+        models.Technician.deposit_amount,
+        models.Technician.payment_provider,
+    ).filter(models.Technician.id == technician_id).first()
+    if tech is None:
+        return None
+
+    services = db.query(
+        models.Service.id, models.Service.name, models.Service.price, models.Service.duration
+    ).filter(models.Service.technician_id == technician_id).order_by(models.Service.id).all()
+    hours = db.query(
+        models.Availability.day, models.Availability.start_time, models.Availability.end_time
+    ).filter(models.Availability.technician_id == technician_id).order_by(models.Availability.id).all()
+    payments = db.query(
+        models.PaymentSetting.provider, models.PaymentSetting.bank_name
+    ).filter(models.PaymentSetting.technician_id == technician_id).order_by(models.PaymentSetting.id).all()
+    auto_reply = db.query(models.SocialAutomationSetting.auto_reply_enabled).filter(
+        models.SocialAutomationSetting.technician_id == technician_id
+    ).scalar()
+
+    return {
+        "business_name": tech.business_name,
+        "deposit_required": bool(tech.deposit_required),
+        "deposit_amount": tech.deposit_amount or 0.0,
+        "payment_methods": _payment_methods([tech.payment_provider] + [p.provider for p in payments], payments),
+        "auto_reply_enabled": auto_reply is not False,
+        "services": [
+            [s.id, s.name, s.price or 0.0, s.duration if s.duration and s.duration > 0 else availability.DEFAULT_DURATION_MINUTES]
+            for s in services
+        ],
+        "hours": [[h.day, h.start_time, h.end_time] for h in hours],
+    }
+
+
+def _payment_methods(providers: List[Optional[str]], payments) -> List[str]:
+    methods = []
+    bank = next((p.bank_name for p in payments if p.bank_name), None)
+    for provider in providers:
+        if not provider:
+            continue
+        method = PAYMENT_METHODS.get(provider.lower(), provider.lower())
+        if method == "bank transfer" and bank:
+            method = f"bank transfer ({bank})"
+        if method not in methods and not (method == "bank transfer" and any(m.startswith("bank transfer") for m in methods)):
+            methods.append(method)
+    return methods
+
+
+def _checksum(facts: dict) -> str:
+    return hashlib.sha1(json.dumps(facts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _weekly_hours(rows: Tuple[HoursRow, ...]) -> Optional[List[Tuple[str, List[availability.Interval]]]]:
+    """(Weekday, intervals) for the weekly schedule; None when only dated rows exist"""
+    if not rows:
+        default = (availability.parse_time(availability.DEFAULT_WORKING_HOURS[0]), availability.parse_time(availability.DEFAULT_WORKING_HOURS[1]))
+        return [(day, [default]) for day in availability.WEEKDAYS]
+    by_day: Dict[str, List[availability.Interval]] = {day: [] for day in availability.WEEKDAYS}
+    weekly = False
+    for row in rows:
+        value = (row.day or "").strip().lower()
+        if not value or value[0].isdigit():
+            continue
+        for day in availability.WEEKDAYS:
+            if value == day or (len(value) >= 3 and day.startswith(value)):
+                try:
+                    by_day[day].append((availability.parse_time(row.start_time), availability.parse_time(row.end_time)))
+                    weekly = True
+                except (ValueError, AttributeError):
+                    pass
+    return [(day, availability.merge_intervals(by_day[day])) for day in availability.WEEKDAYS] if weekly else None
+
+
+def _render(facts: dict, services: Tuple[ServiceInfo, ...], hours: Tuple[HoursRow, ...]) -> Tuple[str, Dict[str, str], Dict[int, str]]:
+    business = facts["business_name"]
+    menu = "\n".join(
+        f"{n}. {s.name} — {format_money(s.price)} ({s.duration} min)" for n, s in enumerate(services, 1)
+    )
+    no_services = "We haven't listed any services yet."
+
+    weekly = _weekly_hours(hours)
+    if weekly is None:
+        hours_text = "Our hours change from week to week. Tell me a day and I'll check it for you."
+    else:
+        lines = [
+            f"{day.capitalize()}: " + (", ".join(
+                f"{availability.format_time(start)}–{availability.format_time(end)}" for start, end in intervals
+            ) or "closed")
+            for day, intervals in weekly
+        ]
+        hours_text = "Our opening hours:\n" + "\n".join(lines)
+
+    if facts["deposit_required"] and facts["deposit_amount"]:
+        deposit = f"We take a {format_money(facts['deposit_amount'])} deposit to secure each booking."
+    elif facts["deposit_required"]:
+        deposit = "We take a deposit to secure each booking; the amount is shown when you book."
+    else:
+        deposit = "No deposit is needed to book."
+
+    methods = facts["payment_methods"]
+    if methods:
+        payment = "You can pay by " + (" or ".join([", ".join(methods[:-1]), methods[-1]]) if len(methods) > 1 else methods[0]) + "."
+    else:
+        payment = f"Payment details are sent with your booking confirmation from {business}."
+
+    answers = {
+        "services": "Here's what we offer:\n" + menu if services else no_services,
+        "prices": "Here are our prices:\n" + menu if services else no_services,
+        "duration": "\n".join(f"{s.name}: {s.duration} min" for s in services) if services else no_services,
+        "hours": hours_text,
+        "deposit": deposit,
+        "payment": f"{payment} {deposit}",
+    }
+    service_answers = {s.id: f"{s.name} is {format_money(s.price)} and takes {s.duration} min." for s in services}
+    return menu, answers, service_answers
+
+
+def freeze(technician_id: int, facts: dict, version: int, checksum: str) -> KnowledgeSnapshot:
+    services = tuple(ServiceInfo(*s) for s in facts["services"])
+    hours = tuple(HoursRow(*h) for h in facts["hours"])
+    menu, answers, service_answers = _render(facts, services, hours)
+    return KnowledgeSnapshot(
+        technician_id=technician_id,
+        version=version,
+        checksum=checksum,
+        business_name=facts["business_name"],
+        deposit_required=facts["deposit_required"],
+        deposit_amount=facts["deposit_amount"],
+        payment_methods=tuple(facts["payment_methods"]),
+        auto_reply_enabled=facts["auto_reply_enabled"],
+        services=services,
+        hours=hours,
+        menu=menu,
+        answers=MappingProxyType(answers),
+        service_answers=MappingProxyType(service_answers),
+        matcher=extraction.service_matcher(services),
+    )
+
+
+# ==========================
+# STORE
+# ==========================
+
+class KnowledgeStore:
+    """Current KnowledgeSnapshot per technician (LRU-bounded)"""
+
+    def __init__(
+        self,
+        maxsize: int = KNOWLEDGE_MAX_TECHNICIANS,
+        max_age: float = KNOWLEDGE_MAX_AGE_SEC,
+        session_factory=SessionLocal,
+    ):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.session_factory = session_factory
+        self._items: "OrderedDict[int, KnowledgeSnapshot]" = OrderedDict()
+        self._versions: Dict[int, Tuple[int, str]] = {}
+        self._stale: Set[int] = set()
+        self._generations: Dict[int, int] = {}  # bumped by invalidate()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "builds": 0, "unchanged": 0, "invalidations": 0, "superseded": 0}
+        _stores.add(self)
+
+    def get(self, db: Session, technician_id: int) -> Optional[KnowledgeSnapshot]:
+        with self._lock:
+            snapshot = self._items.get(technician_id)
+            if snapshot is not None:
+                self._items.move_to_end(technician_id)
+            self.counters["hits" if snapshot is not None else "misses"] += 1
+        return snapshot if snapshot is not None else self.rebuild(db, technician_id)
+
+    def peek(self, technician_id: int) -> Optional[KnowledgeSnapshot]:
+        with self._lock:
+            return self._items.get(technician_id)
+
+    def rebuild(self, db: Session, technician_id: int) -> Optional[KnowledgeSnapshot]:
+        """Load and freeze a fresh snapshot (same version if nothing changed).
+
+        If the technician is invalidated while this runs, the facts may
+        predate that commit: the snapshot is still returned to the caller
+        but not installed, so the next reader rebuilds.
+        """
+        with self._lock:
+            generation = self._generations.get(technician_id, 0)
+        facts = load_facts(db, technician_id)
+        if facts is None:
+            with self._lock:
+                self._items.pop(technician_id, None)
+                self._stale.discard(technician_id)
+            return None
+
+        checksum = _checksum(facts)
+        with self._lock:
+            version, previous = self._versions.get(technician_id, (0, None))
+            current = self._items.get(technician_id)
+        if current is not None and current.checksum == checksum:
+            snapshot = replace(current, built_at=time.monotonic())
+        else:
+            snapshot = freeze(technician_id, facts, version if checksum == previous else version + 1, checksum)
+
+        with self._lock:
+            if self._generations.get(technician_id, 0) != generation:
+                self.counters["superseded"] += 1
+                return snapshot
+            self._versions[technician_id] = (snapshot.version, checksum)
+            self._items[technician_id] = snapshot
+            self._items.move_to_end(technician_id)
+            self._stale.discard(technician_id)
+            self.counters["builds"] += 1
+            if checksum == previous:
+                self.counters["unchanged"] += 1
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, technician_id: int) -> None:
+        """Drop a snapshot whose tables changed; refresh() rebuilds it if it was in use"""
+        with self._lock:
+            self._generations[technician_id] = self._generations.get(technician_id, 0) + 1
+            if self._items.pop(technician_id, None) is not None:
+                self._stale.add(technician_id)
+            self.counters["invalidations"] += 1
+
+    def refresh(self) -> int:
+        """Rebuild invalidated and aged-out snapshots; returns how many were rebuilt"""
+        cutoff = time.monotonic() - self.max_age
+        with self._lock:
+            due = set(self._stale) | {tid for tid, s in self._items.items() if s.built_at <= cutoff}
+        if not due:
+            return 0
+        db = self.session_factory()
+        try:
+            for technician_id in due:
+                self.rebuild(db, technician_id)
+        finally:
+            db.close()
+        return len(due)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._versions.clear()
+            self._stale.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "size": len(self._items), "stale": len(self._stale)}
+
+
+# Every live store hears about commits (tests and benchmarks make their own)
+_stores: "weakref.WeakSet[KnowledgeStore]" = weakref.WeakSet()
+store = KnowledgeStore()
+metrics.register("knowledge", store.stats)
+
+
+# ==========================
+# CHANGE TRACKING
+# ==========================
+# Flushed writes are collected on the session and only applied on commit,
+# so a rolled-back edit never drops a snapshot and readers never rebuild
+# from data that is not committed yet.
+
+_CHANGED_KEY = "knowledge_changed"
+
+
+def _changed(mapper, connection, target) -> None:
+    technician_id = target.id if isinstance(target, models.Technician) else target.technician_id
+    session = object_session(target)
+    if technician_id is not None and session is not None:
+        session.info.setdefault(_CHANGED_KEY, set()).add(technician_id)
+
+
+for _model in (models.Technician, models.Service, models.Availability, models.PaymentSetting, models.SocialAutomationSetting):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session) -> None:
+    for technician_id in session.info.pop(_CHANGED_KEY, ()):
+        for knowledge_store in list(_stores):
+            knowledge_store.invalidate(technician_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
+
+
+# ==========================
+# BACKGROUND REFRESHER
+# ==========================
+
+_refresher: Optional[asyncio.Task] = None
+
+
+async def _refresh_loop() -> None:
+    while True:
+        await asyncio.sleep(KNOWLEDGE_REFRESH_INTERVAL_SEC)
+        try:
+            await asyncio.to_thread(store.refresh)
+        except Exception as e:
+            print("⚠️  Knowledge refresh error:", e)
+
+
+async def start_refresher() -> None:
+    global _refresher
+    if _refresher is None:
+        _refresher = asyncio.create_task(_refresh_loop())
+
+
+async def stop_refresher() -> None:
+    global _refresher
+    if _refresher is not None:
+        _refresher.cancel()
+        try:
+            await _refresher
+        except asyncio.CancelledError:
+            pass
+        _refresher = None
@@ -0,0 +1,691 @@
+# llm_gateway.py
+# The one path for model calls (any OpenAI-compatible /chat/completions API).
+# A technician's ChatSetting is rendered once into a PromptTemplate and
+# cached until the settings change. Short FAQ-style questions ("price?",
+# "where are you?") are answered from a response cache keyed by template,
+# by exact wording or by near-duplicate wording, and identical questions
+# already in flight share one model call. Each technician gets a small
+# number of concurrent calls and a daily token budget (per process), and
+# replies can be streamed as they are generated.
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date as date_type, datetime, timezone
+from typing import AsyncIterator, Dict, FrozenSet, List, Optional, Tuple
+
+import httpx
+from cachetools import TTLCache
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from services.backend import extraction, metrics, models
+
+DEFAULT_API_BASE_URL = "https://api.openai.com/v1"
+LLM_API_BASE_URL = os.getenv("LLM_API_BASE_URL", DEFAULT_API_BASE_URL)
+LLM_API_KEY = os.getenv("LLM_API_KEY") or os.getenv("OPENAI_API_KEY", "")
+LLM_TIMEOUT_SEC = float(os.getenv("LLM_TIMEOUT_SEC", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "300"))
+
+LLM_TECH_CONCURRENCY = int(os.getenv("LLM_TECH_CONCURRENCY", "2"))
+LLM_QUEUE_TIMEOUT_SEC = float(os.getenv("LLM_QUEUE_TIMEOUT_SEC", "10"))
+LLM_DAILY_TOKEN_BUDGET = int(os.getenv("LLM_DAILY_TOKEN_BUDGET", "50000"))  # per technician; 0 = unlimited
+
+LLM_PROMPT_CACHE_TTL_SEC = int(os.getenv("LLM_PROMPT_CACHE_TTL_SEC", "300"))
+LLM_PROMPT_CACHE_MAX = int(os.getenv("LLM_PROMPT_CACHE_MAX", "1000"))
+LLM_RESPONSE_CACHE_TTL_SEC = int(os.getenv("LLM_RESPONSE_CACHE_TTL_SEC", "3600"))
+LLM_RESPONSE_CACHE_PER_TECH = int(os.getenv("LLM_RESPONSE_CACHE_PER_TECH", "200"))
+LLM_RESPONSE_CACHE_TECHS = int(os.getenv("LLM_RESPONSE_CACHE_TECHS", "1000"))
+LLM_SIMILARITY_THRESHOLD = float(os.getenv("LLM_SIMILARITY_THRESHOLD", "0.8"))
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+DEFAULT_TEMPERATURE = 0.7
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_BACKOFF_SEC = 10.0
+CACHEABLE_MAX_CHARS = 160
+
+
+class LLMError(Exception):
+    """The model could not be reached (or is not configured)"""
+
+
+class LLMBusyError(LLMError):
+    """A technician already has LLM_TECH_CONCURRENCY calls running and the queue wait timed out"""
+
+
+class BudgetExceededError(LLMError):
+    """The technician's daily token budget would be exceeded"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token) for budgeting before a call"""
+    return len(text) // 4 + 1
+
+
+# ==========================
+# PROMPT TEMPLATES
+# ==========================
+
+TONES = {
+    "friendly": "Be warm and friendly.",
+    "professional": "Be polite and professional.",
+    "cozy": "Be relaxed and cozy, like chatting with a regular client.",
+}
+
+SYSTEM_PROMPT = (
+    "You are the booking assistant for {business_name}, a beauty business, replying to client messages. "
+    "{tone} Keep replies short. Never invent prices, opening hours or policies you have not been given."
+)
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """A technician's ChatSetting rendered into what a model call sends"""
+    technician_id: int
+    model: str
+    temperature: float
+    system: str
+    fingerprint: str  # changes whenever the rendered prompt or model settings change
+
+    def messages(self, message: str, history: Optional[List[dict]] = None) -> List[dict]:
+        return [{"role": "system", "content": self.system}, *(history or []), {"role": "user", "content": message}]
+
+
+def render_template(
+    technician_id: int,
+    business_name: Optional[str],
+    tone: Optional[str] = None,
+    custom_prompt: Optional[str] = None,
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+) -> PromptTemplate:
+    system = SYSTEM_PROMPT.format(
+        business_name=business_name or "the studio",
+        tone=TONES.get(tone or "friendly", TONES["friendly"]),
+    )
+    if custom_prompt and custom_prompt.strip():
+        system += "\n\n" + custom_prompt.strip()
+    model = model or DEFAULT_MODEL
+    temperature = DEFAULT_TEMPERATURE if temperature is None else temperature
+    fingerprint = hashlib.sha1(f"{model}\0{temperature}\0{system}".encode("utf-8")).hexdigest()[:16]
+    return PromptTemplate(technician_id, model, temperature, system, fingerprint)
+
+
+def load_template(db: Session, technician_id: int) -> Optional[PromptTemplate]:
+    row = db.query(
+        models.Technician.business_name,
+        models.ChatSetting.tone,
+        models.ChatSetting.custom_prompt,
+        models.ChatSetting.model_name,
+        models.ChatSetting.temperature,
+    ).outerjoin(
+        models.ChatSetting, models.ChatSetting.technician_id == models.Technician.id
+    ).filter(models.Technician.id == technician_id).first()
+    if row is None:
+        return None
+    return render_template(technician_id, row.business_name, row.tone, row.custom_prompt, row.model_name, row.temperature)
+
+
+class PromptCache:
+    """Per-technician TTL cache of rendered PromptTemplates"""
+
+    def __init__(self, maxsize: int = LLM_PROMPT_CACHE_MAX, ttl: int = LLM_PROMPT_CACHE_TTL_SEC):
+        self._items: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def _cached(self, technician_id: int) -> Optional[PromptTemplate]:
+        with self._lock:
+            cached = self._items.get(technician_id)
+            self.counters["hits" if cached is not None else "misses"] += 1
+        return cached
+
+    def _store(self, template: Optional[PromptTemplate]) -> Optional[PromptTemplate]:
+        if template is not None:
+            with self._lock:
+                self._items[template.technician_id] = template
+        return template
+
+    def get(self, db: Session, technician_id: int) -> Optional[PromptTemplate]:
+        return self._cached(technician_id) or self._store(load_template(db, technician_id))
+
+    async def aget(self, db, technician_id: int) -> Optional[PromptTemplate]:
+        """get() for an AsyncSession"""
+        cached = self._cached(technician_id)
+        if cached is not None:
+            return cached
+        return self._store(await db.run_sync(load_template, technician_id))
+
+    def invalidate(self, technician_id: int) -> None:
+        with self._lock:
+            self._items.pop(technician_id, None)
+            self.counters["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "size": len(self._items)}
+
+
+# ==========================
+# RESPONSE CACHE
+# ==========================
+# Only short questions with no personal details are cached, and only when
+# the call carries no conversation history. Near duplicates are found by
+# comparing canonical word sets, so "price?", "what's the price" and
+# "how much?" share one entry while "how much is a lash lift" does not
+# match "how much is a brow tint".
+
+STOP_WORDS = frozenset("""
+a an and are be can could do does for get have hello hey hi how i im is it its me my of on or please s so
+that the there this to u what whats which would you your youre
+""".split())
+
+SYNONYMS = {
+    "cost": "price", "costs": "price", "much": "price", "prices": "price", "pricing": "price", "charge": "price", "rates": "price",
+    "located": "where", "location": "where", "address": "where", "based": "where", "find": "where",
+    "open": "hours", "opening": "hours", "close": "hours", "closing": "hours", "times": "hours",
+    "deposits": "deposit", "upfront": "deposit",
+}
+
+
+def question_key(text: str) -> Optional[FrozenSet[str]]:
+    """Canonical word set of a cacheable question, or None if the reply could be personal"""
+    if not text or len(text) > CACHEABLE_MAX_CHARS:
+        return None
+    found = extraction.extract(text)
+    if found.entities or found.intent in ("confirm", "deny", "restart", "cancel", "reschedule"):
+        return None
+    words = frozenset(SYNONYMS.get(w, w) for w in extraction.normalize(text).split() if w not in STOP_WORDS)
+    return words or None
+
+
+@dataclass
+class _Cached:
+    reply: str
+    expires_at: float
+
+
+class ResponseCache:
+    """Replies by (template fingerprint, question), with near-duplicate lookup"""
+
+    def __init__(
+        self,
+        per_template: int = LLM_RESPONSE_CACHE_PER_TECH,
+        max_templates: int = LLM_RESPONSE_CACHE_TECHS,
+        ttl: int = LLM_RESPONSE_CACHE_TTL_SEC,
+        threshold: float = LLM_SIMILARITY_THRESHOLD,
+        enabled: bool = True,
+    ):
+        self.per_template = per_template
+        self.max_templates = max_templates
+        self.ttl = ttl
+        self.threshold = threshold
+        self.enabled = enabled
+        self._items: "OrderedDict[str, OrderedDict[FrozenSet[str], _Cached]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "stored": 0}
+
+    def get(self, fingerprint: str, key: FrozenSet[str]) -> Tuple[Optional[str], Optional[str]]:
+        """(reply, "exact" | "similar") or (None, None)"""
+        if not self.enabled:
+            return None, None
+        now = time.monotonic()
+        with self._lock:
+            entries = self._items.get(fingerprint)
+            if entries is not None:
+                self._items.move_to_end(fingerprint)
+                hit = entries.get(key)
+                if hit is not None and hit.expires_at > now:
+                    entries.move_to_end(key)
+                    self.counters["exact_hits"] += 1
+                    return hit.reply, "exact"
+                best, best_score = None, self.threshold
+                for other, cached in entries.items():
+                    if cached.expires_at <= now:
+                        continue
+                    score = len(key & other) / len(key | other)
+                    if score >= best_score:
+                        best, best_score = cached, score
+                if best is not None:
+                    self.counters["similar_hits"] += 1
+                    return best.reply, "similar"
+            self.counters["misses"] += 1
+        return None, None
+
+    def put(self, fingerprint: str, key: FrozenSet[str], reply: str) -> None:
+        if not self.enabled or not reply:
+            return
+        with self._lock:
+            entries = self._items.get(fingerprint)
+            if entries is None:
+                entries = self._items[fingerprint] = OrderedDict()
+                while len(self._items) > self.max_templates:
+                    self._items.popitem(last=False)
+            entries[key] = _Cached(reply, time.monotonic() + self.ttl)
+            entries.move_to_end(key)
+            while len(entries) > self.per_template:
+                entries.popitem(last=False)
+            self.counters["stored"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "templates": len(self._items), "size": sum(len(e) for e in self._items.values())}
+
+
+# ==========================
+# TOKEN BUDGETS
+# ==========================
+
+class TokenBudget:
+    """Per-technician daily token allowance (UTC days, counted in this process).
+
+    A call reserves its prompt estimate plus max_tokens up front and settles
+    to the real usage afterwards, so concurrent calls cannot overshoot.
+    """
+
+    def __init__(self, daily_limit: int = LLM_DAILY_TOKEN_BUDGET):
+        self.daily_limit = daily_limit
+        self._used: Dict[int, Tuple[date_type, int]] = {}
+        self._lock = threading.Lock()
+        self.counters = {"rejected": 0}
+
+    def _today_used(self, technician_id: int, today: date_type) -> int:
+        day, used = self._used.get(technician_id, (today, 0))
+        return used if day == today else 0
+
+    def used(self, technician_id: int) -> int:
+        with self._lock:
+            return self._today_used(technician_id, datetime.now(timezone.utc).date())
+
+    def reserve(self, technician_id: int, tokens: int) -> None:
+        today = datetime.now(timezone.utc).date()
+        with self._lock:
+            used = self._today_used(technician_id, today)
+            if self.daily_limit and used + tokens > self.daily_limit:
+                self.counters["rejected"] += 1
+                raise BudgetExceededError(f"Daily AI token budget reached ({used}/{self.daily_limit})")
+            self._used[technician_id] = (today, used + tokens)
+
+    def settle(self, technician_id: int, reserved: int, actual: int) -> None:
+        today = datetime.now(timezone.utc).date()
+        with self._lock:
+            used = self._today_used(technician_id, today)
+            self._used[technician_id] = (today, max(0, used - reserved + actual))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._used.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "technicians": len(self._used), "daily_limit": self.daily_limit}
+
+
+prompt_cache = PromptCache()
+response_cache = ResponseCache()
+token_budget = TokenBudget()
+metrics.register("llm_prompts", prompt_cache.stats)
+metrics.register("llm_responses", response_cache.stats)
+metrics.register("llm_budget", token_budget.stats)
+
+
+def _invalidate_template(mapper, connection, target) -> None:
+    technician_id = target.id if isinstance(target, models.Technician) else target.technician_id
+    if technician_id is not None:
+        prompt_cache.invalidate(technician_id)
+
+
+for _model in (models.ChatSetting, models.Technician):
+    for _event in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event, _invalidate_template)
+
+
+# ==========================
+# GATEWAY
+# ==========================
+
+@dataclass
+class Reply:
+    text: str
+    model: str
+    cached: Optional[str] = None  # exact | similar | shared (joined an identical call in flight)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class LLMGateway:
+    """Async client for an OpenAI-compatible chat API, shared by every model call.
+
+    Calls go through the response cache, the technician's concurrency slot
+    and token budget, and are retried with backoff on 429/5xx and transport
+    errors (a stream only before its first chunk).
+    """
+
+    def __init__(
+        self,
+        base_url: str = LLM_API_BASE_URL,
+        api_key: str = LLM_API_KEY,
+        timeout: float = LLM_TIMEOUT_SEC,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = 0.5,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        max_tokens: int = LLM_MAX_OUTPUT_TOKENS,
+        concurrency: int = LLM_TECH_CONCURRENCY,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT_SEC,
+        responses: Optional[ResponseCache] = None,
+        budget: Optional[TokenBudget] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_tokens = max_tokens
+        self.concurrency = concurrency
+        self.queue_timeout = queue_timeout
+        self.responses = responses if responses is not None else response_cache
+        self.budget = budget if budget is not None else token_budget
+        self._slots: Dict[int, asyncio.Semaphore] = {}
+        self._inflight: Dict[Tuple[str, FrozenSet[str]], asyncio.Future] = {}
+        self.counters = {"calls": 0, "retries": 0, "errors": 0, "busy": 0, "shared": 0}
+        self._http = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key) or self.base_url != DEFAULT_API_BASE_URL
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    # ---------------- public ----------------
+    async def complete(self, template: PromptTemplate, message: str, history: Optional[List[dict]] = None) -> Reply:
+        """One reply, from the cache when the question has been answered before"""
+        key = None if history or not self.responses.enabled else question_key(message)
+        if key is not None:
+            text, how = self.responses.get(template.fingerprint, key)
+            if text is not None:
+                return Reply(text, template.model, cached=how)
+            shared = self._inflight.get((template.fingerprint, key))
+            if shared is not None:
+                self.counters["shared"] += 1
+                reply = await asyncio.shield(shared)
+                return Reply(reply.text, reply.model, cached="shared")
+
+        future = self._claim(template, key)
+        try:
+            reply = await self._call(template, template.messages(message, history))
+        except BaseException as e:
+            self._release(template, key, future, error=e)
+            raise
+        if key is not None:
+            self.responses.put(template.fingerprint, key, reply.text)
+        self._release(template, key, future, reply=reply)
+        return reply
+
+    async def stream(self, template: PromptTemplate, message: str, history: Optional[List[dict]] = None) -> AsyncIterator[str]:
+        """Reply text as it is generated (a cached reply arrives as one chunk)"""
+        key = None if history or not self.responses.enabled else question_key(message)
+        if key is not None:
+            text, _ = self.responses.get(template.fingerprint, key)
+            if text is None and (template.fingerprint, key) in self._inflight:
+                self.counters["shared"] += 1
+                text = (await asyncio.shield(self._inflight[(template.fingerprint, key)])).text
+            if text is not None:
+                yield text
+                return
+
+        future = self._claim(template, key)
+        parts: List[str] = []
+        try:
+            async for chunk in self._stream(template, template.messages(message, history)):
+                parts.append(chunk)
+                yield chunk
+        except BaseException as e:
+            self._release(template, key, future, error=e)
+            raise
+        reply = Reply("".join(parts), template.model)
+        if key is not None:
+            self.responses.put(template.fingerprint, key, reply.text)
+        self._release(template, key, future, reply=reply)
+
+    def stats(self) -> dict:
+        return {**self.counters, "in_flight": len(self._inflight)}
+
+    # ---------------- coalescing ----------------
+    def _claim(self, template: PromptTemplate, key: Optional[FrozenSet[str]]) -> Optional[asyncio.Future]:
+        if key is None:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[(template.fingerprint, key)] = future
+        return future
+
+    def _release(self, template, key, future, reply: Optional[Reply] = None, error: Optional[BaseException] = None) -> None:
+        if future is None:
+            return
+        if self._inflight.get((template.fingerprint, key)) is future:
+            del self._inflight[(template.fingerprint, key)]
+        if future.done():
+            return
+        if reply is not None:
+            future.set_result(reply)
+        else:
+            future.set_exception(error if isinstance(error, Exception) else LLMError("Model call cancelled"))
+            future.exception()  # nobody may be waiting; don't warn about it
+
+    # ---------------- limits ----------------
+    def _slot(self, technician_id: int) -> asyncio.Semaphore:
+        slot = self._slots.get(technician_id)
+        if slot is None:
+            slot = self._slots[technician_id] = asyncio.Semaphore(self.concurrency)
+        return slot
+
+    async def _acquire(self, technician_id: int) -> asyncio.Semaphore:
+        slot = self._slot(technician_id)
+        try:
+            await asyncio.wait_for(slot.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.counters["busy"] += 1
+            raise LLMBusyError("Too many AI replies in progress, try again shortly")
+        return slot
+
+    def _payload(self, template: PromptTemplate, messages: List[dict], stream: bool) -> dict:
+        payload = {
+            "model": template.model,
+            "messages": messages,
+            "temperature": template.temperature,
+            "max_tokens": self.max_tokens,
+        }
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def _reserve(self, template: PromptTemplate, messages: List[dict]) -> int:
+        if not self.configured:
+            raise LLMError("No model API configured (set LLM_API_KEY or LLM_API_BASE_URL)")
+        reserved = sum(estimate_tokens(m["content"]) for m in messages) + self.max_tokens
+        self.budget.reserve(template.technician_id, reserved)
+        return reserved
+
+    # ---------------- HTTP ----------------
+    def _headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(float(retry_after), MAX_BACKOFF_SEC)
+                except ValueError:
+                    pass
+        delay = self.backoff_base * (2 ** attempt)
+        return min(delay + random.uniform(0, delay / 2), MAX_BACKOFF_SEC)
+
+    async def _call(self, template: PromptTemplate, messages: List[dict]) -> Reply:
+        reserved = self._reserve(template, messages)
+        used = 0
+        slot = None
+        try:
+            slot = await self._acquire(template.technician_id)
+            payload = self._payload(template, messages, stream=False)
+            for attempt in range(self.max_retries + 1):
+                response, error = None, None
+                self.counters["calls"] += 1
+                try:
+                    response = await self._http.post(f"{self.base_url}/chat/completions", json=payload, headers=self._headers())
+                except httpx.TransportError as e:
+                    error = f"{type(e).__name__}: {e}"
+                else:
+                    if response.status_code < 400:
+                        data = _json(response)
+                        usage = data.get("usage") or {}
+                        text = _content(data, "message")
+                        reply = Reply(
+                            text=text,
+                            model=data.get("model") or template.model,
+                            prompt_tokens=usage.get("prompt_tokens") or (reserved - self.max_tokens),
+                            completion_tokens=usage.get("completion_tokens") or estimate_tokens(text),
+                        )
+                        used = reply.prompt_tokens + reply.completion_tokens
+                        return reply
+                    error = _error_message(response)
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        break
+                if attempt < self.max_retries:
+                    self.counters["retries"] += 1
+                    await asyncio.sleep(self._backoff(attempt, response))
+            self.counters["errors"] += 1
+            raise LLMError(f"Model call failed: {error}")
+        finally:
+            if slot is not None:
+                slot.release()
+            self.budget.settle(template.technician_id, reserved, used)
+
+    async def _stream(self, template: PromptTemplate, messages: List[dict]) -> AsyncIterator[str]:
+        reserved = self._reserve(template, messages)
+        text: List[str] = []
+        used = None
+        slot = None
+        try:
+            slot = await self._acquire(template.technician_id)
+            payload = self._payload(template, messages, stream=True)
+            for attempt in range(self.max_retries + 1):
+                response, error = None, None
+                self.counters["calls"] += 1
+                try:
+                    async with self._http.stream(
+                        "POST", f"{self.base_url}/chat/completions", json=payload, headers=self._headers()
+                    ) as response:
+                        if response.status_code < 400:
+                            prompt_tokens, completion_tokens = reserved - self.max_tokens, 0
+                            async for line in response.aiter_lines():
+                                if not line.startswith("data:"):
+                                    continue
+                                data = line[5:].strip()
+                                if data == "[DONE]":
+                                    break
+                                chunk = _loads(data)
+                                usage = chunk.get("usage") or {}
+                                prompt_tokens = usage.get("prompt_tokens") or prompt_tokens
+                                completion_tokens = usage.get("completion_tokens") or completion_tokens
+                                piece = _content(chunk, "delta")
+                                if piece:
+                                    text.append(piece)
+                                    yield piece
+                            used = prompt_tokens + (completion_tokens or estimate_tokens("".join(text)))
+                            return
+                        await response.aread()
+                        error = _error_message(response)
+                except httpx.TransportError as e:
+                    if text:
+                        # Part of the reply has already gone out; it can't be retried
+                        self.counters["errors"] += 1
+                        raise LLMError(f"Model stream interrupted: {type(e).__name__}: {e}")
+                    error = f"{type(e).__name__}: {e}"
+                if response is not None and response.status_code >= 400 and response.status_code not in RETRY_STATUS_CODES:
+                    break
+                if attempt < self.max_retries:
+                    self.counters["retries"] += 1
+                    await asyncio.sleep(self._backoff(attempt, response))
+            self.counters["errors"] += 1
+            raise LLMError(f"Model call failed: {error}")
+        finally:
+            if slot is not None:
+                slot.release()
+            # A stream abandoned part-way keeps its whole reservation
+            self.budget.settle(template.technician_id, reserved, used if used is not None else (reserved if text else 0))
+
+
+def _loads(data: str) -> dict:
+    try:
+        parsed = json.loads(data)
+    except ValueError:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def _json(response: httpx.Response) -> dict:
+    try:
+        data = response.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _content(data: dict, key: str) -> str:
+    choices = data.get("choices") or []
+    if not choices or not isinstance(choices[0], dict):
+        return ""
+    return (choices[0].get(key) or {}).get("content") or ""
+
+
+def _error_message(response: httpx.Response) -> str:
+    error = _json(response).get("error")
+    if isinstance(error, dict) and error.get("message"):
+        return error["message"]
+    return f"HTTP {response.status_code}"
+
+
+# One gateway per event loop: httpx connections and semaphores are bound to the loop that made them.
+_gateways: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LLMGateway]" = weakref.WeakKeyDictionary()
+
+
+def get_gateway() -> LLMGateway:
+    loop = asyncio.get_running_loop()
+    gateway = _gateways.get(loop)
+    if gateway is None:
+        gateway = _gateways[loop] = LLMGateway()
+    return gateway
+
+
+async def close_gateway() -> None:
+    gateway = _gateways.pop(asyncio.get_running_loop(), None)
+    if gateway is not None:
+        await gateway.aclose()
@@ -2,37 +2,113 @@
 # AIVA BEAUTY SAAS BACKEND
 # =======================
 
-from typing import List
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import json
 import os
 import pathlib
+import time
 from fastapi import FastAPI, Depends, HTTPException, Request, Header, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import PlainTextResponse, FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from services.backend import models, schemas
-from services.backend.database import engine, get_db
-from services.password_service import hash_password, verify_password
-from services.backend.auth import create_access_token, get_technician_from_token
+from services.backend import availability, booking as booking_service, chat_engine, chat_sessions, events, idempotency, knowledge, llm_gateway, metrics, models, outbox, pagination, revenue, schemas, social_utils, token_refresh, webhook_inbox
+from services.backend.column_types import to_utc_datetime
+from services.backend.database import dispose_async_engine, get_async_db, get_db
+from services import messaging_service, password_service, qr_service
+from services.backend.auth import create_access_token, get_technician_from_token, get_technician_from_token_async
 from services.backend.webhook import router as webhook_router
 
 # =======================
-# CREATE DATABASE
+# STARTUP
 # =======================
+# The schema is managed by Alembic (`alembic upgrade head` runs before the
+# server in the start command), so importing this module never touches the
+# database. APP_LAZY_STARTUP=true also defers the background workers to the
+# first request, so a cold worker is listening as soon as the app imports.
+
+APP_LAZY_STARTUP = os.getenv("APP_LAZY_STARTUP", "false").lower() == "true"
+
+_background_started = False
+
+
+async def start_background_workers():
+    global _background_started
+    if _background_started:
+        return
+    _background_started = True
+    await outbox.start_worker()
+    await webhook_inbox.start_pipeline()
+    await token_refresh.start_refresher()
+    await chat_sessions.start_flusher()
+    await knowledge.start_refresher()
+
+
+async def stop_background_workers():
+    global _background_started
+    if _background_started:
+        await knowledge.stop_refresher()
+        await token_refresh.stop_refresher()
+        await webhook_inbox.stop_pipeline()
+        await outbox.stop_worker()
+        _background_started = False
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not APP_LAZY_STARTUP:
+        await start_background_workers()
+    yield
+    await stop_background_workers()
+    # Outside stop_background_workers: dirty chat sessions are written even if lazy workers never started
+    await chat_sessions.stop_flusher()
+    await messaging_service.close_client()
+    await llm_gateway.close_gateway()
+    await social_utils.close_oauth_client()
+    await dispose_async_engine()
 
-models.Base.metadata.create_all(bind=engine)
-
-# =======================
-# CREATE APP ✅ FIRST
-# =======================
 
 app = FastAPI(
     title="AIVA SaaS Agent Backend 🪄✨",
-    version="1.1.0"
+    version="1.1.0",
+    lifespan=lifespan,
 )
 app.include_router(webhook_router)
 
+if APP_LAZY_STARTUP:
+    @app.middleware("http")
+    async def start_workers_on_first_request(request: Request, call_next):
+        if not _background_started:
+            await start_background_workers()
+        return await call_next(request)
+
+metrics.register("password_hashing", password_service.stats)
+metrics.register("qr_codes", qr_service.stats)
+
+
+@app.exception_handler(booking_service.SlotUnavailableError)
+async def slot_unavailable_handler(request: Request, exc: booking_service.SlotUnavailableError):
+    return JSONResponse(status_code=409, content=exc.to_dict())
+
+
+@app.exception_handler(llm_gateway.LLMError)
+async def llm_error_handler(request: Request, exc: llm_gateway.LLMError):
+    # Budget and concurrency limits are the technician's to wait out; anything else is the model being unavailable
+    status = 429 if isinstance(exc, (llm_gateway.BudgetExceededError, llm_gateway.LLMBusyError)) else 503
+    return JSONResponse(status_code=status, content={"detail": str(exc)})
+
+
+@app.exception_handler(chat_engine.StaleSessionError)
+async def stale_chat_session_handler(request: Request, exc: chat_engine.StaleSessionError):
+    # Another worker answered this conversation first; the client resends and gets the fresh row
+    return JSONResponse(status_code=409, content={"detail": "Conversation was updated elsewhere, please resend"})
+
 ROOT_DIR = pathlib.Path(__file__).resolve().parents[2]
 
 # Support both layouts:
@@ -74,12 +150,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# =======================
-# META WEBHOOK CONFIG ✅
-# =======================
-
-VERIFY_TOKEN = os.getenv("VERIFY_TOKEN")
-
 # =======================
 # AUTH HELPER ✅
 # =======================
@@ -100,6 +170,23 @@ def get_current_technician(
     return tech
 
 
+async def get_current_technician_async(
+    authorization: str = Header(..., alias="Authorization"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """get_current_technician for async (AsyncSession) endpoints"""
+    if not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid auth header")
+
+    token = authorization.replace("Bearer ", "").strip()
+    tech = await get_technician_from_token_async(token, db)
+
+    if not tech:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    return tech
+
+
 # =======================
 # SIGNUP
 # =======================
@@ -120,7 +207,7 @@ async def signup_technician(request: Request, db: Session = Depends(get_db)):
     new_tech = models.Technician(
         full_name=data.get("full_name") or data.get("business_name", ""),
         email=email,
-        password_hash=hash_password(password),
+        password=await password_service.hash_password_async(password),
         phone=data.get("phone", ""),
         business_name=data.get("business_name", ""),
         country=data.get("country"),
@@ -148,9 +235,18 @@ async def login(data: schemas.LoginRequest, db: Session = Depends(get_db)):
         models.Technician.email == data.email
     ).first()
 
-    if not tech or not verify_password(data.password, tech.password_hash):
+    if not tech:
+        raise HTTPException(401, "Invalid email or password")
+
+    valid, new_hash = await password_service.verify_and_update_async(data.password, tech.password)
+    if not valid:
         raise HTTPException(401, "Invalid email or password")
 
+    if new_hash:
+        # Argon2 parameters changed since this hash was made; upgrade it transparently
+        tech.password = new_hash
+        db.commit()
+
     token = create_access_token(subject=tech.email)
 
     return {
@@ -207,82 +303,503 @@ def create_service(
 
 
 @app.get("/services/me", response_model=List[schemas.ServiceResponse])
-def get_services(
-    db: Session = Depends(get_db),
-    technician=Depends(get_current_technician),
+async def get_services(
+    db: AsyncSession = Depends(get_async_db),
+    technician=Depends(get_current_technician_async),
 ):
-    return db.query(models.Service).filter(
+    result = await db.execute(select(models.Service).where(
         models.Service.technician_id == technician.id
-    ).all()
+    ))
+    return result.scalars().all()
 
 
 # =======================
 # 📅 BOOKINGS
 # =======================
 
-try:
-    from services.backend.models import Booking
-except ImportError:
-    Booking = models.Appointment
+@app.get("/availability/slots", response_model=schemas.AvailableSlotsResponse)
+def get_availability_slots(
+    technician_id: int,
+    date: str,
+    timezone: Optional[str] = None,
+    service_id: Optional[int] = None,
+    staff_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    """Currently bookable slots for one technician-day (shared by AI and calendar)"""
+    try:
+        target = availability.parse_date(date)
+        return availability.get_available_slots(
+            db,
+            technician_id,
+            target,
+            service_id=service_id,
+            staff_id=staff_id,
+            timezone_name=timezone,
+        )
+    except LookupError as e:
+        raise HTTPException(404, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
 
 @app.post("/check-availability")
 def check_availability(
     appointment_date: str,
     appointment_time: str,
+    service_id: Optional[int] = None,
+    staff_id: Optional[int] = None,
     db: Session = Depends(get_db),
     technician=Depends(get_current_technician),
 ):
-    taken = db.query(Booking).filter(
-        Booking.technician_id == technician.id,
-        Booking.appointment_date == appointment_date,
-        Booking.appointment_time == appointment_time,
-        Booking.status == "CONFIRMED",
-    ).first()
+    try:
+        available = availability.is_slot_available(
+            db,
+            technician.id,
+            availability.parse_date(appointment_date),
+            appointment_time,
+            service_id=service_id,
+            staff_id=staff_id,
+        )
+    except LookupError as e:
+        raise HTTPException(404, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    return {"available": available}
+
+
+@app.post(
+    "/bookings/create",
+    response_model=schemas.ClientBookingResponse,
+    responses={409: {"model": schemas.SlotUnavailableResponse}},
+)
+def create_booking_shared(
+    data: schemas.BookingCreateRequest,
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    """Contract booking endpoint used by both the AI flow and the website calendar"""
+    return idempotency.run_idempotent(
+        idempotency_key,
+        f"bookings/create:{data.technician_id}",
+        data,
+        lambda: _create_booking_shared(data, db),
+    )
 
-    return {"available": taken is None}
 
+def _create_booking_shared(data: schemas.BookingCreateRequest, db: Session):
+    try:
+        if data.timezone:
+            availability.get_timezone(data.timezone)
+        booking = booking_service.create_booking(
+            db,
+            technician_id=data.technician_id,
+            service_id=data.service_id,
+            staff_id=data.staff_id,
+            client_name=data.client_name,
+            client_phone=data.client_phone,
+            client_email=data.client_email,
+            date=data.date,
+            time=data.time,
+            source=data.source,
+        )
+    except LookupError as e:
+        raise HTTPException(404, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
-@app.post("/book", response_model=schemas.BookingResponse)
+    return {
+        "success": True,
+        "booking_id": booking.id,
+        "message": "Booking created",
+        "service_price": booking.service_price or 0.0,
+    }
+
+
+@app.post(
+    "/book",
+    response_model=schemas.BookingResponse,
+    responses={409: {"model": schemas.SlotUnavailableResponse}},
+)
 def create_booking(
     data: schemas.BookingRequest,
     db: Session = Depends(get_db),
     technician=Depends(get_current_technician),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    return idempotency.run_idempotent(
+        idempotency_key,
+        f"book:{technician.id}",
+        data,
+        lambda: _create_booking(data, db, technician),
+    )
+
+
+def _create_booking(data: schemas.BookingRequest, db: Session, technician):
+    try:
+        booking = booking_service.create_booking(
+            db,
+            technician_id=technician.id,
+            service_id=data.service_id,
+            client_name=data.client_name,
+            client_email=data.client_email,
+            date=data.appointment_date,
+            time=data.appointment_time,
+        )
+    except LookupError as e:
+        raise HTTPException(404, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    service = db.query(models.Service).filter(models.Service.id == booking.service_id).first()
+
+    return {
+        "id": booking.id,
+        "client_name": booking.client_name,
+        "client_phone": booking.client_phone,
+        "service_name": service.name if service else None,
+        "appointment_date": booking.date,
+        "appointment_time": booking.time,
+        "payment_status": booking.payment_status,
+    }
+
+
+@app.post("/confirm-payment")
+def confirm_payment(
+    data: schemas.ConfirmPaymentRequest,
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
-    occupied = db.query(Booking).filter(
-        Booking.technician_id == technician.id,
-        Booking.appointment_date == data.appointment_date,
-        Booking.appointment_time == data.appointment_time,
-        Booking.status == "CONFIRMED",
+    return idempotency.run_idempotent(
+        idempotency_key,
+        f"confirm-payment:{data.booking_id}",
+        data,
+        lambda: _confirm_payment(data, db),
+    )
+
+
+def _confirm_payment(data: schemas.ConfirmPaymentRequest, db: Session):
+    booking = db.query(models.Appointment).filter(
+        models.Appointment.id == data.booking_id
     ).first()
 
-    if occupied:
-        raise HTTPException(409, "Time slot already booked")
+    if not booking:
+        raise HTTPException(404, "Booking not found")
 
-    booking = Booking(
-        technician_id=technician.id,
-        service_id=data.service_id,
-        client_name=data.client_name,
-        client_email=data.client_email,
-        appointment_date=data.appointment_date,
-        appointment_time=data.appointment_time,
-        status="PENDING_PAYMENT",
+    booking.payment_status = "confirmed"
+    booking.payment_method = data.payment_method
+    booking.status = "confirmed"
+    db.commit()
+
+    return {
+        "success": True,
+        "booking_id": booking.id,
+        "payment_status": booking.payment_status,
+        "message": "Payment confirmed",
+    }
+
+
+@app.get("/bookings/{technician_id}", response_model=schemas.BookingsListResponse)
+async def list_bookings(technician_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Technician's bookings, latest appointment first (cancelled ones excluded)"""
+    A = models.Appointment
+    result = await db.execute(
+        select(A, models.Service.name, models.Staff.full_name)
+        .outerjoin(models.Service, models.Service.id == A.service_id)
+        .outerjoin(models.Staff, models.Staff.id == A.staff_id)
+        .where(A.technician_id == technician_id, func.lower(func.coalesce(A.status, "")).notin_(revenue.EXCLUDED_STATUSES))
+        .order_by(A.date.desc(), A.time.desc(), A.id.desc())
+    )
+    return {"bookings": [
+        {
+            "id": booking.id,
+            "client_name": booking.client_name,
+            "client_phone": booking.client_phone,
+            "service_name": service_name,
+            "staff_name": staff_name,
+            "appointment_date": booking.date,
+            "appointment_time": booking.time,
+            "booking_source": booking.booking_source,
+            "payment_status": booking.payment_status or "unpaid",
+        }
+        for booking, service_name, staff_name in result.all()
+    ]}
+
+
+# =======================
+# 💷 REVENUE DASHBOARD (PREMIUM)
+# =======================
+
+@app.get("/dashboard/revenue/{technician_id}")
+def get_revenue_dashboard(technician_id: int, days: int = Query(30, ge=1, le=366), db: Session = Depends(get_db)):
+    """Revenue totals, daily trend and top services from the revenue_daily rollup"""
+    if not revenue.has_premium(db, technician_id):
+        raise HTTPException(403, "Revenue dashboard is available on the Premium plan")
+    return revenue.summary(db, technician_id, days)
+
+
+# =======================
+# 🔔 NOTIFICATIONS & SOCIAL FEEDS
+# =======================
+# List endpoints page by (created_at, id): `before` loads older rows,
+# `since` (the previous response's sync_cursor) returns rows inserted since.
+
+NOTIFICATION_FIELDS = ("id", "event_type", "title", "message", "related_id", "is_read", "created_at")
+MESSAGE_FIELDS = ("id", "platform", "direction", "sender_id", "recipient_id", "message_content", "session_id", "status", "created_at")
+SESSION_FIELDS = ("session_id", "platform", "account_id", "step", "client_name", "handoff_paused", "handoff_note", "created_at", "updated_at")
+
+
+async def _keyset_page_async(db, statement, model, limit, before, since, oldest_first=False):
+    try:
+        return await pagination.keyset_page_async(db, statement, model, limit, before, since, oldest_first)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+def _page_meta(page: dict) -> dict:
+    return {key: page[key] for key in ("has_more", "next_cursor", "sync_cursor")}
+
+
+@app.get("/notifications/{technician_id}")
+async def list_notifications(
+    technician_id: int,
+    limit: int = pagination.DEFAULT_LIMIT,
+    before: Optional[str] = None,
+    since: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Dashboard notifications, newest first"""
+    statement = select(models.DashboardNotification).where(
+        models.DashboardNotification.technician_id == technician_id
     )
+    page = await _keyset_page_async(db, statement, models.DashboardNotification, limit, before, since)
 
-    db.add(booking)
+    unread_count = (await db.execute(select(func.count(models.DashboardNotification.id)).where(
+        models.DashboardNotification.technician_id == technician_id,
+        models.DashboardNotification.is_read == False,  # noqa: E712
+    ))).scalar()
+
+    return {
+        "notifications": pagination.serialize(page["items"], NOTIFICATION_FIELDS),
+        "unread_count": unread_count,
+        **_page_meta(page),
+    }
+
+
+@app.get("/social/messages/{technician_id}")
+async def list_social_messages(
+    technician_id: int,
+    limit: int = pagination.DEFAULT_LIMIT,
+    before: Optional[str] = None,
+    since: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Recent inbound/outbound social messages, newest first"""
+    statement = select(models.MessageLog).where(models.MessageLog.technician_id == technician_id)
+    page = await _keyset_page_async(db, statement, models.MessageLog, limit, before, since)
+    return {"messages": pagination.serialize(page["items"], MESSAGE_FIELDS), **_page_meta(page)}
+
+
+@app.get("/social/session/{technician_id}/{session_id}/messages")
+async def get_session_timeline(
+    technician_id: int,
+    session_id: str,
+    limit: int = pagination.DEFAULT_LIMIT,
+    before: Optional[str] = None,
+    since: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """One conversation's messages in chronological order"""
+    session = (await db.execute(select(models.ChatSession).where(
+        models.ChatSession.session_id == session_id,
+        models.ChatSession.technician_id == technician_id,
+    ))).scalars().first()
+    if not session:
+        raise HTTPException(404, "Session not found")
+
+    statement = select(models.MessageLog).where(
+        models.MessageLog.session_id == session_id,
+        models.MessageLog.technician_id == technician_id,
+    )
+    page = await _keyset_page_async(db, statement, models.MessageLog, limit, before, since, oldest_first=True)
+    return {
+        "session": pagination.serialize([session], SESSION_FIELDS)[0],
+        "messages": pagination.serialize(page["items"], MESSAGE_FIELDS),
+        **_page_meta(page),
+    }
+
+
+# =======================
+# 🔗 SOCIAL CONNECT (OAUTH)
+# =======================
+
+OAUTH_PLATFORMS = {
+    "instagram": (social_utils.get_instagram_auth_url, social_utils.exchange_instagram_code),
+    "facebook": (social_utils.get_facebook_auth_url, social_utils.exchange_facebook_code),
+}
+
+
+def _oauth_platform(platform: str):
+    if platform not in OAUTH_PLATFORMS:
+        raise HTTPException(400, f"Unsupported platform: {platform}")
+    return OAUTH_PLATFORMS[platform]
+
+
+@app.post("/social/connect/{platform}", response_model=schemas.OAuthInitiateResponse)
+def start_social_connect(
+    platform: str,
+    data: schemas.OAuthInitiateRequest,
+    technician=Depends(get_current_technician),
+):
+    """Issue a one-time state and return the provider's authorize URL"""
+    build_auth_url, _ = _oauth_platform(platform)
+    if data.technician_id != technician.id:
+        raise HTTPException(403, "Not allowed")
+
+    state = social_utils.generate_oauth_state(technician.id, platform)
+    try:
+        auth_url = build_auth_url(data.redirect_uri, state)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    return {"auth_url": auth_url, "platform": platform, "state": state}
+
+
+def _save_social_account(db: Session, technician_id: int, platform: str, result: dict) -> models.SocialAccount:
+    now = datetime.now(timezone.utc)
+    account = db.query(models.SocialAccount).filter(
+        models.SocialAccount.technician_id == technician_id,
+        models.SocialAccount.platform == platform,
+    ).first()
+    if not account:
+        account = models.SocialAccount(technician_id=technician_id, platform=platform)
+        db.add(account)
+
+    account.account_name = result.get("account_name") or platform
+    account.account_id = result.get("account_id")
+    account.access_token = result.get("access_token")
+    account.token_expires_at = (now + timedelta(seconds=int(result.get("expires_in") or 0))).isoformat()
+    account.connected_at = now.isoformat()
+    account.is_active = True
     db.commit()
-    db.refresh(booking)
+    return account
+
+
+@app.post("/social/token", response_model=schemas.OAuthCallbackResponse)
+async def finish_social_connect(
+    data: schemas.OAuthCallbackRequest,
+    technician=Depends(get_current_technician),
+    db: Session = Depends(get_db),
+):
+    """Exchange the OAuth code and save the connected account"""
+    _, exchange_code = _oauth_platform(data.platform)
+    if data.technician_id != technician.id:
+        raise HTTPException(403, "Not allowed")
+    if not await run_in_threadpool(social_utils.verify_oauth_state, data.state, technician.id, data.platform):
+        raise HTTPException(400, "Invalid or expired OAuth state")
 
-    return booking
+    # Graph calls are awaited on the loop; only the DB work goes to a thread
+    result = await exchange_code(data.code, data.redirect_uri)
+    if not result:
+        raise HTTPException(400, "Could not connect account")
+
+    account = await run_in_threadpool(_save_social_account, db, technician.id, data.platform, result)
+    return {"success": True, "account_name": account.account_name, "platform": data.platform}
+
+
+# =======================
+# 📱 WHATSAPP PAIRING QR
+# =======================
+
+WHATSAPP_QR_TTL_SEC = int(os.getenv("WHATSAPP_QR_TTL_SEC", "300"))
+
+
+def _create_whatsapp_session(db: Session, technician_id: int):
+    qr_data, session_id = social_utils.generate_whatsapp_qr(technician_id)
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=WHATSAPP_QR_TTL_SEC)
+    db.add(models.WhatsAppSession(
+        technician_id=technician_id,
+        session_id=session_id,
+        qr_code_data=qr_data,
+        status="pending",
+        created_at=now.isoformat(),
+        expires_at=expires_at.isoformat(),
+    ))
+    db.commit()
+    return session_id, qr_data, expires_at
+
+
+def _load_whatsapp_session(db: Session, session_id: str):
+    return db.query(
+        models.WhatsAppSession.qr_code_data, models.WhatsAppSession.expires_at
+    ).filter(models.WhatsAppSession.session_id == session_id).first()
+
+
+@app.post("/whatsapp/qr", response_model=schemas.WhatsAppQRResponse)
+async def create_whatsapp_qr(
+    data: schemas.WhatsAppQRRequest,
+    request: Request,
+    technician=Depends(get_current_technician),
+    db: Session = Depends(get_db),
+):
+    """Start a pairing session and return the URL of its QR image"""
+    if data.technician_id != technician.id:
+        raise HTTPException(403, "Not allowed")
+
+    session_id, qr_data, expires_at = await run_in_threadpool(_create_whatsapp_session, db, technician.id)
+    # Render now so the <img> request that follows is a cache hit
+    await qr_service.cache.render(session_id, qr_data, expires_at.timestamp())
+
+    return {
+        "qr_code": str(request.url_for("whatsapp_qr_image", session_id=session_id)),
+        "session_id": session_id,
+        "expires_in": WHATSAPP_QR_TTL_SEC,
+    }
+
+
+@app.get("/whatsapp/qr/{session_id}.png", name="whatsapp_qr_image")
+async def whatsapp_qr_image(
+    session_id: str,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """PNG for a pairing session; the unguessable session id is the credential (it's an <img> src)"""
+    image = qr_service.cache.get(session_id)
+    if image is None:
+        row = await run_in_threadpool(_load_whatsapp_session, db, session_id)
+        expires_at = to_utc_datetime(row.expires_at).timestamp() if row and row.qr_code_data else 0
+        if expires_at <= time.time():
+            raise HTTPException(404, "QR code not found or expired")
+        image = await qr_service.cache.render(session_id, row.qr_code_data, expires_at)
+
+    headers = {
+        "Cache-Control": f"private, max-age={image.max_age()}, immutable",
+        "ETag": image.etag,
+    }
+    if if_none_match == image.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=image.png, media_type="image/png", headers=headers)
 
 
 # =======================
 # 🤖 AI CHAT ENGINE
 # =======================
 
-try:
-    from services.backend.models import ConversationState
-except ImportError:
-    ConversationState = models.ChatSession
+# Both entry points run the compiled flow in chat_engine against the
+# write-behind session cache in chat_sessions: a burst of messages reads the
+# session once and writes it when the conversation moves to a new step.
+
+
+def _run_chat_turn(db: Session, technician_id: int, state: chat_engine.ChatState, message: str, timezone_name: Optional[str] = None):
+    try:
+        return chat_engine.engine.turn(db, technician_id, state, message, timezone_name=timezone_name)
+    except LookupError as e:
+        raise HTTPException(404, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
 
 @app.post("/chat", response_model=schemas.ChatResponse)
 def chat_with_client(
@@ -290,52 +807,115 @@ def chat_with_client(
     db: Session = Depends(get_db),
     technician=Depends(get_current_technician),
 ):
-    session = db.query(ConversationState).filter(
-        ConversationState.chat_id == data.chat_id
-    ).first()
+    # chat ids are chosen by the caller, so scope them to the technician
+    session_id = f"web-{technician.id}-{data.chat_id}"
+    with chat_sessions.cache.session(db, technician.id, session_id, platform="web", create_id=session_id) as chat:
+        turn = _run_chat_turn(db, technician.id, chat.state, data.message)
+    return {
+        "reply": turn.reply,
+        "action": f"ASK_{turn.need.upper()}" if turn.need else turn.step.upper(),
+        "step": turn.step,
+        "services": turn.services,
+        "available_suggestions": turn.suggestions,
+        "booking_id": turn.booking_id,
+        "intent": turn.intent,
+        "confidence": turn.confidence,
+    }
 
-    if not session:
-        session = ConversationState(chat_id=data.chat_id, stage="GREETING")
-        db.add(session)
-        db.commit()
-        db.refresh(session)
 
-    if session.stage == "GREETING":
-        session.stage = "SERVICE_SELECTION"
-        db.commit()
-
-        return {
-            "reply": f"Hi 👋 I'm {technician.assistant_name or 'your booking assistant'} for {technician.business_name}. What service would you like to book?",
-            "action": "ASK_SERVICE",
-        }
+@app.post("/chat/receive", response_model=schemas.ChatMessageResponse)
+def receive_chat_message(data: schemas.ChatMessageRequest, db: Session = Depends(get_db)):
+    """Client-facing chat turn (website widget or a social platform conversation)"""
+    if data.requested_service_id is not None:
+        catalog = knowledge.store.get(db, data.technician_id)
+        if catalog is None:
+            raise HTTPException(404, "Technician not found")
+        if catalog.service(data.requested_service_id) is None:
+            raise HTTPException(400, "Unknown service")
+    # Pre-filled slots are stored normalized; whether they are free is the datetime step's check
+    try:
+        requested_date = availability.parse_date(data.requested_date).isoformat() if data.requested_date is not None else None
+        requested_time = availability.format_time(availability.parse_time(data.requested_time)) if data.requested_time is not None else None
+    except ValueError:
+        raise HTTPException(400, "requested_date must be YYYY-MM-DD and requested_time HH:MM")
+    with chat_sessions.cache.session(db, data.technician_id, data.session_id, data.platform, data.account_id) as chat:
+        session_id, state = chat.session_id, chat.state
+        if chat.handoff_paused:
+            # A person has taken over this conversation; record the message only
+            state.last_message = data.message
+            state.message_count += 1
+            return {"reply": "", "session_id": session_id, "step": state.step, "handoff_paused": True}
+
+        for field, value in (
+            ("client_name", data.client_name),
+            ("client_phone", data.client_phone),
+            ("client_email", data.client_email),
+            ("service_id", data.requested_service_id),
+            ("appointment_date", requested_date),
+            ("appointment_time", requested_time),
+        ):
+            if value is not None:
+                setattr(state, field, value)
+        message = "yes" if data.confirm and state.step == "confirm" else data.message
+        turn = _run_chat_turn(db, data.technician_id, state, message, data.timezone)
 
     return {
-        "reply": "Type BOOK to begin booking ❤️",
-        "action": "UNKNOWN",
+        "reply": turn.reply,
+        "session_id": session_id,
+        "booking_id": turn.booking_id,
+        "need": turn.need,
+        "step": turn.step,
+        "services": turn.services,
+        "price": turn.price,
+        "available_suggestions": turn.suggestions,
+        "intent": turn.intent,
+        "confidence": turn.confidence,
     }
 
 
-# =======================
-# 📡 META / INSTAGRAM WEBHOOK
-# =======================
-
-@app.get("/webhook")
-async def verify_webhook(
-    hub_mode: str = Query(None, alias="hub.mode"),
-    hub_challenge: str = Query(None, alias="hub.challenge"),
-    hub_verify_token: str = Query(None, alias="hub.verify_token"),
+@app.post("/chat/ai-reply", response_model=schemas.AIReplyResponse)
+async def ai_reply(
+    data: schemas.AIReplyRequest,
+    db: AsyncSession = Depends(get_async_db),
+    technician=Depends(get_current_technician_async),
 ):
-    if hub_mode == "subscribe" and hub_verify_token == VERIFY_TOKEN:
-        return PlainTextResponse(hub_challenge)
+    """Model-written reply in the technician's ChatSetting voice (SSE chunks when stream=true)"""
+    template = await llm_gateway.prompt_cache.aget(db, technician.id)
+    if template is None:
+        raise HTTPException(404, "Technician not found")
+    await db.close()  # don't hold a pooled connection while the model runs
+    gateway = llm_gateway.get_gateway()
+    history = [m.model_dump() for m in data.history] if data.history else None
+    if not data.stream:
+        reply = await gateway.complete(template, data.message, history)
+        return {
+            "reply": reply.text,
+            "model": reply.model,
+            "cached": reply.cached,
+            "prompt_tokens": reply.prompt_tokens,
+            "completion_tokens": reply.completion_tokens,
+        }
 
-    raise HTTPException(status_code=403, detail="Webhook verification failed")
+    chunks = gateway.stream(template, data.message, history)
+    # Pull the first chunk here so budget/busy/model errors still get a proper status code
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = ""
 
+    async def sse():
+        try:
+            yield f"data: {json.dumps({'text': first})}\n\n"
+            async for chunk in chunks:
+                yield f"data: {json.dumps({'text': chunk})}\n\n"
+        except llm_gateway.LLMError as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+            return
+        finally:
+            await chunks.aclose()
+        yield "data: [DONE]\n\n"
 
-@app.post("/webhook")
-async def receive_webhook(request: Request):
-    payload = await request.json()
-    print("📥 Instagram Webhook Event:", payload)
-    return {"status": "received"}
+    return StreamingResponse(sse(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 # =======================
@@ -378,6 +958,50 @@ Email: support@aivabeauty.app
 """
     }
 
+# =======================
+# 📡 LIVE DASHBOARD EVENTS (SSE)
+# =======================
+
+@app.get("/events/stream")
+async def dashboard_event_stream(
+    request: Request,
+    token: Optional[str] = None,
+    last_event_id: Optional[int] = None,
+    authorization: Optional[str] = Header(None, alias="Authorization"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: Session = Depends(get_db),
+):
+    """Push new notifications, messages and bookings for the signed-in technician"""
+    # EventSource can't set headers, so the token may come as ?token=
+    if authorization and authorization.startswith("Bearer "):
+        token = authorization.replace("Bearer ", "").strip()
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing token")
+
+    technician = get_technician_from_token(token, db)
+    if not technician:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    db.close()  # don't hold a pooled connection for the life of the stream
+
+    # Browsers resend the last id they saw on reconnect
+    if last_event_id_header and last_event_id_header.isdigit():
+        last_event_id = int(last_event_id_header)
+
+    subscriber = events.broker.subscribe(technician.id, last_event_id)
+    return StreamingResponse(
+        events.stream(subscriber, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# =======================
+# METRICS
+# =======================
+
+@app.get("/metrics")
+def get_metrics():
+    return metrics.snapshot()
+
 # =======================
 # ROOT
 # =======================
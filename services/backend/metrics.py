@@ -0,0 +1,19 @@
+# metrics.py
+# Tiny in-process metrics registry: modules register a callable returning a
+# dict of counters/gauges and GET /metrics reports them all as JSON.
+import threading
+from typing import Callable, Dict
+
+_providers: Dict[str, Callable[[], dict]] = {}
+_lock = threading.Lock()
+
+
+def register(name: str, provider: Callable[[], dict]) -> None:
+    with _lock:
+        _providers[name] = provider
+
+
+def snapshot() -> Dict[str, dict]:
+    with _lock:
+        providers = dict(_providers)
+    return {name: provider() for name, provider in providers.items()}
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean, Text, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from services.backend.database import Base
+from services.backend.column_types import ISODate, ISOTime, ISODateTime
 
 
 class Technician(Base):
@@ -11,6 +12,11 @@ class Technician(Base):
     business_name = Column(String, nullable=False)
     email = Column(String, unique=True, nullable=False)
     password = Column(String, nullable=False)
+    phone = Column(String, nullable=True)
+    country = Column(String, nullable=True)
+    payment_provider = Column(String, nullable=True)
+    deposit_required = Column(Boolean, default=False)
+    deposit_amount = Column(Float, default=0.0)
 
     services = relationship(
         "Service",
@@ -43,7 +49,7 @@ class Staff(Base):
     full_name = Column(String, nullable=False)
     role = Column(String, nullable=True)
     active = Column(Boolean, default=True)
-    created_at = Column(String, nullable=True)
+    created_at = Column(ISODateTime, nullable=True)
 
 
 class Availability(Base):
@@ -52,12 +58,16 @@ class Availability(Base):
     id = Column(Integer, primary_key=True, index=True)
     technician_id = Column(Integer, nullable=False, index=True)
     day = Column(String, nullable=False)
-    start_time = Column(String, nullable=False)
-    end_time = Column(String, nullable=False)
+    start_time = Column(ISOTime, nullable=False)
+    end_time = Column(ISOTime, nullable=False)
 
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        Index("ix_appointments_technician_date_status", "technician_id", "date", "status"),
+        Index("ix_appointments_technician_staff_date", "technician_id", "staff_id", "date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     technician_id = Column(Integer, nullable=False, index=True)
@@ -65,15 +75,26 @@ class Appointment(Base):
     client_name = Column(String, nullable=False)
     client_phone = Column(String, nullable=True)
     client_email = Column(String, nullable=True)
-    date = Column(String, nullable=False)
-    time = Column(String, nullable=False)
+    date = Column(ISODate, nullable=False)
+    time = Column(ISOTime, nullable=False)
     status = Column(String, default="pending")  # pending | payment_sent | confirmed | completed
     service_price = Column(Float, nullable=True)
     payment_status = Column(String, default="unpaid")  # unpaid | pending | confirmed | paid
     payment_method = Column(String, nullable=True)  # bank | manual | stripe
     booking_source = Column(String, default="website")  # website | ai
     staff_id = Column(Integer, ForeignKey("staff.id"), nullable=True)
-    created_at = Column(String, nullable=True)
+    created_at = Column(ISODateTime, nullable=True)
+
+
+class BookingLock(Base):
+    """One row per technician-day; bookings lock it before checking for overlaps."""
+    __tablename__ = "booking_locks"
+    __table_args__ = (UniqueConstraint("technician_id", "date", name="uq_booking_locks_technician_date"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    technician_id = Column(Integer, nullable=False)
+    date = Column(String, nullable=False)
+    version = Column(Integer, nullable=False, default=0)
 
 
 class PaymentSetting(Base):
@@ -107,8 +128,8 @@ class Subscription(Base):
     plan = Column(String, default="trial")   # trial | starter | pro | premium | free
     status = Column(String, default="active")
 
-    start_date = Column(String)
-    end_date = Column(String)
+    start_date = Column(ISODateTime)
+    end_date = Column(ISODateTime)
 
     stripe_subscription_id = Column(String, nullable=True)
 
@@ -117,8 +138,30 @@ class Subscription(Base):
 # SOCIAL MEDIA ACCOUNTS
 # ==========================
 
+class RevenueDaily(Base):
+    """Pre-summed revenue per technician/day/staff/service, kept by services/backend/revenue.py."""
+    __tablename__ = "revenue_daily"
+    __table_args__ = (
+        UniqueConstraint("technician_id", "day", "staff_id", "service_id", name="uq_revenue_daily_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    technician_id = Column(Integer, nullable=False)
+    day = Column(ISODate, nullable=False)
+    staff_id = Column(Integer, nullable=False, default=0)  # 0 = not assigned to staff
+    service_id = Column(Integer, nullable=False, default=0)
+    confirmed_revenue = Column(Float, nullable=False, default=0.0)
+    confirmed_bookings = Column(Integer, nullable=False, default=0)
+    pending_revenue = Column(Float, nullable=False, default=0.0)
+    pending_bookings = Column(Integer, nullable=False, default=0)
+
+
 class SocialAccount(Base):
     __tablename__ = "social_accounts"
+    __table_args__ = (
+        # Token refresh scheduler scans active accounts by expiry
+        Index("ix_social_accounts_active_expiry", "is_active", "token_expires_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     technician_id = Column(Integer, ForeignKey("technicians.id"), nullable=False)
@@ -132,10 +175,10 @@ class SocialAccount(Base):
     # Token management
     access_token = Column(Text, nullable=True)  # OAuth access token
     refresh_token = Column(Text, nullable=True)  # For refreshing expired tokens
-    token_expires_at = Column(String, nullable=True)  # ISO format expiry datetime
+    token_expires_at = Column(ISODateTime, nullable=True)  # ISO format expiry datetime
     
     # Metadata
-    connected_at = Column(String, nullable=False)  # ISO format connection timestamp
+    connected_at = Column(ISODateTime, nullable=False)  # ISO format connection timestamp
     is_active = Column(Boolean, default=True)  # Whether the connection is active
     
     # Webhook/subscription info
@@ -153,7 +196,7 @@ class SocialAutomationSetting(Base):
     technician_id = Column(Integer, ForeignKey("technicians.id"), nullable=False, unique=True)
     auto_reply_enabled = Column(Boolean, default=True)
     welcome_dm_template = Column(Text, nullable=True)
-    updated_at = Column(String, nullable=False)
+    updated_at = Column(ISODateTime, nullable=False)
 
     technician = relationship("Technician", back_populates="social_automation_setting")
 
@@ -170,9 +213,9 @@ class WhatsAppSession(Base):
     session_id = Column(String, unique=True, nullable=False, index=True)
     qr_code_data = Column(Text, nullable=True)  # QR code data or URL
     status = Column(String, default="pending")  # pending | scanning | connected | expired
-    created_at = Column(String, nullable=False)
-    expires_at = Column(String, nullable=False)
-    connected_at = Column(String, nullable=True)
+    created_at = Column(ISODateTime, nullable=False)
+    expires_at = Column(ISODateTime, nullable=False)
+    connected_at = Column(ISODateTime, nullable=True)
     
     # Relationship
     technician = relationship("Technician")
@@ -189,8 +232,8 @@ class OAuthState(Base):
     state = Column(String, unique=True, nullable=False, index=True)
     technician_id = Column(Integer, ForeignKey("technicians.id"), nullable=False)
     platform = Column(String, nullable=False)
-    created_at = Column(String, nullable=False)
-    expires_at = Column(String, nullable=False)
+    created_at = Column(ISODateTime, nullable=False)
+    expires_at = Column(ISODateTime, nullable=False)
     used = Column(Boolean, default=False)
     
     # Relationship
@@ -209,7 +252,7 @@ class ChatSetting(Base):
 
     tone = Column(String, default="friendly")  # friendly | professional | cozy | custom
     custom_prompt = Column(Text, nullable=True)
-    updated_at = Column(String, nullable=True)
+    updated_at = Column(ISODateTime, nullable=True)
     
     # AI model settings
     model_name = Column(String, default="gpt-3.5-turbo")  # AI model to use
@@ -229,9 +272,9 @@ class PaymentProof(Base):
     booking_id = Column(Integer, ForeignKey("appointments.id"), nullable=False)
     technician_id = Column(Integer, ForeignKey("technicians.id"), nullable=False)
     filename = Column(String, nullable=False)
-    uploaded_at = Column(String, nullable=False)
+    uploaded_at = Column(ISODateTime, nullable=False)
     status = Column(String, default="pending")  # pending | approved | rejected
-    reviewed_at = Column(String, nullable=True)
+    reviewed_at = Column(ISODateTime, nullable=True)
     reviewed_by = Column(String, nullable=True)  # "technician" or "auto"
     
     # Relationships
@@ -272,9 +315,10 @@ class ChatSession(Base):
     handoff_updated_at = Column(String, nullable=True)
     
     # Metadata
-    created_at = Column(String, nullable=False)
-    updated_at = Column(String, nullable=False)
-    expires_at = Column(String, nullable=False)
+    created_at = Column(ISODateTime, nullable=False)
+    updated_at = Column(ISODateTime, nullable=False)
+    expires_at = Column(ISODateTime, nullable=False)
+    version = Column(Integer, nullable=False, default=0)  # bumped on every write (see chat_engine.save_turn)
     
     # Relationships - FIXED: Removed the problematic booking relationship
     technician = relationship("Technician")
@@ -287,6 +331,10 @@ class ChatSession(Base):
 
 class MessageLog(Base):
     __tablename__ = "message_logs"
+    __table_args__ = (
+        Index("ix_message_logs_technician_created", "technician_id", "created_at", "id"),
+        Index("ix_message_logs_session_created", "session_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     technician_id = Column(Integer, ForeignKey("technicians.id"), nullable=False)
@@ -296,15 +344,68 @@ class MessageLog(Base):
     recipient_id = Column(String, nullable=True)
     message_content = Column(Text, nullable=True)
     session_id = Column(String, nullable=True)
-    status = Column(String, default="sent")  # sent | delivered | read | failed
-    created_at = Column(String, nullable=False)
+    status = Column(String, default="sent")  # queued | sent | delivered | read | failed
+    created_at = Column(ISODateTime, nullable=False)
     
     # Relationship
     technician = relationship("Technician")
 
 
+class OutboundMessage(Base):
+    """Outbox row for a queued send; drained by services/backend/outbox.py."""
+    __tablename__ = "outbound_messages"
+    __table_args__ = (
+        Index("ix_outbound_messages_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    message_log_id = Column(Integer, ForeignKey("message_logs.id"), nullable=False, index=True)
+    technician_id = Column(Integer, ForeignKey("technicians.id"), nullable=False)
+    platform = Column(String, nullable=False)  # whatsapp | instagram
+    recipient_id = Column(String, nullable=False)
+    social_account_id = Column(Integer, ForeignKey("social_accounts.id"), nullable=True)
+    status = Column(String, default="queued")  # queued | sending | sent | failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(ISODateTime, nullable=False)
+    locked_until = Column(ISODateTime, nullable=True)
+    provider_message_id = Column(String, nullable=True, index=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(ISODateTime, nullable=False)
+    updated_at = Column(ISODateTime, nullable=False)
+
+    message_log = relationship("MessageLog")
+
+
+class WebhookEvent(Base):
+    """Append-only inbox of raw webhook deliveries, processed by webhook_inbox.py."""
+    __tablename__ = "webhook_events"
+    __table_args__ = (
+        Index("ix_webhook_events_status_received", "status", "received_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String, nullable=False)  # instagram | meta
+    payload = Column(Text, nullable=False)  # raw request body
+    status = Column(String, default="pending")  # pending | processing | processed | failed
+    error = Column(Text, nullable=True)
+    received_at = Column(ISODateTime, nullable=False)
+    processed_at = Column(ISODateTime, nullable=True)
+    lease_until = Column(ISODateTime, nullable=True)  # while processing; reclaimable once passed
+
+
+class WebhookDedupKey(Base):
+    """Shared replay-window index of webhook event keys (WEBHOOK_DEDUP_DB=true)."""
+    __tablename__ = "webhook_dedup_keys"
+
+    key = Column(String, primary_key=True)  # mid:<mid> | wamid:<id> | status:<id>:<status> | evt:<sha1>
+    seen_at = Column(ISODateTime, nullable=False, index=True)
+
+
 class DashboardNotification(Base):
     __tablename__ = "dashboard_notifications"
+    __table_args__ = (
+        Index("ix_dashboard_notifications_technician_created", "technician_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     technician_id = Column(Integer, ForeignKey("technicians.id"), nullable=False, index=True)
@@ -313,7 +414,7 @@ class DashboardNotification(Base):
     message = Column(Text, nullable=False)
     related_id = Column(Integer, nullable=True)
     is_read = Column(Boolean, default=False)
-    created_at = Column(String, nullable=False)
+    created_at = Column(ISODateTime, nullable=False)
 
     technician = relationship("Technician")
 
@@ -328,6 +429,6 @@ class Complaint(Base):
     client_contact = Column(String, nullable=True)
     complaint_text = Column(Text, nullable=False)
     status = Column(String, default="open")
-    created_at = Column(String, nullable=False)
+    created_at = Column(ISODateTime, nullable=False)
 
     technician = relationship("Technician")
\ No newline at end of file
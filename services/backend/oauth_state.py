@@ -0,0 +1,166 @@
+# oauth_state.py
+# One-time OAuth `state` values for the social connect flow. The default
+# store keeps them in oauth_states so the callback can land on any worker;
+# consuming a state is a single conditional UPDATE, so a replayed callback
+# (or two workers racing) can use it at most once. MemoryStateStore is the
+# same contract in-process, for tests and single-worker dev setups.
+import os
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from cachetools import TTLCache
+from sqlalchemy.orm import sessionmaker
+
+from services.backend import metrics, models
+from services.backend.database import SessionLocal
+
+OAUTH_STATE_TTL_SEC = int(os.getenv("OAUTH_STATE_TTL_SEC", "600"))
+OAUTH_STATE_BACKEND = os.getenv("OAUTH_STATE_BACKEND", "db")  # db | memory
+OAUTH_STATE_SWEEP_INTERVAL_SEC = int(os.getenv("OAUTH_STATE_SWEEP_INTERVAL_SEC", "300"))
+OAUTH_STATE_MEMORY_MAX = 10000
+
+
+def new_state() -> str:
+    return secrets.token_urlsafe(32)
+
+
+class OAuthStateStore(ABC):
+    """issue() a state for a technician/platform, consume() it exactly once"""
+
+    @abstractmethod
+    def issue(self, technician_id: int, platform: str) -> str:
+        ...
+
+    @abstractmethod
+    def consume(self, state: str, technician_id: int, platform: str) -> bool:
+        ...
+
+    @abstractmethod
+    def sweep(self) -> int:
+        """Drop expired states; returns how many were removed"""
+
+
+class MemoryStateStore(OAuthStateStore):
+    """Process-local store; bounded and self-expiring via TTLCache"""
+
+    def __init__(self, ttl: int = OAUTH_STATE_TTL_SEC, maxsize: int = OAUTH_STATE_MEMORY_MAX):
+        self._states: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def issue(self, technician_id: int, platform: str) -> str:
+        state = new_state()
+        with self._lock:
+            self._states[state] = (technician_id, platform)
+        return state
+
+    def consume(self, state: str, technician_id: int, platform: str) -> bool:
+        with self._lock:
+            stored = self._states.pop(state, None)
+        return stored == (technician_id, platform)
+
+    def sweep(self) -> int:
+        with self._lock:
+            before = len(self._states)
+            self._states.expire()
+            return before - len(self._states)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._states)
+
+
+class DBStateStore(OAuthStateStore):
+    """States in the oauth_states table, shared by every worker"""
+
+    def __init__(
+        self,
+        session_factory: sessionmaker = SessionLocal,
+        ttl: int = OAUTH_STATE_TTL_SEC,
+        sweep_interval: int = OAUTH_STATE_SWEEP_INTERVAL_SEC,
+    ):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0.0
+
+    def issue(self, technician_id: int, platform: str) -> str:
+        now = datetime.now(timezone.utc)
+        state = new_state()
+        db = self.session_factory()
+        try:
+            db.add(models.OAuthState(
+                state=state,
+                technician_id=technician_id,
+                platform=platform,
+                created_at=now.isoformat(),
+                expires_at=(now + timedelta(seconds=self.ttl)).isoformat(),
+                used=False,
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+        # Piggyback cleanup on issue so no scheduler is needed
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            self.sweep()
+        return state
+
+    def consume(self, state: str, technician_id: int, platform: str) -> bool:
+        now = datetime.now(timezone.utc).isoformat()
+        db = self.session_factory()
+        try:
+            updated = db.query(models.OAuthState).filter(
+                models.OAuthState.state == state,
+                models.OAuthState.technician_id == technician_id,
+                models.OAuthState.platform == platform,
+                models.OAuthState.used == False,  # noqa: E712
+                models.OAuthState.expires_at > now,
+            ).update({models.OAuthState.used: True}, synchronize_session=False)
+            db.commit()
+            return updated == 1
+        finally:
+            db.close()
+
+    def sweep(self) -> int:
+        self._last_sweep = time.monotonic()
+        now = datetime.now(timezone.utc).isoformat()
+        db = self.session_factory()
+        try:
+            deleted = db.query(models.OAuthState).filter(
+                models.OAuthState.expires_at <= now
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+
+_store: Optional[OAuthStateStore] = None
+
+
+def get_store() -> OAuthStateStore:
+    global _store
+    if _store is None:
+        _store = MemoryStateStore() if OAUTH_STATE_BACKEND == "memory" else DBStateStore()
+    return _store
+
+
+def set_store(store: Optional[OAuthStateStore]) -> None:
+    """Swap the active store (tests); None restores the configured default"""
+    global _store
+    _store = store
+
+
+def stats() -> dict:
+    store = get_store()
+    data = {"backend": type(store).__name__}
+    if isinstance(store, MemoryStateStore):
+        data["states"] = len(store)
+    return data
+
+
+metrics.register("oauth_state", stats)
@@ -0,0 +1,342 @@
+# outbox.py
+# Durable outbound message queue. Handlers call enqueue_message(), which
+# writes a MessageLog row (status "queued") plus an outbound_messages row in
+# the caller's transaction and returns immediately. OutboxWorker drains the
+# table in batches in the background and moves both rows to sent/failed.
+# Works on SQLite and Postgres; no external broker.
+import asyncio
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from services import messaging_service
+from services.backend import events, metrics, models
+from services.backend.database import SessionLocal
+
+OUTBOX_WORKER_ENABLED = os.getenv("OUTBOX_WORKER_ENABLED", "true").lower() == "true"
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_POLL_INTERVAL_SEC = float(os.getenv("OUTBOX_POLL_INTERVAL_SEC", "1.0"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_LEASE_SEC = int(os.getenv("OUTBOX_LEASE_SEC", "60"))
+OUTBOX_RETRY_BASE_SEC = float(os.getenv("OUTBOX_RETRY_BASE_SEC", "30"))
+
+_stats_lock = threading.Lock()
+_stats = {"enqueued": 0, "sent": 0, "failed": 0, "retried": 0, "batches": 0}
+
+
+def _count(key: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[key] += n
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+metrics.register("outbox", stats)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# ==========================
+# PRODUCER SIDE
+# ==========================
+
+def enqueue_message(
+    db: Session,
+    technician_id: int,
+    platform: str,
+    recipient_id: str,
+    text: str,
+    session_id: Optional[str] = None,
+    sender_id: Optional[str] = None,
+    social_account_id: Optional[int] = None,
+    commit: bool = True,
+) -> models.OutboundMessage:
+    """Queue an outgoing message; with commit=False it joins the caller's transaction"""
+    now = _now().isoformat()
+
+    log = models.MessageLog(
+        technician_id=technician_id,
+        platform=platform,
+        direction="outgoing",
+        sender_id=sender_id,
+        recipient_id=recipient_id,
+        message_content=text,
+        session_id=session_id,
+        status="queued",
+        created_at=now,
+    )
+    db.add(log)
+    db.flush()
+
+    item = models.OutboundMessage(
+        message_log_id=log.id,
+        technician_id=technician_id,
+        platform=platform,
+        recipient_id=recipient_id,
+        social_account_id=social_account_id,
+        status="queued",
+        attempts=0,
+        next_attempt_at=now,
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(item)
+
+    if commit:
+        db.commit()
+        wake()
+    else:
+        db.flush()
+
+    _count("enqueued")
+    return item
+
+
+def update_delivery_status(db: Session, provider_message_id: str, status: str) -> bool:
+    """Apply a Meta status callback (delivered/read/failed) to the MessageLog row"""
+    item = db.query(models.OutboundMessage).filter(
+        models.OutboundMessage.provider_message_id == provider_message_id
+    ).first()
+    if not item:
+        return False
+
+    db.query(models.MessageLog).filter(
+        models.MessageLog.id == item.message_log_id
+    ).update({models.MessageLog.status: status}, synchronize_session=False)
+    db.commit()
+    events.publish_message_updates(db, [item.message_log_id])
+    return True
+
+
+# ==========================
+# CONSUMER SIDE
+# ==========================
+
+def _claimable(now: str):
+    OM = models.OutboundMessage
+    return or_(
+        and_(OM.status == "queued", OM.next_attempt_at <= now),
+        # Rows whose worker died mid-send become claimable once the lease expires
+        and_(OM.status == "sending", OM.locked_until < now),
+    )
+
+
+ClaimedMessage = Tuple[int, messaging_service.OutboundMessage]
+
+
+def claim_batch(db: Session, limit: int = OUTBOX_BATCH_SIZE) -> List[ClaimedMessage]:
+    """Lease up to `limit` due rows and return (outbox id, ready-to-send message) pairs"""
+    OM = models.OutboundMessage
+    now = _now()
+    now_iso = now.isoformat()
+    lease = (now + timedelta(seconds=OUTBOX_LEASE_SEC)).isoformat()
+
+    candidates = db.query(OM.id).filter(_claimable(now_iso)).order_by(
+        OM.next_attempt_at, OM.id
+    ).limit(limit).with_for_update(skip_locked=True).all()
+
+    claimed = []
+    for (item_id,) in candidates:
+        # Conditional update so two workers can't both claim the same row
+        updated = db.query(OM).filter(OM.id == item_id, _claimable(now_iso)).update(
+            {
+                OM.status: "sending",
+                OM.locked_until: lease,
+                OM.attempts: OM.attempts + 1,
+                OM.updated_at: now_iso,
+            },
+            synchronize_session=False,
+        )
+        if updated:
+            claimed.append(item_id)
+    db.commit()
+
+    if not claimed:
+        return []
+
+    rows = db.query(
+        OM.id,
+        OM.platform,
+        OM.recipient_id,
+        models.MessageLog.message_content,
+        models.SocialAccount.access_token,
+        models.SocialAccount.is_active,
+        models.SocialAccount.account_id,
+        models.SocialAccount.phone_number,
+    ).join(
+        models.MessageLog, models.MessageLog.id == OM.message_log_id
+    ).outerjoin(
+        models.SocialAccount, models.SocialAccount.id == OM.social_account_id
+    ).filter(OM.id.in_(claimed)).order_by(OM.id).all()
+
+    return [
+        (row.id, messaging_service.OutboundMessage(
+            platform=row.platform,
+            recipient=row.recipient_id,
+            text=row.message_content or "",
+            # Disconnected accounts (see token_refresh) fail without a Graph call
+            access_token=(row.access_token if row.is_active is not False else None) or "",
+            sender_id=row.account_id or (row.phone_number if row.platform == "whatsapp" else None),
+        ))
+        for row in rows
+    ]
+
+
+def complete_batch(db: Session, claimed: List[ClaimedMessage], results: List[messaging_service.SendResult]) -> None:
+    """Record send results on the outbox rows and their MessageLog entries"""
+    OM = models.OutboundMessage
+    now = _now()
+    now_iso = now.isoformat()
+    log_ids = []
+
+    for (outbox_id, _), result in zip(claimed, results):
+        item = db.query(OM).filter(OM.id == outbox_id).first()
+        if item is None:
+            continue
+
+        retryable = not result.maybe_sent and (
+            result.status_code is None or result.status_code in messaging_service.RETRY_STATUS_CODES
+        )
+        if result.ok:
+            item.status = "sent"
+            item.provider_message_id = result.message_id
+            item.last_error = None
+            log_status = "sent"
+            _count("sent")
+        elif retryable and (item.attempts or 0) < OUTBOX_MAX_ATTEMPTS:
+            delay = OUTBOX_RETRY_BASE_SEC * (2 ** ((item.attempts or 1) - 1))
+            item.status = "queued"
+            item.next_attempt_at = (now + timedelta(seconds=delay)).isoformat()
+            item.last_error = result.error
+            log_status = "queued"
+            _count("retried")
+        else:
+            item.status = "failed"
+            item.last_error = result.error
+            log_status = "failed"
+            _count("failed")
+
+        item.locked_until = None
+        item.updated_at = now_iso
+        db.query(models.MessageLog).filter(
+            models.MessageLog.id == item.message_log_id
+        ).update({models.MessageLog.status: log_status}, synchronize_session=False)
+        log_ids.append(item.message_log_id)
+
+    db.commit()
+    events.publish_message_updates(db, log_ids)
+
+
+class OutboxWorker:
+    """Background task that drains outbound_messages in batches"""
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        client: Optional[messaging_service.MessagingClient] = None,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL_SEC,
+    ):
+        self.session_factory = session_factory
+        self.client = client
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+
+    def _claim(self):
+        db = self.session_factory()
+        try:
+            return claim_batch(db, self.batch_size)
+        finally:
+            db.close()
+
+    def _complete(self, claimed, results):
+        db = self.session_factory()
+        try:
+            complete_batch(db, claimed, results)
+        finally:
+            db.close()
+
+    async def run_once(self) -> int:
+        """Claim, send and record one batch; returns the number of messages handled"""
+        claimed = await asyncio.to_thread(self._claim)
+        if not claimed:
+            return 0
+
+        client = self.client or messaging_service.get_client()
+        results = await client.send_many(message for _, message in claimed)
+        await asyncio.to_thread(self._complete, claimed, results)
+        _count("batches")
+        return len(claimed)
+
+    async def run(self) -> None:
+        while not self._stopping:
+            try:
+                handled = await self.run_once()
+            except Exception as e:
+                print("⚠️  Outbox worker error:", e)
+                handled = 0
+
+            if handled < self.batch_size and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self.run())
+
+    def wake(self) -> None:
+        """Thread-safe nudge so new messages go out without waiting for the poll"""
+        if self._loop is not None and self._wakeup is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._task is None:
+            return
+        self.wake()
+        try:
+            await asyncio.wait_for(self._task, timeout=self.poll_interval + 5)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        self._task = None
+
+
+worker: Optional[OutboxWorker] = None
+
+
+def wake() -> None:
+    if worker is not None:
+        worker.wake()
+
+
+async def start_worker() -> None:
+    global worker
+    if not OUTBOX_WORKER_ENABLED or worker is not None:
+        return
+    worker = OutboxWorker()
+    worker.start()
+
+
+async def stop_worker() -> None:
+    global worker
+    if worker is not None:
+        await worker.stop()
+        worker = None
@@ -0,0 +1,138 @@
+# pagination.py
+# Keyset pagination over (created_at, id) for append-mostly feeds
+# (notifications, message logs, session timelines). Cursors are opaque
+# strings; `before` walks back into history, `since` returns only rows
+# added after the last sync, so a refresh costs an index seek instead of
+# re-reading the newest N rows. Sync cursors hold the row id alone, which
+# avoids app-clock skew between writers stamping created_at. It does NOT
+# make `since` safe against late commits in general: ids are handed out at
+# insert, not at commit, so on Postgres a transaction holding id 41 can
+# commit after a reader already moved its cursor past 42, and row 41 is
+# never synced. Only single-writer SQLite (one write transaction at a time,
+# so ids become visible in order) gets that guarantee; on Postgres, treat
+# `since` as a fast path and reconcile with a full reload now and then.
+import base64
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query
+
+from services.backend.column_types import to_utc_datetime
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+Cursor = Tuple[str, int]
+
+
+def encode_cursor(created_at: str, row_id: int) -> str:
+    raw = f"{created_at}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Parse a cursor; raises ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").rsplit("|", 1)
+        if to_utc_datetime(created_at) is None:
+            raise ValueError
+        return created_at, int(row_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+
+def encode_sync_cursor(row_id: int) -> str:
+    return base64.urlsafe_b64encode(str(row_id).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_sync_cursor(cursor: str) -> int:
+    """Row id of a sync cursor (older "created_at|id" cursors still work); raises ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").rsplit("|", 1)[-1])
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    return max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+
+
+def _before(model, cursor: Cursor):
+    created_at, row_id = cursor
+    return or_(model.created_at < created_at, and_(model.created_at == created_at, model.id < row_id))
+
+
+def _page_statement(query, model, limit: int, before: Optional[str], since: Optional[str]):
+    """Apply cursor filter, ordering and limit+1 (works on a Query or a select())"""
+    if since:
+        return query.filter(model.id > decode_sync_cursor(since)).order_by(model.id.asc()).limit(limit + 1)
+    if before:
+        query = query.filter(_before(model, decode_cursor(before)))
+    return query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+
+def _page_result(rows: List, limit: int, before: Optional[str], since: Optional[str], oldest_first: bool) -> dict:
+    has_more = len(rows) > limit
+    rows = list(rows[:limit])
+    if since:
+        newest = rows[-1].id if rows else None
+        oldest = None
+        if not oldest_first:
+            rows.reverse()
+    else:
+        newest = max(row.id for row in rows) if rows and not before else None
+        oldest = rows[-1] if rows and has_more else None
+        if oldest_first:
+            rows.reverse()
+
+    return {
+        "items": rows,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(oldest.created_at, oldest.id) if oldest is not None else None,
+        "sync_cursor": encode_sync_cursor(newest) if newest is not None else since,
+    }
+
+
+def keyset_page(
+    query: Query,
+    model,
+    limit: Optional[int] = None,
+    before: Optional[str] = None,
+    since: Optional[str] = None,
+    oldest_first: bool = False,
+) -> dict:
+    """Fetch one page of `query` ordered by (created_at, id).
+
+    Without cursors this is the newest `limit` rows. `before` continues into
+    older rows; `since` returns rows inserted after the cursor, in id order
+    so `has_more` means "call again with sync_cursor". Items come back
+    newest-first unless `oldest_first` (timelines).
+
+    Returns {"items", "has_more", "next_cursor", "sync_cursor"}: next_cursor
+    pages further back, sync_cursor is the highest id seen, to pass as `since`.
+    """
+    limit = clamp_limit(limit)
+    rows = _page_statement(query, model, limit, before, since).all()
+    return _page_result(rows, limit, before, since, oldest_first)
+
+
+async def keyset_page_async(
+    db: AsyncSession,
+    statement: Select,
+    model,
+    limit: Optional[int] = None,
+    before: Optional[str] = None,
+    since: Optional[str] = None,
+    oldest_first: bool = False,
+) -> dict:
+    """keyset_page() for an AsyncSession and a select(model) statement"""
+    limit = clamp_limit(limit)
+    result = await db.execute(_page_statement(statement, model, limit, before, since))
+    return _page_result(result.scalars().all(), limit, before, since, oldest_first)
+
+
+def serialize(rows: List, fields: Tuple[str, ...]) -> List[dict]:
+    return [{field: getattr(row, field) for field in fields} for row in rows]
@@ -0,0 +1,271 @@
+# revenue.py
+# Daily revenue rollups for the premium revenue dashboard. revenue_daily keeps
+# one pre-summed row per technician / day / staff / service. Appointment
+# insert, update and delete hooks apply +/- deltas in the same flush, so the
+# rollup commits (or rolls back) with the booking itself. rebuild() recomputes
+# rows from appointments; run it after bulk UPDATEs that bypass the ORM, or
+# from services/rebuild_revenue_rollups.py.
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import and_, case, event, func, inspect as sa_inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from services.backend import models
+
+CURRENCY = "GBP"
+CONFIRMED_PAYMENT_STATUSES = ("confirmed", "paid")
+EXCLUDED_STATUSES = ("cancelled", "canceled")
+NO_STAFF = 0  # staff_id is part of the unique key, so "no staff" can't be NULL
+
+RollupKey = Tuple[int, str, int, int]  # technician_id, day, staff_id, service_id
+
+
+def classify(status: Optional[str], payment_status: Optional[str]) -> Optional[str]:
+    """Which bucket a booking counts towards: confirmed, pending or None"""
+    if (status or "").lower() in EXCLUDED_STATUSES:
+        return None
+    if (payment_status or "").lower() in CONFIRMED_PAYMENT_STATUSES:
+        return "confirmed"
+    return "pending"
+
+
+# ==========================
+# INCREMENTAL UPDATES
+# ==========================
+
+def _upsert(connection, key: RollupKey, values: Dict[str, float]) -> None:
+    """Add `values` to the rollup row for `key`, creating it if needed"""
+    table = models.RevenueDaily.__table__
+    technician_id, day, staff_id, service_id = key
+    row = {
+        "technician_id": technician_id,
+        "day": day,
+        "staff_id": staff_id,
+        "service_id": service_id,
+        "confirmed_revenue": 0.0,
+        "confirmed_bookings": 0,
+        "pending_revenue": 0.0,
+        "pending_bookings": 0,
+        **values,
+    }
+    increments = {name: table.c[name] + amount for name, amount in values.items()}
+
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = (sqlite.insert if dialect == "sqlite" else postgresql.insert)(table).values(**row)
+        connection.execute(insert.on_conflict_do_update(
+            index_elements=["technician_id", "day", "staff_id", "service_id"],
+            set_=increments,
+        ))
+        return
+
+    where = and_(
+        table.c.technician_id == technician_id,
+        table.c.day == day,
+        table.c.staff_id == staff_id,
+        table.c.service_id == service_id,
+    )
+    if not connection.execute(table.update().where(where).values(**increments)).rowcount:
+        connection.execute(table.insert().values(**row))
+
+
+def _service_price(connection, service_id) -> float:
+    price = connection.execute(
+        select(models.Service.price).where(models.Service.id == service_id)
+    ).scalar()
+    return float(price or 0)
+
+
+def _contribution(connection, values: dict) -> Optional[Tuple[RollupKey, Dict[str, float]]]:
+    bucket = classify(values["status"], values["payment_status"])
+    if bucket is None or not values["date"] or values["technician_id"] is None:
+        return None
+    price = values["service_price"]
+    if price is None:
+        price = _service_price(connection, values["service_id"])
+    key = (values["technician_id"], values["date"], values["staff_id"] or NO_STAFF, values["service_id"] or 0)
+    return key, {f"{bucket}_revenue": float(price), f"{bucket}_bookings": 1}
+
+
+TRACKED = ("technician_id", "service_id", "staff_id", "date", "status", "payment_status", "service_price")
+
+
+def _current(target) -> dict:
+    return {name: getattr(target, name) for name in TRACKED}
+
+
+def _previous(target) -> dict:
+    """Column values as they were before this flush"""
+    state = sa_inspect(target)
+    values = {}
+    for name in TRACKED:
+        history = state.attrs[name].history
+        values[name] = history.deleted[0] if history.deleted else getattr(target, name)
+    return values
+
+
+def _apply(connection, values: dict, sign: int) -> None:
+    contribution = _contribution(connection, values)
+    if contribution is None:
+        return
+    key, amounts = contribution
+    _upsert(connection, key, {name: sign * amount for name, amount in amounts.items()})
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# active_history loads the old value before an unloaded attribute is
+# overwritten, so _previous() always knows which bucket to subtract from.
+for _name in TRACKED:
+    event.listen(getattr(models.Appointment, _name), "set", _load_old_value, active_history=True)
+
+
+@event.listens_for(models.Appointment, "after_insert")
+def _on_insert(mapper, connection, target):
+    _apply(connection, _current(target), +1)
+
+
+@event.listens_for(models.Appointment, "after_update")
+def _on_update(mapper, connection, target):
+    before, after = _previous(target), _current(target)
+    if before == after:
+        return
+    _apply(connection, before, -1)
+    _apply(connection, after, +1)
+
+
+@event.listens_for(models.Appointment, "after_delete")
+def _on_delete(mapper, connection, target):
+    _apply(connection, _previous(target), -1)
+
+
+# ==========================
+# BATCH REBUILD
+# ==========================
+
+def rebuild(db: Session, technician_id: Optional[int] = None, start: Optional[str] = None, end: Optional[str] = None) -> int:
+    """Recompute rollup rows from appointments; returns the number of rows written"""
+    A = models.Appointment
+    R = models.RevenueDaily
+
+    scope = []
+    rollup_scope = []
+    if technician_id is not None:
+        scope.append(A.technician_id == technician_id)
+        rollup_scope.append(R.technician_id == technician_id)
+    if start:
+        scope.append(A.date >= start)
+        rollup_scope.append(R.day >= start)
+    if end:
+        scope.append(A.date <= end)
+        rollup_scope.append(R.day <= end)
+
+    price = func.coalesce(A.service_price, models.Service.price, 0)
+    status = func.lower(func.coalesce(A.status, ""))
+    payment = func.lower(func.coalesce(A.payment_status, ""))
+    counted = status.notin_(EXCLUDED_STATUSES)
+    confirmed = and_(counted, payment.in_(CONFIRMED_PAYMENT_STATUSES))
+    pending = and_(counted, payment.notin_(CONFIRMED_PAYMENT_STATUSES))
+    staff = func.coalesce(A.staff_id, NO_STAFF)
+    service = func.coalesce(A.service_id, 0)
+
+    rows = db.query(
+        A.technician_id,
+        A.date,
+        staff,
+        service,
+        func.sum(case((confirmed, price), else_=0)),
+        func.sum(case((confirmed, 1), else_=0)),
+        func.sum(case((pending, price), else_=0)),
+        func.sum(case((pending, 1), else_=0)),
+    ).outerjoin(
+        models.Service, models.Service.id == A.service_id
+    ).filter(*scope).group_by(A.technician_id, A.date, staff, service).all()
+
+    db.query(R).filter(*rollup_scope).delete(synchronize_session=False)
+    written = 0
+    for tech_id, day, staff_id, service_id, c_rev, c_count, p_rev, p_count in rows:
+        if not c_count and not p_count:
+            continue
+        db.add(R(
+            technician_id=tech_id,
+            day=day,
+            staff_id=staff_id,
+            service_id=service_id,
+            confirmed_revenue=float(c_rev or 0),
+            confirmed_bookings=int(c_count or 0),
+            pending_revenue=float(p_rev or 0),
+            pending_bookings=int(p_count or 0),
+        ))
+        written += 1
+    db.commit()
+    return written
+
+
+# ==========================
+# DASHBOARD QUERY
+# ==========================
+
+def has_premium(db: Session, technician_id: int) -> bool:
+    now = datetime.now(timezone.utc).isoformat()
+    return db.query(models.Subscription.id).filter(
+        models.Subscription.technician_id == technician_id,
+        models.Subscription.plan == "premium",
+        models.Subscription.status == "active",
+        (models.Subscription.end_date == None) | (models.Subscription.end_date >= now),  # noqa: E711
+    ).first() is not None
+
+
+def summary(db: Session, technician_id: int, days: int, today: Optional[date] = None) -> dict:
+    """Totals, daily trend and top services for the last `days` days (today included)"""
+    R = models.RevenueDaily
+    today = today or datetime.now(timezone.utc).date()
+    start = (today - timedelta(days=days - 1)).isoformat()
+    end = today.isoformat()
+    in_period = (R.technician_id == technician_id, R.day >= start, R.day <= end)
+
+    totals = db.query(
+        func.coalesce(func.sum(R.confirmed_revenue), 0),
+        func.coalesce(func.sum(R.confirmed_bookings), 0),
+        func.coalesce(func.sum(R.pending_revenue), 0),
+        func.coalesce(func.sum(R.pending_bookings), 0),
+    ).filter(*in_period).one()
+    confirmed_revenue, confirmed_bookings, pending_revenue, pending_bookings = totals
+
+    by_day = dict(db.query(R.day, func.sum(R.confirmed_revenue)).filter(*in_period).group_by(R.day).all())
+    trend = []
+    for offset in range(days):
+        day = (today - timedelta(days=days - 1 - offset)).isoformat()
+        trend.append({"date": day, "revenue": round(float(by_day.get(day) or 0), 2)})
+
+    service_rows = db.query(
+        R.service_id,
+        models.Service.name,
+        func.sum(R.confirmed_revenue).label("revenue"),
+        func.sum(R.confirmed_bookings),
+    ).outerjoin(
+        models.Service, models.Service.id == R.service_id
+    ).filter(*in_period).group_by(R.service_id, models.Service.name).having(
+        func.sum(R.confirmed_bookings) > 0
+    ).order_by(func.sum(R.confirmed_revenue).desc()).limit(10).all()
+
+    return {
+        "currency": CURRENCY,
+        "period_days": days,
+        "totals": {
+            "confirmed_revenue": round(float(confirmed_revenue), 2),
+            "confirmed_bookings": int(confirmed_bookings),
+            "average_ticket": round(float(confirmed_revenue) / confirmed_bookings, 2) if confirmed_bookings else 0.0,
+            "pending_revenue": round(float(pending_revenue), 2),
+            "pending_bookings": int(pending_bookings),
+        },
+        "trend": trend,
+        "top_services": [
+            {"service_id": service_id, "service_name": name, "revenue": round(float(revenue or 0), 2), "bookings": int(count or 0)}
+            for service_id, name, revenue, count in service_rows
+        ],
+    }
@@ -68,6 +68,14 @@ class AvailabilitySchema(BaseModel):
     end_time: str
 
 
+class AvailableSlotsResponse(BaseModel):
+    technician_id: int
+    date: str
+    timezone: str
+    duration_minutes: int
+    slots: List[str]
+
+
 class AppointmentSchema(BaseModel):
     technician_id: int
     service_id: int
@@ -282,6 +290,7 @@ class ChatMessageRequest(BaseModel):
     session_id: Optional[str] = None
     platform: Optional[str] = None
     account_id: Optional[str] = None
+    timezone: Optional[str] = None  # IANA name; relative days like "tomorrow" are read in it
     
     # Optional pre-filled data
     client_name: Optional[str] = None
@@ -303,6 +312,9 @@ class ChatMessageResponse(BaseModel):
     price: Optional[float] = None
     available_suggestions: Optional[List[str]] = None
     payment_instructions: Optional[dict] = None
+    handoff_paused: Optional[bool] = None
+    intent: Optional[str] = None
+    confidence: Optional[float] = None
 
 
 class ChatRequest(BaseModel):
@@ -313,6 +325,31 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     reply: str
     action: str
+    step: Optional[str] = None
+    services: Optional[List[dict]] = None
+    available_suggestions: Optional[List[str]] = None
+    booking_id: Optional[int] = None
+    intent: Optional[str] = None
+    confidence: Optional[float] = None
+
+
+class AIHistoryMessage(BaseModel):
+    role: str  # user | assistant
+    content: str
+
+
+class AIReplyRequest(BaseModel):
+    message: str
+    history: Optional[List[AIHistoryMessage]] = None  # earlier turns; replies with history are never cached
+    stream: bool = False
+
+
+class AIReplyResponse(BaseModel):
+    reply: str
+    model: str
+    cached: Optional[str] = None  # exact | similar | shared
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
 
 
 class ChatSessionResponse(BaseModel):
@@ -389,6 +426,25 @@ class ConfirmPaymentRequest(BaseModel):
     payment_method: str = "bank"  # bank | stripe | manual
 
 
+class BookingCreateRequest(BaseModel):
+    technician_id: int
+    service_id: int
+    staff_id: Optional[int] = None
+    client_name: str
+    client_phone: Optional[str] = None
+    client_email: Optional[str] = None
+    date: str
+    time: str
+    timezone: Optional[str] = None
+    source: str = "website"  # ai | website
+
+
+class SlotUnavailableResponse(BaseModel):
+    code: str = "SLOT_UNAVAILABLE"
+    message: str
+    next_available: List[str] = []
+
+
 class BookingRequest(BaseModel):
     service_id: int
     client_name: str
@@ -402,8 +458,10 @@ class BookingResponse(BaseModel):
     client_name: str
     client_phone: Optional[str] = None
     service_name: Optional[str] = None
+    staff_name: Optional[str] = None
     appointment_date: str
     appointment_time: str
+    booking_source: Optional[str] = None
     payment_status: str
 
     model_config = ConfigDict(from_attributes=True)
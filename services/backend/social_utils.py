@@ -1,45 +1,24 @@
 # social_utils.py
+import asyncio
 import os
-import requests
 import uuid
-from datetime import datetime, timedelta
-from datetime import timezone
+import weakref
+from dataclasses import dataclass
 from typing import Dict, Optional, Tuple
 
-# Store OAuth states (in production use Redis)
-oauth_states: Dict[str, Dict] = {}
+import httpx
+
+from services.backend import oauth_state
 
 def generate_oauth_state(technician_id: int, platform: str) -> str:
     """Generate and store OAuth state for CSRF protection"""
-    state = str(uuid.uuid4())
-    oauth_states[state] = {
-        "technician_id": technician_id,
-        "platform": platform,
-        "expires": (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat()
-    }
-    return state
+    return oauth_state.get_store().issue(technician_id, platform)
 
 def verify_oauth_state(state: str, technician_id: int, platform: str) -> bool:
-    """Verify OAuth state"""
-    if state not in oauth_states:
+    """Verify OAuth state (one-time use; expired or reused states fail)"""
+    if not state:
         return False
-    
-    stored = oauth_states[state]
-    if stored["technician_id"] != technician_id or stored["platform"] != platform:
-        return False
-    
-    # Check expiration
-    expiry = datetime.fromisoformat(stored["expires"])
-    now_utc = datetime.now(timezone.utc)
-    if expiry.tzinfo is None:
-        expiry = expiry.replace(tzinfo=timezone.utc)
-    if now_utc > expiry:
-        del oauth_states[state]
-        return False
-    
-    # Clean up after verification
-    del oauth_states[state]
-    return True
+    return oauth_state.get_store().consume(state, technician_id, platform)
 
 def get_instagram_auth_url(redirect_uri: str, state: str) -> str:
     """Build Instagram OAuth URL"""
@@ -75,112 +54,223 @@ def get_facebook_auth_url(redirect_uri: str, state: str) -> str:
     import urllib.parse
     return f"https://www.facebook.com/v18.0/dialog/oauth?{urllib.parse.urlencode(params)}"
 
-def exchange_instagram_code(code: str, redirect_uri: str) -> Optional[Dict]:
-    """Exchange Instagram code for access token"""
-    client_id = os.getenv("INSTAGRAM_CLIENT_ID")
-    client_secret = os.getenv("INSTAGRAM_CLIENT_SECRET")
-    
-    if not client_id or not client_secret:
-        return None
-    
-    token_url = "https://api.instagram.com/oauth/access_token"
-    response = requests.post(token_url, data={
-        "client_id": client_id,
-        "client_secret": client_secret,
-        "grant_type": "authorization_code",
-        "redirect_uri": redirect_uri,
-        "code": code
-    })
-    
-    if response.status_code != 200:
-        return None
-    
-    data = response.json()
-    access_token = data.get("access_token")
-    
-    # Get long-lived token (60 days)
-    long_token_url = "https://graph.instagram.com/access_token"
-    long_response = requests.get(long_token_url, params={
-        "grant_type": "ig_exchange_token",
-        "client_secret": client_secret,
-        "access_token": access_token
-    })
-    
-    if long_response.status_code == 200:
-        long_data = long_response.json()
-        access_token = long_data.get("access_token", access_token)
-    
-    # Get user info
-    user_url = "https://graph.instagram.com/me"
-    user_response = requests.get(user_url, params={
-        "fields": "id,username",
-        "access_token": access_token
-    })
-    
-    user_data = {}
-    if user_response.status_code == 200:
-        user_data = user_response.json()
-    
-    return {
-        "access_token": access_token,
-        "account_id": user_data.get("id"),
-        "account_name": user_data.get("username", "Instagram Account"),
-        "expires_in": 5184000  # 60 days in seconds
-    }
+# ---------------- OAUTH CODE EXCHANGE ----------------
+# One pooled async client per event loop; each Graph call gets its own
+# timeout so a slow lookup can't hold the request for the whole chain.
 
-def exchange_facebook_code(code: str, redirect_uri: str) -> Optional[Dict]:
-    """Exchange Facebook code for access token"""
-    app_id = os.getenv("FACEBOOK_APP_ID")
-    app_secret = os.getenv("FACEBOOK_APP_SECRET")
-    
-    if not app_id or not app_secret:
-        return None
-    
-    token_url = "https://graph.facebook.com/v18.0/oauth/access_token"
-    response = requests.get(token_url, params={
-        "client_id": app_id,
-        "client_secret": app_secret,
-        "redirect_uri": redirect_uri,
-        "code": code
-    })
-    
-    if response.status_code != 200:
-        return None
-    
-    data = response.json()
-    access_token = data.get("access_token")
-    
-    # Get pages
-    pages_url = "https://graph.facebook.com/v18.0/me/accounts"
-    pages_response = requests.get(pages_url, params={
-        "access_token": access_token
-    })
-    
-    account_name = "Facebook Page"
-    account_id = None
-    
-    if pages_response.status_code == 200:
-        pages_data = pages_response.json()
+INSTAGRAM_OAUTH_BASE_URL = os.getenv("INSTAGRAM_OAUTH_BASE_URL", "https://api.instagram.com")
+INSTAGRAM_GRAPH_BASE_URL = os.getenv("INSTAGRAM_GRAPH_BASE_URL", "https://graph.instagram.com")
+FACEBOOK_GRAPH_BASE_URL = os.getenv("FACEBOOK_GRAPH_BASE_URL", "https://graph.facebook.com")
+FACEBOOK_OAUTH_API_VERSION = "v18.0"
+
+OAUTH_TOKEN_TIMEOUT_SEC = float(os.getenv("OAUTH_TOKEN_TIMEOUT_SEC", "10"))
+OAUTH_LOOKUP_TIMEOUT_SEC = float(os.getenv("OAUTH_LOOKUP_TIMEOUT_SEC", "5"))
+OAUTH_MAX_CONNECTIONS = int(os.getenv("OAUTH_MAX_CONNECTIONS", "20"))
+
+INSTAGRAM_LONG_LIVED_EXPIRES_IN = 5184000  # 60 days in seconds
+
+
+@dataclass
+class RefreshResult:
+    ok: bool
+    access_token: Optional[str] = None
+    expires_in: Optional[int] = None
+    retryable: bool = False  # worth trying again later (timeout, 429, 5xx)
+    error: Optional[str] = None
+
+
+class OAuthClient:
+    """Async token exchange against Instagram / Facebook Graph"""
+
+    def __init__(
+        self,
+        instagram_oauth_url: str = INSTAGRAM_OAUTH_BASE_URL,
+        instagram_graph_url: str = INSTAGRAM_GRAPH_BASE_URL,
+        facebook_graph_url: str = FACEBOOK_GRAPH_BASE_URL,
+        token_timeout: float = OAUTH_TOKEN_TIMEOUT_SEC,
+        lookup_timeout: float = OAUTH_LOOKUP_TIMEOUT_SEC,
+        max_connections: int = OAUTH_MAX_CONNECTIONS,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.instagram_oauth_url = instagram_oauth_url.rstrip("/")
+        self.instagram_graph_url = instagram_graph_url.rstrip("/")
+        self.facebook_graph_url = facebook_graph_url.rstrip("/")
+        self.token_timeout = token_timeout
+        self.lookup_timeout = lookup_timeout
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def _request(self, method: str, url: str, timeout: float, **kwargs) -> Tuple[Optional[int], Dict]:
+        """(status code, JSON object body); status is None on a transport error/timeout"""
+        try:
+            response = await self._http.request(method, url, timeout=timeout, **kwargs)
+        except httpx.HTTPError as e:
+            print("⚠️  OAuth request failed:", url, type(e).__name__)
+            return None, {}
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        return response.status_code, data if isinstance(data, dict) else {}
+
+    async def _call(self, method: str, url: str, timeout: float, **kwargs) -> Optional[Dict]:
+        """JSON body of a 200 response, or None on any error/timeout"""
+        status, data = await self._request(method, url, timeout, **kwargs)
+        return data if status == 200 else None
+
+    async def exchange_instagram_code(self, code: str, redirect_uri: str) -> Optional[Dict]:
+        """Exchange Instagram code for a long-lived access token"""
+        client_id = os.getenv("INSTAGRAM_CLIENT_ID")
+        client_secret = os.getenv("INSTAGRAM_CLIENT_SECRET")
+
+        if not client_id or not client_secret:
+            return None
+
+        data = await self._call("POST", f"{self.instagram_oauth_url}/oauth/access_token", self.token_timeout, data={
+            "client_id": client_id,
+            "client_secret": client_secret,
+            "grant_type": "authorization_code",
+            "redirect_uri": redirect_uri,
+            "code": code
+        })
+        if not data or not data.get("access_token"):
+            return None
+        access_token = data["access_token"]
+
+        # The long-lived exchange and the profile lookup only need the
+        # short-lived token, so run them side by side.
+        long_data, user_data = await asyncio.gather(
+            self._call("GET", f"{self.instagram_graph_url}/access_token", self.lookup_timeout, params={
+                "grant_type": "ig_exchange_token",
+                "client_secret": client_secret,
+                "access_token": access_token
+            }),
+            self._call("GET", f"{self.instagram_graph_url}/me", self.lookup_timeout, params={
+                "fields": "id,username",
+                "access_token": access_token
+            }),
+        )
+        # A short-lived token dies within the hour; saving it with the
+        # long-lived lifetime would leave a dead account marked active.
+        if not long_data or not long_data.get("access_token"):
+            return None
+        user_data = user_data or {}
+
+        return {
+            "access_token": long_data["access_token"],
+            "account_id": user_data.get("id"),
+            "account_name": user_data.get("username", "Instagram Account"),
+            "expires_in": long_data.get("expires_in", INSTAGRAM_LONG_LIVED_EXPIRES_IN)
+        }
+
+    async def exchange_facebook_code(self, code: str, redirect_uri: str) -> Optional[Dict]:
+        """Exchange Facebook code for a page access token"""
+        app_id = os.getenv("FACEBOOK_APP_ID")
+        app_secret = os.getenv("FACEBOOK_APP_SECRET")
+
+        if not app_id or not app_secret:
+            return None
+
+        base = f"{self.facebook_graph_url}/{FACEBOOK_OAUTH_API_VERSION}"
+        data = await self._call("GET", f"{base}/oauth/access_token", self.token_timeout, params={
+            "client_id": app_id,
+            "client_secret": app_secret,
+            "redirect_uri": redirect_uri,
+            "code": code
+        })
+        if not data or not data.get("access_token"):
+            return None
+        access_token = data["access_token"]
+
+        # Page tokens depend on the user token, so this one stays sequential
+        pages_data = await self._call("GET", f"{base}/me/accounts", self.lookup_timeout, params={
+            "access_token": access_token
+        }) or {}
+
+        account_name = "Facebook Page"
+        account_id = None
         if pages_data.get("data"):
             page = pages_data["data"][0]
             access_token = page.get("access_token", access_token)
             account_name = page.get("name", account_name)
             account_id = page.get("id")
-    
-    return {
-        "access_token": access_token,
-        "account_id": account_id,
-        "account_name": account_name,
-        "expires_in": data.get("expires_in", 5184000)
-    }
+
+        return {
+            "access_token": access_token,
+            "account_id": account_id,
+            "account_name": account_name,
+            "expires_in": data.get("expires_in", INSTAGRAM_LONG_LIVED_EXPIRES_IN)
+        }
+
+
+    async def refresh_token(self, platform: str, access_token: str) -> RefreshResult:
+        """Trade a still-valid long-lived Instagram token for a fresh one"""
+        if platform == "instagram":
+            status, data = await self._request("GET", f"{self.instagram_graph_url}/refresh_access_token", self.token_timeout, params={
+                "grant_type": "ig_refresh_token",
+                "access_token": access_token
+            })
+        else:
+            return RefreshResult(ok=False, error=f"Token refresh not supported for {platform}")
+
+        if status == 200 and data.get("access_token"):
+            return RefreshResult(
+                ok=True,
+                access_token=data["access_token"],
+                expires_in=int(data.get("expires_in") or INSTAGRAM_LONG_LIVED_EXPIRES_IN),
+            )
+        error = data.get("error")
+        message = error.get("message") if isinstance(error, dict) else None
+        # Timeouts, 429 and 5xx may clear up; any other answer means the token is dead
+        retryable = status is None or status == 429 or status >= 500
+        return RefreshResult(ok=False, retryable=retryable, error=message or (f"HTTP {status}" if status else "Request failed"))
+
+
+# httpx connections are bound to the loop that opened them
+_oauth_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, OAuthClient]" = weakref.WeakKeyDictionary()
+
+
+def get_oauth_client() -> OAuthClient:
+    loop = asyncio.get_running_loop()
+    client = _oauth_clients.get(loop)
+    if client is None:
+        client = OAuthClient()
+        _oauth_clients[loop] = client
+    return client
+
+
+async def close_oauth_client() -> None:
+    client = _oauth_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def exchange_instagram_code(code: str, redirect_uri: str) -> Optional[Dict]:
+    """Exchange Instagram code for access token"""
+    return await get_oauth_client().exchange_instagram_code(code, redirect_uri)
+
+
+async def exchange_facebook_code(code: str, redirect_uri: str) -> Optional[Dict]:
+    """Exchange Facebook code for access token"""
+    return await get_oauth_client().exchange_facebook_code(code, redirect_uri)
 
 def generate_whatsapp_qr(technician_id: int) -> Tuple[str, str]:
-    """Generate WhatsApp QR code for pairing"""
+    """Pairing payload to encode in the WhatsApp QR code, plus its session id"""
     session_id = str(uuid.uuid4())
     
     # In production, integrate with WhatsApp Business API
-    # For demo, use QR code API
+    # The image itself is rendered locally (services/qr_service.py)
     qr_data = f"https://wa.me/?text=connect_{technician_id}_{session_id}"
-    qr_url = f"https://api.qrserver.com/v1/create-qr-code/?size=200x200&data={qr_data}"
     
-    return qr_url, session_id
\ No newline at end of file
+    return qr_data, session_id
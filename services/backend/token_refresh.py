@@ -0,0 +1,269 @@
+# token_refresh.py
+# Keeps SocialAccount access tokens fresh in the background. Every interval
+# the refresher pulls active accounts whose token expires within the lead
+# window (oldest expiry first, via ix_social_accounts_active_expiry) and
+# refreshes them in batches with bounded concurrency. Accounts whose token is
+# rejected, or has run out while refresh kept failing, are marked inactive
+# and the technician gets a dashboard notification to reconnect, so send
+# paths only ever read a token and never refresh one inline.
+import asyncio
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from services.backend import metrics, models, social_utils
+from services.backend.column_types import to_utc_datetime
+from services.backend.database import SessionLocal
+
+TOKEN_REFRESH_ENABLED = os.getenv("TOKEN_REFRESH_ENABLED", "true").lower() == "true"
+TOKEN_REFRESH_LEAD_SEC = int(os.getenv("TOKEN_REFRESH_LEAD_SEC", str(7 * 24 * 3600)))
+TOKEN_REFRESH_INTERVAL_SEC = float(os.getenv("TOKEN_REFRESH_INTERVAL_SEC", "3600"))
+TOKEN_REFRESH_BATCH_SIZE = int(os.getenv("TOKEN_REFRESH_BATCH_SIZE", "50"))
+TOKEN_REFRESH_CONCURRENCY = int(os.getenv("TOKEN_REFRESH_CONCURRENCY", "5"))
+TOKEN_REFRESH_RETRY_SEC = int(os.getenv("TOKEN_REFRESH_RETRY_SEC", "900"))
+
+# Platforms with a refresh grant; other tokens are only deactivated once they
+# have actually expired. That includes Facebook: the stored credential is a
+# page token, which fb_exchange_token rejects (only user tokens can be
+# exchanged), and WhatsApp system user tokens.
+REFRESHABLE_PLATFORMS = ("instagram",)
+
+_stats_lock = threading.Lock()
+_stats = {"refreshed": 0, "retrying": 0, "deactivated": 0, "batches": 0}
+
+
+def _count(key: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[key] += n
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+metrics.register("token_refresh", stats)
+
+
+@dataclass
+class DueAccount:
+    id: int
+    technician_id: int
+    platform: str
+    account_name: str
+    access_token: Optional[str]
+    expires_at: datetime
+
+
+def due_accounts(
+    db: Session,
+    now: datetime,
+    lead: int = TOKEN_REFRESH_LEAD_SEC,
+    limit: int = TOKEN_REFRESH_BATCH_SIZE,
+    skip_ids: Optional[List[int]] = None,
+) -> List[DueAccount]:
+    """Active accounts expiring before now + lead, soonest first"""
+    SA = models.SocialAccount
+    horizon = (now + timedelta(seconds=lead)).isoformat()
+    query = db.query(
+        SA.id, SA.technician_id, SA.platform, SA.account_name, SA.access_token, SA.token_expires_at
+    ).filter(
+        SA.is_active == True,  # noqa: E712
+        SA.token_expires_at != None,  # noqa: E711
+        SA.token_expires_at <= horizon,
+    )
+    if skip_ids:
+        query = query.filter(SA.id.notin_(skip_ids))
+    rows = query.order_by(SA.token_expires_at, SA.id).limit(limit).all()
+    return [
+        DueAccount(row.id, row.technician_id, row.platform, row.account_name, row.access_token, to_utc_datetime(row.token_expires_at))
+        for row in rows
+    ]
+
+
+def _unchanged(account: DueAccount):
+    """Row filter matching the account only if its token wasn't replaced meanwhile (e.g. a reconnect)"""
+    SA = models.SocialAccount
+    token = SA.access_token.is_(None) if account.access_token is None else SA.access_token == account.access_token
+    return (SA.id == account.id, token)
+
+
+def _deactivate(db: Session, account: DueAccount, reason: str, now: datetime) -> bool:
+    updated = db.query(models.SocialAccount).filter(*_unchanged(account)).update(
+        {models.SocialAccount.is_active: False}, synchronize_session=False
+    )
+    if not updated:
+        return False
+    db.add(models.DashboardNotification(
+        technician_id=account.technician_id,
+        event_type="social_disconnected",
+        title=f"Reconnect your {account.platform.title()} account",
+        message=f"{account.account_name} was disconnected: {reason}",
+        related_id=account.id,
+        is_read=False,
+        created_at=now.isoformat(),
+    ))
+    return True
+
+
+def apply_results(
+    db: Session,
+    results: List[Tuple[DueAccount, social_utils.RefreshResult]],
+    now: datetime,
+) -> List[int]:
+    """Store refreshed tokens / deactivate dead ones; returns ids to retry later"""
+    SA = models.SocialAccount
+    retry = []
+    for account, result in results:
+        if result.ok:
+            updated = db.query(SA).filter(*_unchanged(account)).update({
+                SA.access_token: result.access_token,
+                SA.token_expires_at: (now + timedelta(seconds=result.expires_in)).isoformat(),
+            }, synchronize_session=False)
+            if updated:
+                _count("refreshed")
+            continue
+
+        if not result.retryable or account.expires_at <= now:
+            if _deactivate(db, account, result.error or "token expired", now):
+                _count("deactivated")
+            continue
+
+        retry.append(account.id)
+        _count("retrying")
+    db.commit()
+    return retry
+
+
+class TokenRefresher:
+    """Background task that refreshes expiring social tokens in batches"""
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        client: Optional[social_utils.OAuthClient] = None,
+        batch_size: int = TOKEN_REFRESH_BATCH_SIZE,
+        concurrency: int = TOKEN_REFRESH_CONCURRENCY,
+        lead: int = TOKEN_REFRESH_LEAD_SEC,
+        interval: float = TOKEN_REFRESH_INTERVAL_SEC,
+        retry_delay: int = TOKEN_REFRESH_RETRY_SEC,
+    ):
+        self.session_factory = session_factory
+        self.client = client
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.lead = lead
+        self.interval = interval
+        self.retry_delay = retry_delay
+        # account id -> when to try again (transient failures, non-refreshable tokens)
+        self._retry_at: Dict[int, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def _due(self, now: datetime) -> List[DueAccount]:
+        self._retry_at = {k: v for k, v in self._retry_at.items() if v > now}
+        db = self.session_factory()
+        try:
+            return due_accounts(db, now, self.lead, self.batch_size, list(self._retry_at))
+        finally:
+            db.close()
+
+    def _apply(self, results, now: datetime) -> List[int]:
+        db = self.session_factory()
+        try:
+            return apply_results(db, results, now)
+        finally:
+            db.close()
+
+    async def _refresh(self, accounts: List[DueAccount]) -> List[social_utils.RefreshResult]:
+        client = self.client or social_utils.get_oauth_client()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def _one(account: DueAccount) -> social_utils.RefreshResult:
+            if not account.access_token:
+                return social_utils.RefreshResult(ok=False, error="no access token")
+            async with semaphore:
+                return await client.refresh_token(account.platform, account.access_token)
+
+        return list(await asyncio.gather(*(_one(a) for a in accounts)))
+
+    async def run_once(self, now: Optional[datetime] = None) -> int:
+        """Refresh one batch of due accounts; returns how many were looked at"""
+        now = now or datetime.now(timezone.utc)
+        accounts = await asyncio.to_thread(self._due, now)
+        if not accounts:
+            return 0
+
+        to_refresh = []
+        results = []
+        for account in accounts:
+            if account.platform in REFRESHABLE_PLATFORMS:
+                to_refresh.append(account)
+            elif account.expires_at <= now:
+                results.append((account, social_utils.RefreshResult(ok=False, error="token expired")))
+            else:
+                # Nothing to refresh with; check again once it has expired
+                self._retry_at[account.id] = account.expires_at
+
+        if to_refresh:
+            results.extend(zip(to_refresh, await self._refresh(to_refresh)))
+        retry_at = now + timedelta(seconds=self.retry_delay)
+        for account_id in await asyncio.to_thread(self._apply, results, now):
+            self._retry_at[account_id] = retry_at
+
+        _count("batches")
+        return len(accounts)
+
+    async def run(self) -> None:
+        while not self._stopping:
+            try:
+                handled = await self.run_once()
+            except Exception as e:
+                print("⚠️  Token refresh error:", e)
+                handled = 0
+
+            # A full batch means more accounts are due; go again right away
+            if handled < self.batch_size and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._task is None:
+            return
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=5)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        self._task = None
+
+
+refresher: Optional[TokenRefresher] = None
+
+
+async def start_refresher() -> None:
+    global refresher
+    if not TOKEN_REFRESH_ENABLED or refresher is not None:
+        return
+    refresher = TokenRefresher()
+    refresher.start()
+
+
+async def stop_refresher() -> None:
+    global refresher
+    if refresher is not None:
+        await refresher.stop()
+        refresher = None
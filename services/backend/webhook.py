@@ -1,5 +1,15 @@
-from fastapi import APIRouter, Request, HTTPException, Query
+import hashlib
+import hmac
+import json
+import os
+
+from fastapi import APIRouter, Depends, Request, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import Response
+from sqlalchemy.orm import Session
+
+from services.backend import webhook_dedup, webhook_inbox
+from services.backend.database import get_db
 
 router = APIRouter()
 
@@ -7,7 +17,24 @@ router = APIRouter()
 # META / INSTAGRAM WEBHOOK CONFIG
 # ==================================================
 
-VERIFY_TOKEN = "aiva_saas_verify_token_2025"
+VERIFY_TOKEN = os.getenv("VERIFY_TOKEN", "aiva_saas_verify_token_2025")
+
+
+def _instagram_verify_token() -> str:
+    return os.getenv("INSTAGRAM_VERIFY_TOKEN", VERIFY_TOKEN)
+
+
+def _signature_enforced() -> bool:
+    return os.getenv("INSTAGRAM_WEBHOOK_ENFORCE_SIGNATURE", "false").lower() == "true"
+
+
+def _signature_valid(raw: bytes, header: str) -> bool:
+    """Check X-Hub-Signature-256 against the app secret"""
+    secret = os.getenv("INSTAGRAM_WEBHOOK_SECRET") or os.getenv("INSTAGRAM_CLIENT_SECRET") or ""
+    if not secret or not header or not header.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode("utf-8"), raw, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, header[len("sha256="):])
 
 
 # ==================================================
@@ -31,18 +58,91 @@ async def verify_webhook(
     raise HTTPException(status_code=403, detail="Webhook verification failed")
 
 
+@router.get("/webhooks/instagram")
+async def verify_instagram_webhook(
+    hub_mode: str = Query(None, alias="hub.mode"),
+    hub_challenge: str = Query(None, alias="hub.challenge"),
+    hub_verify_token: str = Query(None, alias="hub.verify_token"),
+):
+    """Instagram subscription handshake (INSTAGRAM_VERIFY_TOKEN)"""
+
+    if hub_mode == "subscribe" and hub_verify_token == _instagram_verify_token():
+        return Response(content=hub_challenge, media_type="text/plain")
+
+    raise HTTPException(status_code=403, detail="Webhook verification failed")
+
+
 # ==================================================
 # WEBHOOK RECEIVER (Instagram events will come here)
 # ==================================================
 
+async def _ingest(request: Request, db: Session, source: str) -> dict:
+    """
+    Verify, append to the inbox and acknowledge. Parsing, session lookup and
+    replies happen in webhook_inbox workers so Meta gets its 200 in
+    milliseconds and never times out / retries under load.
+    """
+
+    raw = await request.body()
+
+    if _signature_enforced() and not _signature_valid(raw, request.headers.get("X-Hub-Signature-256", "")):
+        raise HTTPException(status_code=403, detail="Invalid webhook signature")
+
+    try:
+        payload = json.loads(raw)
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+
+    # Meta redelivers on timeouts/5xx; drop events already seen in the
+    # replay window before touching the database.
+    claimed = webhook_dedup.index.claim(payload)
+    if claimed.payload is None:
+        return {"status": "duplicate"}
+
+    try:
+        event_id = await run_in_threadpool(_store_event, db, source, raw, claimed)
+    except Exception:
+        webhook_dedup.index.forget(claimed.keys)
+        raise
+    if event_id is None:
+        return {"status": "duplicate"}
+
+    # A deferred event (busy pipeline) goes back to pending for the recovery
+    # sweep; without a pipeline it was never claimed in the first place.
+    if webhook_inbox.pipeline is not None and not webhook_inbox.pipeline.submit(event_id, claimed.payload):
+        await run_in_threadpool(webhook_inbox.release_event, db, event_id)
+
+    return {"status": "received"}
+
+
+def _store_event(db: Session, source: str, raw: bytes, claimed: webhook_dedup.DedupResult):
+    """Claim keys in the shared index (if enabled) and append to the inbox in one transaction"""
+    if webhook_dedup.WEBHOOK_DEDUP_DB:
+        shared = webhook_dedup.claim_db(db, claimed.payload)
+        if shared.payload is None:
+            db.commit()
+            return None
+        claimed.dropped += shared.dropped
+
+    if claimed.dropped:
+        raw = json.dumps(claimed.payload).encode("utf-8")
+    return webhook_inbox.persist_event(db, source, raw, claim=webhook_inbox.pipeline is not None)
+
+
 @router.post("/webhook")
-async def receive_webhook(request: Request):
+async def receive_webhook(request: Request, db: Session = Depends(get_db)):
     """
     Receives Instagram / Meta webhook events.
     Always respond 200 OK so Meta doesn't retry.
     """
 
-    payload = await request.json()
-    print("📥 Instagram Webhook Event:", payload)
+    return await _ingest(request, db, "meta")
+
+
+@router.post("/webhooks/instagram")
+async def receive_instagram_webhook(request: Request, db: Session = Depends(get_db)):
+    """Receives Instagram messaging webhook events"""
 
-    return {"status": "received"}
\ No newline at end of file
+    return await _ingest(request, db, "instagram")
@@ -0,0 +1,215 @@
+# webhook_dedup.py
+# Replay-window dedup for Meta webhook redeliveries. Every messaging event,
+# WhatsApp message and status callback gets a key (its mid / wamid, or a
+# hash of the event when there is none). Keys live in time buckets so a
+# whole bucket expires at once instead of tracking a TTL per key; with
+# WEBHOOK_DEDUP_DB=true the keys are also claimed in webhook_dedup_keys so
+# several workers/processes share one index.
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from services.backend import metrics, models
+
+REPLAY_WINDOW_SEC = int(os.getenv("INSTAGRAM_WEBHOOK_REPLAY_WINDOW_SEC", "300"))
+WEBHOOK_DEDUP_BUCKETS = int(os.getenv("WEBHOOK_DEDUP_BUCKETS", "10"))
+WEBHOOK_DEDUP_MAX_KEYS = int(os.getenv("WEBHOOK_DEDUP_MAX_KEYS", "100000"))
+WEBHOOK_DEDUP_DB = os.getenv("WEBHOOK_DEDUP_DB", "false").lower() == "true"
+
+
+@dataclass
+class DedupResult:
+    payload: Optional[dict]  # None when every event was a duplicate
+    keys: List[str] = field(default_factory=list)  # keys claimed by this delivery
+    dropped: int = 0
+
+
+# ==========================
+# EVENT KEYS
+# ==========================
+
+def _hash_event(event: dict) -> str:
+    raw = json.dumps(event, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _messaging_key(event: dict) -> str:
+    mid = (event.get("message") or {}).get("mid") or (event.get("postback") or {}).get("mid")
+    return f"mid:{mid}" if mid else f"evt:{_hash_event(event)}"
+
+
+def _events(payload: dict) -> Iterator[Tuple[dict, str, dict, str]]:
+    """Yield (container, field, event, key) for every event in a Meta payload"""
+    for entry in payload.get("entry") or []:
+        for event in entry.get("messaging") or []:
+            yield entry, "messaging", event, _messaging_key(event)
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            for message in value.get("messages") or []:
+                key = f"wamid:{message['id']}" if message.get("id") else f"evt:{_hash_event(message)}"
+                yield value, "messages", message, key
+            for status in value.get("statuses") or []:
+                # One message gets several callbacks (sent, delivered, read)
+                yield value, "statuses", status, f"status:{status.get('id')}:{status.get('status')}"
+
+
+def _filter(payload: dict, is_new) -> DedupResult:
+    """Keep only events for which is_new(key) is true; drops emptied entries"""
+    kept = {}
+    result = DedupResult(payload=payload)
+    for container, name, event, key in list(_events(payload)):
+        bucket = kept.setdefault((id(container), name), (container, name, []))[2]
+        if is_new(key):
+            bucket.append(event)
+            result.keys.append(key)
+        else:
+            result.dropped += 1
+
+    if not result.dropped:
+        return result
+    if not result.keys:
+        return DedupResult(payload=None, dropped=result.dropped)
+
+    for container, name, events in kept.values():
+        container[name] = events
+    payload["entry"] = [
+        entry for entry in payload.get("entry") or []
+        if entry.get("messaging") or any(
+            (change.get("value") or {}).get("messages") or (change.get("value") or {}).get("statuses")
+            for change in entry.get("changes") or []
+        )
+    ]
+    return result
+
+
+# ==========================
+# IN-MEMORY INDEX
+# ==========================
+
+class ReplayIndex:
+    """Time-bucketed set of recently seen event keys (thread-safe)"""
+
+    def __init__(
+        self,
+        window: int = REPLAY_WINDOW_SEC,
+        buckets: int = WEBHOOK_DEDUP_BUCKETS,
+        max_keys: int = WEBHOOK_DEDUP_MAX_KEYS,
+    ):
+        self.window = window
+        self.buckets = max(1, buckets)
+        self.bucket_width = max(1.0, window / self.buckets)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[int, Set[bytes]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.counters = {"checked": 0, "duplicates": 0, "evicted": 0}
+
+    @staticmethod
+    def _digest(key: str) -> bytes:
+        # 12-byte digests keep the index compact regardless of mid length
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=12).digest()
+
+    def _expire(self, current: int) -> None:
+        oldest_live = current - self.buckets
+        while self._buckets:
+            bucket_id, keys = next(iter(self._buckets.items()))
+            if bucket_id > oldest_live and self._size <= self.max_keys:
+                break
+            if bucket_id > oldest_live:
+                self.counters["evicted"] += len(keys)
+            self._buckets.popitem(last=False)
+            self._size -= len(keys)
+
+    def add(self, key: str, now: Optional[float] = None) -> bool:
+        """Record a key; False if it was already seen inside the window"""
+        digest = self._digest(key)
+        current = int((time.time() if now is None else now) // self.bucket_width)
+        with self._lock:
+            self._expire(current)
+            self.counters["checked"] += 1
+            if any(digest in keys for keys in self._buckets.values()):
+                self.counters["duplicates"] += 1
+                return False
+            self._buckets.setdefault(current, set()).add(digest)
+            self._size += 1
+            return True
+
+    def forget(self, keys: List[str]) -> None:
+        """Un-claim keys whose delivery could not be stored, so a retry gets through"""
+        digests = {self._digest(key) for key in keys}
+        with self._lock:
+            for bucket in self._buckets.values():
+                before = len(bucket)
+                bucket -= digests
+                self._size -= before - len(bucket)
+
+    def claim(self, payload: dict) -> DedupResult:
+        return _filter(payload, self.add)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self._size = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "keys": self._size, "buckets": len(self._buckets), "db_backed": WEBHOOK_DEDUP_DB}
+
+
+index = ReplayIndex()
+metrics.register("webhook_dedup", index.stats)
+
+
+# ==========================
+# DB BACKING
+# ==========================
+
+_last_sweep = 0.0
+
+
+def _sweep(db: Session, now: datetime, window: int) -> None:
+    global _last_sweep
+    if time.monotonic() - _last_sweep < max(1.0, window / WEBHOOK_DEDUP_BUCKETS):
+        return
+    _last_sweep = time.monotonic()
+    cutoff = (now - timedelta(seconds=window)).isoformat()
+    db.query(models.WebhookDedupKey).filter(
+        models.WebhookDedupKey.seen_at < cutoff
+    ).delete(synchronize_session=False)
+
+
+def claim_db(db: Session, payload: dict, window: int = REPLAY_WINDOW_SEC) -> DedupResult:
+    """Claim event keys in webhook_dedup_keys; joins the caller's transaction (no commit)"""
+    now = datetime.now(timezone.utc)
+    cutoff = (now - timedelta(seconds=window)).isoformat()
+    _sweep(db, now, window)
+
+    def is_new(key: str) -> bool:
+        row = db.query(models.WebhookDedupKey).filter(models.WebhookDedupKey.key == key).first()
+        if row is not None:
+            if row.seen_at >= cutoff:
+                return False
+            row.seen_at = now.isoformat()  # expired; reclaim
+            return True
+        try:
+            with db.begin_nested():
+                db.add(models.WebhookDedupKey(key=key, seen_at=now.isoformat()))
+        except IntegrityError:
+            # Another worker claimed it first
+            return False
+        return True
+
+    return _filter(payload, is_new)
@@ -0,0 +1,448 @@
+# webhook_inbox.py
+# Webhook ingestion pipeline. The HTTP handlers only verify the request,
+# append the raw body to webhook_events and hand it to WebhookPipeline; the
+# pipeline parses the event and fans messages out to worker queues sharded
+# by (account, sender), so one conversation is processed in order while
+# different conversations run in parallel.
+import asyncio
+import json
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from services.backend import knowledge, metrics, models, outbox
+from services.backend.database import SessionLocal
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_RECOVERY_INTERVAL_SEC = float(os.getenv("WEBHOOK_RECOVERY_INTERVAL_SEC", "30"))
+WEBHOOK_LEASE_SEC = float(os.getenv("WEBHOOK_LEASE_SEC", "300"))  # a claimed event is reclaimable after this
+
+
+@dataclass
+class InboundMessage:
+    platform: str  # instagram | whatsapp | facebook
+    account_id: str  # our page / phone number ID the message was sent to
+    sender_id: str
+    mid: Optional[str] = None
+    text: Optional[str] = None
+    timestamp: Optional[int] = None
+
+
+@dataclass
+class StatusUpdate:
+    provider_message_id: str
+    status: str  # sent | delivered | read | failed
+
+
+_stats_lock = threading.Lock()
+_stats = {"received": 0, "processed": 0, "failed": 0, "deferred": 0, "auto_replies": 0}
+
+
+def _count(key: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[key] += n
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# ==========================
+# PARSING
+# ==========================
+
+def parse_payload(payload: dict) -> List[object]:
+    """Flatten a Meta webhook payload into InboundMessage / StatusUpdate items"""
+    items: List[object] = []
+    obj = payload.get("object")
+    platform = "facebook" if obj == "page" else "instagram"
+
+    for entry in payload.get("entry") or []:
+        # Instagram / Messenger: entry[].messaging[]
+        for event in entry.get("messaging") or []:
+            message = event.get("message") or {}
+            sender = (event.get("sender") or {}).get("id")
+            recipient = (event.get("recipient") or {}).get("id") or entry.get("id")
+            if not sender or not recipient or message.get("is_echo"):
+                continue
+            items.append(InboundMessage(
+                platform=platform,
+                account_id=str(recipient),
+                sender_id=str(sender),
+                mid=message.get("mid"),
+                text=message.get("text"),
+                timestamp=event.get("timestamp"),
+            ))
+
+        # WhatsApp Cloud API: entry[].changes[].value.{messages,statuses}
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            phone_id = (value.get("metadata") or {}).get("phone_number_id")
+            for message in value.get("messages") or []:
+                if not phone_id or not message.get("from"):
+                    continue
+                items.append(InboundMessage(
+                    platform="whatsapp",
+                    account_id=str(phone_id),
+                    sender_id=str(message["from"]),
+                    mid=message.get("id"),
+                    text=(message.get("text") or {}).get("body"),
+                    timestamp=int(message["timestamp"]) if str(message.get("timestamp", "")).isdigit() else None,
+                ))
+            for status in value.get("statuses") or []:
+                if status.get("id") and status.get("status"):
+                    items.append(StatusUpdate(provider_message_id=status["id"], status=status["status"]))
+
+    return items
+
+
+# ==========================
+# PROCESSING
+# ==========================
+
+def process_message(db: Session, item: InboundMessage) -> None:
+    """Default handler: attribute the message to a technician and log it.
+
+    FAQ-style questions (prices, hours, deposit, how to pay) are answered
+    straight from the technician's knowledge snapshot via the outbox.
+    """
+    account = db.query(models.SocialAccount).filter(
+        models.SocialAccount.account_id == item.account_id,
+        models.SocialAccount.is_active == True,  # noqa: E712
+    ).first()
+    if not account:
+        return
+
+    db.add(models.MessageLog(
+        technician_id=account.technician_id,
+        platform=item.platform,
+        direction="incoming",
+        sender_id=item.sender_id,
+        recipient_id=item.account_id,
+        message_content=item.text,
+        status="received",
+        created_at=_now(),
+    ))
+
+    snapshot = knowledge.store.get(db, account.technician_id)
+    answer = snapshot.answer(item.text) if snapshot is not None and snapshot.auto_reply_enabled else None
+    if answer is not None:
+        outbox.enqueue_message(
+            db, account.technician_id, item.platform, item.sender_id, answer.text,
+            sender_id=item.account_id, social_account_id=account.id, commit=False,
+        )
+    db.commit()
+    if answer is not None:
+        outbox.wake()
+        _count("auto_replies")
+
+
+def process_item(db: Session, item: object, handler: Callable[[Session, InboundMessage], None] = process_message) -> None:
+    if isinstance(item, StatusUpdate):
+        outbox.update_delivery_status(db, item.provider_message_id, item.status)
+    else:
+        handler(db, item)
+
+
+# ==========================
+# INBOX
+# ==========================
+
+def _lease() -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=WEBHOOK_LEASE_SEC)).isoformat()
+
+
+def persist_event(db: Session, source: str, raw: bytes, claim: bool = False) -> int:
+    """Append the raw delivery to the inbox (the only work done before the 200).
+
+    With claim=True the event is leased to this process's pipeline, so
+    recovery in other processes leaves it alone.
+    """
+    event = models.WebhookEvent(
+        source=source,
+        payload=raw.decode("utf-8", errors="replace"),
+        status="processing" if claim else "pending",
+        received_at=_now(),
+        lease_until=_lease() if claim else None,
+    )
+    db.add(event)
+    db.commit()
+    _count("received")
+    return event.id
+
+
+def release_event(db: Session, event_id: int) -> None:
+    """Hand a claimed event back to recovery (the pipeline deferred it)"""
+    db.query(models.WebhookEvent).filter(
+        models.WebhookEvent.id == event_id,
+        models.WebhookEvent.status == "processing",
+    ).update({models.WebhookEvent.status: "pending", models.WebhookEvent.lease_until: None}, synchronize_session=False)
+    db.commit()
+
+
+def _claimable(now: str):
+    WE = models.WebhookEvent
+    return or_(
+        WE.status == "pending",
+        # Events whose process died mid-way become claimable once the lease expires
+        and_(WE.status == "processing", WE.lease_until < now),
+    )
+
+
+def claim_pending(db: Session, limit: int) -> List[tuple]:
+    """Lease up to `limit` unclaimed events in id order; returns (id, payload) pairs"""
+    WE = models.WebhookEvent
+    now = _now()
+    lease = _lease()
+    candidates = db.query(WE.id, WE.payload).filter(_claimable(now)).order_by(WE.id).limit(limit).all()
+
+    claimed = []
+    for event_id, payload in candidates:
+        # Conditional update so two processes can't both claim the same event
+        updated = db.query(WE).filter(WE.id == event_id, _claimable(now)).update(
+            {WE.status: "processing", WE.lease_until: lease},
+            synchronize_session=False,
+        )
+        if updated:
+            claimed.append((event_id, payload))
+    db.commit()
+    return claimed
+
+
+def _mark_event(session_factory, event_id: int, error: Optional[str]) -> None:
+    db = session_factory()
+    try:
+        db.query(models.WebhookEvent).filter(models.WebhookEvent.id == event_id).update(
+            {
+                models.WebhookEvent.status: "failed" if error else "processed",
+                models.WebhookEvent.error: error,
+                models.WebhookEvent.processed_at: _now(),
+                models.WebhookEvent.lease_until: None,
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+class WebhookPipeline:
+    """Sharded asyncio worker pool over the webhook inbox"""
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        workers: int = WEBHOOK_WORKERS,
+        queue_size: int = WEBHOOK_QUEUE_SIZE,
+        handler: Callable[[Session, InboundMessage], None] = process_message,
+        recovery_interval: float = WEBHOOK_RECOVERY_INTERVAL_SEC,
+    ):
+        self.session_factory = session_factory
+        self.handler = handler
+        self.recovery_interval = recovery_interval
+        self.queue_size = queue_size
+        self.workers = workers
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Dict[int, List] = {}  # event id -> [items left, first error]
+        # Conversation key -> newest event deferred for it; later events for
+        # the key wait behind it so a conversation is never reordered
+        self._deferred: Dict[tuple, int] = {}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @staticmethod
+    def shard_key(item: object) -> tuple:
+        if isinstance(item, InboundMessage):
+            return (item.account_id, item.sender_id)
+        return ("status", item.provider_message_id)
+
+    def submit(self, event_id: int, payload: dict, recovering: bool = False) -> bool:
+        """Queue an event's items; False if it was deferred (recovery retries it).
+
+        An event is deferred when its shard queues are full or, outside
+        recovery, when an earlier event of the same conversation is still
+        waiting there. Recovery submits in id order, so it may go ahead.
+        """
+        if event_id in self._pending:
+            return True
+
+        items = parse_payload(payload)
+        keys = [self.shard_key(item) for item in items]
+        shards = [hash(key) % self.workers for key in keys]
+        needed: Dict[int, int] = {}
+        for shard in shards:
+            needed[shard] = needed.get(shard, 0) + 1
+        behind = not recovering and any(key in self._deferred for key in keys)
+        if behind or any(self._queues[s].qsize() + n > self.queue_size for s, n in needed.items()):
+            for key in keys:
+                self._deferred[key] = max(event_id, self._deferred.get(key, 0))
+            _count("deferred")
+            return False
+        for key in keys:
+            if self._deferred.get(key) == event_id:
+                del self._deferred[key]  # nothing newer is waiting for this conversation
+
+        if not items:
+            self._pending[event_id] = [1, None]
+            self._finish(event_id, None)
+            return True
+
+        self._pending[event_id] = [len(items), None]
+        for shard, item in zip(shards, items):
+            self._queues[shard].put_nowait((event_id, item))
+        return True
+
+    def _finish(self, event_id: int, error: Optional[str]) -> None:
+        state = self._pending.get(event_id)
+        if state is None:
+            return
+        state[0] -= 1
+        state[1] = state[1] or error
+        if state[0] <= 0:
+            asyncio.get_running_loop().create_task(self._close_event(event_id, state[1]))
+
+    async def _close_event(self, event_id: int, error: Optional[str]) -> None:
+        try:
+            await asyncio.to_thread(_mark_event, self.session_factory, event_id, error)
+        finally:
+            self._pending.pop(event_id, None)
+            _count("failed" if error else "processed")
+
+    def _handle(self, item: object) -> None:
+        db = self.session_factory()
+        try:
+            process_item(db, item, self.handler)
+        finally:
+            db.close()
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            event_id, item = await queue.get()
+            error = None
+            try:
+                await asyncio.to_thread(self._handle, item)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            finally:
+                queue.task_done()
+                self._finish(event_id, error)
+
+    def _claim(self) -> List[tuple]:
+        db = self.session_factory()
+        try:
+            return claim_pending(db, self.queue_size)
+        finally:
+            db.close()
+
+    def _release(self, event_ids: List[int]) -> None:
+        db = self.session_factory()
+        try:
+            for event_id in event_ids:
+                release_event(db, event_id)
+        finally:
+            db.close()
+
+    def _still_pending(self, event_ids: List[int]) -> set:
+        db = self.session_factory()
+        try:
+            return {event_id for (event_id,) in db.query(models.WebhookEvent.id).filter(
+                models.WebhookEvent.id.in_(event_ids),
+                models.WebhookEvent.status == "pending",
+            ).all()}
+        finally:
+            db.close()
+
+    async def recover(self) -> int:
+        """Claim and re-submit inbox events nobody is processing (crash, restart or a full queue)"""
+        if self._deferred:
+            # Deferred events another process has since claimed no longer hold their conversations back
+            waiting = await asyncio.to_thread(self._still_pending, sorted(set(self._deferred.values())))
+            self._deferred = {key: event_id for key, event_id in self._deferred.items() if event_id in waiting}
+
+        submitted = 0
+        claimed = await asyncio.to_thread(self._claim)
+        for n, (event_id, raw) in enumerate(claimed):
+            try:
+                payload = json.loads(raw)
+            except ValueError:
+                payload = None
+            if not isinstance(payload, dict):
+                await asyncio.to_thread(_mark_event, self.session_factory, event_id, "Invalid JSON payload")
+                continue
+            if not self.submit(event_id, payload, recovering=True):
+                # Hand this and the rest back in one go; the next sweep resumes in order
+                await asyncio.to_thread(self._release, [e for e, _ in claimed[n:]])
+                break
+            submitted += 1
+        return submitted
+
+    async def _recovery_loop(self) -> None:
+        await self.recover()
+        while True:
+            await asyncio.sleep(self.recovery_interval)
+            try:
+                await self.recover()
+            except Exception as e:
+                print("⚠️  Webhook recovery error:", e)
+
+    async def join(self) -> None:
+        """Wait until every queued item has been processed (used by tests and shutdown)"""
+        for queue in self._queues:
+            await queue.join()
+        while self._pending:
+            await asyncio.sleep(0.01)
+
+    def start(self, recover: bool = True) -> None:
+        self._queues = [asyncio.Queue() for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._worker(q)) for q in self._queues]
+        if recover:
+            self._tasks.append(asyncio.create_task(self._recovery_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            **_stats,
+            "queued": sum(q.qsize() for q in self._queues),
+            "events_in_flight": len(self._pending),
+        }
+
+
+pipeline: Optional[WebhookPipeline] = None
+
+
+def stats() -> dict:
+    if pipeline is not None:
+        return pipeline.stats()
+    with _stats_lock:
+        return dict(_stats)
+
+
+metrics.register("webhook_inbox", stats)
+
+
+async def start_pipeline() -> None:
+    global pipeline
+    if pipeline is None:
+        pipeline = WebhookPipeline()
+        pipeline.start()
+
+
+async def stop_pipeline() -> None:
+    global pipeline
+    if pipeline is not None:
+        await pipeline.stop()
+        pipeline = None
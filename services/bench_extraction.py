@@ -0,0 +1,57 @@
+# bench_extraction.py
+# Per-message cost of extraction.extract() on typical DMs against a small
+# service catalog: exact and misspelt service names, dates and times,
+# contact details and one-word replies.
+#
+#   python -m services.bench_extraction --iterations 20000
+import argparse
+import statistics
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from services.backend import extraction
+
+SERVICES = [
+    "Lash Lift", "Lash Extensions Classic", "Lash Extensions Hybrid", "Brow Tint",
+    "Brow Lamination", "Brow Wax", "Lash Lift & Tint", "Infill 2 Weeks", "Removal",
+]
+
+MESSAGES = [
+    "yes please",
+    "brow tint friday 10:30",
+    "Hi I'm Amy, can I get a lash lift tomorrow at 2pm?",
+    "lash lfit",
+    "brow lamnation next tuesday",
+    "07700 900123",
+    "amy@example.com",
+    "what services do you have?",
+]
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark local chat message extraction")
+    parser.add_argument("--iterations", type=int, default=20000, help="Calls per message")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed repeats (median reported)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = _parse_args()
+    matcher = extraction.service_matcher([SimpleNamespace(id=i, name=name) for i, name in enumerate(SERVICES, 1)])
+    now = datetime.now(timezone.utc)
+    print(f"{len(SERVICES)} services, {args.iterations} calls x {args.repeats} repeats per message\n")
+    print(f"{'message':<52} {'µs/call':>8}  result")
+    for message in MESSAGES:
+        timings = []
+        for _ in range(args.repeats):
+            started = time.perf_counter()
+            for _ in range(args.iterations):
+                result = extraction.extract(message, matcher, now=now)
+            timings.append((time.perf_counter() - started) / args.iterations * 1e6)
+        found = ", ".join(f"{key}={getattr(result, key)}" for key in result.entities)
+        print(f"{message:<52} {statistics.median(timings):>8.1f}  {result.intent} ({result.confidence:.2f}) {found}")
+
+
+if __name__ == "__main__":
+    main()
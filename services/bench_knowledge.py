@@ -0,0 +1,90 @@
+# bench_knowledge.py
+# Cost of answering FAQ-style DMs: querying the tables for each message (what
+# a handler without snapshots would do) against a warm KnowledgeSnapshot.
+# Uses a throwaway SQLite file so the database round trips are real.
+#
+#   python -m services.bench_knowledge --iterations 2000
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from services.backend import knowledge, models
+from services.backend.database import Base
+
+SERVICES = [
+    ("Lash Lift", 45.0, 60), ("Lash Extensions Classic", 70.0, 120), ("Brow Tint", 20.0, 30),
+    ("Brow Lamination", 40.0, 45), ("Brow Wax", 12.0, 15), ("Infill 2 Weeks", 35.0, 60),
+]
+
+MESSAGES = [
+    "how much is a lash lift?",
+    "what are your opening hours?",
+    "do you take a deposit?",
+    "can I pay by card?",
+    "prices",
+]
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark FAQ replies from knowledge snapshots")
+    parser.add_argument("--iterations", type=int, default=2000, help="Answers per message and mode")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed repeats (median reported)")
+    return parser.parse_args()
+
+
+def _seed(db) -> None:
+    db.add(models.Technician(
+        full_name="Tech", business_name="Lash Studio", email="t@example.com", password="x",
+        deposit_required=True, deposit_amount=10.0, payment_provider="stripe",
+    ))
+    db.add_all(models.Service(technician_id=1, name=n, price=p, duration=d) for n, p, d in SERVICES)
+    db.add_all(
+        models.Availability(technician_id=1, day=day, start_time="09:00", end_time="18:00")
+        for day in ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday")
+    )
+    db.commit()
+
+
+def _time(fn, args) -> float:
+    timings = []
+    for _ in range(args.repeats):
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            fn()
+        timings.append((time.perf_counter() - started) / args.iterations * 1e6)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    args = _parse_args()
+    path = os.path.join(tempfile.mkdtemp(), "bench_knowledge.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    _seed(db)
+    store = knowledge.KnowledgeStore()
+
+    def per_message(message):
+        facts = knowledge.load_facts(db, 1)
+        return knowledge.freeze(1, facts, 1, "").answer(message)
+
+    print(f"{len(SERVICES)} services, {args.iterations} answers x {args.repeats} repeats per message\n")
+    print(f"{'message':<32} {'query µs':>9} {'snapshot µs':>12}  topic")
+    try:
+        for message in MESSAGES:
+            queried = _time(lambda: per_message(message), args)
+            warm = _time(lambda: store.get(db, 1).answer(message), args)
+            print(f"{message:<32} {queried:>9.1f} {warm:>12.1f}  {store.get(db, 1).answer(message).topic}")
+    finally:
+        db.close()
+        engine.dispose()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
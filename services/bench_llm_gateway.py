@@ -0,0 +1,121 @@
+# bench_llm_gateway.py
+# Latency and model calls for a burst of DMs through llm_gateway, against the
+# local fake model server (no network, no API key). Runs the same workload
+# with the response cache off and on, then compares time to first chunk of a
+# streamed reply with a whole non-streamed one.
+#
+#   python -m services.bench_llm_gateway --messages 400 --latency-ms 400
+#
+# The workload is mostly repeated or reworded FAQs ("price?", "how much?",
+# "where are you?") plus a share of one-off questions, arriving at random
+# intervals.
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from services.backend import llm_gateway
+from services.fake_model_server import FakeModelServer
+
+FAQS = [
+    ("price?", "how much?", "what's the price", "prices please"),
+    ("where are you?", "where are you located?", "what's your address"),
+    ("what are your opening hours?", "opening hours?", "when are you open"),
+    ("do you take a deposit?", "is there a deposit", "deposit?"),
+    ("do you do lash lifts and brow tints?", "do you do lash lifts and brow tints too?"),
+]
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the LLM gateway against a fake model server")
+    parser.add_argument("--messages", type=int, default=400, help="Messages per mode")
+    parser.add_argument("--technicians", type=int, default=5, help="Technicians the messages are spread over")
+    parser.add_argument("--unique", type=float, default=0.3, help="Share of one-off (uncacheable) questions")
+    parser.add_argument("--rate", type=float, default=40, help="Messages arriving per second")
+    parser.add_argument("--latency-ms", type=float, default=400, help="Fake model time to first byte")
+    parser.add_argument("--token-ms", type=float, default=15, help="Fake model delay per streamed token")
+    return parser.parse_args()
+
+
+def _workload(args) -> list:
+    rng = random.Random(7)
+    work = []
+    for n in range(args.messages):
+        technician_id = rng.randrange(1, args.technicians + 1)
+        if rng.random() < args.unique:
+            message = f"I had a lash lift {n} days ago, is it normal for them to feel stiff?"
+        else:
+            message = rng.choice(rng.choice(FAQS))
+        work.append((technician_id, message, rng.expovariate(args.rate)))
+    return work
+
+
+async def _run(server: FakeModelServer, work: list, cache: bool) -> dict:
+    templates = {tid: llm_gateway.render_template(tid, f"Studio {tid}") for tid in {t for t, _, _ in work}}
+    before = len(server.requests)
+    latencies = []
+
+    async with llm_gateway.LLMGateway(
+        base_url=server.url,
+        responses=llm_gateway.ResponseCache(enabled=cache),
+        budget=llm_gateway.TokenBudget(daily_limit=0),
+        queue_timeout=600,
+    ) as gateway:
+        async def one(technician_id: int, message: str):
+            started = time.perf_counter()
+            await gateway.complete(templates[technician_id], message)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        tasks = []
+        for technician_id, message, gap in work:
+            await asyncio.sleep(gap)
+            tasks.append(asyncio.create_task(one(technician_id, message)))
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "calls": len(server.requests) - before,
+        "wall_s": wall,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+async def _first_chunk(server: FakeModelServer) -> tuple:
+    template = llm_gateway.render_template(1, "Studio")
+    async with llm_gateway.LLMGateway(base_url=server.url, responses=llm_gateway.ResponseCache(enabled=False)) as gateway:
+        started = time.perf_counter()
+        await gateway.complete(template, "tell me about aftercare")
+        whole = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        first = None
+        async for _ in gateway.stream(template, "tell me about aftercare"):
+            if first is None:
+                first = (time.perf_counter() - started) * 1000
+    return whole, first
+
+
+def main() -> None:
+    args = _parse_args()
+    server = FakeModelServer(args.latency_ms / 1000, args.token_ms / 1000).start()
+    try:
+        work = _workload(args)
+        print(f"{len(work)} messages over {args.technicians} technicians at ~{args.rate:.0f}/s, {args.unique:.0%} one-off")
+        print(f"fake model: {args.latency_ms:.0f} ms to first byte\n")
+        print(f"{'mode':<18} {'model calls':>11} {'wall s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for label, cache in (("no response cache", False), ("gateway", True)):
+            result = asyncio.run(_run(server, work, cache))
+            print(f"{label:<18} {result['calls']:>11} {result['wall_s']:>8.2f} {result['p50_ms']:>8.0f} {result['p95_ms']:>8.0f}")
+
+        whole, first = asyncio.run(_first_chunk(server))
+        print(f"\nwhole reply {whole:.0f} ms, streamed first chunk {first:.0f} ms")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
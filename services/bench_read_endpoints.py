@@ -0,0 +1,137 @@
+# bench_read_endpoints.py
+# Throughput of the same read endpoint served through the sync Session path
+# (FastAPI threadpool) and the AsyncSession path, driven in-process over ASGI.
+#
+#   python -m services.bench_read_endpoints --requests 2000 --concurrency 200
+#
+# Without DATABASE_URL a throwaway SQLite file is created and seeded. Point
+# DATABASE_URL at Postgres (with asyncpg installed) to include real network
+# round trips, which is where the threadpool cap shows most.
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark sync vs async DB read endpoints")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per mode")
+    parser.add_argument("--concurrency", type=int, default=200, help="Requests in flight")
+    parser.add_argument("--rows", type=int, default=500, help="Notifications to seed")
+    parser.add_argument("--limit", type=int, default=20, help="Page size requested")
+    return parser.parse_args()
+
+
+def _build_app():
+    from fastapi import Depends, FastAPI
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import Session
+
+    from services.backend import models, pagination
+    from services.backend.database import get_async_db, get_db
+
+    app = FastAPI()
+    N = models.DashboardNotification
+    fields = ("id", "event_type", "title", "message", "is_read", "created_at")
+
+    @app.get("/sync/notifications/{technician_id}")
+    def sync_notifications(technician_id: int, limit: int = 20, db: Session = Depends(get_db)):
+        page = pagination.keyset_page(db.query(N).filter(N.technician_id == technician_id), N, limit)
+        return {"notifications": pagination.serialize(page["items"], fields)}
+
+    @app.get("/async/notifications/{technician_id}")
+    async def async_notifications(technician_id: int, limit: int = 20, db: AsyncSession = Depends(get_async_db)):
+        page = await pagination.keyset_page_async(db, select(N).where(N.technician_id == technician_id), N, limit)
+        return {"notifications": pagination.serialize(page["items"], fields)}
+
+    return app
+
+
+def _seed(rows: int) -> int:
+    from datetime import datetime, timedelta, timezone
+
+    from services.backend import models
+    from services.backend.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        tech = models.Technician(full_name="Bench", business_name="Bench", email=f"bench_{time.time_ns()}@example.com", password="x")
+        db.add(tech)
+        db.flush()
+        start = datetime.now(timezone.utc) - timedelta(seconds=rows)
+        db.add_all(
+            models.DashboardNotification(
+                technician_id=tech.id,
+                event_type="booking_created",
+                title=f"Booking {n}",
+                message="New booking",
+                is_read=False,
+                created_at=(start + timedelta(seconds=n)).isoformat(),
+            )
+            for n in range(rows)
+        )
+        db.commit()
+        return tech.id
+    finally:
+        db.close()
+
+
+async def _run(app, path: str, requests: int, concurrency: int) -> dict:
+    import httpx
+
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(20):  # warm up pools and caches
+            (await client.get(path)).raise_for_status()
+
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def _main(args) -> None:
+    from services.backend.database import DATABASE_URL, dispose_async_engine
+
+    technician_id = _seed(args.rows)
+    app = _build_app()
+    print(f"Database: {DATABASE_URL}")
+    print(f"{args.requests} requests per mode, concurrency {args.concurrency}, page size {args.limit}\n")
+    print(f"{'mode':<6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for mode in ("sync", "async"):
+        path = f"/{mode}/notifications/{technician_id}?limit={args.limit}"
+        result = await _run(app, path, args.requests, args.concurrency)
+        print(f"{mode:<6} {result['rps']:>9.0f} {result['p50']:>9.1f} {result['p95']:>9.1f} {result['p99']:>9.1f}")
+    await dispose_async_engine()
+
+
+def main() -> None:
+    args = _parse_args()
+    if not os.getenv("DATABASE_URL"):
+        # Must be set before services.backend.database is imported
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# bench_startup.py
+# Cold start time of the ASGI app: `import main` in a fresh interpreter, then
+# the lifespan startup, once with the default startup and once with
+# APP_LAZY_STARTUP=true (workers deferred to the first request).
+#
+#   python -m services.bench_startup --runs 7
+#
+# Every run is a new subprocess, so nothing is shared through sys.modules.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside each child process; prints one JSON line of timings (ms)
+_CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def lifespan():
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+    return ready
+
+ready = asyncio.run(lifespan())
+print(json.dumps({"import_ms": (imported - started) * 1000, "ready_ms": (ready - started) * 1000}))
+"""
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark app import and startup time")
+    parser.add_argument("--runs", type=int, default=7, help="Fresh processes per mode")
+    return parser.parse_args()
+
+
+def _run_once(lazy: bool, database_url: str) -> dict:
+    env = {
+        **os.environ,
+        "APP_LAZY_STARTUP": "true" if lazy else "false",
+        "DATABASE_URL": database_url,
+        "PYTHONPATH": ROOT,
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", _CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    args = _parse_args()
+    database_url = os.getenv("DATABASE_URL") or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    print(f"Database: {database_url}")
+    print(f"{args.runs} fresh processes per mode (median, min)\n")
+    print(f"{'mode':<8} {'import ms':>16} {'ready ms':>16}")
+    for lazy in (False, True):
+        runs = [_run_once(lazy, database_url) for _ in range(args.runs)]
+        imports = [r["import_ms"] for r in runs]
+        ready = [r["ready_ms"] for r in runs]
+        label = "lazy" if lazy else "default"
+        print(
+            f"{label:<8} {statistics.median(imports):>9.0f} ({min(imports):>4.0f})"
+            f" {statistics.median(ready):>9.0f} ({min(ready):>4.0f})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# fake_model_server.py
+# Local stand-in for an OpenAI-compatible /chat/completions API, for running
+# and benchmarking llm_gateway offline. Replies are deterministic, `latency`
+# delays the first byte and `token_delay` is the time to generate each token
+# (streamed replies send them as they go), so cache hits and streaming show
+# up in timings like they would for real.
+#
+#   python -m services.fake_model_server --port 8089 --latency-ms 400
+#   LLM_API_BASE_URL=http://127.0.0.1:8089/v1 uvicorn main:app
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_reply(messages: list) -> str:
+    question = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    return f"Thanks for your message! You asked: {question.strip()[:120]}. We'll be happy to help."
+
+
+class FakeModelServer:
+    """Serves POST /v1/chat/completions (plain JSON or SSE when "stream": true).
+
+    Records every request body; `status` lets a test force errors, and
+    `max_in_flight` tracks the highest number of concurrent requests.
+    """
+
+    def __init__(self, latency: float = 0.0, token_delay: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.status = 200
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # small SSE writes would otherwise wait on delayed ACKs
+
+            def do_POST(self):
+                with fake._lock:
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    with fake._lock:
+                        fake.requests.append(body)
+                    if fake.latency:
+                        time.sleep(fake.latency)
+                    if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+                        return self._json(404, {"error": {"message": "Not found"}})
+                    if fake.status >= 400:
+                        return self._json(fake.status, {"error": {"message": f"Fake error {fake.status}"}})
+                    self._complete(body)
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+            def _complete(self, body: dict):
+                messages = body.get("messages") or []
+                reply = fake_reply(messages)
+                words = reply.split(" ")
+                usage = {
+                    "prompt_tokens": sum(len((m.get("content") or "").split()) for m in messages),
+                    "completion_tokens": len(words),
+                }
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                model = body.get("model") or "fake"
+                if not body.get("stream"):
+                    if fake.token_delay:
+                        time.sleep(fake.token_delay * len(words))  # generated all the same, just not sent yet
+                    return self._json(200, {
+                        "model": model,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                        "usage": usage,
+                    })
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, word in enumerate(words):
+                    piece = word if i == 0 else " " + word
+                    self._chunk({"model": model, "choices": [{"index": 0, "delta": {"content": piece}}]})
+                    if fake.token_delay:
+                        time.sleep(fake.token_delay)
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    self._chunk({"model": model, "choices": [], "usage": usage})
+                self._write(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, data: dict):
+                self._write(f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+
+            def _write(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def _json(self, status: int, data: dict):
+                raw = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible model server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=400, help="Delay before the first byte")
+    parser.add_argument("--token-ms", type=float, default=20, help="Delay between streamed tokens")
+    args = parser.parse_args()
+    server = FakeModelServer(args.latency_ms / 1000, args.token_ms / 1000, args.host, args.port)
+    print(f"Fake model API on {server.url} (Ctrl+C to stop)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
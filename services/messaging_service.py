@@ -0,0 +1,227 @@
+import asyncio
+import os
+import random
+import weakref
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+import httpx
+
+GRAPH_API_BASE_URL = os.getenv("GRAPH_API_BASE_URL", "https://graph.facebook.com")
+GRAPH_API_VERSION = os.getenv("GRAPH_API_VERSION", "v17.0")
+
+SEND_TIMEOUT_SEC = float(os.getenv("MESSAGING_SEND_TIMEOUT_SEC", "10"))
+SEND_MAX_RETRIES = int(os.getenv("MESSAGING_MAX_RETRIES", "3"))
+SEND_CONCURRENCY = int(os.getenv("MESSAGING_SEND_CONCURRENCY", "20"))
+MAX_CONNECTIONS = int(os.getenv("MESSAGING_MAX_CONNECTIONS", "50"))
+
+# Graph rejected the send outright: rate limiting, or an explicit "come back
+# later" (503 is only retried when it carries Retry-After). Other 5xx replies
+# may come after the message was accepted, so they count as maybe sent.
+RETRY_STATUS_CODES = {429, 503}
+# Failures where the request never reached Graph; a read timeout or a broken
+# response may come after the message was accepted, so those are not retried
+RETRY_TRANSPORT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+MAX_BACKOFF_SEC = 30.0
+
+
+@dataclass
+class OutboundMessage:
+    platform: str  # whatsapp | instagram
+    recipient: str  # phone number for WhatsApp, IGSID for Instagram
+    text: str
+    access_token: str
+    sender_id: Optional[str] = None  # WhatsApp phone number ID / Instagram page ID
+
+
+@dataclass
+class SendResult:
+    ok: bool
+    status_code: Optional[int] = None
+    message_id: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    maybe_sent: bool = False  # the request went out but the reply was lost; resending could duplicate it
+
+
+class MessagingClient:
+    """Async Graph API sender sharing one keep-alive connection pool.
+
+    httpx keeps a separate pool per host, so WhatsApp and Instagram sends
+    reuse warm connections to their Graph hosts. 429s, 503s with Retry-After
+    and connection failures are retried with exponential backoff (honouring
+    Retry-After); other 5xx replies and errors after the request was sent are
+    not, so a message Graph already accepted is never sent twice.
+    """
+
+    def __init__(
+        self,
+        base_url: str = GRAPH_API_BASE_URL,
+        api_version: str = GRAPH_API_VERSION,
+        timeout: float = SEND_TIMEOUT_SEC,
+        max_retries: int = SEND_MAX_RETRIES,
+        backoff_base: float = 0.5,
+        max_connections: int = MAX_CONNECTIONS,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_version = api_version
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._http = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            transport=transport,
+        )
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    def _url(self, path: str) -> str:
+        return f"{self.base_url}/{self.api_version}/{path.lstrip('/')}"
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(float(retry_after), MAX_BACKOFF_SEC)
+                except ValueError:
+                    pass
+        delay = self.backoff_base * (2 ** attempt)
+        return min(delay + random.uniform(0, delay / 2), MAX_BACKOFF_SEC)
+
+    async def _post(self, path: str, access_token: str, payload: dict) -> SendResult:
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = None
+        error = None
+
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = await self._http.post(self._url(path), json=payload, headers=headers)
+            except httpx.TransportError as e:
+                error = f"{type(e).__name__}: {e}"
+                if not isinstance(e, RETRY_TRANSPORT_ERRORS):
+                    return SendResult(ok=False, error=error, attempts=attempt + 1, maybe_sent=True)
+            else:
+                if response.status_code < 400:
+                    data = _json(response)
+                    return SendResult(
+                        ok=True,
+                        status_code=response.status_code,
+                        message_id=_message_id(data),
+                        attempts=attempt + 1,
+                    )
+                error = _error_message(response)
+                if not _is_retryable(response):
+                    return SendResult(
+                        ok=False,
+                        status_code=response.status_code,
+                        error=error,
+                        attempts=attempt + 1,
+                        maybe_sent=response.status_code >= 500,
+                    )
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, response))
+
+        return SendResult(
+            ok=False,
+            status_code=response.status_code if response is not None else None,
+            error=error,
+            attempts=self.max_retries + 1,
+        )
+
+    async def send_whatsapp_text(self, phone_id: str, access_token: str, to: str, text: str) -> SendResult:
+        payload = {
+            "messaging_product": "whatsapp",
+            "to": to,
+            "type": "text",
+            "text": {"body": text},
+        }
+        return await self._post(f"{phone_id}/messages", access_token, payload)
+
+    async def send_instagram_text(self, access_token: str, recipient_id: str, text: str, page_id: str = "me") -> SendResult:
+        payload = {
+            "recipient": {"id": recipient_id},
+            "message": {"text": text},
+        }
+        return await self._post(f"{page_id}/messages", access_token, payload)
+
+    async def send(self, message: OutboundMessage) -> SendResult:
+        if not message.access_token:
+            return SendResult(ok=False, status_code=401, error="No active access token for this account")
+        if message.platform == "whatsapp":
+            return await self.send_whatsapp_text(message.sender_id, message.access_token, message.recipient, message.text)
+        if message.platform == "instagram":
+            return await self.send_instagram_text(message.access_token, message.recipient, message.text, message.sender_id or "me")
+        return SendResult(ok=False, error=f"Unsupported platform: {message.platform}")
+
+    async def send_many(self, messages: Iterable[OutboundMessage], concurrency: int = SEND_CONCURRENCY) -> List[SendResult]:
+        """Send a batch (e.g. a reminder run) with at most `concurrency` requests in flight"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _one(message: OutboundMessage) -> SendResult:
+            async with semaphore:
+                return await self.send(message)
+
+        return list(await asyncio.gather(*(_one(m) for m in messages)))
+
+
+def _json(response: httpx.Response) -> dict:
+    try:
+        data = response.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _message_id(data: dict) -> Optional[str]:
+    if data.get("message_id"):
+        return data["message_id"]
+    messages = data.get("messages") or []
+    if messages and isinstance(messages[0], dict):
+        return messages[0].get("id")
+    return None
+
+
+def _is_retryable(response: httpx.Response) -> bool:
+    if response.status_code == 503:
+        return bool(response.headers.get("Retry-After"))
+    return response.status_code in RETRY_STATUS_CODES
+
+
+def _error_message(response: httpx.Response) -> str:
+    error = _json(response).get("error")
+    if isinstance(error, dict) and error.get("message"):
+        return error["message"]
+    return f"HTTP {response.status_code}"
+
+
+# One client per event loop: httpx connections are bound to the loop that opened them.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, MessagingClient]" = weakref.WeakKeyDictionary()
+
+
+def get_client() -> MessagingClient:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = MessagingClient()
+        _clients[loop] = client
+    return client
+
+
+async def close_client() -> None:
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
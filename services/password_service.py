@@ -1,8 +1,26 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
 from argon2 import PasswordHasher
-from argon2.exceptions import VerifyMismatchError, VerificationError
+from argon2.exceptions import VerifyMismatchError, VerificationError, InvalidHashError
+
+# Argon2 cost parameters; changing them makes existing hashes get upgraded on next login.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+
+# Max hashes running at once; extra requests wait in the executor queue.
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
 
 # Direct Argon2 hasher avoids passlib dependency issues in some environments.
-pwd_hasher = PasswordHasher()
+pwd_hasher = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM,
+)
 
 def hash_password(password: str) -> str:
     return pwd_hasher.hash(password)
@@ -10,5 +28,59 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
         return pwd_hasher.verify(hashed_password, plain_password)
-    except (VerifyMismatchError, VerificationError):
-        return False
\ No newline at end of file
+    except (VerifyMismatchError, VerificationError, InvalidHashError):
+        return False
+
+def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password; if the hash uses outdated parameters also return a new hash"""
+    if not verify_password(plain_password, hashed_password):
+        return False, None
+    if pwd_hasher.check_needs_rehash(hashed_password):
+        return True, hash_password(plain_password)
+    return True, None
+
+
+# ---------------- OFF-LOOP HASHING ----------------
+# argon2-cffi releases the GIL while hashing, so a small thread pool keeps
+# the event loop free without the overhead of a process pool.
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_CONCURRENCY, thread_name_prefix="argon2")
+_stats_lock = threading.Lock()
+_stats = {"queued": 0, "running": 0, "completed": 0, "max_queue_depth": 0}
+
+
+def _run_tracked(fn, *args):
+    with _stats_lock:
+        _stats["queued"] -= 1
+        _stats["running"] += 1
+    try:
+        return fn(*args)
+    finally:
+        with _stats_lock:
+            _stats["running"] -= 1
+            _stats["completed"] += 1
+
+
+async def _submit(fn, *args):
+    with _stats_lock:
+        _stats["queued"] += 1
+        _stats["max_queue_depth"] = max(_stats["max_queue_depth"], _stats["queued"])
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _run_tracked, fn, *args)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _submit(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _submit(verify_password, plain_password, hashed_password)
+
+
+async def verify_and_update_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await _submit(verify_and_update, plain_password, hashed_password)
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return {**_stats, "concurrency": PASSWORD_HASH_CONCURRENCY}
@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+QR_CACHE_SIZE = int(os.getenv("QR_CACHE_SIZE", "256"))
+QR_BOX_SIZE = 8  # pixels per module
+QR_BORDER = 2  # modules of quiet zone
+
+
+@dataclass
+class QRImage:
+    png: bytes
+    etag: str
+    expires_at: float  # epoch seconds
+
+    def max_age(self, now: Optional[float] = None) -> int:
+        return max(0, int(self.expires_at - (time.time() if now is None else now)))
+
+
+def render_png(data: str, box_size: int = QR_BOX_SIZE, border: int = QR_BORDER) -> bytes:
+    """Render `data` as a PNG QR code (CPU-bound; call off the event loop)"""
+    # Imported on first render: qrcode pulls in Pillow, which is slow to load
+    import qrcode
+    from qrcode.constants import ERROR_CORRECT_M
+
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECT_M, box_size=box_size, border=border)
+    qr.add_data(data)
+    qr.make(fit=True)
+    buffer = io.BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class QRCache:
+    """Small LRU of rendered QR images; entries also drop out at their expiry"""
+
+    def __init__(self, maxsize: int = QR_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[str, QRImage]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "rendered": 0, "evicted": 0}
+
+    def get(self, key: str, now: Optional[float] = None) -> Optional[QRImage]:
+        now = time.time() if now is None else now
+        with self._lock:
+            image = self._items.get(key)
+            if image is not None and image.expires_at <= now:
+                del self._items[key]
+                image = None
+            if image is None:
+                self.counters["misses"] += 1
+                return None
+            self._items.move_to_end(key)
+            self.counters["hits"] += 1
+            return image
+
+    def put(self, key: str, image: QRImage) -> None:
+        with self._lock:
+            self._items[key] = image
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+                self.counters["evicted"] += 1
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "size": len(self._items)}
+
+    async def render(self, key: str, data: str, expires_at: float) -> QRImage:
+        """Cached image for `key`, rendering `data` in a worker thread on a miss"""
+        image = self.get(key)
+        if image is not None:
+            return image
+        png = await asyncio.to_thread(render_png, data)
+        image = QRImage(png=png, etag=f'"{hashlib.sha1(png).hexdigest()}"', expires_at=expires_at)
+        with self._lock:
+            self.counters["rendered"] += 1
+        self.put(key, image)
+        return image
+
+
+cache = QRCache()
+
+
+def stats() -> dict:
+    return cache.stats()
@@ -0,0 +1,25 @@
+# rebuild_revenue_rollups.py
+# Recompute revenue_daily from appointments (nightly job, or after bulk edits).
+#   python -m services.rebuild_revenue_rollups [--technician-id N] [--days N]
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from services.backend import revenue
+from services.backend.database import SessionLocal
+
+parser = argparse.ArgumentParser(description="Rebuild revenue_daily rollups")
+parser.add_argument("--technician-id", type=int, default=None)
+parser.add_argument("--days", type=int, default=None, help="only the last N days (default: all history)")
+args = parser.parse_args()
+
+start = None
+if args.days:
+    start = (datetime.now(timezone.utc).date() - timedelta(days=args.days - 1)).isoformat()
+
+db = SessionLocal()
+try:
+    print("🔄 Rebuilding revenue rollups...")
+    written = revenue.rebuild(db, technician_id=args.technician_id, start=start)
+    print(f"✅ {written} rollup rows written")
+finally:
+    db.close()
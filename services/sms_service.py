@@ -1,11 +1,17 @@
 import requests
 import os
 
+from services import messaging_service
+
 WHATSAPP_TOKEN = os.getenv("WHATSAPP_TOKEN")
 WHATSAPP_PHONE_ID = os.getenv("WHATSAPP_PHONE_ID")
 
+# Shared keep-alive session so repeated sends reuse the connection
+_session = requests.Session()
+
+
 def send_sms(number: str, message: str):
-    url = f"https://graph.facebook.com/v17.0/{WHATSAPP_PHONE_ID}/messages"
+    url = f"{messaging_service.GRAPH_API_BASE_URL}/{messaging_service.GRAPH_API_VERSION}/{WHATSAPP_PHONE_ID}/messages"
 
     headers = {
         "Authorization": f"Bearer {WHATSAPP_TOKEN}",
@@ -21,8 +27,13 @@ def send_sms(number: str, message: str):
         }
     }
 
-    response = requests.post(url, json=payload, headers=headers)
+    try:
+        response = _session.post(url, json=payload, headers=headers, timeout=messaging_service.SEND_TIMEOUT_SEC)
+    except requests.RequestException as e:
+        print("META SEND FAILED:", e)
+        return False
 
-    print("META RESPONSE:", response.status_code, response.text)
+    if response.status_code != 200:
+        print("META RESPONSE:", response.status_code, response.text)
 
     return response.status_code == 200
@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from services.backend.database import Base
+
+
+class FakeGraphServer:
+    """Local stand-in for the Meta Graph API.
+
+    Tests queue responses per path (status, body, headers); unqueued requests
+    get `default`. Every request is recorded, and `max_in_flight` tracks the
+    highest number of concurrent requests seen.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.requests = []
+        self.responses = {}
+        self.default = (200, {"messages": [{"id": "wamid.fake"}]}, {})
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def queue(self, path: str, status: int, body: dict, headers: dict = None):
+        self.responses.setdefault(path, []).append((status, body, headers or {}))
+
+    def _next_response(self, path: str):
+        with self._lock:
+            queued = self.responses.get(path)
+            if queued:
+                return queued.pop(0)
+            return self.default
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                with fake._lock:
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    raw = self.rfile.read(length) if length else b""
+                    path = self.path.split("?")[0]
+                    fake.requests.append({
+                        "method": self.command,
+                        "path": path,
+                        "query": self.path[len(path) + 1:],
+                        "headers": dict(self.headers),
+                        "body": raw.decode("utf-8"),
+                    })
+                    if fake.delay:
+                        time.sleep(fake.delay)
+                    status, body, headers = fake._next_response(path)
+                    data = json.dumps(body).encode("utf-8")
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    for key, value in headers.items():
+                        self.send_header(key, value)
+                    self.end_headers()
+                    self.wfile.write(data)
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+            do_GET = _handle
+            do_POST = _handle
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def fake_graph():
+    server = FakeGraphServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def file_session_factory(tmp_path):
+    """sessionmaker over a fresh SQLite file with every table created.
+
+    It has a real pool, so each thread gets its own connection and
+    concurrent writers meet SQLite's locking.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory():
+    """sessionmaker over a fresh in-memory database with every table created.
+
+    StaticPool keeps the one connection, so all sessions (and threads) see
+    the same database.
+    """
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
@@ -0,0 +1,31 @@
+from datetime import date, datetime, timezone
+
+from services.backend import availability
+
+
+def test_merge_and_subtract_intervals():
+    merged = availability.merge_intervals([(600, 660), (540, 600), (700, 720), (710, 730)])
+    assert merged == [(540, 660), (700, 730)]
+
+    free = availability.subtract_intervals([(540, 720)], [(570, 600), (630, 660)])
+    assert free == [(540, 570), (600, 630), (660, 720)]
+
+
+def test_slot_starts_respects_duration_step_and_not_before():
+    starts = availability.slot_starts([(540, 660)], duration=60, step=30, not_before=550)
+    assert [availability.format_time(m) for m in starts] == ["09:30", "10:00"]
+
+
+def test_overlaps_detects_partial_overlap_only():
+    blocked = [(600, 630)]
+    assert availability.overlaps(blocked, (585, 615))
+    assert not availability.overlaps(blocked, (630, 660))
+
+
+def test_earliest_start_uses_timezone():
+    now = datetime(2030, 1, 7, 12, 0, tzinfo=timezone.utc)
+    lagos = availability.get_timezone("Africa/Lagos")
+    # 12:00 UTC is 13:00 in Lagos
+    assert availability._earliest_start(date(2030, 1, 7), lagos, now) == 13 * 60 + 1
+    assert availability._earliest_start(date(2030, 1, 6), lagos, now) is None
+    assert availability._earliest_start(date(2030, 1, 8), lagos, now) == 0
@@ -0,0 +1,47 @@
+import threading
+
+
+from services.backend import booking, models
+
+
+def test_concurrent_bookings_for_same_slot_create_one_row(file_session_factory):
+    """Parallel check-and-create on one slot must not double-book."""
+    Session = file_session_factory
+
+    db = Session()
+    tech = models.Technician(full_name="T", business_name="B", email="t@example.com", password="x")
+    db.add(tech)
+    db.commit()
+    svc = models.Service(technician_id=tech.id, name="Lashes", price=50.0, duration=60)
+    db.add(svc)
+    db.commit()
+    tech_id, svc_id = tech.id, svc.id
+    db.close()
+
+    results = []
+    barrier = threading.Barrier(8)
+
+    def attempt(n):
+        session = Session()
+        barrier.wait()
+        try:
+            booking.create_booking(session, tech_id, svc_id, f"Client {n}", "2030-01-08", "10:00")
+            results.append("created")
+        except booking.SlotUnavailableError:
+            results.append("conflict")
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=attempt, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    db = Session()
+    count = db.query(models.Appointment).filter(models.Appointment.technician_id == tech_id).count()
+    db.close()
+
+    assert results.count("created") == 1
+    assert results.count("conflict") == 7
+    assert count == 1
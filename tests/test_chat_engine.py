@@ -0,0 +1,179 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import event
+
+from services.backend import chat_engine, knowledge, models
+from services.backend.chat_engine import ChatEngine, ChatState, Step, compile_flow
+from services.backend.knowledge import KnowledgeStore
+
+# A Monday, 09:00 UTC
+NOW = datetime(2026, 6, 1, 9, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    tech = models.Technician(full_name="Tech", business_name="Lash Studio", email="t@example.com", password="x")
+    session.add(tech)
+    session.flush()
+    session.add_all([
+        models.Service(technician_id=tech.id, name="Lash Lift", price=45.0, duration=60),
+        models.Service(technician_id=tech.id, name="Brow Tint", price=20.0, duration=30),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def _count_statements(db):
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def _talk(engine, db, state, *messages):
+    turns = [engine.turn(db, 1, state, message, now=NOW) for message in messages]
+    return turns[-1]
+
+
+def test_flow_compiles_and_rejects_unknown_targets():
+    flow = compile_flow()
+    assert flow.first == "start"
+    assert set(flow.steps) >= {"start", "name", "service", "datetime", "contact", "price", "confirm", "booking_created", "completed"}
+
+    with pytest.raises(ValueError):
+        compile_flow([Step("start", next="nowhere", handler=lambda ctx, text, step: None)])
+
+
+def test_conversation_books_appointment(db):
+    engine = ChatEngine(catalogs=KnowledgeStore())
+    state = ChatState()
+
+    turn = _talk(engine, db, state, "Hi")
+    assert (turn.step, turn.need) == ("name", "client_name")
+
+    turn = _talk(engine, db, state, "My name is alice smith")
+    assert state.client_name == "Alice Smith"
+    assert turn.step == "service"
+    assert [s["name"] for s in turn.services] == ["Lash Lift", "Brow Tint"]
+
+    turn = _talk(engine, db, state, "2")
+    assert turn.step == "datetime"
+    assert turn.suggestions[0] == "2026-06-01 09:30"
+
+    turn = _talk(engine, db, state, "tomorrow at 2pm")
+    assert (state.appointment_date, state.appointment_time) == ("2026-06-02", "14:00")
+    assert turn.need == "contact"
+
+    turn = _talk(engine, db, state, "07700 900123")
+    assert state.client_phone == "07700900123"
+    assert turn.step == "confirm"
+    assert turn.price == 20.0
+    assert "£20.00" in turn.reply
+
+    turn = _talk(engine, db, state, "yes please")
+    booking = db.query(models.Appointment).one()
+    assert turn.booking_id == booking.id == state.booking_id
+    assert (booking.date, booking.time, booking.booking_source) == ("2026-06-02", "14:00", "ai")
+    assert turn.step == "booking_created"
+
+
+def test_taken_slot_offers_alternatives(db):
+    db.add(models.Appointment(technician_id=1, service_id=1, client_name="X", date="2026-06-02", time="10:00", status="confirmed"))
+    db.commit()
+    engine = ChatEngine(catalogs=KnowledgeStore())
+    state = ChatState(step="datetime", client_name="Bo", service_id=1)
+
+    turn = _talk(engine, db, state, "2026-06-02 10:00")
+
+    assert turn.step == "datetime"
+    assert state.appointment_time is None
+    assert turn.suggestions == ["2026-06-02 11:00", "2026-06-02 11:30", "2026-06-02 12:00"]
+
+
+def test_services_question_keeps_current_step(db):
+    engine = ChatEngine(catalogs=KnowledgeStore())
+    state = ChatState(step="contact", client_name="Bo", service_id=1, appointment_date="2026-06-02", appointment_time="10:00")
+
+    turn = _talk(engine, db, state, "what services do you have?")
+
+    assert turn.step == "contact"
+    assert len(turn.services) == 2
+
+    turn = _talk(engine, db, state, "how much is a brow tint?")
+    assert turn.step == "contact"
+    assert turn.reply.startswith("Brow Tint is £20.00 and takes 30 min.")
+    assert state.service_id == 1
+
+
+def test_removed_service_goes_back_to_the_service_step(db):
+    engine = ChatEngine(catalogs=KnowledgeStore())
+    state = ChatState(
+        step="confirm", client_name="Bo", service_id=2, appointment_date="2026-06-02",
+        appointment_time="10:00", client_phone="07700900123",
+    )
+    db.query(models.Service).filter(models.Service.id == 2).delete()
+    db.commit()
+
+    turn = _talk(engine, db, state, "yes")
+
+    assert turn.step == "service"
+    assert state.service_id is None
+    assert turn.reply.startswith("Sorry, that service is no longer available.")
+    assert db.query(models.Appointment).count() == 0
+
+    turn = _talk(engine, db, state, "1")
+    assert turn.step == "confirm"
+    assert "Lash Lift" in turn.reply
+
+
+def test_prefilled_slot_in_the_past_or_taken_is_asked_again(db):
+    db.add(models.Appointment(technician_id=1, service_id=1, client_name="X", date="2026-06-02", time="10:00", status="confirmed"))
+    db.commit()
+    engine = ChatEngine(catalogs=KnowledgeStore())
+
+    for day, time in (("2020-01-01", "10:00"), ("2026-06-02", "10:00"), ("2026-06-03", "23:00")):  # past, taken, closed
+        state = ChatState(
+            step="confirm", client_name="Bo", service_id=1, appointment_date=day,
+            appointment_time=time, client_phone="07700900123",
+        )
+        turn = _talk(engine, db, state, "yes")
+        assert turn.step == "datetime", day
+        assert turn.reply.startswith(f"Sorry, {time} on {day} isn't available."), day
+        assert state.appointment_time is None
+    assert db.query(models.Appointment).count() == 1
+
+
+def test_catalog_is_cached_until_services_change(db):
+    cache = knowledge.store
+    cache.clear()
+    engine = ChatEngine(catalogs=cache)
+    _talk(engine, db, ChatState(step="name"), "Bo")
+
+    statements = _count_statements(db)
+    _talk(engine, db, ChatState(step="name"), "Cy")
+    assert statements == []
+
+    db.add(models.Service(technician_id=1, name="Facial", price=60.0, duration=45))
+    db.commit()
+    turn = _talk(engine, db, ChatState(step="name"), "Di")
+    assert [s["name"] for s in turn.services][-1] == "Facial"
+
+
+def test_save_turn_writes_once(db):
+    engine = ChatEngine(catalogs=KnowledgeStore())
+    state = ChatState()
+    _talk(engine, db, state, "Hi")
+    chat_engine.save_turn(db, state, 1, "s1", now=NOW)
+    row = db.query(models.ChatSession).filter_by(session_id="s1").one()
+
+    state = chat_engine.load_state(row, now=NOW)
+    previous = state.values()
+    _talk(engine, db, state, "Bo")
+    statements = _count_statements(db)
+    chat_engine.save_turn(db, state, 1, "s1", previous=previous, now=NOW)
+
+    assert [s.split()[0] for s in statements] == ["UPDATE"]
+    db.refresh(row)
+    assert (row.step, row.client_name, row.message_count) == ("service", "Bo", 2)
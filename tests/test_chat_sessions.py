@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+
+from services.backend import chat_engine, models
+from services.backend.chat_sessions import SessionCache
+
+
+@pytest.fixture
+def Session(session_factory):
+    db = session_factory()
+    db.add(models.Technician(full_name="Tech", business_name="Lash Studio", email="t@example.com", password="x"))
+    db.add(models.Service(technician_id=1, name="Lash Lift", price=45.0, duration=60))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def _writes(factory):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if statement.split()[0] in ("INSERT", "UPDATE"):
+            statements.append(statement.split()[0])
+
+    event.listen(factory.kw["bind"], "before_cursor_execute", record)
+    return statements
+
+
+def _turn(cache, db, message, **kwargs):
+    with cache.session(db, 1, **kwargs) as chat:
+        return chat_engine.engine.turn(db, 1, chat.state, message), chat
+
+
+def test_burst_without_step_change_is_written_once_when_idle(Session):
+    cache = SessionCache(session_factory=Session, idle_after=0)
+    db = Session()
+    turn, chat = _turn(cache, db, "Hi", platform="instagram", account_id="u1")
+    assert turn.step == "name"
+
+    writes = _writes(Session)
+    for message in ("???", "!!!", "..."):  # not names: the step stays put
+        _turn(cache, db, message, platform="instagram", account_id="u1")
+    assert writes == []
+    assert cache.stats()["dirty"] == 1
+
+    assert cache.flush() == 1
+    assert writes == ["UPDATE"]
+    assert cache.stats()["size"] == 0
+    row = db.query(models.ChatSession).filter_by(session_id=chat.session_id).one()
+    assert (row.message_count, row.last_message) == (4, "...")
+    db.close()
+
+
+def test_step_transition_writes_immediately(Session):
+    cache = SessionCache(session_factory=Session)
+    db = Session()
+    _, chat = _turn(cache, db, "Hi", session_id=None, create_id="s1")
+    writes = _writes(Session)
+
+    turn, _ = _turn(cache, db, "Bo", session_id="s1")
+
+    assert turn.step == "service"
+    assert writes == ["UPDATE"]
+    assert db.query(models.ChatSession.step).filter_by(session_id="s1").scalar() == "service"
+    db.close()
+
+
+def test_shutdown_flush_writes_busy_sessions(Session):
+    cache = SessionCache(session_factory=Session)
+    db = Session()
+    _turn(cache, db, "Hi", create_id="s1")
+    _turn(cache, db, "???", session_id="s1")
+
+    assert cache.flush() == 0  # not idle yet
+    assert cache.flush(idle_only=False) == 1
+    assert db.query(models.ChatSession.message_count).filter_by(session_id="s1").scalar() == 2
+    db.close()
+
+
+def test_expired_session_starts_over(Session):
+    cache = SessionCache(session_factory=Session)
+    db = Session()
+    _turn(cache, db, "Hi", create_id="s1")
+    _turn(cache, db, "Bo", session_id="s1")
+    cache._items["s1"].expires_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+    turn, chat = _turn(cache, db, "Hello again", session_id="s1")
+
+    assert turn.step == "name"
+    assert chat.state.client_name is None
+    assert cache.stats()["expired"] == 1
+    db.close()
+
+
+def test_failed_turn_drops_cached_copy(Session):
+    cache = SessionCache(session_factory=Session)
+    db = Session()
+    _turn(cache, db, "Hi", create_id="s1")
+
+    with pytest.raises(RuntimeError):
+        with cache.session(db, 1, "s1") as chat:
+            chat.state.client_name = "Half Written"
+            raise RuntimeError("boom")
+
+    assert cache.stats()["size"] == 0
+    with cache.session(db, 1, "s1") as chat:
+        assert chat.state.client_name is None
+    db.close()
+
+
+def test_stale_worker_cannot_overwrite_a_newer_turn(Session):
+    worker_a, worker_b = SessionCache(session_factory=Session), SessionCache(session_factory=Session)
+    db = Session()
+    _turn(worker_a, db, "Hi", create_id="s1")
+
+    turn, _ = _turn(worker_b, db, "Amy", session_id="s1")
+    assert turn.step == "service"
+
+    with pytest.raises(chat_engine.StaleSessionError):
+        _turn(worker_a, db, "Bo", session_id="s1")  # still holds the pre-"Amy" copy
+    assert worker_a.stats()["conflicts"] == 1
+    assert db.query(models.ChatSession).one().client_name == "Amy"
+
+    with worker_a.session(db, 1, "s1") as chat:  # reloaded
+        assert (chat.state.client_name, chat.state.step) == ("Amy", "service")
+    db.close()
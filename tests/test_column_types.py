@@ -0,0 +1,40 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from services.backend import models
+from services.backend.database import Base
+
+
+def test_native_columns_round_trip_iso_strings():
+    """Native date/time columns accept and return the app's ISO strings."""
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    db.add(models.Appointment(
+        technician_id=1,
+        service_id=1,
+        client_name="Round Trip",
+        date="2030-01-07",
+        time="09:30",
+        created_at="2030-01-01T10:00:00+01:00"
+    ))
+    db.add(models.Appointment(
+        technician_id=1,
+        service_id=1,
+        client_name="Later",
+        date="2030-02-01",
+        time="14:00"
+    ))
+    db.commit()
+
+    in_january = db.query(models.Appointment).filter(
+        models.Appointment.date >= "2030-01-01",
+        models.Appointment.date < "2030-02-01"
+    ).all()
+    db.close()
+
+    assert len(in_january) == 1
+    assert in_january[0].date == "2030-01-07"
+    assert in_january[0].time == "09:30"
+    assert in_january[0].created_at == "2030-01-01T09:00:00+00:00"
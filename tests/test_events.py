@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timezone
+
+from services.backend import events, models
+
+
+def _drain(subscriber):
+    items = []
+    while not subscriber.queue.empty():
+        items.append(subscriber.queue.get_nowait())
+    return items
+
+
+def test_subscriber_resumes_from_cursor_and_resyncs_when_gap_is_lost():
+    async def run():
+        broker = events.EventBroker(buffer_size=3)
+        first = broker.publish(1, "notification", {"n": 1})
+        broker.publish(1, "notification", {"n": 2})
+        broker.publish(2, "notification", {"n": "other technician"})
+
+        resumed = broker.subscribe(1, last_event_id=first.id)
+        live = broker.subscribe(1)
+        broker.publish(1, "message", {"n": 3})
+        await asyncio.sleep(0)  # let call_soon_threadsafe deliver
+
+        replay = [item.data["n"] for item in _drain(resumed)]
+        assert replay == [2, 3]
+        assert [item.data["n"] for item in _drain(live)] == [3]
+
+        for n in range(4, 8):
+            broker.publish(1, "message", {"n": n})
+        stale = broker.subscribe(1, last_event_id=first.id)
+        assert [item.type for item in _drain(stale)] == [events.RESYNC]
+
+        from_other_process = broker.subscribe(1, last_event_id=first.id - 10_000)
+        assert [item.type for item in _drain(from_other_process)] == [events.RESYNC]
+
+    asyncio.run(run())
+
+
+def test_rows_are_published_only_after_commit(session_factory):
+    Session = session_factory
+
+    async def run():
+        db = Session()
+        tech = models.Technician(full_name="T", business_name="B", email="events@example.com", password="x")
+        db.add(tech)
+        db.commit()
+        subscriber = events.broker.subscribe(tech.id)
+
+        now = datetime.now(timezone.utc).isoformat()
+        db.add(models.DashboardNotification(technician_id=tech.id, event_type="booking_created", title="t", message="m", created_at=now))
+        db.flush()
+        db.rollback()
+
+        db.add(models.MessageLog(technician_id=tech.id, platform="instagram", direction="incoming", message_content="hi", created_at=now))
+        db.flush()
+        await asyncio.sleep(0)
+        assert subscriber.queue.empty()
+
+        db.commit()
+        await asyncio.sleep(0)
+        received = _drain(subscriber)
+        db.close()
+        events.broker.unsubscribe(subscriber)
+        return received
+
+    received = asyncio.run(run())
+    assert [item.type for item in received] == ["message"]
+    assert received[0].data["message_content"] == "hi"
+
+
+def test_stream_formats_events_and_sends_heartbeats():
+    async def run():
+        broker_event = events.broker.publish(99, "notification", {"title": "New booking"})
+        subscriber = events.broker.subscribe(99, last_event_id=broker_event.id - 1)
+
+        async def connected():
+            return False
+
+        body = events.stream(subscriber, connected, heartbeat=0.01)
+        frames = [await body.__anext__() for _ in range(3)]
+        await body.aclose()
+        return broker_event, frames
+
+    broker_event, frames = asyncio.run(run())
+    assert frames[0] == f"retry: {events.EVENT_RETRY_MS}\n\n"
+    assert frames[1] == f'id: {broker_event.id}\nevent: notification\ndata: {{"title":"New booking"}}\n\n'
+    assert frames[2] == ": ping\n\n"
+    assert events.broker.stats()["subscribers"] == 0
@@ -0,0 +1,83 @@
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+from services.backend import extraction, models
+from services.backend.chat_engine import ChatEngine, ChatState
+from services.backend.knowledge import KnowledgeStore
+
+# A Monday, 09:00 UTC
+NOW = datetime(2026, 6, 1, 9, 0, tzinfo=timezone.utc)
+
+MATCHER = extraction.service_matcher([
+    SimpleNamespace(id=1, name="Lash Lift"),
+    SimpleNamespace(id=2, name="Brow Tint"),
+    SimpleNamespace(id=3, name="Brow Lamination"),
+])
+
+
+def test_entities_from_one_message():
+    result = extraction.extract("Hi I'm amy, can I get a brow tint friday at 10:30?", MATCHER, now=NOW)
+
+    assert (result.name, result.service_id, result.date, result.time) == ("Amy", 2, date(2026, 6, 5), 630)
+    assert not result.needs_fallback
+
+
+def test_dates_times_and_contact():
+    result = extraction.extract("14/06 3pm, amy@example.com or +44 7700 900123", now=NOW)
+
+    assert (result.date, result.time) == (date(2026, 6, 14), 15 * 60)
+    assert (result.email, result.phone) == ("amy@example.com", "+447700900123")
+
+
+def test_dotted_times_are_not_read_as_dates():
+    for message, day, minute in (
+        ("tomorrow at 10.05", date(2026, 6, 2), 10 * 60 + 5),
+        ("tomorrow at 10.30", date(2026, 6, 2), 10 * 60 + 30),
+        ("friday 9.30", date(2026, 6, 5), 9 * 60 + 30),
+        ("next monday 11.45", date(2026, 6, 8), 11 * 60 + 45),
+    ):
+        result = extraction.extract(message, now=NOW)
+        assert (result.date, result.time) == (day, minute), message
+
+    assert extraction.extract("12.06.2026 at 10.30", now=NOW).date == date(2026, 6, 12)
+    assert extraction.extract("31/02 or friday", now=NOW).date == date(2026, 6, 5)
+
+
+def test_relative_days_use_the_client_timezone():
+    late = datetime(2026, 6, 1, 23, 30, tzinfo=timezone.utc)  # already Tuesday in Tokyo
+
+    assert extraction.extract("tomorrow", now=late).date == date(2026, 6, 2)
+    assert extraction.extract("tomorrow", now=late, tz=ZoneInfo("Asia/Tokyo")).date == date(2026, 6, 3)
+
+
+def test_fuzzy_service_names_and_ambiguity():
+    assert extraction.extract("lash lfit please", MATCHER).service_id == 1
+    assert extraction.extract("brwo tint", MATCHER).service_id == 2
+    assert extraction.extract("brow", MATCHER).service_id is None  # tint or lamination
+
+
+def test_intents_and_fallback():
+    assert extraction.extract("yes please").intent == "confirm"
+    assert extraction.extract("nope").intent == "deny"
+    assert extraction.extract("restart").intent == "restart"
+    assert extraction.extract("what do you offer?").intent == "services"
+    assert extraction.extract("hmm not sure what to say").needs_fallback
+
+
+def test_first_message_prefills_the_conversation(session_factory):
+    db = session_factory()
+    db.add(models.Technician(full_name="Tech", business_name="Lash Studio", email="t@example.com", password="x"))
+    db.add_all([
+        models.Service(technician_id=1, name="Lash Lift", price=45.0, duration=60),
+        models.Service(technician_id=1, name="Brow Tint", price=20.0, duration=30),
+    ])
+    db.commit()
+    state = ChatState()
+
+    turn = ChatEngine(catalogs=KnowledgeStore()).turn(db, 1, state, "Hi, I'm Amy. Could I get a brow tint on Tuesday?", now=NOW)
+
+    assert (state.client_name, state.service_id, state.appointment_date) == ("Amy", 2, "2026-06-02")
+    assert turn.step == "datetime"
+    assert turn.intent == "greeting"
+    db.close()
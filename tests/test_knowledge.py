@@ -0,0 +1,117 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
+from services.backend import knowledge, models, outbox, webhook_inbox
+from services.backend.knowledge import KnowledgeStore
+
+
+def _db(Session):
+    db = Session()
+    db.add(models.Technician(
+        full_name="Tech", business_name="Lash Studio", email="t@example.com", password="x",
+        deposit_required=True, deposit_amount=10.0, payment_provider="bank",
+    ))
+    db.add_all([
+        models.Service(technician_id=1, name="Lash Lift", price=40.0, duration=60),
+        models.Service(technician_id=1, name="Brow Tint", price=15.0, duration=20),
+        models.Availability(technician_id=1, day="monday", start_time="09:00", end_time="17:00"),
+        models.Availability(technician_id=1, day="sat", start_time="10:00", end_time="14:00"),
+        models.PaymentSetting(technician_id=1, provider="bank", bank_name="Barclays"),
+    ])
+    db.commit()
+    return db
+
+
+def test_snapshot_answers_faqs_without_queries(session_factory):
+    db = _db(session_factory)
+    store = KnowledgeStore()
+    snapshot = store.get(db, 1)
+
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert store.get(db, 1) is snapshot
+    answers = {q: snapshot.answer(q) for q in (
+        "how much is a lash lift?", "how much is the deposit?", "can I pay by card?",
+        "what are your opening hours?", "prices", "see you friday at 2",
+    )}
+    assert statements == []
+
+    assert answers["how much is a lash lift?"] == ("service", "Lash Lift is £40.00 and takes 60 min.")
+    assert answers["how much is the deposit?"].text == "We take a £10.00 deposit to secure each booking."
+    assert answers["can I pay by card?"].text.startswith("You can pay by bank transfer (Barclays).")
+    hours = answers["what are your opening hours?"].text
+    assert "Monday: 09:00–17:00" in hours and "Saturday: 10:00–14:00" in hours and "Sunday: closed" in hours
+    assert answers["prices"].text == "Here are our prices:\n1. Lash Lift — £40.00 (60 min)\n2. Brow Tint — £15.00 (20 min)"
+    assert answers["see you friday at 2"] is None
+    db.close()
+
+
+def test_version_moves_only_when_content_changes(session_factory):
+    db = _db(session_factory)
+    store = KnowledgeStore(session_factory=session_factory)
+    first = store.get(db, 1)
+    assert first.version == 1
+
+    db.query(models.Service).filter(models.Service.id == 1).one().price = 45.0
+    db.commit()
+    assert store.peek(1) is None  # dropped on commit
+    assert store.refresh() == 1
+    second = store.peek(1)
+    assert (second.version, second.service(1).price) == (2, 45.0)
+
+    db.add(models.Availability(technician_id=1, day="monday", start_time="09:00", end_time="17:00"))
+    db.rollback()
+    assert store.peek(1) is second  # a rolled-back write changes nothing
+
+    db.query(models.Technician).one().business_name = "Lash Studio"  # no-op write
+    db.commit()
+    assert store.rebuild(db, 1).version == 2
+    assert store.stats()["unchanged"] == 1
+    db.close()
+
+
+def test_rebuild_overtaken_by_a_commit_is_not_installed(monkeypatch, session_factory):
+    db = _db(session_factory)
+    store = KnowledgeStore(session_factory=session_factory)
+    load_facts = knowledge.load_facts
+
+    def racing_load(db, technician_id):
+        facts = load_facts(db, technician_id)
+        store.invalidate(technician_id)  # a commit lands after the read
+        return facts
+
+    monkeypatch.setattr(knowledge, "load_facts", racing_load)
+    assert store.get(db, 1).business_name == "Lash Studio"  # the caller still gets an answer
+    assert store.peek(1) is None
+    assert store.stats()["superseded"] == 1
+
+    monkeypatch.setattr(knowledge, "load_facts", load_facts)
+    assert store.get(db, 1) is store.peek(1) is not None
+    db.close()
+
+
+def test_webhook_faq_is_answered_through_the_outbox(monkeypatch, session_factory):
+    db = _db(session_factory)
+    now = datetime.now(timezone.utc).isoformat()
+    db.add(models.SocialAccount(
+        technician_id=1, platform="instagram", account_name="lashstudio", account_id="PAGE1", connected_at=now,
+    ))
+    db.commit()
+    knowledge.store.clear()
+    monkeypatch.setattr(outbox, "wake", lambda: None)
+
+    webhook_inbox.process_message(db, webhook_inbox.InboundMessage("instagram", "PAGE1", "U1", "m1", "do you take a deposit?"))
+    webhook_inbox.process_message(db, webhook_inbox.InboundMessage("instagram", "PAGE1", "U1", "m2", "hello"))
+
+    queued = db.query(models.OutboundMessage).all()
+    assert len(queued) == 1
+    reply = db.query(models.MessageLog).filter_by(direction="outgoing").one()
+    assert (reply.recipient_id, reply.message_content) == ("U1", "We take a £10.00 deposit to secure each booking.")
+
+    db.add(models.SocialAutomationSetting(technician_id=1, auto_reply_enabled=False, updated_at=now))
+    db.commit()
+    webhook_inbox.process_message(db, webhook_inbox.InboundMessage("instagram", "PAGE1", "U1", "m3", "what are your prices?"))
+    assert db.query(models.OutboundMessage).count() == 1
+    knowledge.store.clear()
+    db.close()
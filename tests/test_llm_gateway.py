@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from services.backend import llm_gateway, models
+from services.backend.llm_gateway import (
+    BudgetExceededError,
+    LLMGateway,
+    PromptCache,
+    ResponseCache,
+    TokenBudget,
+    render_template,
+)
+from services.fake_model_server import FakeModelServer
+
+TEMPLATE = render_template(1, "Lash Studio", tone="friendly")
+
+
+@pytest.fixture
+def fake_model():
+    server = FakeModelServer().start()
+    yield server
+    server.stop()
+
+
+def _gateway(fake_model, **kwargs):
+    kwargs.setdefault("responses", ResponseCache())
+    kwargs.setdefault("budget", TokenBudget(daily_limit=0))
+    return LLMGateway(base_url=fake_model.url, backoff_base=0.01, **kwargs)
+
+
+def test_repeated_and_reworded_faq_is_served_from_cache(fake_model):
+    async def run():
+        async with _gateway(fake_model) as gateway:
+            questions = ("What's the price?", "how much?", "do you do lash lifts and brow tints?", "do you do lash lifts and brow tints too?")
+            return [await gateway.complete(TEMPLATE, q) for q in questions]
+
+    price, how_much, services, services_too = asyncio.run(run())
+    assert len(fake_model.requests) == 2
+    assert (price.cached, how_much.cached, services.cached, services_too.cached) == (None, "exact", None, "similar")
+    assert how_much.text == price.text
+    assert services_too.text == services.text
+
+
+def test_personal_messages_and_other_templates_are_not_shared(fake_model):
+    other = render_template(2, "Brow Bar", tone="professional")
+
+    async def run():
+        async with _gateway(fake_model) as gateway:
+            await gateway.complete(TEMPLATE, "call me on 07700 900123")
+            await gateway.complete(TEMPLATE, "call me on 07700 900123")
+            await gateway.complete(TEMPLATE, "where are you?")
+            await gateway.complete(other, "where are you?")
+
+    asyncio.run(run())
+    assert len(fake_model.requests) == 4
+    assert fake_model.requests[-1]["messages"][0]["content"].startswith("You are the booking assistant for Brow Bar")
+
+
+def test_budget_is_checked_before_calling_the_model(fake_model):
+    budget = TokenBudget(daily_limit=250)
+
+    async def run():
+        async with _gateway(fake_model, budget=budget, max_tokens=150) as gateway:
+            await gateway.complete(TEMPLATE, "first question about lashes")
+            with pytest.raises(BudgetExceededError):
+                await gateway.complete(TEMPLATE, "second question about brows")
+
+    asyncio.run(run())
+    assert len(fake_model.requests) == 1
+    assert 0 < budget.used(1) < 150  # settled to the real usage, not the reservation
+
+
+def test_concurrency_limit_and_shared_in_flight_calls(fake_model):
+    fake_model.latency = 0.05
+
+    async def run():
+        async with _gateway(fake_model, concurrency=2) as gateway:
+            distinct = [gateway.complete(TEMPLATE, f"question number {n} about aftercare") for n in range(6)]
+            await asyncio.gather(*distinct)
+            assert fake_model.max_in_flight <= 2
+            fake_model.requests.clear()
+            return await asyncio.gather(*(gateway.complete(TEMPLATE, "do you do gift vouchers?") for _ in range(5)))
+
+    replies = asyncio.run(run())
+    assert len(fake_model.requests) == 1
+    assert sum(r.cached == "shared" for r in replies) == 4
+
+
+def test_stream_yields_chunks_and_fills_cache(fake_model):
+    async def run():
+        async with _gateway(fake_model) as gateway:
+            chunks = [chunk async for chunk in gateway.stream(TEMPLATE, "where are you based?")]
+            cached = await gateway.complete(TEMPLATE, "where are you located?")  # same canonical question
+            return chunks, cached
+
+    chunks, cached = asyncio.run(run())
+    assert len(chunks) > 1
+    assert "".join(chunks) == cached.text
+    assert cached.cached == "exact"
+    assert fake_model.requests[0]["stream"] is True
+
+
+def test_server_errors_are_retried_then_raised(fake_model):
+    fake_model.status = 503
+
+    async def run():
+        async with _gateway(fake_model, max_retries=1) as gateway:
+            await gateway.complete(TEMPLATE, "anything")
+
+    with pytest.raises(llm_gateway.LLMError):
+        asyncio.run(run())
+    assert len(fake_model.requests) == 2
+
+
+def test_prompt_template_follows_chat_settings(session_factory):
+    db = session_factory()
+    db.add(models.Technician(full_name="Tech", business_name="Lash Studio", email="t@example.com", password="x"))
+    db.commit()
+    cache = llm_gateway.prompt_cache
+    cache.clear()
+
+    before = cache.get(db, 1)
+    assert cache.get(db, 1) is before
+    db.add(models.ChatSetting(technician_id=1, tone="professional", custom_prompt="Mention the free patch test.", model_name="gpt-4o-mini"))
+    db.commit()
+    after = cache.get(db, 1)
+
+    assert after.fingerprint != before.fingerprint
+    assert after.model == "gpt-4o-mini"
+    assert after.system.endswith("Mention the free patch test.")
+    assert PromptCache().get(db, 99) is None
+    db.close()
@@ -9,21 +9,25 @@ import hmac
 import json as jsonlib
 import os
 
-from services.backend.main import app, get_db
+from services.backend.main import app, get_async_db, get_db
 from services.backend import models
-from services.backend.database import Base
+from services.backend.database import Base, async_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+import tempfile
 
-# Use in-memory SQLite for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
-
-from sqlalchemy.pool import StaticPool
+# Throwaway SQLite file, so the sync and async (aiosqlite) sessions share it
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool  # keep same in-memory DB across connections
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# NullPool: TestClient may run each request on a fresh event loop
+TestingAsyncSessionLocal = async_sessionmaker(
+    create_async_engine(async_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool), expire_on_commit=False
+)
 
 Base.metadata.create_all(bind=engine)
 
@@ -34,7 +38,12 @@ def override_get_db():
     finally:
         db.close()
 
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 client = TestClient(app)
 
@@ -1007,6 +1016,27 @@ def test_chat_receive_with_session(test_technician, test_service):
     assert data["session_id"] == session_id
     assert "reply" in data
 
+def test_chat_receive_rejects_unknown_service(test_technician, test_service):
+    """A requested service must belong to the technician."""
+    response = client.post(
+        "/chat/receive",
+        json={
+            "technician_id": test_technician.id,
+            "message": "Hi",
+            "requested_service_id": 999999
+        }
+    )
+    assert response.status_code == 400
+
+def test_chat_receive_rejects_malformed_requested_slot(test_technician, test_service):
+    """Pre-filled dates and times must parse."""
+    for slot in ({"requested_time": "25:00"}, {"requested_date": "next week"}):
+        response = client.post(
+            "/chat/receive",
+            json={"technician_id": test_technician.id, "message": "Hi", **slot}
+        )
+        assert response.status_code == 400
+
 def test_chat_list_services(test_technician, test_service):
     """Test listing services via chat."""
     response = client.post(
@@ -1164,3 +1194,556 @@ def test_disconnect_social_account(test_technician):
     assert response.status_code == 200
     data = response.json()
     assert data["success"] is True
+
+
+# ====== AVAILABILITY SLOT TESTS ======
+def test_availability_slots_subtract_overlapping_bookings(test_technician, test_service):
+    """Slots endpoint should only return starts that don't overlap blocking bookings."""
+    db = TestingSessionLocal()
+    db.add(models.Availability(
+        technician_id=test_technician.id,
+        day="Monday",
+        start_time="09:00",
+        end_time="12:00"
+    ))
+    db.add(models.Appointment(
+        technician_id=test_technician.id,
+        service_id=test_service.id,
+        client_name="Booked Client",
+        date="2030-01-07",
+        time="10:00",
+        status="pending"
+    ))
+    db.add(models.Appointment(
+        technician_id=test_technician.id,
+        service_id=test_service.id,
+        client_name="Cancelled Client",
+        date="2030-01-07",
+        time="11:00",
+        status="cancelled"
+    ))
+    db.commit()
+    db.close()
+
+    response = client.get(
+        "/availability/slots",
+        params={
+            "technician_id": test_technician.id,
+            "date": "2030-01-07",
+            "timezone": "Africa/Lagos",
+            "service_id": test_service.id
+        }
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["timezone"] == "Africa/Lagos"
+    assert data["duration_minutes"] == 30
+    assert data["slots"] == ["09:00", "09:30", "10:30", "11:00", "11:30"]
+
+
+def test_availability_slots_rejects_bad_input(test_technician):
+    """Invalid dates and timezones should return 400."""
+    bad_date = client.get(
+        "/availability/slots",
+        params={"technician_id": test_technician.id, "date": "07/01/2030"}
+    )
+    assert bad_date.status_code == 400
+
+    bad_tz = client.get(
+        "/availability/slots",
+        params={"technician_id": test_technician.id, "date": "2030-01-07", "timezone": "Mars/Base"}
+    )
+    assert bad_tz.status_code == 400
+
+
+# ====== SHARED BOOKING SERVICE TESTS ======
+def test_bookings_create_returns_slot_unavailable_on_overlap(test_technician, test_service):
+    """Overlapping (not just identical) starts should get the contract 409 body."""
+    first = client.post(
+        "/bookings/create",
+        json={
+            "technician_id": test_technician.id,
+            "service_id": test_service.id,
+            "client_name": "First Client",
+            "date": "2030-01-08",
+            "time": "14:00",
+            "timezone": "Africa/Lagos",
+            "source": "ai"
+        }
+    )
+    assert first.status_code == 200
+    assert first.json()["success"] is True
+
+    db = TestingSessionLocal()
+    created = db.query(models.Appointment).filter(models.Appointment.id == first.json()["booking_id"]).first()
+    assert created.booking_source == "ai"
+    assert created.service_price == 5000.0
+    db.close()
+
+    conflict = client.post(
+        "/bookings/create",
+        json={
+            "technician_id": test_technician.id,
+            "service_id": test_service.id,
+            "client_name": "Second Client",
+            "date": "2030-01-08",
+            "time": "14:15",
+            "source": "website"
+        }
+    )
+    assert conflict.status_code == 409
+    body = conflict.json()
+    assert body["code"] == "SLOT_UNAVAILABLE"
+    assert body["next_available"][0] == "14:30"
+
+
+def test_bookings_create_unknown_service(test_technician):
+    """Unknown services should return 404 instead of creating a booking."""
+    response = client.post(
+        "/bookings/create",
+        json={
+            "technician_id": test_technician.id,
+            "service_id": 999999,
+            "client_name": "Nobody",
+            "date": "2030-01-08",
+            "time": "10:00"
+        }
+    )
+    assert response.status_code == 404
+
+
+# ====== IDEMPOTENCY TESTS ======
+def test_bookings_create_replays_idempotency_key(test_technician, test_service):
+    """Same Idempotency-Key + payload returns the stored response without a second insert."""
+    key = f"idem-{uuid.uuid4().hex}"
+    payload = {
+        "technician_id": test_technician.id,
+        "service_id": test_service.id,
+        "client_name": "Retry Client",
+        "date": "2030-01-09",
+        "time": "09:00"
+    }
+    first = client.post("/bookings/create", json=payload, headers={"Idempotency-Key": key})
+    replay = client.post("/bookings/create", json=payload, headers={"Idempotency-Key": key})
+    assert first.status_code == 200
+    assert replay.status_code == 200
+    assert replay.json() == first.json()
+    assert replay.headers.get("Idempotent-Replayed") == "true"
+
+    db = TestingSessionLocal()
+    count = db.query(models.Appointment).filter(
+        models.Appointment.technician_id == test_technician.id
+    ).count()
+    db.close()
+    assert count == 1
+
+    mismatch = client.post(
+        "/bookings/create",
+        json={**payload, "time": "11:00"},
+        headers={"Idempotency-Key": key}
+    )
+    assert mismatch.status_code == 422
+
+
+def test_failed_request_releases_idempotency_key(test_technician, test_service):
+    """Errors are not stored, so a corrected retry with the same key can succeed."""
+    key = f"idem-{uuid.uuid4().hex}"
+    db = TestingSessionLocal()
+    booking = models.Appointment(
+        technician_id=test_technician.id,
+        service_id=test_service.id,
+        client_name="Payer",
+        date="2030-01-09",
+        time="12:00",
+        payment_status="unpaid"
+    )
+    db.add(booking)
+    db.commit()
+    booking_id = booking.id
+    db.close()
+
+    missing = client.post(
+        "/confirm-payment",
+        json={"booking_id": 999999, "payment_method": "bank"},
+        headers={"Idempotency-Key": key}
+    )
+    assert missing.status_code == 404
+
+    ok = client.post(
+        "/confirm-payment",
+        json={"booking_id": booking_id, "payment_method": "bank"},
+        headers={"Idempotency-Key": key}
+    )
+    replay = client.post(
+        "/confirm-payment",
+        json={"booking_id": booking_id, "payment_method": "bank"},
+        headers={"Idempotency-Key": key}
+    )
+    assert ok.status_code == 200
+    assert replay.json() == ok.json()
+    assert replay.headers.get("Idempotent-Replayed") == "true"
+
+
+# ====== AUTH CACHE TESTS ======
+def test_auth_cache_serves_repeat_requests_and_invalidates_on_update(test_technician):
+    """Repeat requests hit the token/technician cache; profile updates invalidate it."""
+    from services.backend.auth import auth_cache, create_access_token
+
+    auth_cache.clear()
+    headers = {"Authorization": f"Bearer {create_access_token(subject=test_technician.email)}"}
+    before = auth_cache.stats()
+
+    first = client.get("/me", headers=headers)
+    second = client.get("/me", headers=headers)
+    assert first.status_code == 200
+    assert second.json()["business_name"] == "Test Beauty"
+
+    after = auth_cache.stats()
+    assert after["token_hits"] - before["token_hits"] == 1
+    assert after["technician_hits"] - before["technician_hits"] == 1
+
+    db = TestingSessionLocal()
+    tech = db.query(models.Technician).filter(models.Technician.id == test_technician.id).first()
+    tech.business_name = "Renamed Beauty"
+    db.commit()
+    db.close()
+
+    refreshed = client.get("/me", headers=headers)
+    assert refreshed.json()["business_name"] == "Renamed Beauty"
+
+    metrics_res = client.get("/metrics")
+    assert metrics_res.status_code == 200
+    assert "auth_cache" in metrics_res.json()
+
+
+def test_auth_rejects_invalid_token():
+    """Garbage tokens are rejected and never cached."""
+    response = client.get("/me", headers={"Authorization": "Bearer not-a-jwt"})
+    assert response.status_code == 401
+
+
+# ====== SIGNUP / LOGIN TESTS ======
+def test_signup_and_login_hash_off_loop():
+    """Signup/login work end to end with hashing in the bounded pool."""
+    from services import password_service
+
+    email = f"signup_{uuid.uuid4().hex[:8]}@example.com"
+    signup = client.post(
+        "/signup-technician",
+        json={"email": email, "password": "s3cret-pass", "business_name": "Pool Beauty"}
+    )
+    assert signup.status_code == 200
+
+    bad = client.post("/login", json={"email": email, "password": "wrong"})
+    assert bad.status_code == 401
+
+    good = client.post("/login", json={"email": email, "password": "s3cret-pass"})
+    assert good.status_code == 200
+    assert good.json()["technician"]["business_name"] == "Pool Beauty"
+
+    stats = password_service.stats()
+    assert stats["completed"] >= 3
+    assert stats["queued"] == 0
+
+
+def test_login_rehashes_outdated_argon2_parameters():
+    """Hashes made with old Argon2 parameters are upgraded on successful login."""
+    from argon2 import PasswordHasher
+    from services import password_service
+
+    email = f"rehash_{uuid.uuid4().hex[:8]}@example.com"
+    old_hash = PasswordHasher(time_cost=1, memory_cost=8192, parallelism=1).hash("old-params")
+    assert password_service.pwd_hasher.check_needs_rehash(old_hash)
+
+    db = TestingSessionLocal()
+    db.add(models.Technician(full_name="R", business_name="Rehash", email=email, password=old_hash))
+    db.commit()
+    db.close()
+
+    response = client.post("/login", json={"email": email, "password": "old-params"})
+    assert response.status_code == 200
+
+    db = TestingSessionLocal()
+    stored = db.query(models.Technician).filter(models.Technician.email == email).first().password
+    db.close()
+    assert stored != old_hash
+    assert not password_service.pwd_hasher.check_needs_rehash(stored)
+
+
+# ====== WEBHOOK INBOX TESTS ======
+
+def test_webhook_is_acknowledged_and_stored_in_inbox(test_technician):
+    """Webhook POST returns 200 immediately and leaves the raw event pending in the inbox."""
+    payload = {"entry": [{"messaging": [{"sender": {"id": "INBOX_USER"}, "recipient": {"id": "INBOX_PAGE"}, "message": {"mid": "m.inbox.1", "text": "hi"}}]}]}
+    response = client.post("/webhooks/instagram", json=payload)
+    assert response.status_code == 200
+    assert response.json() == {"status": "received"}
+
+    db = TestingSessionLocal()
+    event = db.query(models.WebhookEvent).order_by(models.WebhookEvent.id.desc()).first()
+    db.close()
+    assert event.source == "instagram"
+    assert event.status == "pending"
+    assert jsonlib.loads(event.payload) == payload
+
+
+def test_webhook_rejects_invalid_json():
+    response = client.post("/webhooks/instagram", content=b"not json", headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+
+
+def test_webhook_redelivery_is_dropped_before_storage():
+    """A redelivered event inside the replay window is acknowledged but not stored again."""
+    payload = {"entry": [{"messaging": [{"sender": {"id": "DUP_USER"}, "recipient": {"id": "DUP_PAGE"}, "message": {"mid": "m.dup.1", "text": "hi"}}]}]}
+
+    db = TestingSessionLocal()
+    before = db.query(models.WebhookEvent).count()
+    db.close()
+
+    first = client.post("/webhooks/instagram", json=payload)
+    second = client.post("/webhooks/instagram", json=payload)
+    assert first.json() == {"status": "received"}
+    assert second.status_code == 200
+    assert second.json() == {"status": "duplicate"}
+
+    db = TestingSessionLocal()
+    assert db.query(models.WebhookEvent).count() == before + 1
+    db.close()
+
+
+# ====== LIVE EVENTS TESTS ======
+
+def test_event_stream_requires_token():
+    assert client.get("/events/stream").status_code == 401
+    assert client.get("/events/stream?token=not-a-jwt").status_code == 401
+
+
+# ====== FEED PAGINATION TESTS ======
+
+def _add_message_logs(technician_id, session_id, count, start):
+    db = TestingSessionLocal()
+    for n in range(count):
+        db.add(models.MessageLog(
+            technician_id=technician_id,
+            platform="instagram",
+            direction="incoming",
+            sender_id="page_user",
+            message_content=f"msg {n}",
+            session_id=session_id,
+            status="received",
+            created_at=(start + timedelta(seconds=n)).isoformat()
+        ))
+    db.commit()
+    db.close()
+
+
+def test_social_messages_keyset_pages_and_since_cursor(test_technician):
+    """Pages walk back by (created_at, id) and `since` returns only newer rows."""
+    start = datetime(2031, 1, 1, tzinfo=timezone.utc)
+    _add_message_logs(test_technician.id, "page_sess", 5, start)
+
+    first = client.get(f"/social/messages/{test_technician.id}?limit=2").json()
+    assert [m["message_content"] for m in first["messages"]] == ["msg 4", "msg 3"]
+    assert first["has_more"] is True
+
+    second = client.get(f"/social/messages/{test_technician.id}?limit=2&before={first['next_cursor']}").json()
+    assert [m["message_content"] for m in second["messages"]] == ["msg 2", "msg 1"]
+
+    unchanged = client.get(f"/social/messages/{test_technician.id}?since={first['sync_cursor']}").json()
+    assert unchanged["messages"] == []
+    assert unchanged["sync_cursor"] == first["sync_cursor"]
+
+    _add_message_logs(test_technician.id, "page_sess", 1, start + timedelta(minutes=5))
+    delta = client.get(f"/social/messages/{test_technician.id}?since={first['sync_cursor']}").json()
+    assert [m["message_content"] for m in delta["messages"]] == ["msg 0"]
+    assert delta["sync_cursor"] != first["sync_cursor"]
+
+    # Stamped before rows the client already has, but committed after them
+    _add_message_logs(test_technician.id, "page_sess", 1, start - timedelta(hours=1))
+    late = client.get(f"/social/messages/{test_technician.id}?since={delta['sync_cursor']}").json()
+    assert [m["created_at"] for m in late["messages"]] == [(start - timedelta(hours=1)).isoformat()]
+
+
+def test_session_timeline_is_chronological_with_since(test_technician):
+    now = datetime.now(timezone.utc)
+    db = TestingSessionLocal()
+    db.add(models.ChatSession(
+        session_id="keyset_sess",
+        technician_id=test_technician.id,
+        platform="instagram",
+        account_id="keyset_user",
+        step="name",
+        created_at=now.isoformat(),
+        updated_at=now.isoformat(),
+        expires_at=(now + timedelta(hours=24)).isoformat()
+    ))
+    db.commit()
+    db.close()
+    _add_message_logs(test_technician.id, "keyset_sess", 3, now)
+
+    timeline = client.get(f"/social/session/{test_technician.id}/keyset_sess/messages?limit=2").json()
+    assert [m["message_content"] for m in timeline["messages"]] == ["msg 1", "msg 2"]
+
+    older = client.get(f"/social/session/{test_technician.id}/keyset_sess/messages?before={timeline['next_cursor']}").json()
+    assert [m["message_content"] for m in older["messages"]] == ["msg 0"]
+
+    assert client.get(f"/social/session/{test_technician.id}/missing_sess/messages").status_code == 404
+
+
+def test_feed_rejects_malformed_cursor(test_technician):
+    response = client.get(f"/notifications/{test_technician.id}?since=not-a-cursor")
+    assert response.status_code == 400
+
+
+# ====== SOCIAL OAUTH TESTS ======
+
+def test_social_connect_issues_single_use_state(test_technician, monkeypatch):
+    """The callback must present a state issued to the same technician, once."""
+    from services.backend.auth import create_access_token
+    import services.backend.main as backend_main
+
+    from services.backend import oauth_state
+
+    monkeypatch.setenv("INSTAGRAM_CLIENT_ID", "ig_client")
+    monkeypatch.setattr(oauth_state, "_store", oauth_state.DBStateStore(session_factory=TestingSessionLocal))
+    exchanged = []
+    async def fake_exchange(code, redirect_uri):
+        exchanged.append(code)
+        return {"access_token": "LONG_TOKEN", "account_id": "IG_1", "account_name": "beauty_ig", "expires_in": 3600}
+    monkeypatch.setitem(backend_main.OAUTH_PLATFORMS, "instagram", (backend_main.social_utils.get_instagram_auth_url, fake_exchange))
+
+    headers = {"Authorization": f"Bearer {create_access_token(subject=test_technician.email)}"}
+    start = client.post(
+        "/social/connect/instagram",
+        json={"technician_id": test_technician.id, "redirect_uri": "https://app.example/dashboard"},
+        headers=headers,
+    )
+    assert start.status_code == 200
+    state = start.json()["state"]
+    assert f"state={state}" in start.json()["auth_url"]
+
+    callback = {"platform": "instagram", "code": "abc", "technician_id": test_technician.id,
+                "redirect_uri": "https://app.example/dashboard", "state": state}
+    first = client.post("/social/token", json=callback, headers=headers)
+    assert first.status_code == 200
+    assert first.json()["account_name"] == "beauty_ig"
+
+    replay = client.post("/social/token", json=callback, headers=headers)
+    assert replay.status_code == 400
+    assert exchanged == ["abc"]
+
+    db = TestingSessionLocal()
+    account = db.query(models.SocialAccount).filter(
+        models.SocialAccount.technician_id == test_technician.id,
+        models.SocialAccount.platform == "instagram",
+    ).one()
+    db.close()
+    assert account.access_token == "LONG_TOKEN"
+
+
+# ====== WHATSAPP QR TESTS ======
+
+def test_whatsapp_qr_is_rendered_locally_and_cached(test_technician):
+    from services import qr_service
+    from services.backend.auth import create_access_token
+
+    headers = {"Authorization": f"Bearer {create_access_token(subject=test_technician.email)}"}
+    response = client.post("/whatsapp/qr", json={"technician_id": test_technician.id}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["qr_code"].endswith(f"/whatsapp/qr/{data['session_id']}.png")
+    assert "qrserver" not in data["qr_code"]
+    hits = qr_service.cache.stats()["hits"]
+
+    image = client.get(f"/whatsapp/qr/{data['session_id']}.png")
+    assert image.status_code == 200
+    assert image.headers["content-type"] == "image/png"
+    assert image.content.startswith(b"\x89PNG")
+    assert 0 < int(image.headers["cache-control"].split("max-age=")[1].split(",")[0]) <= data["expires_in"]
+    assert qr_service.cache.stats()["hits"] == hits + 1
+
+    cached = client.get(f"/whatsapp/qr/{data['session_id']}.png", headers={"If-None-Match": image.headers["etag"]})
+    assert cached.status_code == 304
+
+    # A cache miss (e.g. another worker) re-renders from the stored session
+    qr_service.cache.discard(data["session_id"])
+    assert client.get(f"/whatsapp/qr/{data['session_id']}.png").content == image.content
+
+    assert client.get("/whatsapp/qr/unknown-session.png").status_code == 404
+
+
+# ====== ASYNC READ ENDPOINT TESTS ======
+
+def test_services_me_reads_through_async_session(test_technician, test_service):
+    from services.backend.auth import create_access_token
+
+    headers = {"Authorization": f"Bearer {create_access_token(subject=test_technician.email)}"}
+    response = client.get("/services/me", headers=headers)
+    assert response.status_code == 200
+    assert [s["id"] for s in response.json()] == [test_service.id]
+
+    assert client.get("/services/me", headers={"Authorization": "Bearer nope"}).status_code == 401
+
+
+def test_bookings_list_joins_service_and_skips_cancelled(test_technician, test_service):
+    db = TestingSessionLocal()
+    for day, status in (("2026-03-01", "confirmed"), ("2026-03-05", "pending"), ("2026-03-07", "cancelled")):
+        db.add(models.Appointment(
+            technician_id=test_technician.id,
+            service_id=test_service.id,
+            client_name=f"Client {day}",
+            date=day,
+            time="10:00",
+            status=status,
+            payment_status="paid" if status == "confirmed" else "unpaid",
+        ))
+    db.commit()
+    db.close()
+
+    bookings = client.get(f"/bookings/{test_technician.id}").json()["bookings"]
+    assert [b["appointment_date"] for b in bookings] == ["2026-03-05", "2026-03-01"]
+    assert bookings[0]["service_name"] == "Haircut"
+    assert bookings[1]["payment_status"] == "paid"
+
+
+def test_chat_endpoint_runs_booking_flow(test_technician, test_service):
+    from services.backend.auth import create_access_token
+
+    headers = {"Authorization": f"Bearer {create_access_token(subject=test_technician.email)}"}
+    first = client.post("/chat", json={"chat_id": "c1", "message": "Hi"}, headers=headers)
+    assert first.status_code == 200
+    assert first.json()["action"] == "ASK_CLIENT_NAME"
+    assert "Test Beauty" in first.json()["reply"]
+
+    second = client.post("/chat", json={"chat_id": "c1", "message": "I'm Alice"}, headers=headers)
+    assert second.json()["step"] == "service"
+    assert [s["id"] for s in second.json()["services"]] == [test_service.id]
+
+
+def test_ai_reply_uses_gateway_cache_and_streams(test_technician, monkeypatch):
+    import functools
+    import weakref
+
+    from services.backend import llm_gateway
+    from services.backend.auth import create_access_token
+    from services.fake_model_server import FakeModelServer
+
+    server = FakeModelServer().start()
+    monkeypatch.setattr(llm_gateway, "LLMGateway", functools.partial(llm_gateway.LLMGateway, base_url=server.url, responses=llm_gateway.ResponseCache()))
+    monkeypatch.setattr(llm_gateway, "_gateways", weakref.WeakKeyDictionary())
+    headers = {"Authorization": f"Bearer {create_access_token(subject=test_technician.email)}"}
+    try:
+        first = client.post("/chat/ai-reply", json={"message": "where are you?", "stream": True}, headers=headers)
+        assert first.status_code == 200
+        assert first.headers["content-type"].startswith("text/event-stream")
+        chunks = [jsonlib.loads(line[6:])["text"] for line in first.text.splitlines() if line.startswith("data: {")]
+        assert len(chunks) > 1 and first.text.rstrip().endswith("data: [DONE]")
+
+        second = client.post("/chat/ai-reply", json={"message": "Where are you located?"}, headers=headers)
+        assert second.status_code == 200
+        assert second.json()["cached"] == "exact"
+        assert second.json()["reply"] == "".join(chunks)
+        assert len(server.requests) == 1
+        assert "Test Beauty" in server.requests[0]["messages"][0]["content"]
+    finally:
+        server.stop()
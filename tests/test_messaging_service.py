@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+import httpx
+
+from services.messaging_service import MessagingClient, OutboundMessage
+
+
+def test_whatsapp_send_retries_on_429_then_succeeds(fake_graph):
+    fake_graph.queue("/v17.0/PHONE1/messages", 429, {"error": {"message": "rate limited"}}, {"Retry-After": "0"})
+    fake_graph.queue("/v17.0/PHONE1/messages", 200, {"messages": [{"id": "wamid.ok"}]})
+
+    async def run():
+        async with MessagingClient(base_url=fake_graph.url, backoff_base=0.01) as client:
+            return await client.send_whatsapp_text("PHONE1", "TOKEN", "+2348000000000", "Hi")
+
+    result = asyncio.run(run())
+    assert result.ok is True
+    assert result.message_id == "wamid.ok"
+    assert result.attempts == 2
+    assert fake_graph.requests[-1]["headers"]["Authorization"] == "Bearer TOKEN"
+    assert json.loads(fake_graph.requests[-1]["body"])["text"]["body"] == "Hi"
+
+
+def test_client_error_is_not_retried(fake_graph):
+    fake_graph.queue("/v17.0/me/messages", 400, {"error": {"message": "Invalid recipient"}})
+
+    async def run():
+        async with MessagingClient(base_url=fake_graph.url, backoff_base=0.01) as client:
+            return await client.send_instagram_text("TOKEN", "IGSID", "Hello")
+
+    result = asyncio.run(run())
+    assert result.ok is False
+    assert result.attempts == 1
+    assert result.error == "Invalid recipient"
+
+
+def test_only_connection_failures_are_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        if len(calls) == 1:
+            raise httpx.ConnectError("connection refused", request=request)
+        raise httpx.ReadTimeout("timed out", request=request)  # Graph may already have the message
+
+    async def run():
+        async with MessagingClient(base_url="http://graph.test", backoff_base=0.01, transport=httpx.MockTransport(handler)) as client:
+            return await client.send_whatsapp_text("PHONE1", "TOKEN", "+2348000000000", "Hi")
+
+    result = asyncio.run(run())
+    assert result.ok is False
+    assert result.attempts == 2
+    assert result.error.startswith("ReadTimeout")
+    assert result.maybe_sent is True
+
+
+def test_server_errors_are_retried_only_when_graph_asks():
+    statuses = iter([(503, {"Retry-After": "0"}), (502, {})])
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        status, headers = next(statuses)
+        return httpx.Response(status, json={"error": {"message": "upstream"}}, headers=headers)
+
+    async def run():
+        async with MessagingClient(base_url="http://graph.test", backoff_base=0.01, transport=httpx.MockTransport(handler)) as client:
+            return await client.send_whatsapp_text("PHONE1", "TOKEN", "+2348000000000", "Hi")
+
+    result = asyncio.run(run())
+    assert len(calls) == 2
+    assert result.ok is False
+    assert result.status_code == 502
+    assert result.maybe_sent is True
+
+
+def test_send_many_respects_concurrency_limit(fake_graph):
+    fake_graph.delay = 0.02
+    messages = [
+        OutboundMessage(platform="whatsapp", recipient=f"+234800000{i:04d}", text="Reminder", access_token="T", sender_id="PHONE1")
+        for i in range(40)
+    ]
+
+    async def run():
+        async with MessagingClient(base_url=fake_graph.url) as client:
+            return await client.send_many(messages, concurrency=5)
+
+    results = asyncio.run(run())
+    assert len(results) == 40
+    assert all(r.ok for r in results)
+    assert fake_graph.max_in_flight <= 5
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.backend import models, oauth_state
+
+
+@pytest.fixture(params=["memory", "db"])
+def store(request):
+    if request.param == "memory":
+        return oauth_state.MemoryStateStore()
+    return oauth_state.DBStateStore(session_factory=request.getfixturevalue("session_factory"))
+
+
+def test_state_is_bound_to_technician_and_single_use(store):
+    state = store.issue(1, "instagram")
+    other = store.issue(1, "instagram")
+
+    assert not store.consume(other, 2, "instagram")
+    assert not store.consume("unknown", 1, "instagram")
+    assert store.consume(state, 1, "instagram")
+    assert not store.consume(state, 1, "instagram")  # replayed callback
+
+
+def test_memory_store_expires_states():
+    store = oauth_state.MemoryStateStore(ttl=0)
+    state = store.issue(1, "facebook")
+    assert not store.consume(state, 1, "facebook")
+    assert len(store) == 0
+
+
+def test_db_store_rejects_and_sweeps_expired_states(session_factory):
+    store = oauth_state.DBStateStore(session_factory=session_factory, ttl=600)
+    fresh = store.issue(1, "instagram")
+
+    db = store.session_factory()
+    past = datetime.now(timezone.utc) - timedelta(minutes=1)
+    for n in range(3):
+        db.add(models.OAuthState(
+            state=f"old-{n}", technician_id=1, platform="instagram",
+            created_at=(past - timedelta(minutes=10)).isoformat(), expires_at=past.isoformat(),
+        ))
+    db.commit()
+    db.close()
+
+    assert not store.consume("old-0", 1, "instagram")
+    assert store.sweep() == 3
+    assert store.consume(fresh, 1, "instagram")
+
+
+def test_incomplete_store_fails_when_created():
+    class NoSweep(oauth_state.OAuthStateStore):
+        def issue(self, technician_id, platform):
+            return "s"
+
+        def consume(self, state, technician_id, platform):
+            return True
+
+    with pytest.raises(TypeError):
+        NoSweep()
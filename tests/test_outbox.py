@@ -0,0 +1,117 @@
+import asyncio
+from datetime import datetime, timezone
+
+from services.backend import events, models, outbox
+from services.messaging_service import MessagingClient
+
+
+def _technician_with_account(Session, platform="instagram"):
+    db = Session()
+    tech = models.Technician(full_name="T", business_name="B", email="outbox@example.com", password="x")
+    db.add(tech)
+    db.commit()
+    account = models.SocialAccount(
+        technician_id=tech.id,
+        platform=platform,
+        account_name="biz",
+        account_id="PAGE1",
+        access_token="PAGE_TOKEN",
+        connected_at=datetime.now(timezone.utc).isoformat(),
+    )
+    db.add(account)
+    db.commit()
+    ids = (tech.id, account.id)
+    db.close()
+    return ids
+
+
+def test_worker_drains_queue_and_marks_logs_sent(fake_graph, session_factory):
+    Session = session_factory
+    tech_id, account_id = _technician_with_account(Session)
+    fake_graph.default = (200, {"recipient_id": "USER1", "message_id": "mid.1"}, {})
+
+    db = Session()
+    for n in range(3):
+        outbox.enqueue_message(db, tech_id, "instagram", "USER1", f"Reply {n}", social_account_id=account_id)
+    queued = db.query(models.MessageLog).filter(models.MessageLog.status == "queued").count()
+    db.close()
+    assert queued == 3
+
+    async def run():
+        async with MessagingClient(base_url=fake_graph.url) as client:
+            worker = outbox.OutboxWorker(session_factory=Session, client=client, batch_size=10)
+            return await worker.run_once(), await worker.run_once()
+
+    first, second = asyncio.run(run())
+    assert (first, second) == (3, 0)
+    assert len(fake_graph.requests) == 3
+    assert fake_graph.requests[0]["path"] == "/v17.0/PAGE1/messages"
+
+    db = Session()
+    statuses = {log.status for log in db.query(models.MessageLog).all()}
+    assert statuses == {"sent"}
+    assert outbox.update_delivery_status(db, "mid.1", "delivered") is True
+    assert db.query(models.MessageLog).filter(models.MessageLog.status == "delivered").count() == 1
+    db.close()
+
+
+def test_retryable_failure_is_requeued_and_permanent_failure_marked(fake_graph, session_factory):
+    Session = session_factory
+    tech_id, account_id = _technician_with_account(Session)
+    fake_graph.queue("/v17.0/PAGE1/messages", 503, {"error": {"message": "down"}}, {"Retry-After": "5"})
+    fake_graph.queue("/v17.0/PAGE1/messages", 400, {"error": {"message": "bad recipient"}})
+    fake_graph.queue("/v17.0/PAGE1/messages", 500, {"error": {"message": "internal error"}})
+
+    db = Session()
+    outbox.enqueue_message(db, tech_id, "instagram", "USER1", "first", social_account_id=account_id)
+    outbox.enqueue_message(db, tech_id, "instagram", "USER2", "second", social_account_id=account_id)
+    outbox.enqueue_message(db, tech_id, "instagram", "USER3", "third", social_account_id=account_id)
+    db.close()
+
+    async def run():
+        async with MessagingClient(base_url=fake_graph.url, max_retries=0) as client:
+            worker = outbox.OutboxWorker(session_factory=Session, client=client, batch_size=1)
+            for _ in range(3):
+                await worker.run_once()
+
+    asyncio.run(run())
+
+    db = Session()
+    rows = {row.recipient_id: row for row in db.query(models.OutboundMessage).all()}
+    assert rows["USER1"].status == "queued"
+    assert rows["USER1"].attempts == 1
+    assert rows["USER1"].next_attempt_at > datetime.now(timezone.utc).isoformat()
+    assert rows["USER2"].status == "failed"
+    assert rows["USER2"].last_error == "bad recipient"
+    # A 500 may come after Graph accepted the message; resending could duplicate it
+    assert rows["USER3"].status == "failed"
+    assert rows["USER3"].last_error == "internal error"
+    db.close()
+
+
+def test_send_results_and_delivery_receipts_publish_message_updates(fake_graph, session_factory):
+    Session = session_factory
+    tech_id, account_id = _technician_with_account(Session)
+    fake_graph.default = (200, {"recipient_id": "USER1", "message_id": "mid.1"}, {})
+
+    db = Session()
+    outbox.enqueue_message(db, tech_id, "instagram", "USER1", "Reply", social_account_id=account_id)
+    db.close()
+
+    async def run():
+        subscriber = events.broker.subscribe(tech_id)
+        async with MessagingClient(base_url=fake_graph.url) as client:
+            worker = outbox.OutboxWorker(session_factory=Session, client=client, batch_size=10)
+            await worker.run_once()
+        db = Session()
+        outbox.update_delivery_status(db, "mid.1", "read")
+        db.close()
+        await asyncio.sleep(0)
+        received = []
+        while not subscriber.queue.empty():
+            received.append(subscriber.queue.get_nowait())
+        events.broker.unsubscribe(subscriber)
+        return received
+
+    updates = [item.data["status"] for item in asyncio.run(run()) if item.type == "message_updated"]
+    assert updates == ["sent", "read"]
@@ -0,0 +1,39 @@
+import asyncio
+import io
+
+from PIL import Image
+
+from services.qr_service import QRCache, QRImage, render_png
+
+
+def test_render_png_produces_square_image():
+    png = render_png("https://wa.me/?text=connect_1_abc")
+    image = Image.open(io.BytesIO(png))
+    assert image.format == "PNG"
+    assert image.size[0] == image.size[1] > 100
+
+
+def test_cache_is_lru_and_drops_expired_entries():
+    cache = QRCache(maxsize=2)
+    cache.put("a", QRImage(b"a", '"a"', expires_at=200))
+    cache.put("b", QRImage(b"b", '"b"', expires_at=200))
+    assert cache.get("a", now=100).png == b"a"  # a is now most recent
+    cache.put("c", QRImage(b"c", '"c"', expires_at=150))
+
+    assert cache.get("b", now=100) is None
+    assert cache.get("c", now=160) is None  # past its session expiry
+    assert cache.get("a", now=160) is not None
+    assert cache.stats()["evicted"] == 1
+
+
+def test_render_is_cached_per_session():
+    cache = QRCache()
+
+    async def run():
+        first = await cache.render("s1", "payload", expires_at=4102444800)
+        second = await cache.render("s1", "other payload", expires_at=4102444800)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first is second
+    assert cache.stats()["rendered"] == 1
@@ -0,0 +1,59 @@
+from datetime import date
+
+from services.backend import models, revenue
+
+
+def _rollup(db):
+    return sorted(
+        (r.day, r.staff_id, r.service_id, r.confirmed_revenue, r.confirmed_bookings, r.pending_revenue, r.pending_bookings)
+        for r in db.query(models.RevenueDaily).all()
+        if r.confirmed_bookings or r.pending_bookings
+    )
+
+
+def test_rollup_follows_booking_lifecycle_and_matches_rebuild(session_factory):
+    db = session_factory()
+    service = models.Service(technician_id=1, name="Lashes", price=50.0, duration=60)
+    db.add(service)
+    db.commit()
+
+    a = models.Appointment(technician_id=1, service_id=service.id, client_name="A", date="2030-05-01", time="10:00", service_price=50.0)
+    b = models.Appointment(technician_id=1, service_id=service.id, client_name="B", date="2030-05-01", time="11:00", staff_id=7)
+    c = models.Appointment(technician_id=1, service_id=service.id, client_name="C", date="2030-05-02", time="09:00", service_price=30.0)
+    db.add_all([a, b, c])
+    db.commit()
+    assert _rollup(db) == [
+        ("2030-05-01", 0, service.id, 0.0, 0, 50.0, 1),
+        ("2030-05-01", 7, service.id, 0.0, 0, 50.0, 1),  # price falls back to the service
+        ("2030-05-02", 0, service.id, 0.0, 0, 30.0, 1),
+    ]
+
+    a.payment_status = "paid"
+    db.commit()
+    db.expire_all()
+    b = db.get(models.Appointment, b.id)
+    b.status = "cancelled"  # old value was never loaded in this session
+    c.date = "2030-05-03"
+    db.commit()
+    db.delete(c)
+    db.commit()
+
+    assert _rollup(db) == [("2030-05-01", 0, service.id, 50.0, 1, 0.0, 0)]
+    incremental = _rollup(db)
+    revenue.rebuild(db)
+    assert _rollup(db) == incremental
+
+
+def test_summary_reads_rollups_for_period(session_factory):
+    db = session_factory()
+    db.add(models.Service(id=3, technician_id=1, name="Refill", price=45.0, duration=60))
+    db.add_all([
+        models.Appointment(technician_id=1, service_id=3, client_name="A", date="2030-05-10", time="10:00", service_price=45.0, payment_status="paid"),
+        models.Appointment(technician_id=1, service_id=3, client_name="B", date="2030-05-01", time="10:00", service_price=45.0, payment_status="paid"),
+    ])
+    db.commit()
+
+    data = revenue.summary(db, 1, days=3, today=date(2030, 5, 10))
+    assert data["totals"]["confirmed_revenue"] == 45.0
+    assert [row["date"] for row in data["trend"]] == ["2030-05-08", "2030-05-09", "2030-05-10"]
+    assert data["top_services"] == [{"service_id": 3, "service_name": "Refill", "revenue": 45.0, "bookings": 1}]
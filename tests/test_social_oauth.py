@@ -0,0 +1,91 @@
+import asyncio
+
+from services.backend.social_utils import OAuthClient
+
+
+def _client(fake_graph, **kwargs):
+    return OAuthClient(
+        instagram_oauth_url=fake_graph.url,
+        instagram_graph_url=fake_graph.url,
+        facebook_graph_url=fake_graph.url,
+        **kwargs,
+    )
+
+
+def test_instagram_exchange_runs_lookups_concurrently(fake_graph, monkeypatch):
+    monkeypatch.setenv("INSTAGRAM_CLIENT_ID", "ig_client")
+    monkeypatch.setenv("INSTAGRAM_CLIENT_SECRET", "ig_secret")
+    fake_graph.queue("/oauth/access_token", 200, {"access_token": "SHORT", "user_id": 1})
+    fake_graph.queue("/access_token", 200, {"access_token": "LONG", "expires_in": 5000})
+    fake_graph.queue("/me", 200, {"id": "IG_1", "username": "beauty_ig"})
+    fake_graph.delay = 0.05
+
+    async def run():
+        async with _client(fake_graph) as client:
+            return await client.exchange_instagram_code("CODE", "https://app.example/cb")
+
+    result = asyncio.run(run())
+    assert result == {"access_token": "LONG", "account_id": "IG_1", "account_name": "beauty_ig", "expires_in": 5000}
+    assert [r["path"] for r in fake_graph.requests][0] == "/oauth/access_token"
+    assert "code=CODE" in fake_graph.requests[0]["body"]
+    assert fake_graph.max_in_flight == 2
+
+
+def test_instagram_exchange_falls_back_when_profile_lookup_fails(fake_graph, monkeypatch):
+    monkeypatch.setenv("INSTAGRAM_CLIENT_ID", "ig_client")
+    monkeypatch.setenv("INSTAGRAM_CLIENT_SECRET", "ig_secret")
+    fake_graph.queue("/oauth/access_token", 200, {"access_token": "SHORT"})
+    fake_graph.queue("/access_token", 200, {"access_token": "LONG", "expires_in": 5000})
+    fake_graph.queue("/me", 500, {"error": "unavailable"})
+
+    async def run():
+        async with _client(fake_graph) as client:
+            return await client.exchange_instagram_code("CODE", "https://app.example/cb")
+
+    result = asyncio.run(run())
+    assert result["access_token"] == "LONG"
+    assert result["account_id"] is None
+    assert result["account_name"] == "Instagram Account"
+
+
+def test_instagram_exchange_fails_when_long_lived_exchange_times_out(fake_graph, monkeypatch):
+    monkeypatch.setenv("INSTAGRAM_CLIENT_ID", "ig_client")
+    monkeypatch.setenv("INSTAGRAM_CLIENT_SECRET", "ig_secret")
+    fake_graph.queue("/oauth/access_token", 200, {"access_token": "SHORT"})
+    fake_graph.delay = 0.3
+
+    async def run():
+        async with _client(fake_graph, token_timeout=2, lookup_timeout=0.05) as client:
+            return await client.exchange_instagram_code("CODE", "https://app.example/cb")
+
+    # Saving the hour-long token with a 60-day expiry would leave a dead
+    # account marked active, so the connect fails instead
+    assert asyncio.run(run()) is None
+
+
+def test_instagram_exchange_rejected_code(fake_graph, monkeypatch):
+    monkeypatch.setenv("INSTAGRAM_CLIENT_ID", "ig_client")
+    monkeypatch.setenv("INSTAGRAM_CLIENT_SECRET", "ig_secret")
+    fake_graph.queue("/oauth/access_token", 400, {"error_message": "Invalid code"})
+
+    async def run():
+        async with _client(fake_graph) as client:
+            return await client.exchange_instagram_code("BAD", "https://app.example/cb")
+
+    assert asyncio.run(run()) is None
+    assert len(fake_graph.requests) == 1
+
+
+def test_facebook_exchange_uses_first_page_token(fake_graph, monkeypatch):
+    monkeypatch.setenv("FACEBOOK_APP_ID", "fb_app")
+    monkeypatch.setenv("FACEBOOK_APP_SECRET", "fb_secret")
+    fake_graph.queue("/v18.0/oauth/access_token", 200, {"access_token": "USER_TOKEN", "expires_in": 7200})
+    fake_graph.queue("/v18.0/me/accounts", 200, {"data": [{"id": "PAGE_1", "name": "Nails Page", "access_token": "PAGE_TOKEN"}]})
+
+    async def run():
+        async with _client(fake_graph) as client:
+            return await client.exchange_facebook_code("CODE", "https://app.example/cb")
+
+    result = asyncio.run(run())
+    assert result == {"access_token": "PAGE_TOKEN", "account_id": "PAGE_1", "account_name": "Nails Page", "expires_in": 7200}
+    assert "access_token=USER_TOKEN" in fake_graph.requests[-1]["query"]
@@ -0,0 +1,25 @@
+import os
+import pathlib
+import subprocess
+import sys
+
+from sqlalchemy import create_engine, inspect
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+
+
+def _import_app(database_url: str) -> str:
+    env = {**os.environ, "DATABASE_URL": database_url, "PYTHONPATH": str(ROOT)}
+    code = "import main; from services.backend import main as m; print(m._background_started)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+
+def test_importing_app_does_not_create_tables(tmp_path):
+    url = f"sqlite:///{tmp_path / 'startup.db'}"
+
+    assert _import_app(url) == "False"
+
+    engine = create_engine(url)
+    assert inspect(engine).get_table_names() == []
+    engine.dispose()
@@ -0,0 +1,136 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from services.backend import models
+from services.backend.social_utils import OAuthClient
+from services.backend.token_refresh import TokenRefresher
+
+NOW = datetime(2026, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _account(db, platform, token, expires_in_days, name="acct"):
+    account = models.SocialAccount(
+        technician_id=1,
+        platform=platform,
+        account_name=name,
+        access_token=token,
+        token_expires_at=(NOW + timedelta(days=expires_in_days)).isoformat(),
+        connected_at=NOW.isoformat(),
+        is_active=True,
+    )
+    db.add(account)
+    db.commit()
+    return account.id
+
+
+def _run(fake_graph, session_factory, **kwargs):
+    async def run():
+        async with OAuthClient(instagram_graph_url=fake_graph.url, facebook_graph_url=fake_graph.url) as client:
+            refresher = TokenRefresher(session_factory=session_factory, client=client, lead=7 * 24 * 3600, **kwargs)
+            handled = await refresher.run_once(now=NOW)
+            return refresher, handled
+
+    return asyncio.run(run())
+
+
+def test_refreshes_expiring_tokens_and_skips_distant_ones(fake_graph, session_factory):
+    Session = session_factory
+    db = Session()
+    soon = _account(db, "instagram", "OLD", 2)
+    later = _account(db, "instagram", "FAR", 40)
+    db.close()
+    fake_graph.queue("/refresh_access_token", 200, {"access_token": "NEW", "expires_in": 5184000})
+
+    _, handled = _run(fake_graph, Session)
+
+    assert handled == 1
+    assert [r["path"] for r in fake_graph.requests] == ["/refresh_access_token"]
+    assert "access_token=OLD" in fake_graph.requests[0]["query"]
+    db = Session()
+    refreshed = db.get(models.SocialAccount, soon)
+    assert refreshed.access_token == "NEW"
+    assert refreshed.token_expires_at == (NOW + timedelta(seconds=5184000)).isoformat()
+    assert db.get(models.SocialAccount, later).access_token == "FAR"
+    db.close()
+
+
+def test_rejected_token_deactivates_account_and_notifies(fake_graph, session_factory):
+    Session = session_factory
+    db = Session()
+    account_id = _account(db, "instagram", "REVOKED", 1, name="beauty_ig")
+    db.close()
+    fake_graph.queue("/refresh_access_token", 400, {"error": {"message": "Error validating access token", "code": 190}})
+
+    _run(fake_graph, Session)
+
+    db = Session()
+    assert db.get(models.SocialAccount, account_id).is_active is False
+    note = db.query(models.DashboardNotification).one()
+    assert note.event_type == "social_disconnected"
+    assert note.related_id == account_id
+    db.close()
+
+
+def test_transient_failure_is_retried_later_not_deactivated(fake_graph, session_factory):
+    Session = session_factory
+    db = Session()
+    account_id = _account(db, "instagram", "OLD", 1)
+    db.close()
+    fake_graph.queue("/refresh_access_token", 503, {"error": {"message": "Service unavailable"}})
+
+    refresher, _ = _run(fake_graph, Session)
+
+    db = Session()
+    assert db.get(models.SocialAccount, account_id).is_active is True
+    db.close()
+    assert refresher._retry_at[account_id] == NOW + timedelta(seconds=refresher.retry_delay)
+
+
+def test_non_refreshable_tokens_deactivate_only_once_expired(fake_graph, session_factory):
+    Session = session_factory
+    db = Session()
+    expired = _account(db, "whatsapp", "WA_OLD", -1)
+    valid = _account(db, "whatsapp", "WA_OK", 3)
+    db.close()
+
+    refresher, _ = _run(fake_graph, Session)
+
+    assert fake_graph.requests == []
+    db = Session()
+    assert db.get(models.SocialAccount, expired).is_active is False
+    assert db.get(models.SocialAccount, valid).is_active is True
+    db.close()
+    assert valid in refresher._retry_at
+
+
+def test_facebook_page_tokens_are_not_exchanged_or_deactivated_early(fake_graph, session_factory):
+    Session = session_factory
+    db = Session()
+    page = _account(db, "facebook", "PAGE_TOKEN", 3, name="Nails Page")
+    db.close()
+
+    refresher, _ = _run(fake_graph, Session)
+
+    assert fake_graph.requests == []
+    db = Session()
+    account = db.get(models.SocialAccount, page)
+    assert account.is_active is True
+    assert account.access_token == "PAGE_TOKEN"
+    assert db.query(models.DashboardNotification).count() == 0
+    db.close()
+    assert refresher._retry_at[page] == NOW + timedelta(days=3)
+
+
+def test_refresh_concurrency_is_bounded(fake_graph, session_factory):
+    Session = session_factory
+    db = Session()
+    for n in range(8):
+        _account(db, "instagram", f"T{n}", 1 + n / 10)
+    db.close()
+    fake_graph.default = (200, {"access_token": "NEW", "expires_in": 5184000}, {})
+    fake_graph.delay = 0.05
+
+    _, handled = _run(fake_graph, Session, concurrency=3)
+
+    assert handled == 8
+    assert 1 < fake_graph.max_in_flight <= 3
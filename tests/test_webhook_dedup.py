@@ -0,0 +1,66 @@
+from services.backend import models, webhook_dedup
+
+
+def _message(sender, mid):
+    return {"sender": {"id": sender}, "recipient": {"id": "PAGE1"}, "message": {"mid": mid, "text": "hi"}}
+
+
+def test_keys_expire_with_their_bucket():
+    index = webhook_dedup.ReplayIndex(window=60, buckets=6)
+    assert index.add("mid:1", now=1000)
+    assert not index.add("mid:1", now=1030)
+    assert index.add("mid:1", now=1075)  # first bucket has rotated out
+    assert index.stats()["duplicates"] == 1
+
+
+def test_index_is_bounded():
+    index = webhook_dedup.ReplayIndex(window=60, buckets=6, max_keys=10)
+    for n in range(50):
+        index.add(f"mid:{n}", now=1000 + n)
+    assert len(index) <= 20
+
+
+def test_claim_drops_only_duplicate_events():
+    index = webhook_dedup.ReplayIndex(window=300)
+    first = index.claim({"entry": [{"messaging": [_message("A", "m1")]}]})
+    assert first.keys == ["mid:m1"] and first.dropped == 0
+
+    mixed = index.claim({"entry": [{"messaging": [_message("A", "m1"), _message("B", "m2")]}]})
+    assert mixed.dropped == 1
+    assert mixed.payload["entry"][0]["messaging"] == [_message("B", "m2")]
+
+    assert index.claim({"entry": [{"messaging": [_message("B", "m2")]}]}).payload is None
+
+    # Status callbacks for one message are distinct events
+    statuses = {"entry": [{"changes": [{"value": {"statuses": [
+        {"id": "wamid.1", "status": "sent"},
+        {"id": "wamid.1", "status": "delivered"},
+        {"id": "wamid.1", "status": "sent"},
+    ]}}]}]}
+    result = index.claim(statuses)
+    assert result.dropped == 1
+    assert len(result.payload["entry"][0]["changes"][0]["value"]["statuses"]) == 2
+
+
+def test_forget_lets_a_retry_through():
+    index = webhook_dedup.ReplayIndex(window=300)
+    claimed = index.claim({"entry": [{"messaging": [_message("A", "m1")]}]})
+    index.forget(claimed.keys)
+    assert index.claim({"entry": [{"messaging": [_message("A", "m1")]}]}).payload is not None
+
+
+def test_db_backing_is_shared_between_processes(session_factory):
+    Session = session_factory
+
+    db = Session()
+    assert webhook_dedup.claim_db(db, {"entry": [{"messaging": [_message("A", "m1")]}]}).payload is not None
+    db.commit()
+    db.close()
+
+    # A second worker with an empty in-memory index still sees the key
+    db = Session()
+    result = webhook_dedup.claim_db(db, {"entry": [{"messaging": [_message("A", "m1"), _message("B", "m2")]}]})
+    db.commit()
+    assert result.dropped == 1 and result.keys == ["mid:m2"]
+    assert db.query(models.WebhookDedupKey).count() == 2
+    db.close()
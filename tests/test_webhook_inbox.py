@@ -0,0 +1,172 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+from services.backend import models, webhook_inbox
+
+
+def _instagram(sender, recipient, text, mid):
+    return {"entry": [{"messaging": [{"sender": {"id": sender}, "recipient": {"id": recipient}, "message": {"mid": mid, "text": text}}]}]}
+
+
+def test_parse_payload_handles_instagram_and_whatsapp():
+    items = webhook_inbox.parse_payload(_instagram("U1", "PAGE1", "hello", "m1"))
+    assert items == [webhook_inbox.InboundMessage("instagram", "PAGE1", "U1", "m1", "hello")]
+
+    whatsapp = {"entry": [{"changes": [{"value": {
+        "metadata": {"phone_number_id": "PHONE1"},
+        "messages": [{"from": "4470000", "id": "wamid.1", "timestamp": "1700000000", "text": {"body": "hi"}}],
+        "statuses": [{"id": "wamid.out", "status": "delivered"}],
+    }}]}]}
+    items = webhook_inbox.parse_payload(whatsapp)
+    assert items[0] == webhook_inbox.InboundMessage("whatsapp", "PHONE1", "4470000", "wamid.1", "hi", 1700000000)
+    assert items[1] == webhook_inbox.StatusUpdate("wamid.out", "delivered")
+
+
+def test_pipeline_keeps_conversation_order_and_runs_conversations_in_parallel(file_session_factory):
+    Session = file_session_factory
+    senders = "ABCDEFGH"  # string hashes vary per run; enough senders that some land on different shards
+    seen = []
+    active = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def handler(db, item):
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+        time.sleep(0.02)
+        with lock:
+            seen.append((item.sender_id, item.text))
+            active["now"] -= 1
+
+    async def run():
+        pipeline = webhook_inbox.WebhookPipeline(session_factory=Session, workers=4, handler=handler)
+        pipeline.start(recover=False)
+        db = Session()
+        for n in range(5):
+            for sender in senders:
+                raw = json.dumps(_instagram(sender, "PAGE1", str(n), f"{sender}{n}")).encode()
+                event_id = webhook_inbox.persist_event(db, "instagram", raw)
+                assert pipeline.submit(event_id, json.loads(raw))
+        db.close()
+        await pipeline.join()
+        await pipeline.stop()
+
+    asyncio.run(run())
+
+    for sender in senders:
+        assert [text for s, text in seen if s == sender] == ["0", "1", "2", "3", "4"]
+    assert active["max"] > 1
+
+    db = Session()
+    statuses = {status for (status,) in db.query(models.WebhookEvent.status).all()}
+    db.close()
+    assert statuses == {"processed"}
+
+
+def test_recover_processes_pending_events_and_logs_message(file_session_factory):
+    Session = file_session_factory
+    db = Session()
+    tech = models.Technician(full_name="T", business_name="B", email="inbox@example.com", password="x")
+    db.add(tech)
+    db.commit()
+    db.add(models.SocialAccount(
+        technician_id=tech.id,
+        platform="instagram",
+        account_name="biz",
+        account_id="PAGE1",
+        connected_at=datetime.now(timezone.utc).isoformat(),
+    ))
+    db.commit()
+    webhook_inbox.persist_event(db, "instagram", json.dumps(_instagram("U1", "PAGE1", "hello", "m1")).encode())
+    webhook_inbox.persist_event(db, "instagram", b"[]")
+    tech_id = tech.id
+    db.close()
+
+    async def run():
+        pipeline = webhook_inbox.WebhookPipeline(session_factory=Session, workers=2)
+        pipeline.start(recover=False)
+        submitted = await pipeline.recover()
+        await pipeline.join()
+        await pipeline.stop()
+        return submitted
+
+    assert asyncio.run(run()) == 1
+
+    db = Session()
+    log = db.query(models.MessageLog).one()
+    events = db.query(models.WebhookEvent).order_by(models.WebhookEvent.id).all()
+    db.close()
+    assert (log.technician_id, log.direction, log.message_content) == (tech_id, "incoming", "hello")
+    assert [e.status for e in events] == ["processed", "failed"]
+
+
+
+def test_deferred_conversation_waits_behind_its_oldest_event(file_session_factory):
+    Session = file_session_factory
+    seen = []
+    release = threading.Event()
+
+    def handler(db, item):
+        release.wait(5)
+        seen.append(item.text)
+
+    async def run():
+        pipeline = webhook_inbox.WebhookPipeline(session_factory=Session, workers=1, queue_size=1, handler=handler)
+        pipeline.start(recover=False)
+        db = Session()
+
+        def deliver(n):
+            raw = json.dumps(_instagram("A", "PAGE1", str(n), f"m{n}")).encode()
+            event_id = webhook_inbox.persist_event(db, "instagram", raw, claim=True)
+            if pipeline.submit(event_id, json.loads(raw)):
+                return True
+            webhook_inbox.release_event(db, event_id)
+            return False
+
+        accepted = [deliver(0), deliver(1)]  # "1" finds the queue full
+        await asyncio.sleep(0.05)  # the worker takes "0", so the queue has room again
+        accepted.append(deliver(2))
+        release.set()
+        await pipeline.join()
+        while await pipeline.recover():  # one at a time through the one-slot queue
+            await pipeline.join()
+        await pipeline.stop()
+        db.close()
+        return accepted, pipeline._deferred
+
+    accepted, deferred = asyncio.run(run())
+    assert accepted == [True, False, False]
+    assert seen == ["0", "1", "2"]
+    assert deferred == {}
+
+
+def test_recovery_claims_each_event_once_across_pipelines(file_session_factory):
+    Session = file_session_factory
+    seen = []
+    lock = threading.Lock()
+
+    def handler(db, item):
+        time.sleep(0.01)
+        with lock:
+            seen.append(item.text)
+
+    db = Session()
+    for n in range(20):
+        webhook_inbox.persist_event(db, "instagram", json.dumps(_instagram(f"U{n}", "PAGE1", str(n), f"m{n}")).encode())
+    db.close()
+
+    async def run():
+        pipelines = [webhook_inbox.WebhookPipeline(session_factory=Session, workers=2, handler=handler) for _ in range(2)]
+        for pipeline in pipelines:
+            pipeline.start(recover=False)
+        submitted = await asyncio.gather(*(pipeline.recover() for pipeline in pipelines))
+        for pipeline in pipelines:
+            await pipeline.join()
+            await pipeline.stop()
+        return submitted
+
+    assert sum(asyncio.run(run())) == 20
+    assert sorted(seen, key=int) == [str(n) for n in range(20)]